@@ -0,0 +1,36 @@
+-- 数据完整度索引（缺口索引）
+-- 每 (数据集, 交易所, 币种, UTC 日) 一行，slots 为当日各槽位是否有数据的位图：
+--   candles_1m  → 1440 位（每分钟一位）
+--   metrics_5m  → 288 位（每 5 分钟一位）
+-- 设计要点：
+--   1) data-service 每次 COPY upsert 后用暂存表按位或增量维护，缺口检测只查本表，
+--      不再对 candles_1m / binance_futures_metrics_5m 做 COUNT(*) GROUP BY day。
+--   2) seeded = 已从基础表回填（索引上线前的历史数据）；扫描时对未回填的 (币种, 日) 回填一次。
+--      不经 copy_upsert 写入的行（手工 SQL、其他服务）不会进入索引，因此：
+--        - 扫描前对已完结且仍有缺口的日用基础表 COUNT(*) 核对，行数多于 filled 的自动重新回填；
+--        - `python src/collectors/backfill.py --all --reseed` 把回溯窗口内的行置为 seeded = FALSE，
+--          下次扫描整体重建（重建对位图按位或，不会丢失并发写入）。
+--   3) 已知无法补齐的区间写入 missing_intervals（status = 'unfillable'），跨重启保留。
+--      只有数据源对该区间明确应答且无数据时才记录（请求失败不算）；checked_at 为最近一次确认时间，
+--      retry_count 为确认次数。超过 BACKFILL_UNFILLABLE_TTL_DAYS 的记录失效，扫描时重新当作缺口检验。
+
+SET search_path TO market_data, public;
+
+CREATE TABLE IF NOT EXISTS market_data.ingest_coverage (
+    dataset     TEXT        NOT NULL,
+    exchange    TEXT        NOT NULL,
+    symbol      TEXT        NOT NULL,
+    day         DATE        NOT NULL,
+    slots       VARBIT      NOT NULL,
+    filled      INTEGER     NOT NULL,
+    seeded      BOOLEAN     NOT NULL DEFAULT FALSE,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (dataset, exchange, symbol, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_missing_intervals_unfillable
+    ON market_data.missing_intervals (exchange, "interval", symbol, gap_start)
+    WHERE status = 'unfillable';
+
+ALTER TABLE market_data.missing_intervals
+    ADD COLUMN IF NOT EXISTS checked_at TIMESTAMPTZ;
@@ -0,0 +1,193 @@
+"""数据完整度索引（缺口索引）
+
+market_data.ingest_coverage 每 (数据集, 交易所, 币种, UTC 日) 一行:
+    slots   当日每个槽位（1m: 1440 / 5m: 288）是否有数据的位图
+    filled  已有数据的槽位数
+    seeded  是否已从基础表回填（索引上线前的历史数据、非经本适配器写入的数据）
+
+TimescaleAdapter.copy_upsert 每次写入后按暂存表的行做按位或，缺口检测只查索引，
+不再对基础表 COUNT(*) GROUP BY day；位图中连续的 0 即精确到槽位的缺口区间。
+
+不经 copy_upsert 写入的行（手工 SQL、其他服务）不会进入索引。对仍有缺口的已完结日，
+扫描前用基础表行数核对（stale_sql），行数多于位图即重新回填；也可用
+backfill.py --reseed 使回溯窗口内的索引整体失效。
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from psycopg import sql
+
+INDEX_TABLE = "ingest_coverage"
+
+# 已知无法补齐的区间记录在 missing_intervals（status = 'unfillable'），跨重启保留
+UNFILLABLE_STATUS = "unfillable"
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """被索引的基础表"""
+    name: str
+    table: str
+    ts_col: str
+    slot_seconds: int
+    naive: bool = False     # 时间列为 UTC naive timestamp
+
+    @property
+    def slots(self) -> int:
+        return 86400 // self.slot_seconds
+
+    def day_start(self, d: date) -> datetime:
+        ts = datetime.combine(d, time.min, tzinfo=timezone.utc)
+        return ts.replace(tzinfo=None) if self.naive else ts
+
+
+DATASETS: Dict[str, Dataset] = {
+    "candles_1m": Dataset("candles_1m", "candles_1m", "bucket_ts", 60),
+    "metrics_5m": Dataset("metrics_5m", "binance_futures_metrics_5m", "create_time", 300, naive=True),
+}
+BY_TABLE: Dict[str, Dataset] = {ds.table: ds for ds in DATASETS.values()}
+
+
+def ddl(schema: str) -> sql.Composed:
+    """与 libs/database/db/schema/008_gap_index.sql 一致"""
+    return sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {table} (
+            dataset     TEXT        NOT NULL,
+            exchange    TEXT        NOT NULL,
+            symbol      TEXT        NOT NULL,
+            day         DATE        NOT NULL,
+            slots       VARBIT      NOT NULL,
+            filled      INTEGER     NOT NULL,
+            seeded      BOOLEAN     NOT NULL DEFAULT FALSE,
+            updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (dataset, exchange, symbol, day)
+        )
+    """).format(table=sql.Identifier(schema, INDEX_TABLE))
+
+
+def _day_bits(ds: Dataset, ts: sql.Composable) -> Tuple[sql.Composable, sql.Composable]:
+    """(UTC 日, 当日位图) 聚合表达式；EXTRACT(EPOCH) 对 naive timestamp 按 UTC 计"""
+    epoch = sql.SQL("EXTRACT(EPOCH FROM {})::bigint").format(ts)
+    day = sql.SQL("(DATE '1970-01-01' + ({} / 86400)::int)").format(epoch)
+    bits = sql.SQL("bit_or(B'1'::bit({n}) >> (mod({e}, 86400) / {slot})::int)::varbit").format(
+        n=sql.Literal(ds.slots), e=epoch, slot=sql.Literal(ds.slot_seconds),
+    )
+    return day, bits
+
+
+def _on_conflict(seeded: bool) -> sql.Composable:
+    return sql.SQL("""
+        ON CONFLICT (dataset, exchange, symbol, day) DO UPDATE SET
+            slots = c.slots | EXCLUDED.slots,
+            filled = bit_count(c.slots | EXCLUDED.slots),
+            {seeded}updated_at = NOW()
+    """).format(seeded=sql.SQL("seeded = TRUE, ") if seeded else sql.SQL(""))
+
+
+def update_sql(schema: str, ds: Dataset, source: sql.Composable) -> sql.Composed:
+    """用刚写入的行（暂存表）更新索引；参数: ds, exchange（行中无 exchange 时的默认值）"""
+    day, bits = _day_bits(ds, sql.Identifier(ds.ts_col))
+    return sql.SQL("""
+        INSERT INTO {index} AS c (dataset, exchange, symbol, day, slots, filled)
+        SELECT %(ds)s, exchange, symbol, day, slots, bit_count(slots)
+        FROM (
+            SELECT COALESCE(exchange, %(exchange)s) AS exchange, symbol, {day} AS day, {bits} AS slots
+            FROM {source}
+            GROUP BY 1, 2, 3
+        ) s
+    """).format(index=sql.Identifier(schema, INDEX_TABLE), day=day, bits=bits, source=source) + _on_conflict(False)
+
+
+def seed_sql(schema: str, ds: Dataset) -> sql.Composed:
+    """
+    从基础表回填指定 (币种, 日)，没有数据的日写入全 0 位图（表示已索引）
+
+    参数: ds, exchange, symbols, days（两个等长数组），syms（去重币种）, start, end（基础表扫描范围）
+    """
+    day, bits = _day_bits(ds, sql.Identifier(ds.ts_col))
+    return sql.SQL("""
+        INSERT INTO {index} AS c (dataset, exchange, symbol, day, slots, filled, seeded)
+        SELECT %(ds)s, %(exchange)s, p.symbol, p.day,
+               COALESCE(a.slots, B'0'::bit({n})::varbit), COALESCE(bit_count(a.slots), 0), TRUE
+        FROM unnest(%(symbols)s::text[], %(days)s::date[]) AS p(symbol, day)
+        LEFT JOIN (
+            SELECT symbol, {day} AS day, {bits} AS slots
+            FROM {base}
+            WHERE exchange = %(exchange)s AND symbol = ANY(%(syms)s)
+              AND {ts} >= %(start)s AND {ts} < %(end)s
+            GROUP BY 1, 2
+        ) a USING (symbol, day)
+    """).format(
+        index=sql.Identifier(schema, INDEX_TABLE), n=sql.Literal(ds.slots), day=day, bits=bits,
+        base=sql.Identifier(schema, ds.table), ts=sql.Identifier(ds.ts_col),
+    ) + _on_conflict(True)
+
+
+def stale_sql(schema: str, ds: Dataset) -> sql.Composed:
+    """
+    已回填且有缺口的 (币种, 日) 中，基础表行数多于位图已有槽位数的（有行绕过了写入路径）
+
+    参数: ds, exchange, symbols, start, end（日期，闭区间）；只核对有缺口的日，COUNT 走主键索引
+    """
+    day_start = sql.SQL("c.day::timestamp") if ds.naive else sql.SQL("(c.day::timestamp AT TIME ZONE 'UTC')")
+    return sql.SQL("""
+        SELECT c.symbol, c.day FROM {index} c
+        WHERE c.dataset = %(ds)s AND c.exchange = %(exchange)s AND c.symbol = ANY(%(symbols)s)
+          AND c.day BETWEEN %(start)s AND %(end)s AND c.seeded AND c.filled < {n}
+          AND (
+              SELECT count(*) FROM {base} b
+              WHERE b.exchange = c.exchange AND b.symbol = c.symbol
+                AND b.{ts} >= {day_start} AND b.{ts} < {day_start} + INTERVAL '1 day'
+          ) > c.filled
+    """).format(
+        index=sql.Identifier(schema, INDEX_TABLE), n=sql.Literal(ds.slots),
+        base=sql.Identifier(schema, ds.table), ts=sql.Identifier(ds.ts_col), day_start=day_start,
+    )
+
+
+def invalidate_sql(schema: str) -> sql.Composed:
+    """标记 (币种, 日) 为未回填，下次扫描重新从基础表回填；参数: ds, exchange, symbols, start, end"""
+    return sql.SQL("""
+        UPDATE {index} SET seeded = FALSE
+        WHERE dataset = %(ds)s AND exchange = %(exchange)s AND symbol = ANY(%(symbols)s)
+          AND day BETWEEN %(start)s AND %(end)s AND seeded
+    """).format(index=sql.Identifier(schema, INDEX_TABLE))
+
+
+_ZEROS = re.compile("0+")
+
+
+def missing_runs(bits: str, limit: int = None) -> List[Tuple[int, int]]:
+    """位图中缺失槽位的 [起, 止) 区间；limit 之后的槽位（当日尚未到达）不计"""
+    if limit is not None:
+        bits = bits[:max(0, limit)]
+    return [m.span() for m in _ZEROS.finditer(bits)]
+
+
+def fill_runs(bits: str, runs: List[Tuple[int, int]]) -> str:
+    """把 runs 覆盖的槽位视为已有（已知无法补齐的区间不再报缺口）"""
+    if not runs:
+        return bits
+    chars = list(bits)
+    for a, b in runs:
+        a, b = max(a, 0), min(b, len(chars))
+        if a < b:
+            chars[a:b] = "1" * (b - a)
+    return "".join(chars)
+
+
+def slot_range(ds: Dataset, d: date, start: datetime, end: datetime) -> Tuple[int, int]:
+    """[start, end) 与日 d 相交部分的槽位区间（可能为空）"""
+    base = datetime.combine(d, time.min, tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    step = timedelta(seconds=ds.slot_seconds)
+    a = max(0, (start - base) // step)
+    b = min(ds.slots, -((base - end) // step))      # 向上取整
+    return int(a), int(b)
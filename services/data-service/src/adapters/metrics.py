@@ -17,6 +17,7 @@ class Metrics:
     gaps_found: int = 0
     gaps_filled: int = 0
     zip_downloads: int = 0
+    rollups_published: int = 0
 
     # 耗时 (秒)
     last_collect_duration: float = 0
@@ -45,6 +46,7 @@ class Metrics:
                 "gaps_found": self.gaps_found,
                 "gaps_filled": self.gaps_filled,
                 "zip_downloads": self.zip_downloads,
+                "rollups_published": self.rollups_published,
                 "last_collect_duration": self.last_collect_duration,
                 "last_backfill_duration": self.last_backfill_duration,
                 "last_collect_time": self.last_collect_time,
@@ -0,0 +1,378 @@
+"""PostgreSQL 二进制 COPY 列式编码
+
+COPY ... (FORMAT BINARY) 的数据流:
+    头部 | 每行 [int16 列数, 每列 (int32 字节数 | -1 表示 NULL, 数据)] | 尾部 int16 -1
+
+按列算出每行长度 → cumsum 得到各行起点 → 逐列把整列大端字节一次性写入缓冲区，
+不逐行 pack。列值可以是 NumPy 数组、列表或标量（整列相同）。
+
+价格 / 数量列按 NUMERIC 二进制格式编码（十进制字符串逐位换算为万进制），
+与原文本 COPY 一样精确；不经 float8 暂存（float8 → numeric 只保留 15 位有效数字）。
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8     # 签名 + flags + 扩展区长度
+TRAILER = b"\xff\xff"                               # 列数 -1 表示数据结束
+
+# PostgreSQL 时间纪元 2000-01-01 与 UNIX 纪元之差（微秒）
+_PG_EPOCH_US = 946_684_800 * 1_000_000
+_UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+# 列类型 → 暂存表中的 SQL 类型
+SQL_TYPES = {
+    "text": "TEXT", "float8": "DOUBLE PRECISION", "int8": "BIGINT", "bool": "BOOLEAN",
+    "timestamptz": "TIMESTAMPTZ", "timestamp": "TIMESTAMP", "numeric": "NUMERIC",
+}
+
+_NUMERIC_NEG = 0x4000
+
+
+def column_length(values) -> int | None:
+    """列长度；标量返回 None"""
+    if values is None or isinstance(values, (str, bytes)) or not hasattr(values, "__len__"):
+        return None
+    return len(values)
+
+
+def _broadcast(values, n: int) -> np.ndarray:
+    if column_length(values) is None:
+        out = np.empty(n, dtype=object)
+        out[:] = [values] * n
+        return out
+    return values if isinstance(values, np.ndarray) else np.asarray(values, dtype=object)
+
+
+def _nulls(arr: np.ndarray) -> np.ndarray:
+    if arr.dtype == object:
+        return np.fromiter((v is None for v in arr), dtype=bool, count=len(arr))
+    if arr.dtype.kind == "f":
+        return np.isnan(arr)
+    if arr.dtype.kind == "M":
+        return np.isnat(arr)
+    return np.zeros(len(arr), dtype=bool)
+
+
+# ==================== 列适配器 ====================
+# 每个适配器返回 (每行字节数 int64[n]，-1 为 NULL；写入函数 write(buf, pos))
+
+def _fixed(data: np.ndarray, null: np.ndarray) -> Tuple[np.ndarray, Callable]:
+    """定长列：data 为大端数组"""
+    width = data.dtype.itemsize
+    raw = data.view(np.uint8).reshape(len(data), width)
+    lengths = np.where(null, -1, width)
+
+    def write(buf: np.ndarray, pos: np.ndarray) -> None:
+        keep = ~null
+        buf[pos[keep, None] + np.arange(width)] = raw[keep]
+    return lengths, write
+
+
+def _float8(values, n):
+    arr = _broadcast(values, n)
+    if arr.dtype == object:
+        null = _nulls(arr)
+        arr = np.array([0.0 if v is None else float(v) for v in arr], dtype=np.float64)
+        null |= np.isnan(arr)
+    else:
+        arr = arr.astype(np.float64, copy=False)
+        null = np.isnan(arr)
+    return _fixed(arr.astype(">f8"), null)
+
+
+def _int8(values, n):
+    arr = _broadcast(values, n)
+    null = _nulls(arr)
+    if arr.dtype == object or arr.dtype.kind == "f":
+        arr = np.where(null, 0, arr).astype(np.int64)
+    return _fixed(arr.astype(">i8"), null)
+
+
+def _bool(values, n):
+    arr = _broadcast(values, n)
+    null = _nulls(arr)
+    if arr.dtype == object:
+        arr = np.where(null, False, arr).astype(bool)
+    return _fixed(arr.astype(np.uint8), null)
+
+
+def _epoch_us(v) -> int:
+    """datetime → UNIX 微秒；naive 视为 UTC（与 timestamp 列的存储约定一致）"""
+    if v.tzinfo is None:
+        v = v.replace(tzinfo=timezone.utc)
+    return (v - _UNIX_EPOCH) // _US
+
+
+def _timestamp(values, n):
+    arr = _broadcast(values, n)
+    null = _nulls(arr)
+    if arr.dtype.kind == "M":
+        us = arr.astype("datetime64[us]").astype(np.int64)
+    else:
+        us = np.fromiter((0 if v is None else _epoch_us(v) for v in arr), dtype=np.int64, count=n)
+    return _fixed((us - _PG_EPOCH_US).astype(">i8"), null)
+
+
+def _text(values, n):
+    """变长文本：取值去重后按行收集字节（symbol / exchange / source 取值很少）"""
+    if column_length(values) is None:
+        uniques, codes = [values], np.zeros(n, dtype=np.intp)
+        null = np.full(n, values is None)
+    else:
+        arr = _broadcast(values, n)
+        null = _nulls(arr)
+        uniques, codes = np.unique(np.where(null, "", arr).astype(str), return_inverse=True)
+    encoded = [b"" if u is None else str(u).encode() for u in uniques]
+    sizes = np.array([len(e) for e in encoded], dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    lengths = np.where(null, -1, sizes[codes])
+
+    def write(buf: np.ndarray, pos: np.ndarray) -> None:
+        # 每个字节: 目标 = 行起点 + k，来源 = 取值起点 + k
+        keep = ~null
+        size = sizes[codes[keep]]
+        k = np.arange(int(size.sum())) - np.repeat(np.cumsum(size) - size, size)
+        buf[np.repeat(pos[keep], size) + k] = blob[np.repeat(starts[codes[keep]], size) + k]
+    return lengths, write
+
+
+def _decimal_chars(values, n) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    列值 → (十进制字符串的 uint8 字符矩阵（右侧补 0）, NULL 掩码)
+
+    字符串数组直接按字节 / UCS4 视图取字符；浮点取最短往返表示（与 repr 一致）；NaN / 空串为 NULL
+    """
+    arr = _broadcast(values, n)
+    kind = arr.dtype.kind
+    null = None
+    if kind == "f":
+        null = np.isnan(arr)
+        if np.isinf(arr).any():
+            raise ValueError("numeric column contains infinity")
+        arr, kind = np.where(null, 0.0, arr).astype(str), "U"
+    elif kind in "iub":
+        arr, kind = arr.astype(np.int64).astype(str), "U"
+    elif kind == "O":
+        out = []
+        for v in arr:
+            if v is None or (isinstance(v, (float, Decimal)) and v != v):
+                out.append("")
+            else:
+                out.append(repr(v) if isinstance(v, float) else str(v))
+        arr, kind = np.array(out, dtype=str), "U"
+
+    arr = np.ascontiguousarray(arr)
+    if kind == "U":
+        width = max(arr.dtype.itemsize // 4, 1)
+        codes = arr.view(np.uint32).reshape(n, -1) if arr.dtype.itemsize else np.zeros((n, 1), np.uint32)
+        m = np.where(codes < 128, codes, 63).astype(np.uint8)          # 非 ASCII → "?"（校验不通过）
+    else:
+        width = max(arr.dtype.itemsize, 1)
+        m = (arr.view(np.uint8).reshape(n, -1) if arr.dtype.itemsize else np.zeros((n, 1), np.uint8)).copy()
+    null = m[:, 0] == 0 if null is None else null
+    m[null] = 0
+    m[null, 0] = 48                                                   # NULL 行按 "0" 参与计算
+    return m.reshape(n, width), null
+
+
+_INT64_DIGITS = 15       # 补齐到万进制边界最多再乘 10^3，仍在 int64 范围内
+_INT64_GROUPS = 5
+
+
+def _groups_int64(mantissa: np.ndarray, scale: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    整数尾数（值 = mantissa * 10^-scale）补零使小数位对齐到 4 的倍数后按万进制拆分
+
+    返回 (万进制各位 int16[n, 5], 第 0 位的权重)
+    """
+    pad = -scale % 4
+    v = mantissa * 10 ** pad
+    groups = np.empty((len(v), _INT64_GROUPS), dtype=np.int16)
+    for k in range(_INT64_GROUPS - 1, -1, -1):
+        v, groups[:, k] = np.divmod(v, 10_000)
+    return groups, _INT64_GROUPS - 1 - (scale + pad) // 4
+
+
+def _groups_grid(m: np.ndarray, is_digit: np.ndarray, scale: np.ndarray, dot_at: np.ndarray,
+                 exp: np.ndarray, point: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    任意位数: 所有行按小数点对齐到同一网格（整数与小数部分各补齐到 4 的倍数），每 4 位合成一个万进制位
+
+    网格第 g 列取该行第 c 个字符: 小数点前 c = g + dot_at + exp - lead，小数点后再跳过小数点本身
+    """
+    width = m.shape[1]
+    lead = -(-max(int(point.max()), 1) // 4) * 4
+    grid_w = lead + -(-max(int(scale.max()), 0) // 4) * 4
+    g = np.arange(grid_w, dtype=np.int64)
+    src = g + (dot_at + exp - lead)[:, None] + (g >= (lead - exp)[:, None])
+    inside = (src >= 0) & (src < width)
+    src = np.where(inside, src, 0)
+    grid = np.where(inside & np.take_along_axis(is_digit, src, 1),
+                    np.take_along_axis(m, src, 1).astype(np.int16) - 48, 0).astype(np.int16)
+    grid = grid.reshape(len(m), -1, 4)
+    groups = ((grid[..., 0] * 10 + grid[..., 1]) * 10 + grid[..., 2]) * 10 + grid[..., 3]
+    return groups, np.full(len(m), lead // 4 - 1, dtype=np.int64)
+
+
+def _scan_decimal(m: np.ndarray) -> tuple:
+    """
+    按 [-+]数字[.数字][e[-+]数字] 解析字符矩阵
+
+    返回 (非法行掩码, 尾数位数, 小数点位置, e 位置, 指数, 是否带符号, 整数尾数（≤18 位时有效）)
+    """
+    n = len(m)
+    # 逐字符列一次扫描（列数 ≈ 字符串宽度，每步都是长度 n 的向量运算）:
+    # 长度、尾数位数、小数点个数 / 位置、e 的位置，同时按 Horner 累加整数尾数
+    size = np.zeros(n, dtype=np.int64)
+    ndigits = np.zeros(n, dtype=np.int64)
+    dots = np.zeros(n, dtype=np.int64)
+    dot_at = np.full(n, -1, dtype=np.int64)
+    e_at = np.full(n, -1, dtype=np.int64)
+    mantissa = np.zeros(n, dtype=np.int64)
+    in_mantissa = np.ones(n, dtype=bool)
+    scientific = bool(((m | 0x20) == 101).any())
+    for j, c in enumerate(np.ascontiguousarray(m.T)):
+        size += c != 0
+        d = c - 48
+        digit = d < 10                                                  # uint8 回绕: 非数字 ≥ 10
+        dot = c == 46
+        if scientific:
+            digit &= in_mantissa
+            dot &= in_mantissa
+            e = ((c | 0x20) == 101) & in_mantissa
+            e_at[e] = j
+            in_mantissa &= ~e
+        ndigits += digit
+        mantissa = np.where(digit, mantissa * 10 + d, mantissa)
+        dots += dot
+        dot_at = np.where(dot, j, dot_at)
+    has_sign = (m[:, 0] == 43) | (m[:, 0] == 45)
+    has_e = e_at >= 0
+    e_at = np.where(has_e, e_at, size)
+    dot_at = np.where(dots > 0, dot_at, e_at)
+
+    exp = np.zeros(n, dtype=np.int64)
+    exp_len = np.zeros(n, dtype=np.int64)              # 含 e 的指数部分字节数；-1 为非法
+    for i in np.nonzero(has_e)[0]:
+        # 指数部分逐行解析（科学计数法只出现在极小 / 极大的浮点数上）
+        tail = m[i, e_at[i] + 1:size[i]].tobytes()
+        digits = tail[1:] if tail[:1] in (b"+", b"-") else tail
+        valid = digits.isdigit() and len(digits) <= 4                  # NUMERIC 本身只到 10^±16383
+        exp[i] = int(tail) if valid else 0
+        exp_len[i] = len(tail) + 1 if valid else -1
+
+    # 每行除符号 / 小数点 / 指数外只能是数字
+    bad = (ndigits == 0) | (dots > 1) | (exp_len < 0) | (ndigits != size - has_sign - dots - exp_len)
+    return bad, ndigits, dot_at, e_at, exp, has_sign, mantissa
+
+
+def valid_decimals(values) -> np.ndarray:
+    """每个值能否按 NUMERIC 编码（空值 / NaN 视为 NULL，可以）"""
+    m, null = _decimal_chars(values, column_length(values) or 1)
+    return null | ~_scan_decimal(m)[0]
+
+
+def _numeric(values, n):
+    """
+    变长 NUMERIC: int16 位数 | int16 权重 | int16 符号 | int16 小数位 | 万进制各位 int16
+
+    十进制字符串换算为万进制各位后去掉首尾为 0 的位；
+    支持 [-+]数字[.数字][e[-+]数字]，小数位取字符串原有位数（"1.50" → 2 位）。
+    """
+    m, null = _decimal_chars(values, n)
+    width = m.shape[1]
+    bad, ndigits, dot_at, e_at, exp, has_sign, mantissa = _scan_decimal(m)
+    if bad.any():
+        raise ValueError(f"invalid numeric value: {m[bad.argmax()].tobytes().rstrip(bytes(1)).decode()!r}")
+
+    point = dot_at - has_sign + exp                                   # 小数点前的十进制位数
+    scale = ndigits - point
+    dscale = np.where(null, 0, np.maximum(scale, 0))
+
+    # 万进制各位 + 第 0 位的权重；整列不超过 15 位有效数字时直接拆分整数尾数（常见情况），否则按网格对齐
+    if ndigits.max() <= _INT64_DIGITS:
+        groups, top = _groups_int64(mantissa, scale)
+    else:
+        is_digit = ((m - 48) < 10) & (np.arange(width) < e_at[:, None])
+        groups, top = _groups_grid(m, is_digit, scale, dot_at, exp, point)
+
+    nonzero = groups != 0
+    any_digit = nonzero.any(1)
+    first = nonzero.argmax(1)
+    last = groups.shape[1] - 1 - nonzero[:, ::-1].argmax(1)
+    count = np.where(any_digit, last - first + 1, 0)
+    weight = np.where(any_digit, top - first, 0)
+    sign = np.where(any_digit & (m[:, 0] == 45), _NUMERIC_NEG, 0)
+
+    # 每行定长载荷（头部 + 左移到首个非 0 位的各位），写入时只取前 8 + 2 * count 字节
+    span = np.arange(groups.shape[1])
+    shifted = np.take_along_axis(groups, np.minimum(first[:, None] + span, groups.shape[1] - 1), 1)
+    payload = np.concatenate([np.stack([count, weight, sign, dscale], axis=1), shifted], axis=1)
+    payload = payload.astype(">i2").view(np.uint8).reshape(n, -1)
+    lengths = np.where(null, -1, 8 + 2 * count)
+    used = np.arange(payload.shape[1]) < lengths[:, None]
+
+    def write(buf: np.ndarray, pos: np.ndarray) -> None:
+        buf[(pos[:, None] + np.arange(payload.shape[1]))[used]] = payload[used]
+    return lengths, write
+
+
+ADAPTERS: Dict[str, Callable] = {
+    "text": _text, "float8": _float8, "int8": _int8, "bool": _bool,
+    "timestamptz": _timestamp, "timestamp": _timestamp, "numeric": _numeric,
+}
+
+
+def encode_rows(columns: Mapping[str, object], types: Mapping[str, str], n: int) -> bytes:
+    """把 n 行列式数据编码为 COPY BINARY 行数据（不含头部 / 尾部）"""
+    if n <= 0:
+        return b""
+    fields = [ADAPTERS[types[name]](values, n) for name, values in columns.items()]
+
+    sizes = np.full(n, 2, dtype=np.int64)
+    for lengths, _ in fields:
+        sizes += 4 + np.maximum(lengths, 0)
+    pos = np.cumsum(sizes) - sizes
+    buf = np.empty(int(sizes.sum()), dtype=np.uint8)
+
+    count = np.full(n, len(fields), dtype=">i2").view(np.uint8).reshape(n, 2)
+    buf[pos[:, None] + np.arange(2)] = count
+    pos = pos + 2
+    for lengths, write in fields:
+        buf[pos[:, None] + np.arange(4)] = lengths.astype(">i4").view(np.uint8).reshape(n, 4)
+        pos = pos + 4
+        write(buf, pos)
+        pos = pos + np.maximum(lengths, 0)
+    return buf.tobytes()
+
+
+def to_columns(rows, names: Sequence[str] | None = None) -> Tuple[Dict[str, object], int]:
+    """
+    统一输入为 ({列名: 列值}, 行数)
+
+    rows 可以是 {列名: 数组/列表/标量}、元组列表（需给出 names）或字典列表（兼容旧调用）
+    """
+    if isinstance(rows, Mapping):
+        lengths = {column_length(v) for v in rows.values()} - {None}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        return dict(rows), lengths.pop() if lengths else 0
+    if not rows:
+        return {}, 0
+    if isinstance(rows[0], Mapping):
+        names = list(rows[0].keys())
+        return {c: [r.get(c) for r in rows] for c in names}, len(rows)
+    if names is None:
+        raise ValueError("Tuple rows require column names")
+    return dict(zip(names, (list(col) for col in zip(*rows, strict=True)), strict=True)), len(rows)
+
+
+def slice_columns(columns: Mapping[str, object], start: int, stop: int) -> Dict[str, object]:
+    return {c: v if column_length(v) is None else v[start:stop] for c, v in columns.items()}
@@ -3,17 +3,36 @@ from __future__ import annotations
 
 import logging
 from contextlib import contextmanager
-from datetime import datetime
-from typing import Dict, Iterator, List, Optional, Sequence
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence
 
 from psycopg import sql
 from psycopg.rows import dict_row
 from psycopg_pool import ConnectionPool
 
+from adapters import coverage
+from adapters.pgcopy import HEADER, SQL_TYPES, TRAILER, encode_rows, slice_columns, to_columns
 from config import normalize_interval, settings
 
 logger = logging.getLogger(__name__)
 
+# 各表可写列 → COPY 编码类型
+CANDLE_TYPES = {
+    "exchange": "text", "symbol": "text", "bucket_ts": "timestamptz",
+    "open": "numeric", "high": "numeric", "low": "numeric", "close": "numeric", "volume": "numeric",
+    "quote_volume": "numeric", "trade_count": "int8",
+    "taker_buy_volume": "numeric", "taker_buy_quote_volume": "numeric",
+    "is_closed": "bool", "source": "text",
+}
+
+METRIC_TYPES = {
+    "create_time": "timestamp", "symbol": "text", "exchange": "text",
+    "sum_open_interest": "numeric", "sum_open_interest_value": "numeric",
+    "count_toptrader_long_short_ratio": "numeric", "sum_toptrader_long_short_ratio": "numeric",
+    "count_long_short_ratio": "numeric", "sum_taker_long_short_vol_ratio": "numeric",
+    "source": "text", "is_closed": "bool",
+}
+
 
 class TimescaleAdapter:
     """TimescaleDB 操作"""
@@ -26,6 +45,7 @@ class TimescaleAdapter:
         self._pool_max = pool_max
         self._timeout = timeout
         self._pool: Optional[ConnectionPool] = None
+        self._coverage_ok: Optional[bool] = None     # 完整度索引表是否可用（首次写入时建表）
 
     @property
     def pool(self) -> ConnectionPool:
@@ -50,138 +70,244 @@ class TimescaleAdapter:
         with self.pool.connection() as conn:
             yield conn
 
-    def upsert_candles(self, interval: str, rows: Sequence[dict], batch_size: int = 2000) -> int:
+    # ==================== 批量写入（二进制 COPY + 会话级暂存表） ====================
+
+    def _staging(self, cur, table: str, types: Mapping[str, str]) -> sql.Identifier:
         """
-        使用 COPY 命令批量 upsert K线，实现最高性能。
+        会话级暂存表：每个连接首次使用时创建，之后复用
 
-        工作流程:
-        1. 创建一个与目标表结构相同的临时表。
-        2. 使用高效的 COPY 命令将所有数据流式传输到临时表。
-        3. 从临时表执行一次 INSERT ... ON CONFLICT 操作到目标表。
-        4. 事务结束时，临时表会自动删除。
+        临时表不写 WAL；ON COMMIT DELETE ROWS 在提交时清空，表结构留在连接上，
+        不再每批 CREATE TABLE ... LIKE。列类型按 COPY 编码；价格 / 数量列暂存为不限精度的 NUMERIC，
+        INSERT 时按目标列精度取整（与原文本 COPY 一致，不经 float8）。
         """
-        if not rows:
-            return 0
+        stage = sql.Identifier(f"stage_{table}")
+        cur.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {stage} ({cols}) ON COMMIT DELETE ROWS").format(
+            stage=stage,
+            cols=sql.SQL(", ").join(
+                sql.SQL("{} {}").format(sql.Identifier(c), sql.SQL(SQL_TYPES[t])) for c, t in types.items()
+            ),
+        ))
+        return stage
+
+    def copy_upsert(self, table: str, types: Mapping[str, str], keys: Sequence[str], rows,
+                    names: Optional[Sequence[str]] = None, batch_size: int = 50000) -> int:
+        """
+        二进制 COPY 到暂存表，再一次 INSERT ... ON CONFLICT 到目标表
 
-        interval = normalize_interval(interval)
-        table_name = f"candles_{interval}"
-        cols = list(rows[0].keys()) # 从第一行获取列名，确保顺序一致
-
-        # 确保关键列存在
-        if "bucket_ts" not in cols or "symbol" not in cols or "exchange" not in cols:
-            raise ValueError("Rows must contain bucket_ts, symbol, and exchange")
-
-        temp_table_name = f"temp_{table_name}_{int(datetime.now().timestamp() * 1000)}"
-
-        sql_create_temp = sql.SQL("""
-            CREATE TEMP TABLE {temp_table} (LIKE {target_table} INCLUDING DEFAULTS)
-            ON COMMIT DROP;
-        """).format(
-            temp_table=sql.Identifier(temp_table_name),
-            target_table=sql.Identifier(self.schema, table_name)
-        )
-
-        # ON CONFLICT 更新的列（排除冲突键）
-        update_cols = [col for col in cols if col not in ("exchange", "symbol", "bucket_ts")]
-        sql_upsert_from_temp = sql.SQL("""
-            INSERT INTO {target_table} ({cols})
-            SELECT {cols} FROM {temp_table}
-            ON CONFLICT (exchange, symbol, bucket_ts) DO UPDATE SET
-                {update_assignments},
-                updated_at = NOW();
-        """).format(
-            target_table=sql.Identifier(self.schema, table_name),
-            cols=sql.SQL(", ").join(map(sql.Identifier, cols)),
-            temp_table=sql.Identifier(temp_table_name),
-            update_assignments=sql.SQL(", ").join(
-                sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col))
-                for col in update_cols
-            )
-        )
+        rows: {列名: NumPy 数组/列表/标量}、元组列表（配合 names）或字典列表
+        """
+        columns, n = to_columns(rows, names)
+        if not n:
+            return 0
+        unknown = [c for c in columns if c not in types]
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {unknown}")
+        missing = [k for k in keys if k not in columns]
+        if missing:
+            raise ValueError(f"Rows must contain {', '.join(keys)}")
+
+        cols = list(columns)
+        col_list = sql.SQL(", ").join(map(sql.Identifier, cols))
+        update_cols = [c for c in cols if c not in keys]
+        index = coverage.BY_TABLE.get(table)
+        if index is not None and not self.ensure_coverage():
+            index = None
 
-        total_inserted = 0
         with self.connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(sql_create_temp)
-
-                # 分批处理
-                for i in range(0, len(rows), batch_size):
-                    batch = rows[i:i + batch_size]
-
-                    # 使用 COPY 命令高效写入临时表
-                    with cur.copy(sql.SQL("COPY {temp_table} ({cols}) FROM STDIN").format(
-                        temp_table=sql.Identifier(temp_table_name),
-                        cols=sql.SQL(", ").join(map(sql.Identifier, cols))
-                    )) as copy:
-                        for row in batch:
-                            copy.write_row(tuple(row.get(col) for col in cols))
-
-                # 从临时表一次性 upsert 到目标表
-                cur.execute(sql_upsert_from_temp)
-                total_inserted = cur.rowcount if cur.rowcount > 0 else len(rows)
-
+                stage = self._staging(cur, table, types)
+                with cur.copy(sql.SQL("COPY {stage} ({cols}) FROM STDIN (FORMAT BINARY)").format(
+                    stage=stage, cols=col_list,
+                )) as copy:
+                    # 原始块写入: 头部与尾部都要自己写（psycopg 只在 write_row 模式下追加尾部）
+                    copy.write(HEADER)
+                    for i in range(0, n, batch_size):
+                        m = min(batch_size, n - i)
+                        copy.write(encode_rows(slice_columns(columns, i, i + m), types, m))
+                    copy.write(TRAILER)
+
+                cur.execute(sql.SQL("""
+                    INSERT INTO {target} ({cols})
+                    SELECT {cols} FROM {stage}
+                    ON CONFLICT ({keys}) DO UPDATE SET
+                        {update_assignments},
+                        updated_at = NOW();
+                """).format(
+                    target=sql.Identifier(self.schema, table),
+                    cols=col_list,
+                    stage=stage,
+                    keys=sql.SQL(", ").join(map(sql.Identifier, keys)),
+                    update_assignments=sql.SQL(", ").join(
+                        sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(c)) for c in update_cols
+                    ),
+                ))
+                total = cur.rowcount if cur.rowcount > 0 else n
+                if index is not None:
+                    self._update_coverage(conn, cur, index, stage)
             conn.commit()
+        return total
+
+    # ==================== 完整度索引 ====================
+
+    def ensure_coverage(self) -> bool:
+        """完整度索引表（首次调用时 CREATE IF NOT EXISTS；失败则本进程内关闭索引维护）"""
+        if self._coverage_ok is None:
+            try:
+                with self.connection() as conn:
+                    conn.execute(coverage.ddl(self.schema))
+                    conn.commit()
+                self._coverage_ok = True
+            except Exception as e:
+                logger.warning("完整度索引不可用，跳过维护: %s", e)
+                self._coverage_ok = False
+        return self._coverage_ok
+
+    def _update_coverage(self, conn, cur, ds: coverage.Dataset, stage: sql.Identifier) -> None:
+        """本批写入的行并入完整度索引；放在 savepoint 中，失败不影响数据写入"""
+        try:
+            with conn.transaction():
+                cur.execute(coverage.update_sql(self.schema, ds, stage),
+                            {"ds": ds.name, "exchange": settings.db_exchange})
+        except Exception as e:
+            logger.warning("完整度索引更新失败 %s: %s", ds.table, e)
+
+    def seed_coverage(self, dataset: str, exchange: str, symbols: Sequence[str], start: date, end: date,
+                      verify: bool = True) -> int:
+        """
+        回填 [start, end] 内尚未从基础表索引过的 (币种, 日)，返回回填的 (币种, 日) 数
 
-        return total_inserted
+        索引上线后只有新的一天（及新上架币种）需要回填，之后由写入路径增量维护。
+        verify=True 时再核对已完结且仍有缺口的日：基础表行数多于位图（有行未经 copy_upsert 写入）的重新回填。
+        """
+        ds = coverage.DATASETS[dataset]
+        if not symbols or not self.ensure_coverage():
+            return 0
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT symbol, day FROM {index}
+                    WHERE dataset = %s AND exchange = %s AND symbol = ANY(%s)
+                      AND day BETWEEN %s AND %s AND seeded
+                """).format(index=sql.Identifier(self.schema, coverage.INDEX_TABLE)),
+                    (ds.name, exchange, list(symbols), start, end))
+                done = set(cur.fetchall())
+                pairs = [(s, d) for s in symbols for d in days if (s, d) not in done]
+                # 当日尚未完结，缺口属正常，不核对
+                last_full = min(end, datetime.now(timezone.utc).date() - timedelta(days=1))
+                if verify and done and start <= last_full:
+                    cur.execute(coverage.stale_sql(self.schema, ds), {
+                        "ds": ds.name, "exchange": exchange, "symbols": list(symbols),
+                        "start": start, "end": last_full,
+                    })
+                    stale = cur.fetchall()
+                    if stale:
+                        logger.info("完整度索引与 %s 不一致，重新回填 %d 个 (币种, 日)", ds.table, len(stale))
+                        pairs += stale
+                if not pairs:
+                    return 0
+                first, last = min(d for _, d in pairs), max(d for _, d in pairs)
+                cur.execute(coverage.seed_sql(self.schema, ds), {
+                    "ds": ds.name, "exchange": exchange,
+                    "symbols": [s for s, _ in pairs], "days": [d for _, d in pairs],
+                    "syms": sorted({s for s, _ in pairs}),
+                    "start": ds.day_start(first), "end": ds.day_start(last + timedelta(days=1)),
+                })
+            conn.commit()
+        return len(pairs)
 
-    def upsert_metrics(self, rows: Sequence[dict], batch_size: int = 2000) -> int:
-        """使用 COPY 命令批量 upsert 指标数据，实现最高性能。"""
-        if not rows:
+    def invalidate_coverage(self, dataset: str, exchange: str, symbols: Sequence[str], start: date, end: date) -> int:
+        """使 [start, end] 内的索引失效（seeded = FALSE），下次扫描从基础表重新回填；返回失效的行数"""
+        if not symbols or not self.ensure_coverage():
             return 0
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(coverage.invalidate_sql(self.schema), {
+                    "ds": coverage.DATASETS[dataset].name, "exchange": exchange,
+                    "symbols": list(symbols), "start": start, "end": end,
+                })
+                n = cur.rowcount
+            conn.commit()
+        return n
 
-        table_name = "binance_futures_metrics_5m"
-        cols = list(rows[0].keys())
-
-        if "create_time" not in cols or "symbol" not in cols:
-            raise ValueError("Rows must contain create_time and symbol")
-
-        temp_table_name = f"temp_{table_name}_{int(datetime.now().timestamp() * 1000)}"
-
-        sql_create_temp = sql.SQL("""
-            CREATE TEMP TABLE {temp_table} (LIKE {target_table} INCLUDING DEFAULTS)
-            ON COMMIT DROP;
-        """).format(
-            temp_table=sql.Identifier(temp_table_name),
-            target_table=sql.Identifier(self.schema, table_name)
-        )
-
-        update_cols = [col for col in cols if col not in ("symbol", "create_time")]
-        sql_upsert_from_temp = sql.SQL("""
-            INSERT INTO {target_table} ({cols})
-            SELECT {cols} FROM {temp_table}
-            ON CONFLICT (symbol, create_time) DO UPDATE SET
-                {update_assignments},
-                updated_at = NOW();
-        """).format(
-            target_table=sql.Identifier(self.schema, table_name),
-            cols=sql.SQL(", ").join(map(sql.Identifier, cols)),
-            temp_table=sql.Identifier(temp_table_name),
-            update_assignments=sql.SQL(", ").join(
-                sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col))
-                for col in update_cols
-            )
-        )
+    def load_coverage(self, dataset: str, exchange: str, symbols: Sequence[str],
+                      start: date, end: date) -> Dict[tuple, str]:
+        """{(币种, 日): 位图字符串}"""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT symbol, day, slots::text FROM {index}
+                    WHERE dataset = %s AND exchange = %s AND symbol = ANY(%s) AND day BETWEEN %s AND %s
+                """).format(index=sql.Identifier(self.schema, coverage.INDEX_TABLE)),
+                    (dataset, exchange, list(symbols), start, end))
+                return {(sym, d): bits for sym, d, bits in cur.fetchall()}
 
-        total_inserted = 0
+    def mark_unfillable(self, exchange: str, interval: str, ranges: Sequence[tuple], reason: str = "") -> int:
+        """记录已确认无数据的区间 [(symbol, start, end)]（missing_intervals, status = unfillable）
+
+        同一区间再次确认时只刷新 checked_at 并累加 retry_count。
+        """
+        if not ranges:
+            return 0
+        table = sql.Identifier(self.schema, "missing_intervals")
+        params = [{"ex": exchange, "sym": sym, "iv": interval, "start": a, "end": b,
+                   "status": coverage.UNFILLABLE_STATUS, "reason": reason or None}
+                  for sym, a, b in ranges]
         with self.connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(sql_create_temp)
+                cur.executemany(sql.SQL("""
+                    WITH hit AS (
+                        UPDATE {table} SET checked_at = NOW(), retry_count = retry_count + 1, last_error = %(reason)s
+                        WHERE exchange = %(ex)s AND symbol = %(sym)s AND "interval" = %(iv)s
+                          AND gap_start = %(start)s AND gap_end = %(end)s AND status = %(status)s
+                        RETURNING 1
+                    )
+                    INSERT INTO {table} (exchange, symbol, "interval", gap_start, gap_end, status, last_error, checked_at)
+                    SELECT %(ex)s, %(sym)s, %(iv)s, %(start)s, %(end)s, %(status)s, %(reason)s, NOW()
+                    WHERE NOT EXISTS (SELECT 1 FROM hit)
+                """).format(table=table), params)
+            conn.commit()
+        return len(ranges)
 
-                for i in range(0, len(rows), batch_size):
-                    batch = rows[i:i + batch_size]
-                    with cur.copy(sql.SQL("COPY {temp_table} ({cols}) FROM STDIN").format(
-                        temp_table=sql.Identifier(temp_table_name),
-                        cols=sql.SQL(", ").join(map(sql.Identifier, cols))
-                    )) as copy:
-                        for row in batch:
-                            copy.write_row(tuple(row.get(col) for col in cols))
+    def load_unfillable(self, exchange: str, interval: str, symbols: Sequence[str],
+                        start: datetime, end: datetime, checked_after: Optional[datetime] = None) -> Dict[str, List[tuple]]:
+        """{symbol: [(start, end)]} 与 [start, end) 相交的已知无法补齐区间；checked_after 之前确认的视为过期"""
+        checked_after = checked_after or datetime.min.replace(tzinfo=timezone.utc)
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("""
+                    SELECT symbol, gap_start, gap_end FROM {table}
+                    WHERE exchange = %s AND "interval" = %s AND symbol = ANY(%s) AND status = %s
+                      AND gap_start < %s AND gap_end > %s AND COALESCE(checked_at, detected_at) >= %s
+                """).format(table=sql.Identifier(self.schema, "missing_intervals")),
+                    (exchange, interval, list(symbols), coverage.UNFILLABLE_STATUS, end, start, checked_after))
+                out: Dict[str, List[tuple]] = {}
+                for sym, a, b in cur.fetchall():
+                    out.setdefault(sym, []).append((a, b))
+                return out
+
+    def upsert_candles(self, interval: str, rows, names: Optional[Sequence[str]] = None,
+                       batch_size: int = 50000) -> int:
+        """批量 upsert K线（列式 / 元组 / 字典行均可）"""
+        interval = normalize_interval(interval)
+        return self.copy_upsert(f"candles_{interval}", CANDLE_TYPES, ("exchange", "symbol", "bucket_ts"),
+                                rows, names, batch_size)
 
-                cur.execute(sql_upsert_from_temp)
-                total_inserted = cur.rowcount if cur.rowcount > 0 else len(rows)
+    def upsert_metrics(self, rows, names: Optional[Sequence[str]] = None, batch_size: int = 50000) -> int:
+        """批量 upsert 期货指标（列式 / 元组 / 字典行均可）"""
+        return self.copy_upsert("binance_futures_metrics_5m", METRIC_TYPES, ("symbol", "create_time"),
+                                rows, names, batch_size)
 
+    def notify(self, channel: str, payloads: Sequence[str]) -> int:
+        """同一事务内发送多条 NOTIFY（提交后按顺序送达）"""
+        if not payloads:
+            return 0
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                for payload in payloads:
+                    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
             conn.commit()
-
-        return total_inserted
+        return len(payloads)
 
     def _quote_val(self, v) -> str:
         """SQL 值转义 (在此重构中已不再需要，保留以兼容旧代码)"""
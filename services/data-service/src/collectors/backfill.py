@@ -1,35 +1,36 @@
 """数据补齐系统 - K线 + 期货指标
 
 功能：
-1. 精确缺口检测 (按条数，非按日期)
-2. REST 分页补齐 (CCXT)
-3. ZIP 历史补齐 (Binance Vision)
-4. 补齐后复检
-5. 持续巡检模式
+1. 精确缺口检测 (完整度索引，精确到分钟区间)
+2. 补齐计划: 按区间在 REST 分页 (CCXT) / 日度 ZIP / 月度 ZIP (Binance Vision) 中取最省的，只写缺失的分钟
+3. 补齐后复检
+4. 持续巡检模式
 """
 from __future__ import annotations
 
 import argparse
-import csv
 import logging
 import sys
 import time
-import zipfile
+from bisect import bisect_right
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import requests
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from adapters.ccxt import fetch_ohlcv, load_symbols, to_rows
+from adapters.coverage import DATASETS, fill_runs, missing_runs, slot_range
 from adapters.metrics import Timer, metrics
 from adapters.rate_limiter import acquire, parse_ban, release, set_ban
 from adapters.timescale import TimescaleAdapter
+from collectors import planner
+from collectors.vision import read_klines, read_metrics
 from config import INTERVAL_TO_MS, settings
 
 logger = logging.getLogger(__name__)
@@ -40,71 +41,137 @@ EXPECTED_5M_PER_DAY = 288   # 5分钟 * 288 = 1天
 
 
 # ==================== 缺口检测 ====================
+@dataclass(slots=True)
+class GapRange:
+    """精确缺口区间 [start, end)"""
+    symbol: str
+    start: datetime
+    end: datetime
+
+    @property
+    def minutes(self) -> int:
+        return int((self.end - self.start).total_seconds() // 60)
+
+
 @dataclass
 class GapInfo:
-    """缺口信息"""
+    """缺口信息（按日汇总，ranges 为当日精确缺口区间）"""
     symbol: str
     date: date
     expected: int
     actual: int
     missing: int = field(init=False)
+    ranges: List[GapRange] = field(default_factory=list, compare=False)
 
     def __post_init__(self):
         self.missing = self.expected - self.actual
 
 
+# 完整度索引数据集 → missing_intervals 中记录无法补齐区间的周期
+_UNFILLABLE_INTERVAL = {"candles_1m": "1m"}
+
+
 class GapScanner:
-    """精确缺口扫描器"""
+    """精确缺口扫描器 - 查完整度索引（adapters/coverage.py），精确到槽位"""
+
+    # 当日最近的槽位可能还在写入途中，不算缺口
+    GRACE = timedelta(minutes=2)
 
     def __init__(self, ts: TimescaleAdapter):
         self._ts = ts
 
-    def scan_klines(self, symbols: Sequence[str], start: date, end: date,
-                    interval: str = "1m", threshold: float = 0.95) -> Dict[str, List[GapInfo]]:
-        """扫描 K 线缺口，返回 {symbol: [GapInfo]}"""
-        expected = EXPECTED_1M_PER_DAY if interval == "1m" else int(EXPECTED_1M_PER_DAY / INTERVAL_TO_MS.get(interval, 60000) * 60000)
-        min_count = int(expected * threshold)
+    def _day_runs(self, dataset: str, symbols: Sequence[str], start: date, end: date,
+                  now: Optional[datetime] = None):
+        """逐 (币种, 日) 产出 (symbol, 日, 应有槽位数, 日起点, [(起槽, 止槽)])，已扣除未过期的已知无法补齐区间"""
+        ds = DATASETS[dataset]
+        exchange = settings.db_exchange
+        self._ts.seed_coverage(dataset, exchange, symbols, start, end)
+        bitmaps = self._ts.load_coverage(dataset, exchange, symbols, start, end)
 
-        table = f"{self._ts.schema}.candles_{interval}"
-        sql = f"""
-            SELECT symbol, DATE(bucket_ts AT TIME ZONE 'UTC') AS d, COUNT(*) AS c
-            FROM {table}
-            WHERE exchange = %s AND symbol = ANY(%s)
-              AND bucket_ts >= %s AND bucket_ts < %s
-            GROUP BY symbol, DATE(bucket_ts AT TIME ZONE 'UTC')
-        """
         start_ts = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
         end_ts = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        now = now or datetime.now(timezone.utc)
+        interval = _UNFILLABLE_INTERVAL.get(dataset)
+        fresh = now - timedelta(days=settings.backfill_unfillable_ttl_days)
+        unfillable = self._ts.load_unfillable(exchange, interval, symbols, start_ts, end_ts, fresh) if interval else {}
 
-        counts: Dict[tuple, int] = {}
-        with self._ts.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(sql, (settings.db_exchange, list(symbols), start_ts, end_ts))
-                for sym, d, c in cur.fetchall():
-                    counts[(sym, d)] = c
-
-        gaps: Dict[str, List[GapInfo]] = {}
+        step = timedelta(seconds=ds.slot_seconds)
+        empty = "0" * ds.slots
         for sym in symbols:
-            sym_gaps = []
+            known = unfillable.get(sym, ())
             for i in range((end - start).days + 1):
                 d = start + timedelta(days=i)
-                actual = counts.get((sym, d), 0)
-                if actual < min_count:
-                    sym_gaps.append(GapInfo(sym, d, expected, actual))
-            if sym_gaps:
-                gaps[sym] = sym_gaps
+                base = start_ts + timedelta(days=i)
+                limit = min(ds.slots, (now - self.GRACE - base) // step)
+                if limit <= 0:
+                    continue
+                bits = fill_runs(bitmaps.get((sym, d), empty), [slot_range(ds, d, a, b) for a, b in known])
+                yield sym, d, int(limit), base, missing_runs(bits, limit)
+
+    def scan_ranges(self, symbols: Sequence[str], start: date, end: date, dataset: str = "candles_1m",
+                    now: Optional[datetime] = None) -> Dict[str, List[GapRange]]:
+        """精确缺口区间 {symbol: [GapRange]}，跨日相连的区间合并"""
+        step = timedelta(seconds=DATASETS[dataset].slot_seconds)
+        out: Dict[str, List[GapRange]] = {}
+        for sym, _, _, base, runs in self._day_runs(dataset, symbols, start, end, now):
+            ranges = out.setdefault(sym, [])
+            for a, b in runs:
+                r_start, r_end = base + a * step, base + b * step
+                if ranges and ranges[-1].end == r_start:
+                    ranges[-1].end = r_end
+                else:
+                    ranges.append(GapRange(sym, r_start, r_end))
+        return {sym: ranges for sym, ranges in out.items() if ranges}
+
+    def _scan_days(self, dataset: str, symbols: Sequence[str], start: date, end: date,
+                   threshold: float) -> Dict[str, List[GapInfo]]:
+        step = timedelta(seconds=DATASETS[dataset].slot_seconds)
+        gaps: Dict[str, List[GapInfo]] = {}
+        for sym, d, expected, base, runs in self._day_runs(dataset, symbols, start, end):
+            actual = expected - sum(b - a for a, b in runs)
+            if actual < int(expected * threshold):
+                ranges = [GapRange(sym, base + a * step, base + b * step) for a, b in runs]
+                gaps.setdefault(sym, []).append(GapInfo(sym, d, expected, actual, ranges))
         return gaps
 
+    def scan_klines(self, symbols: Sequence[str], start: date, end: date,
+                    interval: str = "1m", threshold: float = 0.95) -> Dict[str, List[GapInfo]]:
+        """扫描 K 线缺口，返回 {symbol: [GapInfo]}（当日只计已到达的分钟）"""
+        if interval == "1m":
+            return self._scan_days("candles_1m", symbols, start, end, threshold)
+        return self._scan_counts(symbols, start, end, interval, threshold)
+
     def scan_metrics(self, symbols: Sequence[str], start: date, end: date,
                      threshold: float = 0.95) -> Dict[str, List[GapInfo]]:
         """扫描期货指标缺口"""
-        min_count = int(EXPECTED_5M_PER_DAY * threshold)
+        return self._scan_days("metrics_5m", symbols, start, end, threshold)
+
+    def invalidate(self, symbols: Sequence[str], start: date, end: date) -> int:
+        """使 [start, end] 内各数据集的完整度索引失效，下次扫描从基础表重新回填"""
+        return sum(self._ts.invalidate_coverage(ds, settings.db_exchange, symbols, start, end) for ds in DATASETS)
+
+    # 结束不足该时长的缺口可能只是暂时缺失（交易所延迟），不记为无法补齐
+    UNFILLABLE_SETTLE = timedelta(hours=1)
+
+    def mark_unfillable(self, gaps: Dict[str, List[GapRange]], reason: str = "") -> int:
+        """数据源确认无数据的 K 线区间持久化为已知无法补齐（跨重启保留，TTL 内扫描不再报告）"""
+        cutoff = datetime.now(timezone.utc) - self.UNFILLABLE_SETTLE
+        ranges = [(r.symbol, r.start, r.end) for sym_ranges in gaps.values() for r in sym_ranges if r.end <= cutoff]
+        return self._ts.mark_unfillable(settings.db_exchange, "1m", ranges, reason)
 
-        sql = """
-            SELECT symbol, DATE(create_time) AS d, COUNT(*) AS c
-            FROM market_data.binance_futures_metrics_5m
-            WHERE symbol = ANY(%s) AND create_time >= %s AND create_time < %s
-            GROUP BY symbol, DATE(create_time)
+    def _scan_counts(self, symbols: Sequence[str], start: date, end: date,
+                     interval: str, threshold: float) -> Dict[str, List[GapInfo]]:
+        """非 1m 周期（连续聚合视图，无索引）仍按日计数"""
+        expected = int(EXPECTED_1M_PER_DAY / INTERVAL_TO_MS.get(interval, 60000) * 60000)
+        min_count = int(expected * threshold)
+
+        table = f"{self._ts.schema}.candles_{interval}"
+        sql = f"""
+            SELECT symbol, DATE(bucket_ts AT TIME ZONE 'UTC') AS d, COUNT(*) AS c
+            FROM {table}
+            WHERE exchange = %s AND symbol = ANY(%s)
+              AND bucket_ts >= %s AND bucket_ts < %s
+            GROUP BY symbol, DATE(bucket_ts AT TIME ZONE 'UTC')
         """
         start_ts = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
         end_ts = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
@@ -112,7 +179,7 @@ class GapScanner:
         counts: Dict[tuple, int] = {}
         with self._ts.connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(sql, (list(symbols), start_ts, end_ts))
+                cur.execute(sql, (settings.db_exchange, list(symbols), start_ts, end_ts))
                 for sym, d, c in cur.fetchall():
                     counts[(sym, d)] = c
 
@@ -123,7 +190,7 @@ class GapScanner:
                 d = start + timedelta(days=i)
                 actual = counts.get((sym, d), 0)
                 if actual < min_count:
-                    sym_gaps.append(GapInfo(sym, d, EXPECTED_5M_PER_DAY, actual))
+                    sym_gaps.append(GapInfo(sym, d, expected, actual))
             if sym_gaps:
                 gaps[sym] = sym_gaps
         return gaps
@@ -397,50 +464,31 @@ class ZipBackfiller:
 
         return total
 
-    def _download_kline_month(self, symbol: str, month: str, dates: List[date], interval: str) -> int:
-        """下载并导入一个月的 K 线数据"""
+    def _kline_file(self, symbol: str, interval: str, period: str) -> Optional[Path]:
+        """本地缓存或下载一个 K 线 ZIP；period 为 YYYY-MM（月度）或 YYYY-MM-DD（日度），不可用返回 None"""
         sym = symbol.upper()
-        total = 0
-        current_month = date.today().strftime("%Y-%m")
+        kind = "monthly" if len(period) == 7 else "daily"
+        fname = f"{sym}-{interval}-{period}.zip"
+        path = self._kline_dir / fname
+        if path.exists():
+            return path
+        url = f"{BINANCE_DATA_URL}/data/futures/um/{kind}/klines/{sym}/{interval}/{fname}"
+        return path if self._download_with_retry(url, path) else None
 
-        # 当月数据直接用日度ZIP（月度ZIP还没生成）
-        if month == current_month:
-            for d in dates:
-                day_str = d.strftime("%Y-%m-%d")
-                day_fname = f"{sym}-{interval}-{day_str}.zip"
-                day_path = self._kline_dir / day_fname
-                if not day_path.exists():
-                    day_url = f"{BINANCE_DATA_URL}/data/futures/um/daily/klines/{sym}/{interval}/{day_fname}"
-                    if not self._download_with_retry(day_url, day_path):
-                        continue
-                total += self._import_kline_zip(day_path, symbol, interval)
-            return total
-
-        # 1. 历史月份尝试月度 ZIP
-        month_fname = f"{sym}-{interval}-{month}.zip"
-        month_path = self._kline_dir / month_fname
-        if not month_path.exists():
-            month_url = f"{BINANCE_DATA_URL}/data/futures/um/monthly/klines/{sym}/{interval}/{month_fname}"
-            self._download_with_retry(month_url, month_path)
-
-        if month_path.exists():
-            # 月度 ZIP 存在，导入所有需要的日期
-            for d in dates:
-                n = self._import_kline_zip(month_path, symbol, interval, d)
-                total += n
-            return total
+    def _download_kline_month(self, symbol: str, month: str, dates: List[date], interval: str) -> int:
+        """下载并导入一个月的 K 线数据"""
+        # 当月数据直接用日度ZIP（月度ZIP还没生成）；历史月份优先月度 ZIP，一次解析导入所有需要的日期
+        if month != date.today().strftime("%Y-%m"):
+            month_path = self._kline_file(symbol, interval, month)
+            if month_path is not None:
+                return self._import_kline_zip(month_path, symbol, interval, dates)
 
-        # 2. 月度不存在，降级到日度
+        # 月度不存在，降级到日度
+        total = 0
         for d in dates:
-            day_str = d.strftime("%Y-%m-%d")
-            day_fname = f"{sym}-{interval}-{day_str}.zip"
-            day_path = self._kline_dir / day_fname
-            if not day_path.exists():
-                day_url = f"{BINANCE_DATA_URL}/data/futures/um/daily/klines/{sym}/{interval}/{day_fname}"
-                if not self._download_with_retry(day_url, day_path):
-                    continue
-            total += self._import_kline_zip(day_path, symbol, interval)
-
+            day_path = self._kline_file(symbol, interval, d.strftime("%Y-%m-%d"))
+            if day_path is not None:
+                total += self._import_kline_zip(day_path, symbol, interval)
         return total
 
     def fill_metrics_gaps(self, gaps: Dict[str, List[GapInfo]]) -> int:
@@ -500,10 +548,7 @@ class ZipBackfiller:
             self._download_with_retry(month_url, month_path)
 
         if month_path.exists():
-            for d in dates:
-                n = self._import_metrics_zip(month_path, symbol, d)
-                total += n
-            return total
+            return self._import_metrics_zip(month_path, symbol, dates)
 
         # 2. 降级到日度
         for d in dates:
@@ -518,104 +563,161 @@ class ZipBackfiller:
 
         return total
 
-    def _import_kline_zip(self, path: Path, symbol: str, interval: str, filter_date: date = None) -> int:
-        """导入 K 线 ZIP，可选按日期过滤"""
-        rows = []
+    def _import_kline_zip(self, path: Path, symbol: str, interval: str, dates: Optional[Sequence[date]] = None,
+                          ranges: Optional[Sequence[tuple]] = None) -> int:
+        """列式导入 K 线 ZIP，dates / ranges 非空时只导入这些日期 / 区间（逐块写入，内存与文件大小无关）"""
+        total = 0
         try:
-            with zipfile.ZipFile(path) as zf:
-                for name in zf.namelist():
-                    if not name.endswith(".csv"):
-                        continue
-                    with zf.open(name) as f:
-                        for row in csv.reader(line.decode() for line in f):
-                            if len(row) < 6:
-                                continue
-                            try:
-                                ts = datetime.fromtimestamp(int(row[0]) / 1000, tz=timezone.utc)
-                                # 月度ZIP时只导入指定日期
-                                if filter_date and ts.date() != filter_date:
-                                    continue
-                                rows.append({
-                                    "exchange": settings.db_exchange,
-                                    "symbol": symbol.upper(),
-                                    "bucket_ts": ts,
-                                    "open": float(row[1]), "high": float(row[2]),
-                                    "low": float(row[3]), "close": float(row[4]),
-                                    "volume": float(row[5]),
-                                    "quote_volume": float(row[7]) if len(row) > 7 and row[7] else None,
-                                    "trade_count": int(row[8]) if len(row) > 8 and row[8] else None,
-                                    "is_closed": True,
-                                    "source": "binance_zip",
-                                    "taker_buy_volume": float(row[9]) if len(row) > 9 and row[9] else None,
-                                    "taker_buy_quote_volume": float(row[10]) if len(row) > 10 and row[10] else None,
-                                })
-                            except (ValueError, IndexError):
-                                pass
+            for cols in read_klines(path, dates, settings.backfill_zip_chunk_rows, ranges):
+                cols.update(exchange=settings.db_exchange, symbol=symbol.upper(), is_closed=True, source="binance_zip")
+                total += self._ts.upsert_candles(interval, cols)
         except Exception as e:
-            logger.error("解析失败 %s: %s", path, e)
-            return 0
-
-        if rows:
-            return self._ts.upsert_candles(interval, rows)
-        return 0
+            logger.error("导入失败 %s: %s", path, e)
+        return total
 
-    def _import_metrics_zip(self, path: Path, symbol: str, filter_date: date = None) -> int:
-        """导入 metrics ZIP，可选按日期过滤"""
-        rows = []
+    def _import_metrics_zip(self, path: Path, symbol: str, dates: Optional[Sequence[date]] = None) -> int:
+        """列式导入 metrics ZIP，dates 非空时只导入这些日期"""
+        total = 0
         try:
-            with zipfile.ZipFile(path) as zf:
-                for name in zf.namelist():
-                    if not name.endswith(".csv"):
-                        continue
-                    with zf.open(name) as f:
-                        for row in csv.reader(line.decode() for line in f):
-                            if len(row) < 4:
-                                continue
-                            try:
-                                ts_val = row[0]
-                                if ts_val.isdigit():
-                                    ts = int(ts_val)
-                                else:
-                                    ts = int(datetime.fromisoformat(ts_val.replace("Z", "+00:00")).timestamp() * 1000)
-
-                                # 对齐到 5 分钟边界
-                                ts = (ts // 300000) * 300000
-                                dt = datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
-                                if filter_date and dt.date() != filter_date:
-                                    continue
-
-                                rows.append({
-                                    "create_time": dt.replace(tzinfo=None),
-                                    "symbol": symbol.upper(),
-                                    "exchange": settings.db_exchange,
-                                    "sum_open_interest": Decimal(row[2]) if len(row) > 2 and row[2] else None,
-                                    "sum_open_interest_value": Decimal(row[3]) if len(row) > 3 and row[3] else None,
-                                    "count_toptrader_long_short_ratio": Decimal(row[5]) if len(row) > 5 and row[5] else None,
-                                    "sum_toptrader_long_short_ratio": Decimal(row[4]) if len(row) > 4 and row[4] else None,
-                                    "count_long_short_ratio": Decimal(row[6]) if len(row) > 6 and row[6] else None,
-                                    "sum_taker_long_short_vol_ratio": Decimal(row[7]) if len(row) > 7 and row[7] else None,
-                                    "source": "binance_zip",
-                                    "is_closed": True,
-                                })
-                            except (ValueError, IndexError):
-                                pass
+            for cols in read_metrics(path, dates, settings.backfill_zip_chunk_rows):
+                cols.update(symbol=symbol.upper(), exchange=settings.db_exchange, source="binance_zip", is_closed=True)
+                total += self._upsert_metrics(cols)
         except Exception as e:
-            logger.error("解析失败 %s: %s", path, e)
-            return 0
-
-        if rows:
-            return self._upsert_metrics(rows)
-        return 0
+            logger.error("导入失败 %s: %s", path, e)
+        return total
 
-    def _upsert_metrics(self, rows: List[dict]) -> int:
-        """批量 upsert metrics - 使用 COPY 高性能写入"""
-        if not rows:
+    def _upsert_metrics(self, rows) -> int:
+        """批量 upsert metrics - 使用 COPY 高性能写入（字典行或列式）"""
+        if not len(rows):
             return 0
         n = self._ts.upsert_metrics(rows)
         metrics.inc("rows_written", n)
         return n
 
 
+# ==================== 区间补齐 ====================
+def _minutes(gaps: Dict[str, List[GapRange]]) -> int:
+    return sum(r.minutes for ranges in gaps.values() for r in ranges)
+
+
+def _covered(spans: Sequence[tuple], start: datetime, end: datetime) -> bool:
+    """[start, end) 是否被 spans（可重叠 / 相接）完整覆盖"""
+    reach = start
+    for a, b in sorted(spans):
+        if a > reach:
+            break
+        reach = max(reach, b)
+        if reach >= end:
+            return True
+    return False
+
+
+class RangeBackfiller:
+    """按补齐计划（collectors/planner.py）执行 REST 翻页 / 日度 ZIP / 月度 ZIP，只写原始缺口区间内的行"""
+
+    def __init__(self, ts: TimescaleAdapter, workers: int = 4, zip_bf: Optional[ZipBackfiller] = None):
+        self._ts = ts
+        self._workers = workers
+        self._zip = zip_bf or ZipBackfiller(ts, workers)
+
+    def fill(self, gaps: Dict[str, List[GapRange]], interval: str = "1m", allow_zip: bool = True,
+             answered: Optional[Dict[str, List[tuple]]] = None) -> int:
+        """补齐 {symbol: [GapRange]}，返回写入行数；allow_zip=False 时全部走 REST（ZIP 补过仍缺的区间）
+
+        answered 非空时收集数据源实际应答覆盖的时间段 {symbol: [(start, end)]}（失败的任务不计入），
+        这些时间段内仍缺的分钟才是数据源确认没有的。
+        """
+        tasks = planner.plan(gaps, settings.backfill_coalesce_minutes, allow_zip=allow_zip)
+        if not tasks:
+            return 0
+        logger.info("补齐计划: %s", planner.summarize(tasks))
+
+        total = 0
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            futures = {pool.submit(self._run, task, interval): task for task in tasks}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    n, spans = future.result()
+                    total += n
+                    if answered is not None:
+                        answered.setdefault(task.symbol, []).extend(spans)
+                    if n > 0:
+                        logger.info("[%s] %s %s 补齐 %d 条 (缺 %d 分钟)", task.symbol, task.source, task.period, n, task.minutes)
+                except Exception as e:
+                    logger.warning("[%s] %s %s 失败: %s", task.symbol, task.source, task.period, e)
+        return total
+
+    def fill_verified(self, scanner: GapScanner, gaps: Dict[str, List[GapRange]],
+                      start: date, end: date) -> Tuple[int, Dict[str, List[GapRange]]]:
+        """按计划补齐 → 复检后剩余区间全部走 REST → 仍缺且 REST 明确应答过的记为无法补齐；返回 (写入行数, 最终缺口)
+
+        请求失败 / 限流 / 返回空页的区间不记录，下轮照常重试。
+        """
+        filled = self.fill(gaps)
+        final: Dict[str, List[GapRange]] = {}
+        remaining = scanner.scan_ranges(list(gaps), start, end)
+        if remaining:
+            logger.info("复检: 仍缺 %d 分钟，尝试 REST 补齐", _minutes(remaining))
+            answered: Dict[str, List[tuple]] = {}
+            filled += self.fill(remaining, allow_zip=False, answered=answered)
+            final = scanner.scan_ranges(list(remaining), start, end)
+            confirmed = {sym: [r for r in ranges if _covered(answered.get(sym, ()), r.start, r.end)]
+                         for sym, ranges in final.items()}
+            n = scanner.mark_unfillable(confirmed, "zip+rest")
+            if n:
+                logger.debug("记录 %d 个数据源确认无数据的缺口区间", n)
+        return filled, final
+
+    def _run(self, task: planner.BackfillTask, interval: str) -> Tuple[int, List[tuple]]:
+        """执行一个任务，返回 (写入行数, 数据源应答覆盖的时间段)"""
+        if task.source != planner.REST:
+            path = self._zip._kline_file(task.symbol, interval, task.period)
+            if path is not None:
+                # ZIP 是该周期的完整归档
+                return self._zip._import_kline_zip(path, task.symbol, interval, ranges=task.ranges), list(task.ranges)
+            # ZIP 未发布 / 下载失败 → REST
+            task.windows = planner.coalesce(task.ranges, settings.backfill_coalesce_minutes)
+        return self._fill_rest(task.symbol, task.windows, task.ranges, interval)
+
+    def _fill_rest(self, symbol: str, windows: Sequence[tuple], ranges: Sequence[tuple],
+                   interval: str) -> Tuple[int, List[tuple]]:
+        """按拉取窗口翻页，只保留落在缺口区间内的行
+
+        交易所从 since 起返回首根已有 K 线，因此 [窗口起点, 最后一根 K 线之后) 是确认过的时间段；
+        空页（无数据或请求失败，fetch_ohlcv 不区分）不扩展该时间段。
+        """
+        step = INTERVAL_TO_MS.get(interval, 60000)
+        bounds = sorted(ranges)
+        starts = [a for a, _ in bounds]
+
+        def missing(ts: datetime) -> bool:
+            i = bisect_right(starts, ts) - 1
+            return i >= 0 and ts < bounds[i][1]
+
+        rows, spans = [], []
+        for start, end in windows:
+            since_ms = int(start.timestamp() * 1000)
+            target_ms = int(end.timestamp() * 1000)
+            reached_ms = None
+            for _ in range(100):
+                candles = fetch_ohlcv(settings.ccxt_exchange, symbol, interval, since_ms, planner.REST_PAGE_ROWS)
+                if not candles:
+                    break
+                rows.extend(r for r in to_rows(settings.db_exchange, symbol, candles, "ccxt_gap") if missing(r["bucket_ts"]))
+                last_ms = int(candles[-1][0])
+                reached_ms = last_ms + step
+                if last_ms == since_ms or reached_ms >= target_ms:
+                    break
+                since_ms = reached_ms
+            if reached_ms is not None:
+                spans.append((start, datetime.fromtimestamp(reached_ms / 1000, tz=timezone.utc)))
+
+        if rows:
+            self._ts.upsert_candles(interval, rows)
+        return len(rows), spans
+
+
 # ==================== 统一补齐器 ====================
 class DataBackfiller:
     """统一数据补齐器"""
@@ -628,6 +730,7 @@ class DataBackfiller:
         self._scanner = GapScanner(self._ts)
         self._rest = RestBackfiller(self._ts)
         self._zip = ZipBackfiller(self._ts, workers)
+        self._ranges = RangeBackfiller(self._ts, workers, self._zip)
 
     def run_klines(self, symbols: Optional[Sequence[str]] = None, interval: str = "1m") -> Dict[str, int]:
         """补齐 K 线"""
@@ -636,7 +739,10 @@ class DataBackfiller:
             end = date.today() - timedelta(days=1)
             start = end - timedelta(days=self.lookback_days)
 
-            # 1. 扫描缺口
+            if interval == "1m":
+                return self._run_kline_ranges(symbols, start, end)
+
+            # 1. 扫描缺口（非 1m 周期按日）
             logger.info("扫描 K 线缺口: %d 个符号, %s ~ %s", len(symbols), start, end)
             gaps = self._scanner.scan_klines(symbols, start, end, interval, self.threshold)
 
@@ -665,6 +771,26 @@ class DataBackfiller:
             logger.info("K 线补齐完成: 填充 %d 条, 剩余缺口 %d | %s", filled, final_gaps, metrics)
             return {"scanned": len(symbols), "gaps": total_gaps, "filled": filled, "remaining": final_gaps}
 
+    def _run_kline_ranges(self, symbols: Sequence[str], start: date, end: date) -> Dict[str, int]:
+        """1m: 精确缺口区间 → 补齐计划（REST / 日度 ZIP / 月度 ZIP），只写缺失的分钟"""
+        logger.info("扫描 K 线缺口: %d 个符号, %s ~ %s", len(symbols), start, end)
+        gaps = self._scanner.scan_ranges(symbols, start, end)
+
+        if not gaps:
+            logger.info("K 线无缺口")
+            return {"scanned": len(symbols), "gaps": 0, "filled": 0}
+
+        total_gaps = sum(len(g) for g in gaps.values())
+        metrics.inc("gaps_found", total_gaps)
+        logger.info("发现 %d 个符号共 %d 个缺口区间 (%d 分钟)", len(gaps), total_gaps, _minutes(gaps))
+
+        filled, final = self._ranges.fill_verified(self._scanner, gaps, start, end)
+        final_gaps = sum(len(g) for g in final.values())
+
+        metrics.inc("gaps_filled", filled)
+        logger.info("K 线补齐完成: 填充 %d 条, 剩余缺口 %d | %s", filled, final_gaps, metrics)
+        return {"scanned": len(symbols), "gaps": total_gaps, "filled": filled, "remaining": final_gaps}
+
     def run_metrics(self, symbols: Optional[Sequence[str]] = None) -> Dict[str, int]:
         """补齐期货指标"""
         symbols = symbols or load_symbols(settings.ccxt_exchange)
@@ -720,7 +846,7 @@ class GapFiller:
     def __init__(self, ts: TimescaleAdapter):
         self._ts = ts
         self._lookback = settings.ws_gap_lookback
-        self._rest = RestBackfiller(ts)
+        self._ranges = RangeBackfiller(ts)
         self._scanner = GapScanner(ts)
 
     def set_lookback(self, minutes: int) -> None:
@@ -731,10 +857,10 @@ class GapFiller:
         # lookback 是分钟，转换为天数 (向上取整)
         lookback_days = max(1, (self._lookback + 1439) // 1440)
         start = end - timedelta(days=lookback_days)
-        gaps = self._scanner.scan_klines(symbols, start, end, "1m", 0.95)
+        gaps = self._scanner.scan_ranges(symbols, start, end)
         if gaps:
-            logger.info("检测到 %d 个符号有缺口", len(gaps))
-            self._rest.fill_gaps(gaps, "1m")
+            logger.info("检测到 %d 个符号有缺口 (%d 分钟)", len(gaps), _minutes(gaps))
+            self._ranges.fill(gaps)
 
 
 # ==================== 主入口 ====================
@@ -790,6 +916,8 @@ def main() -> None:
     parser.add_argument("--metrics", action="store_true", help="补齐期货指标")
     parser.add_argument("--all", action="store_true", help="补齐全部")
     parser.add_argument("--scan-only", action="store_true", help="仅扫描不补齐")
+    parser.add_argument("--reseed", action="store_true",
+                        help="回溯窗口内的完整度索引从基础表重建（有数据未经 data-service 写入时使用）")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -813,6 +941,12 @@ def main() -> None:
     bf = DataBackfiller(lookback, args.workers, args.threshold)
 
     try:
+        if args.reseed:
+            symbols = symbols or load_symbols(settings.ccxt_exchange)
+            end = date.today()
+            n = bf._scanner.invalidate(symbols, end - timedelta(days=lookback + 1), end)
+            logger.info("完整度索引已失效 %d 行，扫描时重新回填", n)
+
         if args.scan_only:
             # 仅扫描
             symbols = symbols or load_symbols(settings.ccxt_exchange)
@@ -842,7 +976,7 @@ def main() -> None:
                 result = bf.run_metrics(symbols)
                 print(f"\nMetrics结果: {result}")
             else:
-                print("用法: python backfill.py --klines|--metrics|--all [--scan-only]")
+                print("用法: python backfill.py --klines|--metrics|--all [--scan-only] [--reseed]")
     finally:
         bf.close()
 
@@ -0,0 +1,127 @@
+"""缺口补齐计划 - 按区间选择最省的数据源
+
+输入为 GapScanner.scan_ranges 的精确缺口区间，输出 (币种, 数据源, 区间) 任务:
+
+    rest        CCXT 分页（每页 1000 根，权重 5）
+    zip_day     Binance Vision 日度 ZIP（T+1 后才有）
+    zip_month   Binance Vision 月度 ZIP（仅已结束的月份）
+
+1. 相距不超过 coalesce 分钟的区间合并为一个拉取窗口（少翻页、少下载）；
+   写库时仍只写原始缺口内的行，upsert 量与实际缺失成正比。
+2. 每个 (币种, 日) 比较 REST 翻页成本与日度 ZIP 成本，取小者；
+3. 已结束月份中所有按 ZIP 计价的日，总成本高于一个月度 ZIP 时改下月度 ZIP。
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+REST = "rest"
+ZIP_DAY = "zip_day"
+ZIP_MONTH = "zip_month"
+
+# 成本单位: 约等于 Binance REST 权重（K线 limit=1000 每页权重 5）
+REST_PAGE_ROWS = 1000
+REST_PAGE_COST = 5.0
+ZIP_DAY_COST = 7.0          # 一次 ~60KB 下载（不占 API 权重）+ 解析 1440 行，介于 1~2 页 REST 之间
+ZIP_MONTH_COST = 60.0       # 一次 ~2MB 下载 + 解析 ~44640 行
+ZIP_DAY_LAG = 2             # 日度 ZIP 在 T+1 发布，保守取 T+2
+
+
+@dataclass
+class BackfillTask:
+    """
+    一个补齐任务
+
+    ranges 为要写入的原始缺口区间；period 为 ZIP 的日期（YYYY-MM-DD）或月份（YYYY-MM）；
+    windows 为 REST 实际翻页的拉取窗口（合并后）
+    """
+    symbol: str
+    source: str
+    ranges: List[Tuple[datetime, datetime]] = field(default_factory=list)
+    period: str = ""
+    windows: List[Tuple[datetime, datetime]] = field(default_factory=list)
+
+    @property
+    def minutes(self) -> int:
+        return sum(int((b - a).total_seconds() // 60) for a, b in self.ranges)
+
+
+def coalesce(ranges: Sequence[Tuple[datetime, datetime]], gap_minutes: int) -> List[Tuple[datetime, datetime]]:
+    """合并相距不超过 gap_minutes 的区间（已按起点排序或不排序均可）"""
+    out: List[List[datetime]] = []
+    slack = timedelta(minutes=gap_minutes)
+    for a, b in sorted(ranges):
+        if out and a - out[-1][1] <= slack:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return [(a, b) for a, b in out]
+
+
+def split_days(ranges: Sequence[Tuple[datetime, datetime]]) -> Dict[date, List[Tuple[datetime, datetime]]]:
+    """按 UTC 日切分区间"""
+    days: Dict[date, List[Tuple[datetime, datetime]]] = {}
+    for a, b in ranges:
+        while a < b:
+            d = a.astimezone(timezone.utc).date()
+            edge = min(b, datetime.combine(d + timedelta(days=1), time.min, tzinfo=timezone.utc))
+            days.setdefault(d, []).append((a, edge))
+            a = edge
+    return days
+
+
+def rest_cost(windows: Sequence[Tuple[datetime, datetime]]) -> float:
+    return sum(math.ceil((b - a).total_seconds() / 60 / REST_PAGE_ROWS) for a, b in windows) * REST_PAGE_COST
+
+
+def plan_symbol(symbol: str, ranges: Sequence[Tuple[datetime, datetime]], coalesce_minutes: int = 15,
+                today: Optional[date] = None, allow_zip: bool = True) -> List[BackfillTask]:
+    """单个币种的补齐计划；allow_zip=False 时全部走 REST"""
+    today = today or datetime.now(timezone.utc).date()
+    windows = split_days(coalesce(ranges, coalesce_minutes))
+    missing = split_days(sorted(ranges))
+
+    rest_days: List[date] = []
+    zip_days: Dict[str, List[date]] = {}
+    for d in sorted(windows):
+        if not allow_zip or d > today - timedelta(days=ZIP_DAY_LAG) or rest_cost(windows[d]) <= ZIP_DAY_COST:
+            rest_days.append(d)
+        else:
+            zip_days.setdefault(d.strftime("%Y-%m"), []).append(d)
+
+    tasks: List[BackfillTask] = []
+    current_month = today.strftime("%Y-%m")
+    for month, days in sorted(zip_days.items()):
+        if month < current_month and len(days) * ZIP_DAY_COST > ZIP_MONTH_COST:
+            tasks.append(BackfillTask(symbol, ZIP_MONTH, [r for d in days for r in missing.get(d, ())], month))
+        else:
+            tasks.extend(BackfillTask(symbol, ZIP_DAY, missing.get(d, []), d.isoformat()) for d in days)
+
+    if rest_days:
+        # REST 拉取窗口跨日重新连起来，缺口只写原始区间
+        tasks.append(BackfillTask(symbol, REST, [r for d in rest_days for r in missing.get(d, ())],
+                                  windows=coalesce([w for d in rest_days for w in windows[d]], 0)))
+    return tasks
+
+
+def plan(gaps: Dict[str, Sequence], coalesce_minutes: int = 15, today: Optional[date] = None,
+         allow_zip: bool = True) -> List[BackfillTask]:
+    """{symbol: [GapRange | (start, end)]} → 任务列表"""
+    tasks: List[BackfillTask] = []
+    for symbol, ranges in gaps.items():
+        pairs = [(r.start, r.end) if hasattr(r, "start") else tuple(r) for r in ranges]
+        if pairs:
+            tasks.extend(plan_symbol(symbol, pairs, coalesce_minutes, today, allow_zip))
+    return tasks
+
+
+def summarize(tasks: Sequence[BackfillTask]) -> Dict[str, int]:
+    """各数据源的任务数与缺失分钟数（日志用）"""
+    out: Dict[str, int] = {}
+    for t in tasks:
+        out[t.source] = out.get(t.source, 0) + 1
+        out[f"{t.source}_minutes"] = out.get(f"{t.source}_minutes", 0) + t.minutes
+    return out
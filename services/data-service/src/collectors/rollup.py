@@ -0,0 +1,163 @@
+"""多周期 K线进程内合成
+
+高周期（candles_5m … candles_1w）由 1m 连续聚合生成，按调度刷新；下游要等刷新延迟后才能算高周期指标。
+WSCollector 收到 1m 闭合 K线时在这里同时滚动累计各高周期的 OHLCV / 主动买量，
+某个高周期的最后一根 1m 到达即产出闭合 K线，写库后经 NOTIFY candle_rollup 发布给下游。
+
+对齐规则与 time_bucket 一致：按 UNIX 纪元对齐，周线对齐到周一。
+进程中途启动时，已过半的首个桶缺少开头的 1m，不产出（下一个桶起完整）。
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROLLUP_CHANNEL = "candle_rollup"
+
+INTERVAL_MINUTES = {"5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440, "1w": 10080}
+
+# 周线按周一对齐（1970-01-01 为周四）
+_ALIGN_OFFSET_MINUTES = {"1w": 4 * 1440}
+
+_SUM_FIELDS = ("volume", "quote_volume", "trade_count", "taker_buy_volume", "taker_buy_quote_volume")
+
+# NOTIFY payload 上限 8000 字节，留出余量
+_PAYLOAD_LIMIT = 7800
+
+
+def bucket_start(minute: int, interval: str) -> int:
+    """UNIX 分钟 → 所在高周期桶的起始分钟"""
+    size = INTERVAL_MINUTES[interval]
+    offset = _ALIGN_OFFSET_MINUTES.get(interval, 0)
+    return (minute - offset) // size * size + offset
+
+
+def _add(a, b):
+    if b is None:
+        return a
+    return b if a is None else a + b
+
+
+@dataclass(slots=True)
+class RollupBar:
+    """合成中的高周期 K线"""
+    symbol: str
+    interval: str
+    start: int              # 桶起始 UNIX 分钟
+    last: int               # 最近一根 1m 的 UNIX 分钟
+    open: object
+    high: object
+    low: object
+    close: object
+    volume: object = None
+    quote_volume: object = None
+    trade_count: object = None
+    taker_buy_volume: object = None
+    taker_buy_quote_volume: object = None
+    minutes: int = 0        # 已累计的 1m 根数（有缺口时小于周期分钟数）
+    complete: bool = True   # 是否从桶的第一分钟开始累计
+
+    @property
+    def bucket_ts(self) -> datetime:
+        return datetime.fromtimestamp(self.start * 60, tz=timezone.utc)
+
+    def update(self, minute: int, row: dict) -> None:
+        self.last = minute
+        self.high = max(self.high, row["high"])
+        self.low = min(self.low, row["low"])
+        self.close = row["close"]
+        for f in _SUM_FIELDS:
+            setattr(self, f, _add(getattr(self, f), row.get(f)))
+        self.minutes += 1
+
+    def to_row(self, exchange: str, source: str) -> dict:
+        """与 candles_* 表同列的行"""
+        return {
+            "exchange": exchange, "symbol": self.symbol, "bucket_ts": self.bucket_ts,
+            "open": self.open, "high": self.high, "low": self.low, "close": self.close,
+            "volume": self.volume, "quote_volume": self.quote_volume, "trade_count": self.trade_count,
+            "is_closed": True, "source": source,
+            "taker_buy_volume": self.taker_buy_volume, "taker_buy_quote_volume": self.taker_buy_quote_volume,
+        }
+
+
+class CandleRollup:
+    """{(symbol, 周期): 合成中的 K线}，add() 返回因本根 1m 而闭合的高周期 K线"""
+
+    def __init__(self, intervals: Iterable[str] = tuple(INTERVAL_MINUTES)):
+        self.intervals = [iv for iv in intervals if iv in INTERVAL_MINUTES]
+        self._open: Dict[Tuple[str, str], RollupBar] = {}
+
+    def add(self, row: dict) -> List[RollupBar]:
+        """row 为 1m 闭合 K线（symbol, bucket_ts, OHLCV, 主动买量）"""
+        symbol = row["symbol"]
+        minute = int(row["bucket_ts"].timestamp()) // 60
+        closed: List[RollupBar] = []
+        for interval in self.intervals:
+            start = bucket_start(minute, interval)
+            key = (symbol, interval)
+            bar = self._open.get(key)
+            if bar is not None:
+                if start < bar.start or minute <= bar.last:
+                    continue                # 重复 / 迟到的推送
+                if start > bar.start:
+                    # 桶的最后一分钟缺失：新桶开始时补发上一桶
+                    if bar.complete:
+                        closed.append(bar)
+                    bar = None
+            if bar is None:
+                bar = self._open[key] = RollupBar(
+                    symbol, interval, start, minute, row["open"], row["high"], row["low"], row["close"],
+                    complete=(minute == start),
+                )
+                for f in _SUM_FIELDS:
+                    setattr(bar, f, row.get(f))
+                bar.minutes = 1
+            else:
+                bar.update(minute, row)
+            if minute == start + INTERVAL_MINUTES[interval] - 1:
+                del self._open[key]
+                if bar.complete:
+                    closed.append(bar)
+        return closed
+
+    def add_many(self, rows: Sequence[dict]) -> List[RollupBar]:
+        """按 bucket_ts 顺序处理一批 1m K线"""
+        closed: List[RollupBar] = []
+        for row in sorted(rows, key=lambda r: r["bucket_ts"]):
+            closed.extend(self.add(row))
+        return closed
+
+
+def _num(v) -> Optional[float]:
+    return None if v is None else float(v)
+
+
+def pack_payloads(bars: Sequence[RollupBar]) -> List[str]:
+    """按 (周期, 桶) 分组打包为不超过 NOTIFY 上限的 JSON payload
+
+    {"interval": "5m", "bucket_ts": ISO8601, "bars": [[symbol, o, h, l, c, v, qv, n, tbv, tbqv, 分钟数], ...]}
+    """
+    groups: Dict[Tuple[str, int], List[RollupBar]] = {}
+    for bar in bars:
+        groups.setdefault((bar.interval, bar.start), []).append(bar)
+
+    payloads = []
+    for (interval, _), group in groups.items():
+        head = {"interval": interval, "bucket_ts": group[0].bucket_ts.isoformat()}
+        base = len(json.dumps({**head, "bars": []}))
+        items, size = [], base
+        for bar in group:
+            item = [bar.symbol, *(_num(getattr(bar, f)) for f in ("open", "high", "low", "close")),
+                    *(_num(getattr(bar, f)) for f in _SUM_FIELDS), bar.minutes]
+            encoded = len(json.dumps(item)) + 2     # ", " 分隔符
+            if items and size + encoded > _PAYLOAD_LIMIT:
+                payloads.append(json.dumps({**head, "bars": items}))
+                items, size = [], base
+            items.append(item)
+            size += encoded
+        if items:
+            payloads.append(json.dumps({**head, "bars": items}))
+    return payloads
@@ -4,6 +4,8 @@
 - cryptofeed 每分钟闭合时，~300 个币种在 1-2 秒内推送
 - 使用时间窗口批量写入：收集 3 秒内的数据后一次性写入
 - 避免 300 次单独 DB 操作 → 1 次批量操作
+- 进程内滚动合成 5m~1w（rollup.py），最后一根 1m 写库后立即 NOTIFY candle_rollup，
+  下游不必等连续聚合刷新
 """
 from __future__ import annotations
 
@@ -14,7 +16,7 @@ import threading
 import time
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -22,6 +24,7 @@ from adapters.ccxt import load_symbols, normalize_symbol
 from adapters.cryptofeed import BinanceWSAdapter, CandleEvent, preload_symbols
 from adapters.metrics import metrics
 from adapters.timescale import TimescaleAdapter
+from collectors.rollup import ROLLUP_CHANNEL, CandleRollup, pack_payloads
 from config import settings
 
 logger = logging.getLogger("ws.collector")
@@ -49,6 +52,9 @@ class WSCollector:
         self._last_candle_time: float = 0  # 最后一条 K 线到达时间
         self._flush_task: Optional[asyncio.Task] = None
 
+        # 高周期合成（只在 _flush 中访问，受 _buffer_lock 保护）
+        self._rollup = CandleRollup(settings.ws_rollup_intervals) if settings.ws_rollup_intervals else None
+
     def _load_symbols(self) -> Dict[str, str]:
         raw = load_symbols(settings.ccxt_exchange)
         if not raw:
@@ -112,6 +118,22 @@ class WSCollector:
             logger.debug("批量写入 %d 条 K 线", n)
         except Exception as e:
             logger.error("批量写入失败: %s", e)
+            return
+
+        if self._rollup is not None:
+            await self._publish_rollups(rows)
+
+    async def _publish_rollups(self, rows: List[dict]) -> None:
+        """累计高周期，1m 写库后发布本批闭合的高周期 K线"""
+        closed = self._rollup.add_many(rows)
+        if not closed:
+            return
+        try:
+            sent = await asyncio.to_thread(self._ts.notify, ROLLUP_CHANNEL, pack_payloads(closed))
+            metrics.inc("rollups_published", len(closed))
+            logger.debug("发布 %d 根高周期 K线 (%d 条通知)", len(closed), sent)
+        except Exception as e:
+            logger.error("高周期发布失败: %s", e)
 
     def run(self) -> None:
         """运行采集器"""
@@ -157,11 +179,10 @@ class WSCollector:
     def _gap_loop(self) -> None:
         """智能缺口巡检 - 增量检查 + 自适应回溯"""
         lookback_days = 2  # 固定回溯 2 天 (今天+昨天+前天)
-        unfillable: Set[tuple] = set()  # 缓存无法补齐的缺口 (symbol, date)
 
         while not self._gap_stop.wait(settings.ws_gap_interval):
             try:
-                has_gaps, lookback_days = self._smart_backfill(lookback_days, unfillable)
+                has_gaps, lookback_days = self._smart_backfill(lookback_days)
                 # 无缺口时缩小回溯，有缺口时扩大（最大 7 天）
                 if not has_gaps:
                     lookback_days = max(1, lookback_days - 1)
@@ -170,9 +191,12 @@ class WSCollector:
             except Exception as e:
                 logger.error("周期缺口检查失败: %s", e)
 
-    def _smart_backfill(self, lookback_days: int, unfillable: Set[tuple]) -> tuple:
-        """智能补齐 - 返回 (是否有缺口, 建议回溯天数)"""
-        from collectors.backfill import GapScanner, RestBackfiller, ZipBackfiller
+    def _smart_backfill(self, lookback_days: int) -> tuple:
+        """智能补齐 - 返回 (是否有缺口, 建议回溯天数)
+
+        缺口来自完整度索引，已知无法补齐的区间（missing_intervals, 跨重启保留）已在扫描时扣除
+        """
+        from collectors.backfill import GapScanner, RangeBackfiller, ZipBackfiller
 
         t0 = time.perf_counter()
         symbols = list(self._symbols.values())
@@ -180,43 +204,20 @@ class WSCollector:
         start = end - timedelta(days=lookback_days)
 
         scanner = GapScanner(self._ts)
-        gaps = scanner.scan_klines(symbols, start, end, "1m", 0.95)
+        gaps = scanner.scan_ranges(symbols, start, end)
 
         if not gaps:
             return False, lookback_days
 
-        # 过滤已知无法补齐的缺口
-        filtered = {}
-        for sym, sym_gaps in gaps.items():
-            new_gaps = [g for g in sym_gaps if (sym, g.date) not in unfillable]
-            if new_gaps:
-                filtered[sym] = new_gaps
-
-        if not filtered:
-            logger.debug("所有缺口已知无法补齐，跳过")
-            return False, lookback_days
-
-        total_gaps = sum(len(g) for g in filtered.values())
+        total_gaps = sum(len(g) for g in gaps.values())
+        minutes = sum(r.minutes for g in gaps.values() for r in g)
         metrics.inc("gaps_found", total_gaps)
-        logger.info("发现 %d 个符号 %d 个缺口，开始补齐 (回溯%d天)", len(filtered), total_gaps, lookback_days)
+        logger.info("发现 %d 个符号 %d 个缺口区间 (%d 分钟)，开始补齐 (回溯%d天)",
+                    len(gaps), total_gaps, minutes, lookback_days)
 
         zip_bf = ZipBackfiller(self._ts, workers=2)
         zip_bf.cleanup_old_files()
-        filled = zip_bf.fill_kline_gaps(filtered, "1m")
-
-        # 复检 + REST 补齐
-        remaining = scanner.scan_klines(list(filtered.keys()), start, end, "1m", 0.95)
-        if remaining:
-            rest_bf = RestBackfiller(self._ts, workers=2)
-            filled += rest_bf.fill_gaps(remaining, "1m")
-
-            # 再次复检，记录无法补齐的
-            still_missing = scanner.scan_klines(list(remaining.keys()), start, end, "1m", 0.95)
-            if still_missing:
-                for sym, sym_gaps in still_missing.items():
-                    for g in sym_gaps:
-                        unfillable.add((sym, g.date))
-                logger.debug("记录 %d 个无法补齐的缺口", sum(len(g) for g in still_missing.values()))
+        filled, _ = RangeBackfiller(self._ts, workers=2, zip_bf=zip_bf).fill_verified(scanner, gaps, start, end)
 
         metrics.inc("gaps_filled", filled)
         logger.info("缺口补齐完成: 填充 %d 条, 耗时 %.1fs", filled, time.perf_counter() - t0)
@@ -224,7 +225,7 @@ class WSCollector:
 
     def _run_backfill(self, lookback_days: int = 1, lookback_hours: int = 0) -> None:
         """运行缺口补齐 (启动时调用)"""
-        self._smart_backfill(lookback_days or 1, set())
+        self._smart_backfill(lookback_days or 1)
 
 
 def main() -> None:
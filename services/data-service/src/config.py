@@ -5,7 +5,7 @@ import os
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 # 服务根目录
 SERVICE_ROOT = Path(__file__).parent.parent  # src/config.py -> data-service
@@ -47,6 +47,17 @@ class Settings:
     ws_gap_interval: int = field(default_factory=lambda: _int_env("BINANCE_WS_GAP_INTERVAL", 600))
     ws_gap_lookback: int = field(default_factory=lambda: _int_env("BINANCE_WS_GAP_LOOKBACK", 10080))
     ws_source: str = field(default_factory=lambda: os.getenv("BINANCE_WS_SOURCE", "binance_ws"))
+    # 进程内合成并发布的高周期（空 = 关闭），闭合即 NOTIFY candle_rollup
+    ws_rollup_intervals: List[str] = field(default_factory=lambda: [
+        s.strip() for s in os.getenv("BINANCE_WS_ROLLUP_INTERVALS", "5m,15m,1h,4h,1d,1w").split(",") if s.strip()
+    ])
+
+    # ZIP 导入每块行数（逐块解析写入，决定内存上限；数值列按字符串保留，每行约 600 字节）
+    backfill_zip_chunk_rows: int = field(default_factory=lambda: _int_env("BACKFILL_ZIP_CHUNK_ROWS", 50_000))
+    # 补齐计划中相距不超过 N 分钟的缺口合并为一个拉取窗口
+    backfill_coalesce_minutes: int = field(default_factory=lambda: _int_env("BACKFILL_COALESCE_MINUTES", 15))
+    # 记为无法补齐的区间 N 天后重新检验（数据源可能事后补发）
+    backfill_unfillable_ttl_days: int = field(default_factory=lambda: _int_env("BACKFILL_UNFILLABLE_TTL_DAYS", 7))
 
     db_schema: str = field(default_factory=lambda: os.getenv("KLINE_DB_SCHEMA", "market_data"))
     db_exchange: str = field(default_factory=lambda: os.getenv("BINANCE_WS_DB_EXCHANGE", "binance_futures_um"))
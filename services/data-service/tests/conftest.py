@@ -1,7 +1,13 @@
 """Pytest configuration for data-service tests."""
 
+import sys
+from pathlib import Path
+
 import pytest
 
+# 与 scripts/ 一致: src 下的模块按 adapters.xxx / collectors.xxx 导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
 
 @pytest.fixture
 def sample_symbol():
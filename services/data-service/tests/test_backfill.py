@@ -0,0 +1,90 @@
+"""
+区间补齐：只有数据源明确应答无数据的区间才记为无法补齐
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg")
+pytest.importorskip("ccxt")
+
+from collectors import backfill  # noqa: E402
+from collectors.backfill import GapRange, RangeBackfiller, _covered  # noqa: E402
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MS0 = int(T0.timestamp() * 1000)
+
+
+class FakeTs:
+    def __init__(self):
+        self.rows = []
+
+    def upsert_candles(self, interval, rows):
+        self.rows.extend(rows)
+        return len(rows)
+
+
+class FakeScanner:
+    """复检始终报告同一缺口（数据源里确实没有）"""
+
+    def __init__(self, gaps):
+        self.gaps = gaps
+        self.marked = {}
+
+    def scan_ranges(self, symbols, start, end):
+        return {s: [GapRange(r.symbol, r.start, r.end) for r in g] for s, g in self.gaps.items() if s in symbols}
+
+    def mark_unfillable(self, gaps, reason=""):
+        self.marked = {s: g for s, g in gaps.items() if g}
+        return sum(len(g) for g in gaps.values())
+
+
+def _exchange(minutes):
+    """模拟交易所: 返回 since 起已有的 K 线（跳过没有数据的分钟）"""
+    stamps = [MS0 + m * 60_000 for m in minutes]
+
+    def fetch(exchange, symbol, interval, since_ms, limit):
+        return [[t, 1, 1, 1, 1, 1] for t in stamps if t >= since_ms][:limit]
+    return fetch
+
+
+def _run(monkeypatch, fetch):
+    monkeypatch.setattr(backfill, "fetch_ohlcv", fetch)
+    gaps = {"BTCUSDT": [GapRange("BTCUSDT", T0 + timedelta(minutes=10), T0 + timedelta(minutes=20))]}
+    scanner = FakeScanner(gaps)
+    filled, final = RangeBackfiller(FakeTs(), workers=1, zip_bf=object()).fill_verified(
+        scanner, gaps, T0.date(), T0.date())
+    return filled, final, scanner.marked
+
+
+def test_confirmed_empty_range_is_marked(monkeypatch):
+    filled, final, marked = _run(monkeypatch, _exchange([*range(10), *range(20, 40)]))
+    assert filled == 0
+    assert [(r.start, r.end) for r in marked["BTCUSDT"]] == [(r.start, r.end) for r in final["BTCUSDT"]]
+
+
+def test_empty_page_is_not_proof(monkeypatch):
+    # 请求失败 / 限流时 fetch_ohlcv 返回 []，与"没有数据"无法区分 → 不记录
+    _, final, marked = _run(monkeypatch, lambda *a: [])
+    assert final and not marked
+
+
+def test_failed_fetch_is_not_marked(monkeypatch):
+    def boom(*a):
+        raise RuntimeError("network down")
+    _, final, marked = _run(monkeypatch, boom)
+    assert final and not marked
+
+
+def test_partial_answer_marks_only_covered_ranges(monkeypatch):
+    # 交易所只应答到第 15 分钟之后的一根，之后空页 → 区间未被完整确认
+    _, _, marked = _run(monkeypatch, _exchange([14]))
+    assert not marked
+
+
+def test_covered():
+    t = [T0 + timedelta(minutes=m) for m in range(10)]
+    assert _covered([(t[0], t[3]), (t[3], t[6])], t[1], t[5])
+    assert not _covered([(t[0], t[3]), (t[4], t[6])], t[1], t[5])
+    assert not _covered([(t[2], t[6])], t[1], t[5])
+    assert not _covered([], t[1], t[2])
@@ -0,0 +1,50 @@
+"""
+完整度索引位图工具测试
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from adapters.coverage import DATASETS, fill_runs, missing_runs, slot_range  # noqa: E402
+
+D = date(2024, 1, 1)
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+M1 = DATASETS["candles_1m"]
+M5 = DATASETS["metrics_5m"]
+
+
+def test_missing_runs():
+    assert missing_runs("1111") == []
+    assert missing_runs("0011011000") == [(0, 2), (4, 5), (7, 10)]
+    # limit 之后（当日尚未到达的槽位）不计
+    assert missing_runs("1101000", limit=5) == [(2, 3), (4, 5)]
+    assert missing_runs("000", limit=0) == []
+    assert missing_runs("000", limit=-3) == []
+
+
+def test_fill_runs():
+    assert fill_runs("0000000", []) == "0000000"
+    assert fill_runs("0000000", [(1, 3), (5, 99)]) == "0110011"
+    assert fill_runs("0000", [(-2, 1), (3, 3)]) == "1000"
+
+
+def test_slot_range_clips_to_day():
+    assert slot_range(M1, D, T0 + timedelta(minutes=10), T0 + timedelta(minutes=20)) == (10, 20)
+    assert slot_range(M1, D, T0 - timedelta(days=1), T0 + timedelta(days=2)) == (0, 1440)
+    a, b = slot_range(M1, D, T0 + timedelta(days=1), T0 + timedelta(days=1, minutes=5))
+    assert a >= b                                          # 与当日不相交
+
+
+def test_slot_range_rounds_outward_and_accepts_naive():
+    # 5m 槽位: 部分覆盖的槽位也算在内（结束向上取整）
+    start = (T0 + timedelta(minutes=7)).replace(tzinfo=None)
+    assert slot_range(M5, D, start, T0 + timedelta(minutes=11)) == (1, 3)
+
+
+def test_slot_range_round_trips_missing_runs():
+    bits = "1" * 100 + "0" * 30 + "1" * 1310
+    (a, b), = missing_runs(bits)
+    start, end = T0 + timedelta(minutes=a), T0 + timedelta(minutes=b)
+    assert fill_runs(bits, [slot_range(M1, D, start, end)]) == "1" * 1440
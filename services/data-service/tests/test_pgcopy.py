@@ -0,0 +1,134 @@
+"""
+二进制 COPY 编码测试（按 PostgreSQL 二进制格式逐行解码回来比对）
+"""
+import struct
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg")
+pytest.importorskip("ccxt")  # adapters 包导入时依赖
+
+from psycopg.types.numeric import NumericBinaryLoader  # noqa: E402
+
+from adapters.pgcopy import encode_rows, slice_columns, to_columns  # noqa: E402
+
+_NUMERIC = NumericBinaryLoader(1700)
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def _decode(buf: bytes, ncols: int = 1) -> list:
+    """COPY BINARY 行数据 → [(每列原始字节 | None)]"""
+    rows, i = [], 0
+    while i < len(buf):
+        (count,) = struct.unpack_from(">h", buf, i)
+        assert count == ncols
+        i += 2
+        row = []
+        for _ in range(count):
+            (size,) = struct.unpack_from(">i", buf, i)
+            i += 4
+            if size < 0:
+                row.append(None)
+            else:
+                row.append(bytes(buf[i:i + size]))
+                i += size
+        rows.append(tuple(row))
+    return rows
+
+
+def _numerics(values) -> list:
+    n = len(values)
+    return [None if raw is None else _NUMERIC.load(raw)
+            for (raw,) in _decode(encode_rows({"v": values}, {"v": "numeric"}, n))]
+
+
+def test_numeric_round_trip_is_exact():
+    values = [
+        Decimal("1234567890.12345678"),          # float8 → numeric 只剩 1234567890.12346
+        Decimal("-12345678901234567890.123456789012"),
+        Decimal("0.00001234"), Decimal("1.50"), Decimal("10000"), Decimal("0"), Decimal("1E-7"),
+        "42000.10", "-0.5", 7, None,
+    ]
+    got = _numerics(values)
+    for v, g in zip(values, got, strict=True):
+        if v is None:
+            assert g is None
+        else:
+            expected = Decimal(str(v))
+            assert g == expected
+            assert g.as_tuple().exponent == expected.as_tuple().exponent      # 小数位也保持（"1.50"）
+
+
+def test_numeric_string_columns_and_nulls():
+    got = _numerics(np.array(["100.00000001", "", "99999999999999999999.000000000001", "-2.5e-3"]))
+    assert got == [Decimal("100.00000001"), None, Decimal("99999999999999999999.000000000001"), Decimal("-0.0025")]
+
+
+def test_numeric_floats_use_shortest_repr():
+    got = _numerics(np.array([0.1, np.nan, 1234567890.1234567, 1.5e20]))
+    assert got == [Decimal("0.1"), None, Decimal("1234567890.1234567"), Decimal("150000000000000000000")]
+
+
+@pytest.mark.parametrize("bad", ["1.2.3", "abc", "1e", "--1", "1-", "."])
+def test_numeric_rejects_malformed(bad):
+    with pytest.raises(ValueError):
+        encode_rows({"v": [bad]}, {"v": "numeric"}, 1)
+
+
+def _pg_time(raw: bytes) -> datetime:
+    return _PG_EPOCH + timedelta(microseconds=struct.unpack(">q", raw)[0])
+
+
+def test_text_nulls_and_unicode():
+    rows = _decode(encode_rows({"s": ["BTCUSDT", None, "币安", "", "BTCUSDT"]}, {"s": "text"}, 5))
+    assert [r[0] for r in rows] == [b"BTCUSDT", None, "币安".encode(), b"", b"BTCUSDT"]
+
+
+def test_timestamps_from_datetimes_and_numpy():
+    t = datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    aware = [t, None, t.astimezone(timezone(timedelta(hours=8)))]
+    naive = [t.replace(tzinfo=None)]                      # naive 视为 UTC
+    stamps = np.array(["2024-01-01T12:30:15.123456", "NaT"], dtype="datetime64[us]")
+
+    got = [r[0] for r in _decode(encode_rows({"t": aware}, {"t": "timestamptz"}, 3))]
+    assert [None if raw is None else _pg_time(raw) for raw in got] == [t, None, t]
+    assert _pg_time(_decode(encode_rows({"t": naive}, {"t": "timestamp"}, 1))[0][0]) == t
+    got = [r[0] for r in _decode(encode_rows({"t": stamps}, {"t": "timestamptz"}, 2))]
+    assert _pg_time(got[0]) == t and got[1] is None
+
+
+def test_fixed_width_nulls():
+    cols = {
+        "i": [1, None, -(2 ** 40)], "f": np.array([1.5, np.nan, -0.0]), "b": [True, None, False],
+    }
+    rows = _decode(encode_rows(cols, {"i": "int8", "f": "float8", "b": "bool"}, 3), ncols=3)
+    assert [struct.unpack(">q", r[0])[0] if r[0] else None for r in rows] == [1, None, -(2 ** 40)]
+    assert [struct.unpack(">d", r[1])[0] if r[1] else None for r in rows] == [1.5, None, -0.0]
+    assert [r[2] for r in rows] == [b"\x01", None, b"\x00"]
+
+
+def test_scalar_columns_broadcast():
+    cols = {"ex": "binance_futures_um", "closed": True, "n": 7, "v": Decimal("1.25"), "s": ["A", "B"], "x": None}
+    types = {"ex": "text", "closed": "bool", "n": "int8", "v": "numeric", "s": "text", "x": "text"}
+    rows = _decode(encode_rows(cols, types, 2), ncols=6)
+    assert [r[0] for r in rows] == [b"binance_futures_um"] * 2
+    assert [r[1] for r in rows] == [b"\x01"] * 2
+    assert [struct.unpack(">q", r[2])[0] for r in rows] == [7, 7]
+    assert [_NUMERIC.load(r[3]) for r in rows] == [Decimal("1.25")] * 2
+    assert [r[4] for r in rows] == [b"A", b"B"]
+    assert [r[5] for r in rows] == [None, None]
+
+
+def test_to_columns_and_slices():
+    cols, n = to_columns([{"a": 1, "b": "x"}, {"a": 2, "b": "y"}])
+    assert (cols, n) == ({"a": [1, 2], "b": ["x", "y"]}, 2)
+    assert to_columns([(1, "x"), (2, "y")], ["a", "b"]) == (cols, 2)
+    assert to_columns({"a": np.arange(3), "ex": "binance"})[1] == 3
+    with pytest.raises(ValueError):
+        to_columns({"a": [1, 2], "b": [1]})
+    with pytest.raises(ValueError):
+        to_columns([(1, "x")], ["a"])
+    assert slice_columns({"a": [1, 2, 3], "ex": "binance"}, 1, 3) == {"a": [2, 3], "ex": "binance"}
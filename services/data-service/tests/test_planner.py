@@ -0,0 +1,101 @@
+"""
+缺口补齐计划测试
+"""
+from datetime import date, datetime, timedelta, timezone
+
+from collectors import planner
+from collectors.planner import REST, ZIP_DAY, ZIP_MONTH, coalesce, plan, split_days, summarize
+
+TODAY = date(2024, 3, 15)
+
+
+def _t(d: date, minute: int = 0) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc) + timedelta(minutes=minute)
+
+
+def _day(d: date):
+    return (_t(d), _t(d, 1440))
+
+
+def test_coalesce():
+    d = TODAY
+    ranges = [(_t(d, 30), _t(d, 35)), (_t(d, 0), _t(d, 10)), (_t(d, 20), _t(d, 25)), (_t(d, 8), _t(d, 12))]
+    assert coalesce(ranges, 10) == [(_t(d, 0), _t(d, 35))]
+    assert coalesce(ranges, 5) == [(_t(d, 0), _t(d, 12)), (_t(d, 20), _t(d, 35))]
+    assert coalesce(ranges, 0) == [(_t(d, 0), _t(d, 12)), (_t(d, 20), _t(d, 25)), (_t(d, 30), _t(d, 35))]
+
+
+def test_split_days():
+    d = date(2024, 3, 1)
+    days = split_days([(_t(d, 1400), _t(d, 1500))])
+    assert days == {d: [(_t(d, 1400), _t(d, 1440))], date(2024, 3, 2): [(_t(d, 1440), _t(d, 1500))]}
+
+
+def test_small_gaps_use_rest_with_coalesced_windows():
+    d = date(2024, 3, 1)
+    ranges = [(_t(d, 0), _t(d, 3)), (_t(d, 10), _t(d, 12))]
+    (task,) = plan({"BTCUSDT": ranges}, coalesce_minutes=15, today=TODAY)
+
+    assert task.source == REST
+    assert task.ranges == ranges                        # 只写原始缺口
+    assert task.windows == [(_t(d, 0), _t(d, 12))]
+    assert task.minutes == 5
+
+
+def test_scattered_gaps_cost_more_than_day_zip():
+    # 两个窗口 = 两页 REST（10）> 日度 ZIP（7）
+    d = date(2024, 3, 1)
+    ranges = [(_t(d, 0), _t(d, 3)), (_t(d, 600), _t(d, 601))]
+    (task,) = plan({"BTCUSDT": ranges}, coalesce_minutes=15, today=TODAY)
+    assert (task.source, task.ranges) == (ZIP_DAY, ranges)
+
+
+def test_rest_windows_rejoin_across_midnight():
+    d = date(2024, 3, 1)
+    (task,) = plan({"BTCUSDT": [(_t(d, 1430), _t(d, 1450))]}, today=TODAY)
+    assert task.source == REST and task.windows == [(_t(d, 1430), _t(d, 1450))]
+
+
+def test_full_day_prefers_day_zip():
+    d = date(2024, 3, 1)
+    (task,) = plan({"BTCUSDT": [_day(d)]}, today=TODAY)
+    assert (task.source, task.period, task.ranges) == (ZIP_DAY, "2024-03-01", [_day(d)])
+
+
+def test_day_zip_waits_for_t_plus_2():
+    for lag in range(planner.ZIP_DAY_LAG):
+        d = TODAY - timedelta(days=lag)
+        assert [t.source for t in plan({"BTCUSDT": [_day(d)]}, today=TODAY)] == [REST]
+    d = TODAY - timedelta(days=planner.ZIP_DAY_LAG)
+    assert [t.source for t in plan({"BTCUSDT": [_day(d)]}, today=TODAY)] == [ZIP_DAY]
+
+
+def test_many_days_in_finished_month_use_month_zip():
+    days = [date(2024, 2, i) for i in range(1, 11)]      # 10 × 7 > 60
+    (task,) = plan({"BTCUSDT": [_day(d) for d in days]}, today=TODAY)
+    assert (task.source, task.period, task.minutes) == (ZIP_MONTH, "2024-02", 10 * 1440)
+
+    few = plan({"BTCUSDT": [_day(d) for d in days[:8]]}, today=TODAY)      # 8 × 7 < 60
+    assert [t.source for t in few] == [ZIP_DAY] * 8
+
+
+def test_current_month_never_uses_month_zip():
+    days = [date(2024, 3, i) for i in range(1, 12)]
+    tasks = plan({"BTCUSDT": [_day(d) for d in days]}, today=TODAY)
+    assert {t.source for t in tasks} == {ZIP_DAY}
+
+
+def test_rest_only_when_zip_disallowed():
+    d = date(2024, 2, 1)
+    (task,) = plan({"BTCUSDT": [_day(d)]}, today=TODAY, allow_zip=False)
+    assert task.source == REST and task.windows == [_day(d)]
+
+
+def test_plan_accepts_gap_objects_and_summarizes():
+    class Gap:
+        def __init__(self, start, end):
+            self.start, self.end = start, end
+
+    d = date(2024, 3, 1)
+    tasks = plan({"BTCUSDT": [Gap(*_day(d))], "ETHUSDT": [(_t(d, 5), _t(d, 10))], "XRPUSDT": []}, today=TODAY)
+    assert summarize(tasks) == {ZIP_DAY: 1, f"{ZIP_DAY}_minutes": 1440, REST: 1, f"{REST}_minutes": 5}
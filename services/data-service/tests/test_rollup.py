@@ -0,0 +1,91 @@
+"""
+多周期 K线进程内合成测试
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from collectors.rollup import _PAYLOAD_LIMIT, CandleRollup, RollupBar, bucket_start, pack_payloads
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)   # 周一 00:00
+M0 = int(T0.timestamp()) // 60
+
+
+def _bar(minute: int, price: float, symbol: str = "BTCUSDT", volume=1.0) -> dict:
+    return {
+        "symbol": symbol, "bucket_ts": T0 + timedelta(minutes=minute),
+        "open": price, "high": price + 1, "low": price - 1, "close": price + 0.5,
+        "volume": volume, "quote_volume": volume * price, "trade_count": 10,
+        "taker_buy_volume": None, "taker_buy_quote_volume": volume / 2,
+    }
+
+
+def test_bucket_alignment():
+    m = M0
+    assert bucket_start(m + 7, "5m") == m + 5
+    assert bucket_start(m + 59, "1h") == m
+    assert bucket_start(m + 1439, "1d") == m
+    # 周线对齐到周一，而不是纪元起点（周四）
+    assert bucket_start(m + 3 * 1440, "1w") == m
+    assert bucket_start(m - 1, "1w") == m - 10080
+    assert datetime.fromtimestamp(bucket_start(m + 9000, "1w") * 60, tz=timezone.utc).weekday() == 0
+
+
+def test_aggregates_ohlcv_on_last_minute():
+    roll = CandleRollup(["5m"])
+    closed = []
+    for i, price in enumerate([10, 12, 8, 11, 9]):
+        closed.extend(roll.add(_bar(i, price)))
+
+    assert len(closed) == 1
+    bar = closed[0]
+    assert (bar.open, bar.high, bar.low, bar.close) == (10, 13, 7, 9.5)
+    assert bar.volume == 5.0 and bar.trade_count == 50 and bar.minutes == 5
+    assert bar.taker_buy_volume is None and bar.taker_buy_quote_volume == 2.5
+    assert bar.bucket_ts == T0
+    assert bar.to_row("binance_futures_um", "rollup")["is_closed"] is True
+
+
+def test_decimal_values_stay_exact():
+    roll = CandleRollup(["5m"])
+    closed = roll.add_many([{**_bar(i, 1.0), "volume": Decimal("0.1")} for i in range(5)])
+    assert closed[0].volume == Decimal("0.5")
+
+
+def test_partial_first_bucket_is_skipped():
+    roll = CandleRollup(["5m"])
+    closed = roll.add_many([_bar(i, 10) for i in range(3, 10)])
+    assert [b.bucket_ts for b in closed] == [T0 + timedelta(minutes=5)]
+
+
+def test_missing_last_minute_closes_on_next_bucket():
+    roll = CandleRollup(["5m"])
+    assert roll.add_many([_bar(i, 10) for i in range(4)]) == []
+    closed = roll.add(_bar(5, 10))
+    assert len(closed) == 1 and closed[0].minutes == 4
+
+
+def test_duplicates_and_late_rows_ignored():
+    roll = CandleRollup(["5m", "15m"])
+    rows = [_bar(i, 10) for i in range(15)]
+    closed = roll.add_many(rows + rows[:3])
+    assert sorted(b.interval for b in closed) == ["15m", "5m", "5m", "5m"]
+    assert all(b.minutes == {"5m": 5, "15m": 15}[b.interval] for b in closed)
+    assert roll.add(_bar(2, 10)) == []
+
+
+def test_pack_payloads_respects_notify_limit():
+    bars = [RollupBar(f"SYM{i:04d}USDT", "5m", M0, M0 + 4, 123456.789, 123457.789, 123455.789,
+                      123456.289, 98765.4321, 12345678.9012, 54321, 4567.891, 654321.987, minutes=5)
+            for i in range(600)]
+    bars.append(RollupBar("BTCUSDT", "1h", M0, M0 + 59, 1, 2, 0.5, 1.5, minutes=60))
+
+    payloads = pack_payloads(bars)
+    decoded = [json.loads(p) for p in payloads]
+
+    assert len(payloads) > 1
+    assert all(len(p.encode()) <= _PAYLOAD_LIMIT for p in payloads)
+    assert sum(len(d["bars"]) for d in decoded if d["interval"] == "5m") == 600
+    hourly = [d for d in decoded if d["interval"] == "1h"]
+    assert hourly[0]["bars"] == [["BTCUSDT", 1, 2, 0.5, 1.5, None, None, None, None, None, 60]]
+    assert hourly[0]["bucket_ts"] == "2024-01-01T00:00:00+00:00"
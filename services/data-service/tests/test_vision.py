@@ -0,0 +1,94 @@
+"""
+Binance Vision ZIP 列式解析测试（内存中构造小 ZIP）
+"""
+import zipfile
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg")
+pytest.importorskip("ccxt")  # adapters 包导入时依赖
+
+from collectors.vision import read_klines, read_metrics  # noqa: E402
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MS0 = int(T0.timestamp() * 1000)
+KLINE_HEADER = ("open_time,open,high,low,close,volume,close_time,quote_volume,count,"
+                "taker_buy_volume,taker_buy_quote_volume,ignore")
+METRIC_HEADER = ("create_time,symbol,sum_open_interest,sum_open_interest_value,count_toptrader_long_short_ratio,"
+                 "sum_toptrader_long_short_ratio,count_long_short_ratio,sum_taker_long_short_vol_ratio")
+
+
+def _zip(tmp_path, name: str, lines) -> "Path":  # noqa: F821
+    path = tmp_path / f"{name}.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(f"{name}.csv", "\n".join(lines) + "\n")
+    return path
+
+
+def _kline(minute: int, quote: str = "1234567890.12345678", stamp_scale: int = 1) -> str:
+    ts = (MS0 + minute * 60_000) * stamp_scale
+    return f"{ts},42000.10,42010.5,41990.0,42005.3,12.345,{ts + 59_999},{quote},321,6.1,256000.5,0"
+
+
+def _concat(chunks) -> dict:
+    chunks = list(chunks)
+    return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]} if chunks else {}
+
+
+def test_klines_header_exact_strings_and_microseconds(tmp_path):
+    lines = [KLINE_HEADER, _kline(0), _kline(1, stamp_scale=1000), _kline(2, quote="")]
+    cols = _concat(read_klines(_zip(tmp_path, "k", lines)))
+
+    assert cols["bucket_ts"].astype("datetime64[m]").astype(int).tolist() == [
+        MS0 // 60_000, MS0 // 60_000 + 1, MS0 // 60_000 + 2]                  # 微秒时间戳自动换算
+    assert cols["quote_volume"].tolist() == ["1234567890.12345678"] * 2 + [""]  # 原文透传，空值 → NULL
+    assert cols["open"].tolist() == ["42000.10"] * 3
+    assert cols["trade_count"].tolist() == [321.0] * 3
+
+
+def test_klines_bad_rows_skipped_individually(tmp_path):
+    lines = [_kline(0), "garbage,line", _kline(2).replace("42010.5", "abc"), _kline(3)]
+    cols = _concat(read_klines(_zip(tmp_path, "k", lines), chunk_rows=10))
+
+    minutes = (cols["bucket_ts"].astype(np.int64) - MS0) // 60_000
+    assert minutes.tolist() == [0, 3]
+    assert len(cols["close"]) == len(cols["bucket_ts"])
+
+
+def test_klines_day_and_range_filters(tmp_path):
+    lines = [_kline(m) for m in (0, 1, 2, 3, 1440, 1441)]
+    path = _zip(tmp_path, "k", lines)
+
+    day2 = _concat(read_klines(path, days=[date(2024, 1, 2)]))
+    assert ((day2["bucket_ts"].astype(np.int64) - MS0) // 60_000).tolist() == [1440, 1441]
+
+    ranges = [(T0 + timedelta(minutes=1), T0 + timedelta(minutes=3)), (T0 + timedelta(minutes=1441), T0 + timedelta(days=2))]
+    picked = _concat(read_klines(path, ranges=ranges, chunk_rows=2))
+    assert ((picked["bucket_ts"].astype(np.int64) - MS0) // 60_000).tolist() == [1, 2, 1441]
+
+
+def test_metrics_bad_row_keeps_rest_of_chunk(tmp_path):
+    lines = [
+        METRIC_HEADER,
+        "2024-01-01 00:05:00,BTCUSDT,1.5,2.5,0.3,0.4,0.5,0.6",
+        "2024-01-01 00:10:00,BTCUSDT,bad,2.5,0.3,0.4,0.5,0.6",
+        "not-a-date,BTCUSDT,1,2,3,4,5,6",
+        "2024-01-01 00:15:01,BTCUSDT,1.123456789012345678,,0.3,0.4,0.5,0.6",
+    ]
+    cols = _concat(read_metrics(_zip(tmp_path, "m", lines)))
+
+    assert cols["create_time"].astype(str).tolist() == ["2024-01-01T00:05:00.000", "2024-01-01T00:15:00.000"]
+    assert cols["sum_open_interest"].tolist() == ["1.5", "1.123456789012345678"]
+    assert cols["sum_open_interest_value"].tolist() == ["2.5", ""]
+    # 列号 4 → sum_toptrader，5 → count_toptrader（与原逐行导入一致）
+    assert cols["sum_toptrader_long_short_ratio"].tolist() == ["0.3", "0.3"]
+    assert cols["count_toptrader_long_short_ratio"].tolist() == ["0.4", "0.4"]
+
+
+def test_metrics_epoch_stamps_and_day_filter(tmp_path):
+    lines = [f"{MS0 + 300_000 * i + 1234},BTCUSDT,1,2,3,4,5,6" for i in (0, 1, 288)]
+    cols = _concat(read_metrics(_zip(tmp_path, "m", lines), days=[date(2024, 1, 2)]))
+
+    assert cols["create_time"].astype(str).tolist() == ["2024-01-02T00:00:00.000"]      # 5 分钟对齐
@@ -3504,6 +3504,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ustate["single_periods"] = enabled_periods
             ustate["single_cards"] = {}
             ustate["single_page"] = 0
+            # 长尾币种不在每根收盘的计算范围内，打开卡片时请求 trading-service 按需计算
+            from bot.indicator_demand import request_indicators
+            request_indicators(symbol)
             snap = SingleTokenSnapshot()
             lang = _resolve_lang(update)
             text, pages = snap.render_table(
@@ -5569,6 +5572,8 @@ async def handle_keyboard_message(update: Update, context: ContextTypes.DEFAULT_
             ustate["single_periods"] = enabled_periods
             ustate["single_cards"] = {}  # 默认全开，按需存 False
             ustate["single_page"] = 0
+            from bot.indicator_demand import request_indicators
+            request_indicators(sym)
             try:
                 from bot.single_token_snapshot import SingleTokenSnapshot
                 lang = _resolve_lang(update)
@@ -0,0 +1,55 @@
+"""
+按需指标计算请求
+
+用户打开单币卡片时通知 trading-service 优先计算该币种（长尾币种平时不在每根收盘的计算范围内）：
+NOTIFY indicator_demand，payload 为逗号分隔的币种（与 trading-service core/tiers.request_symbols 一致）。
+
+psycopg / DATABASE_URL 缺失时静默跳过；同一币种 DEMAND_COOLDOWN 秒内只通知一次；
+在后台线程发送，不阻塞消息处理。
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+DEMAND_CHANNEL = "indicator_demand"
+DEMAND_COOLDOWN = float(os.getenv("INDICATOR_DEMAND_COOLDOWN", "60"))
+
+_last_sent: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def _normalize(symbol: str) -> str:
+    sym = (symbol or "").strip().upper().replace("/", "").replace("-", "")
+    return sym if not sym or sym.endswith("USDT") else f"{sym}USDT"
+
+
+def _send(symbol: str, db_url: str) -> None:
+    try:
+        import psycopg
+    except ImportError:
+        return
+    try:
+        with psycopg.connect(db_url, autocommit=True, connect_timeout=3) as conn:
+            conn.execute("SELECT pg_notify(%s, %s)", (DEMAND_CHANNEL, symbol))
+    except Exception as e:
+        logger.debug("按需计算请求失败 %s: %s", symbol, e)
+
+
+def request_indicators(symbol: str) -> bool:
+    """请求按需计算 symbol 的指标，返回是否已发出（冷却中 / 未配置数据库时为 False）"""
+    sym = _normalize(symbol)
+    db_url = os.getenv("DATABASE_URL", "")
+    if not sym or not db_url:
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _last_sent.get(sym, float("-inf")) < DEMAND_COOLDOWN:
+            return False
+        _last_sent[sym] = now
+    threading.Thread(target=_send, args=(sym, db_url), daemon=True, name="indicator-demand").start()
+    return True
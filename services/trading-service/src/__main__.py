@@ -4,7 +4,7 @@
 用法:
     python -m indicator_service --once                   # 一次性计算（推荐）
     python -m indicator_service --full-async             # 完全异步持续运行
-    python -m indicator_service --event                  # 事件驱动模式（实验性）
+    python -m indicator_service --event                  # 事件驱动模式（K线闭合即算，常驻）
     python -m indicator_service --symbols BTCUSDT,ETHUSDT --intervals 5m,15m
 """
 import argparse
@@ -29,7 +29,7 @@ def main():
     parser = argparse.ArgumentParser(description="指标计算服务")
     parser.add_argument("--once", action="store_true", help="一次性计算（推荐，可配合crontab）")
     parser.add_argument("--full-async", dest="full_async", action="store_true", help="完全异步持续运行")
-    parser.add_argument("--event", action="store_true", help="事件驱动模式（实验性）")
+    parser.add_argument("--event", action="store_true", help="事件驱动模式（LISTEN K线闭合，只重算闭合币种）")
     parser.add_argument("--mode", choices=["all", "batch", "incremental"], default="all", help="计算模式")
     parser.add_argument("--symbols", type=str, help="交易对，逗号分隔")
     parser.add_argument("--intervals", type=str, help="周期，逗号分隔")
@@ -40,12 +40,16 @@ def main():
     parser.add_argument("--log-level", type=str, default="INFO", help="日志级别")
     parser.add_argument("--json-log", action="store_true", help="使用JSON格式日志")
     parser.add_argument("--metrics-file", type=str, help="指标输出文件路径")
+    parser.add_argument("--metrics-port", type=int, help="内嵌 /metrics 端点端口（默认读 METRICS_PORT，0 为不启动）")
+    parser.add_argument("--trace-file", type=str, help="退出时导出最近的 trace（chrome://tracing / Perfetto 可打开）")
+    parser.add_argument("--trace-format", choices=["chrome", "otlp"], default="chrome", help="trace 导出格式")
 
     args = parser.parse_args()
 
     # 初始化可观测性
-    from .observability import setup_logging, metrics
+    from .observability import setup_logging, metrics, start_http_server
     from .observability.alerting import setup_alerting
+    from .config import config
 
     setup_logging(
         level=args.log_level,
@@ -58,6 +62,10 @@ def main():
         alert_file = Path(args.log_file).parent / "alerts.jsonl"
         setup_alerting(file_path=alert_file)
 
+    metrics_port = config.metrics_port if args.metrics_port is None else args.metrics_port
+    if metrics_port:
+        start_http_server(metrics_port)
+
     from . import indicators  # noqa - 触发指标注册
 
     # 优先读 --symbols 参数，其次读 TEST_SYMBOLS 环境变量
@@ -101,6 +109,9 @@ def main():
         # 保存指标
         if args.metrics_file:
             metrics.save(Path(args.metrics_file))
+        if args.trace_file:
+            from .observability.tracing import export_traces
+            export_traces(Path(args.trace_file), args.trace_format)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@
     DATABASE_URL: TimescaleDB 连接串
     INDICATOR_SQLITE_PATH: SQLite 输出路径
     MAX_WORKERS: 并行计算线程数
+    INCREMENTAL_STATE: 增量指标走流式状态（1=开启），状态覆盖自预热起的全部K线而非滑动窗口；
+        状态按进程保存，进程后端下每个 (币种, 周期) 固定由同一工作者进程计算
     KLINE_INTERVALS: K线指标计算周期
     FUTURES_INTERVALS: 期货情绪计算周期
 """
@@ -51,9 +53,41 @@ class Config:
     # 计算后端: thread | process | hybrid（IO用线程，CPU用进程）
     compute_backend: str = field(default_factory=lambda: os.getenv("COMPUTE_BACKEND", "thread").lower())
 
+    # 增量指标流式计算（update 逐根推进，O(1)）
+    incremental_state: bool = field(default_factory=lambda: os.getenv("INCREMENTAL_STATE", "0") == "1")
+
     # IO/CPU 拆分执行器配置
     max_io_workers: int = field(default_factory=lambda: int(os.getenv("MAX_IO_WORKERS", "8")))
     max_cpu_workers: int = field(default_factory=lambda: int(os.getenv("MAX_CPU_WORKERS", "4")))
+    # 内嵌 /metrics 端点端口（0 = 不启动）
+    metrics_port: int = field(default_factory=lambda: int(os.getenv("METRICS_PORT", "0")))
+
+    # 每个计算分片内并发执行的 DAG 节点数（1 = 按拓扑序串行）
+    dag_workers: int = field(default_factory=lambda: int(os.getenv("DAG_WORKERS", "4")))
+    # 分片代价模型（按指标/周期实测耗时做 LPT 装箱），跨重启持久化
+    cost_model_path: Path = field(default_factory=lambda: Path(os.getenv(
+        "COST_MODEL_PATH",
+        str(PROJECT_ROOT / "libs/database/services/trading-service/cost_model.json")
+    )))
+    # 每个工作者分到的分片数（>1 时先做完的工作者继续领取剩余分片）
+    chunks_per_worker: int = field(default_factory=lambda: int(os.getenv("CHUNKS_PER_WORKER", "3")))
+    # hybrid 后端：预估计算耗时超过该秒数才用进程池（进程启动与序列化开销）
+    hybrid_process_seconds: float = field(default_factory=lambda: float(os.getenv("HYBRID_PROCESS_SECONDS", "2")))
+    # 高优先级排名增量同步的最小间隔（秒），间隔内只做内存排名
+    priority_sync_seconds: float = field(default_factory=lambda: float(os.getenv("PRIORITY_SYNC_SECONDS", "30")))
+
+    # 分层调度：第二层为高优先级之外按 24h 成交额的前 N 个币种，每 TIER2_EVERY 根收盘重算；
+    # 第三层为其余长尾，TIER3_EVERY=0 时仅按需计算。预算为单次触发的计算秒数
+    tier2_size: int = field(default_factory=lambda: int(os.getenv("TIER2_SIZE", "150")))
+    tier2_every: int = field(default_factory=lambda: int(os.getenv("TIER2_EVERY", "3")))
+    tier2_budget: float = field(default_factory=lambda: float(os.getenv("TIER2_BUDGET", "20")))
+    tier3_every: int = field(default_factory=lambda: int(os.getenv("TIER3_EVERY", "0")))
+    tier3_budget: float = field(default_factory=lambda: float(os.getenv("TIER3_BUDGET", "10")))
+    # 下层任务切片大小（币种数），每片之间让出给第一层
+    tier_chunk: int = field(default_factory=lambda: int(os.getenv("TIER_CHUNK", "20")))
+
+    # K线形态扫描器启用的形态（CDL 函数名 / tradingpatterns / patternpy / trendln），为空则全部启用
+    k_patterns: List[str] = field(default_factory=lambda: _parse_intervals("K_PATTERNS", ""))
 
     # K线指标周期
     kline_intervals: List[str] = field(default_factory=lambda: _parse_intervals(
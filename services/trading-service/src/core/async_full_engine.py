@@ -2,31 +2,38 @@
 完全异步计算引擎 v2（高性能版）
 
 优化点:
-1. 高优先级查询合并SQL + 并行
+1. 高优先级币种由增量滚动统计排名（core/priority.py），不再每次扫描 24h K线
 2. 使用 pickle 协议5 优化序列化
 3. 快慢指标真正并行（不再顺序等待）
 4. 缓存并行初始化
 
 三层隔离:
-1. 币种优先级隔离 - 高优先级币种先算完
-2. 指标隔离 - 快慢指标分离，互不阻塞  
+1. 币种优先级隔离 - 分层调度（core/tiers.py）：第一层每根收盘前台重算并可抢占，
+   第二层每 N 根收盘、第三层长尾按需，在后台按预算 / 截止时间分片执行
+2. 指标隔离 - 按 IndicatorMeta 声明的依赖建 DAG 调度；慢指标按实测耗时自动归入慢进程池，互不阻塞
 3. 写入异步 - 独立线程批量写入
 
 所有操作异步非阻塞
 """
+import json
 import logging
+import select
 import time
 import signal
 import queue
 import pickle
-from concurrent.futures import ProcessPoolExecutor, Future, as_completed, ThreadPoolExecutor
-from threading import Thread, Event
+from concurrent.futures import ProcessPoolExecutor
+from threading import Event, Lock, Thread
 from typing import Dict, List, Optional, Set
 from datetime import datetime, timezone
 import pandas as pd
 
 from ..config import config
 from ..indicators.base import get_all_indicators
+from ..observability.metrics import indicator_duration
+from .cost_model import get_cost_model
+from .dag import SOURCES, DagScheduler, build_graph, report as dag_report, slow_nodes, topo_order
+from .tiers import DEMAND_CHANNEL, TierJob, TierPlan, TierQueue, TierScheduler, run_job
 
 LOG = logging.getLogger("indicator_service.async_full")
 
@@ -38,96 +45,23 @@ INTERVAL_CONFIG = {
 # 高优先级币种 - 动态计算
 HIGH_PRIORITY_SYMBOLS = set()  # 运行时动态获取
 
-# 慢指标 - 单独进程计算
-SLOW_INDICATORS = {
-    "K线形态扫描器.py", "智能RSI扫描器.py", "多空信号扫描器.py",
-    "超级精准趋势扫描器.py", "VPVR排行生成器.py",
-}
-
-INDICATOR_DEPS = {
-    "期货情绪聚合表.py": ["期货情绪元数据.py"],
-    "期货情绪缺口监控.py": ["期货情绪元数据.py"],
-    "数据监控.py": ["基础数据同步器.py"],
-}
-
 
 def get_high_priority_symbols_fast(top_n: int = 30) -> Set[str]:
     """
-    快速获取高优先级币种 - 合并SQL + 并行查询
-    """
-    import psycopg
-    from ..config import config
+    快速获取高优先级币种 - 增量滚动统计 + 内存 top-k
 
-    result = set()
+    K线维度（24h 成交额 / 振幅 / 涨跌幅）与期货维度（持仓价值 / 买卖比 / 多空比）
+    由 PriorityRanker 增量维护，这里只拉取水位线之后的新数据再排名
+    """
+    from .priority import get_priority_ranker
 
-    def query_kline_priority():
-        """K线维度优先级 - 单SQL合并查询"""
-        symbols = set()
-        try:
-            with psycopg.connect(config.db_url) as conn:
-                # 合并3个维度到单个SQL
-                sql = """
-                    WITH base AS (
-                        SELECT symbol, 
-                               SUM(quote_volume) as total_qv,
-                               AVG((high-low)/NULLIF(close,0)) as volatility
-                        FROM market_data.candles_5m
-                        WHERE bucket_ts > NOW() - INTERVAL '24 hours'
-                        GROUP BY symbol
-                    ),
-                    volume_rank AS (
-                        SELECT symbol FROM base ORDER BY total_qv DESC LIMIT %s
-                    ),
-                    volatility_rank AS (
-                        SELECT symbol FROM base ORDER BY volatility DESC LIMIT %s
-                    ),
-                    change_rank AS (
-                        WITH latest AS (
-                            SELECT DISTINCT ON (symbol) symbol, close
-                            FROM market_data.candles_5m
-                            WHERE bucket_ts > NOW() - INTERVAL '1 hour'
-                            ORDER BY symbol, bucket_ts DESC
-                        ),
-                        prev AS (
-                            SELECT DISTINCT ON (symbol) symbol, close as prev_close
-                            FROM market_data.candles_5m
-                            WHERE bucket_ts BETWEEN NOW() - INTERVAL '25 hours' AND NOW() - INTERVAL '23 hours'
-                            ORDER BY symbol, bucket_ts DESC
-                        )
-                        SELECT l.symbol
-                        FROM latest l JOIN prev p ON l.symbol = p.symbol
-                        ORDER BY ABS((l.close - p.prev_close) / NULLIF(p.prev_close, 0)) DESC
-                        LIMIT %s
-                    )
-                    SELECT DISTINCT symbol FROM (
-                        SELECT symbol FROM volume_rank
-                        UNION SELECT symbol FROM volatility_rank
-                        UNION SELECT symbol FROM change_rank
-                    ) combined
-                """
-                cur = conn.execute(sql, (top_n, top_n, top_n))
-                symbols.update(r[0] for r in cur.fetchall())
-        except Exception as e:
-            LOG.warning(f"K线优先级查询失败: {e}")
-        return symbols
-
-    def query_futures_priority():
-        """期货维度优先级"""
-        return _get_futures_priority(top_n)[0]
-
-    # 并行执行K线和期货查询
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = [
-            executor.submit(query_kline_priority),
-            executor.submit(query_futures_priority),
-        ]
-        for f in as_completed(futures):
-            try:
-                result.update(f.result())
-            except Exception as e:
-                LOG.warning(f"优先级查询失败: {e}")
+    ranker = get_priority_ranker()
+    ranker.sync()
+    kline_result, kline_debug = ranker.rank_klines(top_n)
+    futures_result, futures_debug = ranker.rank_futures(top_n)
+    result = kline_result | futures_result
 
-    LOG.info(f"高优先级币种: {len(result)} 个")
+    LOG.info(f"高优先级币种: {len(result)} 个 (K线={kline_debug['kline_total']}, 期货={futures_debug['futures_total']})")
     return result
 
 
@@ -244,70 +178,15 @@ def get_high_priority_symbols(cache, interval: str = "5m", top_n: int = 15) -> t
 
 def _get_futures_priority(top_n: int = 15) -> tuple[set, dict]:
     """获取期货维度的高优先级币种"""
-    import psycopg
-
-    result = set()
-    debug = {"oi_value": 0, "oi_change": 0, "taker_extreme": 0, "ls_extreme": 0, "top_ls_change": 0, "futures_total": 0}
-
-    try:
-        with psycopg.connect(config.db_url) as conn:
-            with conn.cursor() as cur:
-                # 查每个币种的最新数据（限制7天）
-                cur.execute("""
-                    SELECT DISTINCT ON (symbol) 
-                        symbol, sum_open_interest_value as oi_val,
-                        sum_taker_long_short_vol_ratio as taker_ratio,
-                        count_long_short_ratio as ls_ratio
-                    FROM market_data.binance_futures_metrics_5m 
-                    WHERE create_time > NOW() - INTERVAL '7 days'
-                    ORDER BY symbol, create_time DESC
-                """)
-                rows = cur.fetchall()
-
-                oi_value_rank = []    # 持仓价值
-                taker_extreme = set() # 主动买卖比极端
-                ls_extreme = set()    # 多空比极端
-
-                for row in rows:
-                    sym, oi_val, taker, ls = row
-
-                    # 7. 持仓价值 Top30
-                    if oi_val:
-                        oi_value_rank.append((sym, float(oi_val)))
-
-                    # 9. 主动买卖比极端 (<0.2 或 >5.0)
-                    if taker:
-                        t = float(taker)
-                        if t < 0.2 or t > 5.0:
-                            taker_extreme.add(sym)
-
-                    # 10. 多空比极端 (<0.5 或 >4.0)
-                    if ls:
-                        ls_val = float(ls)
-                        if ls_val < 0.5 or ls_val > 4.0:
-                            ls_extreme.add(sym)
-
-                # Top N
-                top_oi_value = {s for s, _ in sorted(oi_value_rank, key=lambda x: x[1], reverse=True)[:top_n]}
-
-                result = top_oi_value | taker_extreme | ls_extreme
-
-                debug = {
-                    "oi_value": len(top_oi_value),
-                    "oi_change": 0,  # 简化掉
-                    "taker_extreme": len(taker_extreme),
-                    "ls_extreme": len(ls_extreme),
-                    "top_ls_change": 0,  # 简化掉
-                    "futures_total": len(result)
-                }
-    except Exception as e:
-        LOG.warning(f"获取期货优先级失败: {e}")
+    from .priority import get_priority_ranker
 
-    return result, debug
+    ranker = get_priority_ranker()
+    ranker.sync()
+    return ranker.rank_futures(top_n)
 
 
 def _compute_indicator(indicator_name: str, klines_data: Dict[str, bytes], interval: str) -> tuple:
-    """计算单个指标（子进程）- 使用 pickle 反序列化"""
+    """计算单个指标（子进程）- 使用 pickle 反序列化，返回 (指标, 周期, 结果, 计算秒数)"""
     import sys
     import os
 
@@ -319,9 +198,10 @@ def _compute_indicator(indicator_name: str, klines_data: Dict[str, bytes], inter
     from src.indicators.base import get_all_indicators
     from src.utils.precision import trim_dataframe
 
+    t0 = time.perf_counter()
     indicators = get_all_indicators()
     if indicator_name not in indicators:
-        return (indicator_name, interval, None)
+        return (indicator_name, interval, None, 0.0)
 
     cls = indicators[indicator_name]
     ind = cls()
@@ -341,8 +221,8 @@ def _compute_indicator(indicator_name: str, klines_data: Dict[str, bytes], inter
 
     if results:
         combined = pd.concat(results, ignore_index=True)
-        return (indicator_name, interval, trim_dataframe(combined))
-    return (indicator_name, interval, None)
+        return (indicator_name, interval, trim_dataframe(combined), time.perf_counter() - t0)
+    return (indicator_name, interval, None, time.perf_counter() - t0)
 
 
 class AsyncWriter(Thread):
@@ -414,6 +294,16 @@ class FullAsyncEngine:
         self._write_queue = queue.Queue(maxsize=2000)
         self._writer: Optional[AsyncWriter] = None
         self._cache = None
+        self._graph: Dict[str, tuple] = {}
+        self._indicators: List[str] = []
+        self._universe: List[str] = []
+        self._plan = TierPlan([], [], [])
+        self._tiers = TierScheduler()
+        self._background = TierQueue()
+        # 第一层各周期在途计算 / 在途期间到来的触发（合并为结束后补算一次）
+        self._inflight: Set[str] = set()
+        self._rerun: Dict[str, tuple] = {}
+        self._inflight_lock = Lock()
 
         signal.signal(signal.SIGINT, self._handle_signal)
         signal.signal(signal.SIGTERM, self._handle_signal)
@@ -422,34 +312,34 @@ class FullAsyncEngine:
         LOG.info(f"收到信号 {signum}，停止...")
         self.stop()
 
-    def _split_symbols(self, symbols: List[str], cache) -> tuple:
-        """按优先级分割币种 - 动态计算"""
-        # 用5m周期判断（数据更及时）
-        interval = "5m" if "5m" in self.intervals else self.intervals[0]
-        high_priority, _ = get_high_priority_symbols(cache, interval, 30)
-        high = [s for s in symbols if s in high_priority]
-        low = [s for s in symbols if s not in high_priority]
-        return high, low
+    def _split_symbols(self, symbols: List[str], high_priority: Set[str] = None) -> TierPlan:
+        """按优先级分层：第一层为高优先级，其余按 24h 成交额切分第二 / 第三层"""
+        from .priority import get_priority_ranker
+
+        if high_priority is None:
+            high_priority = get_high_priority_symbols_fast(top_n=30)
+        return TierPlan.build(symbols, high_priority, get_priority_ranker().by_volume(), config.tier2_size)
 
     def _split_indicators(self, indicators: List[str]) -> tuple:
-        """分离快慢指标"""
-        fast = [i for i in indicators if i not in SLOW_INDICATORS]
-        slow = [i for i in indicators if i in SLOW_INDICATORS]
-        return fast, slow
+        """分离快慢指标（按实测耗时自动归类）"""
+        return slow_nodes.split(indicators)
+
+    def _seed_slow_nodes(self, indicators: List[str], symbols: int):
+        """按持久化代价模型（单币种耗时）估计各节点整批耗时，冷启动即把已知的重节点放进慢池"""
+        wanted = set(indicators)
+        estimates: Dict[str, float] = {}
+        for (name, _), per_symbol in get_cost_model().snapshot().items():
+            if name in wanted:
+                estimates[name] = max(estimates.get(name, 0.0), per_symbol * symbols)
+        slow_nodes.seed(estimates)
+        slow = [n for n in indicators if slow_nodes.is_slow(n)]
+        if slow:
+            LOG.info(f"代价模型预置慢节点: {slow}")
 
     def _get_indicator_order(self, all_indicators: Dict) -> List[str]:
-        indicator_names = set(all_indicators.keys())
-        deps_first = set()
-        for dependent, deps in INDICATOR_DEPS.items():
-            if dependent in indicator_names:
-                for d in deps:
-                    if d in indicator_names:
-                        deps_first.add(d)
-        order = list(deps_first)
-        for name in indicator_names:
-            if name not in deps_first:
-                order.append(name)
-        return order
+        """依赖拓扑序（不含数据源节点）"""
+        self._graph = build_graph(all_indicators)
+        return [n for n in topo_order(self._graph) if n not in SOURCES]
 
     def run(self):
         from ..db import reader
@@ -465,21 +355,25 @@ class FullAsyncEngine:
             all_indicators = {k: v for k, v in all_indicators.items() if k in self.indicator_names}
 
         indicator_order = self._get_indicator_order(all_indicators)
-        fast_indicators, slow_indicators = self._split_indicators(indicator_order)
         max_lookback = max(ind.meta.lookback for ind in all_indicators.values())
 
-        # 快速获取高优先级币种（直接查数据库）
+        # 分层（高优先级由增量排名得出）
         t0 = time.time()
-        high_symbols = get_high_priority_symbols_fast(top_n=30)
-        LOG.info(f"高优先级: {len(high_symbols)} 币种, {time.time()-t0:.1f}s")
-
-        # 只缓存高优先级币种
+        self._universe = list(symbols)
+        self._indicators = indicator_order
+        self._plan = self._split_symbols(self._universe)
+        high_symbols = self._plan.tiers[1]
+        counts = self._plan.counts()
+        LOG.info(f"分层: 第一层={counts[1]} 第二层={counts[2]} 第三层={counts[3]}, {time.time()-t0:.1f}s")
+        self._seed_slow_nodes(indicator_order, len(high_symbols))
+
+        # 缓存全部分层的币种（下层与按需计算直接读缓存）
         t0 = time.time()
-        self._cache = init_cache(list(high_symbols), self.intervals, max_lookback)
+        self._cache = init_cache(self._plan.all_symbols(), self.intervals, max_lookback)
         LOG.info(f"缓存完成: {time.time()-t0:.1f}s")
 
         LOG.info("=" * 60)
-        LOG.info(f"指标计算引擎: {len(high_symbols)} 币种, {len(self.intervals)} 周期, {len(indicator_order)} 指标")
+        LOG.info(f"指标计算引擎: {len(self._universe)} 币种, {len(self.intervals)} 周期, {len(indicator_order)} 指标")
         LOG.info("=" * 60)
 
         # 启动写入线程
@@ -491,76 +385,79 @@ class FullAsyncEngine:
         self._slow_executor = ProcessPoolExecutor(max_workers=1)
 
         self._running = True
+        Thread(target=self._background_loop, daemon=True, name="tier-background").start()
+        Thread(target=self._listen_demand, daemon=True, name="tier-demand").start()
 
         # === 首次计算 ===
         LOG.info("=== 首次计算 ===")
         t_start = time.time()
 
         LOG.info(f"计算 {len(high_symbols)} 币种, {len(self.intervals)} 周期")
-        self._compute_priority(high_symbols, fast_indicators, slow_indicators, self.intervals)
+        with self._tiers.foreground():
+            self._compute_priority(high_symbols, indicator_order, self.intervals)
 
         LOG.info(f"首次计算完成: {time.time()-t_start:.1f}s")
 
+        # 第二层首次全量在后台补算
+        now = time.time()
+        for interval in self.intervals:
+            self._enqueue(2, interval, now)
+
         # 进入定时触发模式
         LOG.info("进入定时触发模式...")
-        self._run_daemon(high_symbols, fast_indicators, slow_indicators)
+        self._run_daemon(indicator_order)
 
         stop_cache()
         self._cleanup()
         LOG.info("引擎已停止")
 
-    def _compute_priority(self, symbols: List[str], fast_indicators: List[str], slow_indicators: List[str],
-                          intervals: List[str] = None):
-        """计算一个优先级的所有币种 - 快慢指标真正并行"""
+    def _compute_priority(self, symbols: List[str], indicators: List[str], intervals: List[str] = None):
+        """计算一个优先级的所有币种 - 按依赖 DAG 调度，快慢指标分池并行"""
         if not symbols:
             return
 
         intervals = intervals or self.intervals
         for interval in intervals:
-            klines = self._cache.get_klines(interval)
-            # 使用 pickle 序列化
-            klines_data = {s: pickle.dumps(df, protocol=5)
-                          for s, df in klines.items() if s in symbols}
-
+            klines_data = self._klines_data(symbols, interval)
             if not klines_data:
                 continue
 
-            t0 = time.time()
+            run = self._run_dag(indicators, klines_data, interval)
+            fast, slow = self._split_indicators(indicators)
+            LOG.info(f"[{interval}] {len(symbols)}币种 快={len(fast)} 慢={len(slow)} "
+                     f"失败={len(run.errors)} 耗时={run.wall:.1f}s")
+
+    def _run_dag(self, indicators: List[str], klines_data: Dict[str, bytes], interval: str):
+        """依赖就绪即提交到快/慢进程池，子进程实测耗时用于慢指标归类"""
+        def run_node(name: str):
+            if name in SOURCES:
+                return
+            slow = slow_nodes.is_slow(name)
+            executor = self._slow_executor if slow else self._fast_executor
+            timeout = 300 if slow else 60
+            future = executor.submit(_compute_indicator, name, klines_data, interval)
+            try:
+                ind_name, iv, result, seconds = future.result(timeout=timeout)
+            except TimeoutError:
+                # 超时说明耗时至少为 timeout：计入归类，下一轮改走慢池，不再反复占住快池工作者
+                future.cancel()
+                slow_nodes.record(name, timeout)
+                raise
+            slow_nodes.record(ind_name, seconds)
+            get_cost_model().observe({(ind_name, iv): (seconds, len(klines_data))})
+            indicator_duration.observe(seconds / len(klines_data), indicator=ind_name, interval=iv)
+            if result is not None:
+                self._write_queue.put_nowait((ind_name, iv, result))
+
+        nodes = set(indicators) | {p for n in indicators for p in self._graph.get(n, ()) if p in SOURCES}
+        run = DagScheduler(self._graph, max_workers=self.workers + 1).run(run_node, nodes)
+        dag_report(run, f"[{interval}] ", classify=False)
+        return run
 
-            # 快慢指标同时提交
-            all_futures = []
-            for indicator in fast_indicators:
-                future = self._fast_executor.submit(_compute_indicator, indicator, klines_data, interval)
-                all_futures.append(('fast', future))
-
-            for indicator in slow_indicators:
-                future = self._slow_executor.submit(_compute_indicator, indicator, klines_data, interval)
-                all_futures.append(('slow', future))
-
-            # 统一等待，完成一个处理一个
-            fast_done = 0
-            slow_done = 0
-            for tag, future in all_futures:
-                try:
-                    timeout = 60 if tag == 'fast' else 300
-                    ind_name, iv, result = future.result(timeout=timeout)
-                    if result is not None:
-                        self._write_queue.put_nowait((ind_name, iv, result))
-                    if tag == 'fast':
-                        fast_done += 1
-                    else:
-                        slow_done += 1
-                except Exception as e:
-                    LOG.error(f"[{interval}] {tag}指标: {e}")
-
-            total_time = time.time() - t0
-            LOG.info(f"[{interval}] {len(symbols)}币种 快={fast_done} 慢={slow_done} 耗时={total_time:.1f}s")
-
-    def _run_daemon(self, high_symbols: List[str],
-                    fast_indicators: List[str], slow_indicators: List[str]):
-        """定时触发模式"""
+    def _run_daemon(self, indicators: List[str]):
+        """定时触发模式：每根收盘第一层前台重算，下层按节奏入后台队列"""
         last_compute = {iv: 0 for iv in self.intervals}
-        last_report = time.time()
+        last_report = last_plan = time.time()
 
         while self._running:
             now = datetime.now(timezone.utc)
@@ -573,57 +470,148 @@ class FullAsyncEngine:
 
                 if wait + 2 <= seconds_after < wait + 7 and close_ts > last_compute[interval]:
                     last_compute[interval] = close_ts
-                    LOG.info(f"[{interval}] 触发")
-                    self._compute_interval(high_symbols, interval, fast_indicators, slow_indicators)
+                    levels = self._tiers.due(interval)
+                    LOG.info(f"[{interval}] 触发 层级={levels}")
+                    if 1 in levels:
+                        self._compute_interval(self._plan.tiers[1], interval, indicators)
+                    for level in levels:
+                        if level > 1:
+                            self._enqueue(level, interval, close_ts)
+
+            # 增量排名只做内存 top-k，定期重新分层
+            if time.time() - last_plan > config.priority_sync_seconds:
+                self._replan()
+                last_plan = time.time()
 
             if time.time() - last_report > 60:
-                LOG.info(f"状态: 队列={self._write_queue.qsize()}, 写入={self._writer.write_count}")
+                LOG.info(f"状态: 队列={self._write_queue.qsize()}, 写入={self._writer.write_count}, "
+                         f"后台任务={len(self._background)}")
                 last_report = time.time()
 
             time.sleep(1)
 
-            if time.time() - last_report > 60:
-                LOG.info(f"状态: 队列={self._write_queue.qsize()}, 写入={self._writer.write_count}")
-                last_report = time.time()
+    def _replan(self):
+        try:
+            plan = self._split_symbols(self._universe)
+        except Exception as e:
+            LOG.warning(f"重新分层失败: {e}")
+            return
+        if plan.tiers[1] and set(plan.tiers[1]) != set(self._plan.tiers[1]):
+            added = set(plan.tiers[1]) - set(self._plan.tiers[1])
+            removed = set(self._plan.tiers[1]) - set(plan.tiers[1])
+            LOG.info(f"第一层变化: +{len(added)} -{len(removed)}")
+        if plan.tiers[1]:
+            self._plan = plan
+
+    def _klines_data(self, symbols, interval: str) -> Dict[str, bytes]:
+        """缓存中指定币种的K线（pickle 序列化）"""
+        symbols = set(symbols)
+        klines = self._cache.get_klines(interval)
+        return {s: pickle.dumps(df, protocol=5) for s, df in klines.items() if s in symbols}
 
-            time.sleep(1)
+    def _compute_interval(self, symbols: List[str], interval: str, indicators: List[str]):
+        """第一层计算单个周期 - DAG 在前台线程执行（期间下层切片让出），不阻塞触发循环
 
-    def _compute_interval(self, symbols: List[str], interval: str,
-                          fast_indicators: List[str], slow_indicators: List[str]):
-        """计算单个周期 - 使用 pickle 序列化"""
+        同周期上一轮仍在执行时不另起线程：触发合并为其结束后用最新K线补算一次，
+        避免超时的周期越积越多、长期占住前台让下层饿死。
+        """
         if not symbols:
             return
 
-        klines = self._cache.get_klines(interval)
-        klines_data = {s: pickle.dumps(df, protocol=5)
-                      for s, df in klines.items() if s in symbols}
+        with self._inflight_lock:
+            if interval in self._inflight:
+                self._rerun[interval] = (symbols, indicators)
+                LOG.warning(f"[{interval}] 上一轮第一层计算未完成，合并到其结束后补算")
+                return
+            self._inflight.add(interval)
 
-        if not klines_data:
+        def run():
+            job = (symbols, indicators)
+            try:
+                while job is not None:
+                    klines_data = self._klines_data(job[0], interval)
+                    if klines_data:
+                        with self._tiers.foreground():
+                            self._run_dag(job[1], klines_data, interval)
+                    with self._inflight_lock:
+                        job = self._rerun.pop(interval, None)
+                        if job is None:
+                            self._inflight.discard(interval)
+            except Exception as e:
+                LOG.error(f"[{interval}] 第一层计算失败: {e}")
+                with self._inflight_lock:
+                    self._rerun.pop(interval, None)
+                    self._inflight.discard(interval)
+
+        Thread(target=run, daemon=True, name=f"dag-{interval}").start()
+
+    # ==================== 下层 / 按需 ====================
+
+    def _enqueue(self, level: int, interval: str, close_ts: float, symbols: List[str] = None):
+        """下层任务入后台队列；symbols 为空时取本层全部币种（轮转），否则为按需请求"""
+        tier = self._tiers.tiers[level]
+        period = INTERVAL_CONFIG.get(interval, (60, 3))[0]
+        rotating = symbols is None
+        symbols = self._plan.tiers[level] if rotating else symbols
+        if symbols:
+            self._background.put(TierJob(level, interval, close_ts, symbols,
+                                         deadline=close_ts + tier.deadline * period, rotating=rotating))
+
+    def request(self, symbols: List[str]):
+        """按需计算（用户打开卡片）：已在第一层的币种跳过，其余各周期以第三层优先级入队"""
+        known = set(self._universe)
+        symbols = [s for s in dict.fromkeys(s.strip().upper() for s in symbols)
+                   if s in known and self._plan.tier_of(s) != 1]
+        if not symbols:
             return
+        now = time.time()
+        for interval in self.intervals:
+            self._enqueue(3, interval, now, symbols)
+        LOG.info(f"按需计算: {symbols[:10]}")
 
-        # 快指标
-        for indicator in fast_indicators:
-            future = self._fast_executor.submit(_compute_indicator, indicator, klines_data, interval)
-            future.add_done_callback(lambda f: self._on_complete(f))
+    def _background_loop(self):
+        """逐个执行下层任务，切片之间让出给第一层"""
+        while self._running:
+            job = self._background.get(timeout=1.0)
+            if job is None:
+                continue
+            tier = self._tiers.tiers[job.level]
+            t0 = time.time()
+            done = run_job(job, tier, self._tiers, self._compute_chunk)
+            LOG.info(f"[T{job.level} {job.interval}] {done}/{len(job.symbols)} 币种, {time.time()-t0:.1f}s")
 
-        # 慢指标
-        for indicator in slow_indicators:
-            future = self._slow_executor.submit(_compute_indicator, indicator, klines_data, interval)
-            future.add_done_callback(lambda f: self._on_complete(f))
+    def _compute_chunk(self, symbols: List[str], interval: str):
+        klines_data = self._klines_data(symbols, interval)
+        if klines_data:
+            self._run_dag(self._indicators, klines_data, interval)
+
+    def _listen_demand(self):
+        """监听 NOTIFY indicator_demand（payload 为逗号分隔的币种）"""
+        import psycopg
 
-    def _on_complete(self, future: Future):
-        """计算完成回调"""
         try:
-            ind_name, iv, result = future.result(timeout=0)
-            if result is not None:
-                self._write_queue.put_nowait((ind_name, iv, result))
-        except Exception:
-            pass
+            conn = psycopg.connect(config.db_url, autocommit=True)
+            conn.execute(f"LISTEN {DEMAND_CHANNEL}")
+        except Exception as e:
+            LOG.warning(f"按需通道监听失败: {e}")
+            return
+
+        while self._running:
+            try:
+                if select.select([conn], [], [], 1.0)[0]:
+                    for notify in conn.notifies(timeout=0):
+                        payload = notify.payload.strip()
+                        symbols = json.loads(payload) if payload.startswith("[") else payload.split(",")
+                        self.request([s for s in symbols if s])
+            except Exception as e:
+                LOG.error(f"处理按需通知失败: {e}")
+        conn.close()
 
     def stop(self):
         self._running = False
 
     def _cleanup(self):
+        get_cost_model().save()
         if self._writer:
             self._writer.stop()
         if self._fast_executor:
@@ -0,0 +1,131 @@
+"""
+计算分片代价模型
+
+按 (指标, 周期) 记录单币种实测耗时的指数滑动平均，跨重启持久化到 JSON。
+_compute_parallel 据此估算每个 (symbol, interval) 任务的代价，按最长处理时间优先（LPT）
+装箱切成多于工作者数的分片，按代价从大到小提交：工作者做完手上的分片就从共享队列领取下一个
+（工作窃取），一轮计算不再被分到 K 线形态 / VPVR 等重任务的单个工作者拖住。
+"""
+import heapq
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOG = logging.getLogger("indicator_service.cost_model")
+
+DEFAULT_COST = 0.001     # 无任何实测数据时的单币种单指标耗时估计（秒）
+
+
+class CostModel:
+    """{(指标, 周期): 单币种耗时} 的滑动平均"""
+
+    def __init__(self, path: Optional[Path] = None, alpha: float = 0.3):
+        self.path = Path(path) if path else None
+        self.alpha = alpha
+        self._costs: Dict[Tuple[str, str], float] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            for key, value in data.items():
+                name, _, interval = key.rpartition("|")
+                self._costs.setdefault((name, interval), float(value))
+        except Exception as e:
+            LOG.debug(f"代价模型加载失败: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {f"{name}|{interval}": round(v, 9) for (name, interval), v in sorted(self._costs.items())}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1))
+            tmp.replace(self.path)
+        except Exception as e:
+            LOG.debug(f"代价模型保存失败: {e}")
+
+    def observe(self, costs: Dict[Tuple[str, str], Sequence[float]]):
+        """costs: {(指标, 周期): (总秒数, 币种数)}"""
+        with self._lock:
+            self._ensure_loaded()
+            for key, (seconds, symbols) in costs.items():
+                if symbols <= 0:
+                    continue
+                per_symbol = seconds / symbols
+                prev = self._costs.get(key)
+                self._costs[key] = per_symbol if prev is None else prev + self.alpha * (per_symbol - prev)
+
+    def get(self, name: str, interval: str) -> Optional[float]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._costs.get((name, interval))
+
+    def snapshot(self) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._costs)
+
+    def interval_costs(self, intervals: Iterable[str], indicators: Iterable[str]) -> Dict[str, float]:
+        """各周期单币种全部指标的估计耗时；未实测的 (指标, 周期) 取该指标其他周期均值，再退回全局中位数"""
+        costs = self.snapshot()
+        indicators = list(indicators)
+        by_name: Dict[str, List[float]] = {}
+        for (name, _), v in costs.items():
+            by_name.setdefault(name, []).append(v)
+        known = sorted(costs.values())
+        fallback = known[len(known) // 2] if known else DEFAULT_COST
+
+        out = {}
+        for interval in intervals:
+            total = 0.0
+            for name in indicators:
+                v = costs.get((name, interval))
+                if v is None:
+                    others = by_name.get(name)
+                    v = sum(others) / len(others) if others else fallback
+                total += v
+            out[interval] = total
+        return out
+
+    def has_data(self) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return bool(self._costs)
+
+
+def lpt_partition(items: Sequence, costs: Sequence[float], bins: int) -> List[Tuple[float, list]]:
+    """
+    最长处理时间优先装箱：按代价从大到小放入当前负载最小的箱子
+
+    返回 [(箱子总代价, 条目列表)]，按总代价降序、去掉空箱
+    """
+    bins = max(1, min(bins, len(items)))
+    heap = [(0.0, i, []) for i in range(bins)]
+    for idx in sorted(range(len(items)), key=lambda k: -costs[k]):
+        load, i, bucket = heapq.heappop(heap)
+        bucket.append(items[idx])
+        heapq.heappush(heap, (load + costs[idx], i, bucket))
+    return sorted(((load, bucket) for load, _, bucket in heap if bucket), key=lambda x: -x[0])
+
+
+_model: Optional[CostModel] = None
+
+
+def get_cost_model() -> CostModel:
+    """全局代价模型（路径取 config.cost_model_path）"""
+    global _model
+    if _model is None:
+        from ..config import config
+        _model = CostModel(config.cost_model_path)
+    return _model
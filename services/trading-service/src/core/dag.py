@@ -0,0 +1,253 @@
+"""
+指标依赖 DAG 调度
+
+节点 = 数据源（K线 / 期货情绪）+ 指标；指标在 IndicatorMeta.inputs / deps 中声明输入，
+据此建图。无依赖关系的节点在线程池中并发执行，记录每个节点的墙钟耗时，
+按完成时间回溯出本轮关键路径；慢节点按耗时滑动平均自动归类（替代手工维护的慢指标集合）。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..indicators.base import FUTURES, KLINES
+from ..indicators.primitives import merge_reports
+from ..observability import metrics
+from ..observability.tracing import current_context, trace
+
+LOG = logging.getLogger("indicator_service.dag")
+
+SOURCES = (KLINES, FUTURES)
+
+_node_duration = metrics.histogram(
+    "dag_node_duration_seconds", "DAG 节点耗时", (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30)
+)
+_critical_path = metrics.gauge("dag_critical_path_seconds", "DAG 关键路径耗时")
+
+
+def build_graph(indicators: Dict[str, type]) -> Dict[str, Tuple[str, ...]]:
+    """按指标元信息建图，返回 {节点: 前驱节点}；依赖未被选中的指标时忽略该边"""
+    graph: Dict[str, Tuple[str, ...]] = {}
+    for name, cls in indicators.items():
+        meta = cls.meta
+        preds = [s for s in meta.inputs if s in SOURCES]
+        preds += [d for d in meta.deps if d in indicators and d != name]
+        for source in preds:
+            if source in SOURCES:
+                graph.setdefault(source, ())
+        graph[name] = tuple(preds)
+    topo_order(graph)
+    return graph
+
+
+def topo_order(graph: Dict[str, Tuple[str, ...]]) -> List[str]:
+    """拓扑排序（同层保持插入顺序），存在环时抛 ValueError"""
+    indegree = {node: len(preds) for node, preds in graph.items()}
+    children: Dict[str, List[str]] = {node: [] for node in graph}
+    for node, preds in graph.items():
+        for p in preds:
+            children[p].append(node)
+
+    order = [node for node, d in indegree.items() if d == 0]
+    for node in order:
+        for child in children[node]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                order.append(child)
+    if len(order) != len(graph):
+        raise ValueError(f"指标依赖存在环: {sorted(set(graph) - set(order))}")
+    return order
+
+
+@dataclass
+class NodeTiming:
+    """单个节点的执行时间（time.perf_counter 时钟）"""
+    start: float
+    end: float
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class DagRun:
+    """一次 DAG 执行结果"""
+    timings: Dict[str, NodeTiming] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    critical_path: List[str] = field(default_factory=list)
+    wall: float = 0.0
+    # 原语缓存统计 {原语: {hits, misses, compute_s, saved_s}}
+    primitives: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # 指标分周期实测耗时 {(指标, 周期): [秒数, 币种数]}（供分片代价模型）
+    costs: Dict[Tuple[str, str], List[float]] = field(default_factory=dict)
+    # 进程池子进程 metrics.drain() 的增量与本批 Span，主进程合并后置空
+    metrics: Optional[dict] = None
+    spans: Optional[list] = None
+
+    def seconds(self) -> Dict[str, float]:
+        return {name: t.seconds for name, t in self.timings.items()}
+
+    @property
+    def critical_seconds(self) -> float:
+        return sum(self.timings[n].seconds for n in self.critical_path)
+
+
+def critical_path(graph: Dict[str, Tuple[str, ...]], timings: Dict[str, NodeTiming]) -> List[str]:
+    """从最晚完成的节点起，沿"最晚完成的前驱"回溯，得到决定本轮墙钟时间的节点链"""
+    if not timings:
+        return []
+    node = max(timings, key=lambda n: timings[n].end)
+    path = [node]
+    while True:
+        preds = [p for p in graph.get(node, ()) if p in timings]
+        if not preds:
+            break
+        node = max(preds, key=lambda p: timings[p].end)
+        path.append(node)
+    return path[::-1]
+
+
+class DagScheduler:
+    """依赖就绪即提交的 DAG 执行器：单节点失败只记录错误，不阻塞后继节点"""
+
+    def __init__(self, graph: Dict[str, Tuple[str, ...]], max_workers: int = 4):
+        self.graph = graph
+        self.order = topo_order(graph)
+        self.max_workers = max(1, max_workers)
+
+    def run(self, fn: Callable[[str], None], nodes: Iterable[str] = None) -> DagRun:
+        """执行 fn(node)；nodes 限定本轮节点（其余节点视为已完成）"""
+        selected = set(self.graph if nodes is None else nodes)
+        pending = {n: {p for p in self.graph[n] if p in selected} for n in self.order if n in selected}
+        run = DagRun()
+        t0 = time.perf_counter()
+        # 调用方处于 trace 中时，每个节点记一个子 Span（节点在线程池中执行，需显式传递父上下文）
+        ctx = current_context()
+
+        def execute(node):
+            start = time.perf_counter()
+            try:
+                if ctx is None:
+                    fn(node)
+                else:
+                    with trace(node, parent=ctx):
+                        fn(node)
+            except Exception as e:
+                run.errors[node] = str(e)
+            run.timings[node] = NodeTiming(start, time.perf_counter())
+            return node
+
+        if self.max_workers == 1:
+            for node in pending:
+                execute(node)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dag") as executor:
+                running = set()
+                while pending or running:
+                    ready = [n for n, deps in pending.items() if not deps]
+                    for node in ready:
+                        del pending[node]
+                        running.add(executor.submit(execute, node))
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        finished = fut.result()
+                        for deps in pending.values():
+                            deps.discard(finished)
+
+        run.wall = time.perf_counter() - t0
+        run.critical_path = critical_path(self.graph, run.timings)
+        return run
+
+
+def merge_runs(runs: List[DagRun]) -> DagRun:
+    """合并多个分片（并行执行）的结果：节点耗时取各分片最大值，关键路径取墙钟最长的分片，原语统计与实测耗时累加"""
+    runs = [r for r in runs if r is not None]
+    if not runs:
+        return DagRun()
+    slowest = max(runs, key=lambda r: r.wall)
+    merged = DagRun(critical_path=list(slowest.critical_path), wall=slowest.wall)
+    for r in runs:
+        for name, t in r.timings.items():
+            if name not in merged.timings or t.seconds > merged.timings[name].seconds:
+                merged.timings[name] = NodeTiming(0.0, t.seconds)
+        merged.errors.update(r.errors)
+    merged.primitives = merge_reports(*(r.primitives for r in runs))
+    for r in runs:
+        for key, (seconds, symbols) in r.costs.items():
+            acc = merged.costs.setdefault(key, [0.0, 0])
+            acc[0] += seconds
+            acc[1] += symbols
+    return merged
+
+
+class SlowClassifier:
+    """
+    慢节点自动归类
+
+    按节点耗时指数滑动平均归类：超过 threshold 秒视为慢节点，
+    回落到 threshold 一半以下才恢复为快节点（滞回，避免来回抖动）。
+    """
+
+    def __init__(self, threshold: float = 2.0, alpha: float = 0.3):
+        self.threshold = threshold
+        self.alpha = alpha
+        self._ewma: Dict[str, float] = {}
+        self._slow: set = set()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            prev = self._ewma.get(name)
+            avg = seconds if prev is None else prev + self.alpha * (seconds - prev)
+            self._ewma[name] = avg
+            if avg > self.threshold and name not in self._slow:
+                self._slow.add(name)
+                LOG.info(f"慢节点: {name} ({avg:.2f}s)")
+            elif avg < self.threshold / 2 and name in self._slow:
+                self._slow.discard(name)
+                LOG.info(f"恢复快节点: {name} ({avg:.2f}s)")
+
+    def seed(self, estimates: Dict[str, float]):
+        """用先验耗时估计（如持久化的代价模型）初始化尚未实测的节点，冷启动时已知的重节点直接归入慢池"""
+        for name, seconds in estimates.items():
+            with self._lock:
+                known = name in self._ewma
+            if not known:
+                self.record(name, seconds)
+
+    def observe(self, run: DagRun):
+        for name, seconds in run.seconds().items():
+            if name not in SOURCES:
+                self.record(name, seconds)
+
+    def is_slow(self, name: str) -> bool:
+        return name in self._slow
+
+    def split(self, names: List[str]) -> Tuple[List[str], List[str]]:
+        """(快节点, 慢节点)，保持原顺序"""
+        return [n for n in names if n not in self._slow], [n for n in names if n in self._slow]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._ewma)
+
+
+# 全局慢节点归类（引擎间共享）
+slow_nodes = SlowClassifier()
+
+
+def report(run: DagRun, tag: str = "", classify: bool = True) -> None:
+    """记录节点耗时指标并输出关键路径；classify=False 时由调用方自行上报实测耗时归类"""
+    for name, seconds in run.seconds().items():
+        _node_duration.observe(seconds, node=name)
+    _critical_path.set(run.critical_seconds)
+    if classify:
+        slow_nodes.observe(run)
+    if run.critical_path:
+        path = " → ".join(f"{n}({run.timings[n].seconds:.2f}s)" for n in run.critical_path)
+        LOG.info(f"{tag}关键路径 {run.critical_seconds:.2f}s / 墙钟 {run.wall:.2f}s: {path}")
+    if run.errors:
+        LOG.warning(f"{tag}节点失败: {run.errors}")
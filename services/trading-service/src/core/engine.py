@@ -4,7 +4,7 @@
 核心优化：
 1. 多周期并行读取数据
 2. 多进程并行计算（按周期+币种分片）
-3. 使用 pickle 协议5 优化序列化
+3. 进程模式通过共享内存传递K线（零拷贝，免 pickle）
 4. 进程池复用
 5. 一次性写入所有结果
 6. 可观测性：日志、指标、Tracing、告警
@@ -13,27 +13,50 @@ import time
 import pickle
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from multiprocessing import cpu_count
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 
 from ..config import config
 from ..indicators.base import get_all_indicators, get_batch_indicators, get_incremental_indicators
 from ..utils.precision import trim_dataframe
 from ..observability import get_logger, metrics, trace, alert, AlertLevel
+from ..observability.metrics import indicator_duration
+from ..observability.tracing import current_context, ingest_spans, pop_trace_spans
+from ..indicators.primitives import format_report
+from .cost_model import get_cost_model, lpt_partition
+from .dag import DagRun, merge_runs, report as dag_report
 
 LOG = get_logger("indicator_service")
 
 # 指标定义
 _compute_total = metrics.counter("indicator_compute_total", "指标计算总次数")
 _compute_errors = metrics.counter("indicator_compute_errors", "指标计算错误次数")
+_batch_fallbacks = metrics.counter("indicator_batch_fallback_total", "批量计算失败回退逐币种的次数")
 _compute_duration = metrics.histogram("indicator_compute_duration_seconds", "指标计算耗时", (0.5, 1, 2, 5, 10, 30, 60))
 _db_read_duration = metrics.histogram("db_read_duration_seconds", "数据库读取耗时", (0.5, 1, 2, 5, 10, 30))
 _db_write_duration = metrics.histogram("db_write_duration_seconds", "数据库写入耗时", (0.1, 0.5, 1, 2, 5))
 _active_symbols = metrics.gauge("active_symbols", "活跃交易对数量")
 _last_compute_ts = metrics.gauge("last_compute_timestamp", "最后计算时间戳")
+_primitive_hits = metrics.counter("primitive_cache_hits_total", "原语缓存命中次数")
+_primitive_misses = metrics.counter("primitive_cache_misses_total", "原语缓存未命中次数")
+_primitive_saved = metrics.counter("primitive_cache_saved_seconds_total", "原语缓存节省的计算耗时")
 
 # 全局进程池（复用）
 _executor: ProcessPoolExecutor = None
+# 流式状态开启时的固定进程：每个工作者一个单进程池，(symbol, interval) 始终落在同一进程
+_pinned: List[ProcessPoolExecutor] = []
+_owners: Dict[Tuple[str, str], int] = {}
+
+# 流式指标状态（每个进程一份，跨批次复用）
+_state_store = None
+
+
+def _get_state_store():
+    global _state_store
+    if _state_store is None:
+        from src.indicators.incremental.state import StateStore
+        _state_store = StateStore()
+    return _state_store
 
 
 def _get_executor(max_workers: int) -> ProcessPoolExecutor:
@@ -44,8 +67,108 @@ def _get_executor(max_workers: int) -> ProcessPoolExecutor:
     return _executor
 
 
-def _compute_batch(args: Tuple) -> Dict[str, List[dict]]:
-    """计算一批 (symbol, interval, df_bytes) 的所有指标"""
+def _get_pinned_executors(workers: int) -> List[ProcessPoolExecutor]:
+    """获取或创建固定进程池；工作者数变化时重建并清空归属"""
+    global _pinned
+    if len(_pinned) != workers:
+        for executor in _pinned:
+            executor.shutdown(wait=False)
+        _pinned = [ProcessPoolExecutor(max_workers=1) for _ in range(workers)]
+        _owners.clear()
+    return _pinned
+
+
+def _run_indicator(ind, frames: list, state_store=None, costs: Dict[str, list] = None) -> List[list]:
+    """单个指标在一批 (symbol, interval, df, last_ts) 上的结果记录列表
+
+    costs: 传入时按周期累加实测耗时 {interval: [秒数, 币种数]}（供分片代价模型）
+    """
+    cls = type(ind)
+    costs = {} if costs is None else costs
+    out = []
+    min_len = ind.meta.lookback // 2
+    use_stream = state_store is not None and ind.meta.is_incremental and ind.create_state() is not None
+
+    # 支持批量计算的指标：同周期所有币种一次向量化计算，失败时回退逐币种
+    batched = {}
+    if not use_stream and cls.has_batch():
+        groups: Dict[str, Dict] = {}
+        for symbol, interval, df, _ in frames:
+            if len(df) >= min_len:
+                groups.setdefault(interval, {})[symbol] = df
+        for interval, group in groups.items():
+            t0 = time.perf_counter()
+            try:
+                for symbol, records in ind.compute_batch(group, interval).items():
+                    batched[(symbol, interval)] = records
+            except Exception as e:
+                batched = {k: v for k, v in batched.items() if k[1] != interval}
+                _batch_fallbacks.inc(1, indicator=ind.meta.name, interval=interval)
+                LOG.warning(f"[{ind.meta.name} {interval}] 批量计算失败，回退逐币种 ({len(group)} 币种): {e}")
+            cost = costs.setdefault(interval, [0.0, 0])
+            cost[0] += time.perf_counter() - t0
+            cost[1] += len(group)
+
+    for symbol, interval, df, last_ts in frames:
+        placeholder = [{"交易对": symbol, "周期": interval, "数据时间": last_ts, "指标": None}]
+
+        if len(df) < min_len:
+            if last_ts:
+                out.append(placeholder)
+            continue
+        records = batched.get((symbol, interval))
+        if records is None:
+            t0 = time.perf_counter()
+            try:
+                result = None
+                if use_stream:
+                    result = state_store.advance(ind, df, symbol, interval)
+                if result is None:
+                    result = ind.compute(df, symbol, interval)
+                records = result.to_dict('records') if result is not None and not result.empty else []
+            except Exception:
+                records = []
+            cost = costs.setdefault(interval, [0.0, 0])
+            cost[0] += time.perf_counter() - t0
+            cost[1] += 1
+        if records:
+            out.append(records)
+        elif last_ts:
+            out.append(placeholder)
+
+    for interval, (seconds, count) in costs.items():
+        if count:
+            indicator_duration.observe(seconds / count, indicator=ind.meta.name, interval=interval)
+    return out
+
+
+def _load_futures(frames: list, futures_cache: dict = None):
+    """期货情绪数据源节点：注入跨进程传来的最新值缓存，并预取本批币种的历史"""
+    from src.config import config as service_config
+
+    if futures_cache:
+        try:
+            from src.indicators.incremental.futures_sentiment import set_metrics_cache
+            set_metrics_cache(futures_cache)
+        except ImportError:
+            pass
+
+    from src.indicators.futures_history import load_history
+    by_interval: Dict[str, List[str]] = {}
+    for symbol, interval, _, _ in frames:
+        if interval in service_config.futures_intervals:
+            by_interval.setdefault(interval, []).append(symbol)
+    for interval, symbols in by_interval.items():
+        load_history(symbols, interval)
+
+
+def _compute_batch(args: Tuple) -> Tuple[Dict[str, List[dict]], "DagRun"]:
+    """计算一批 (symbol, interval, data) 的所有指标
+
+    data 可以是 DataFrame、pickle 字节或共享内存引用 KlineRef；
+    指标按依赖 DAG 调度（无依赖的节点并发执行），返回 (结果, 本批 DAG 执行记录)
+    args 可带第 4 项父 trace 上下文，本批及各节点 Span 挂在其下
+    """
     import pickle
     import sys
     import os
@@ -55,17 +178,18 @@ def _compute_batch(args: Tuple) -> Dict[str, List[dict]]:
     if service_root not in sys.path:
         sys.path.insert(0, service_root)
 
-    from src.indicators.base import get_all_indicators
+    from src.indicators.base import get_all_indicators, FUTURES, KLINES
+    from src.db.shm import KlineRef, attach_frame, release_attached
+    from src.config import config as service_config
+    from src.core.dag import DagScheduler, build_graph
+    from src.indicators.primitives import get_primitive_cache
+    from multiprocessing import parent_process
 
-    batch, indicator_names, futures_cache = args
+    batch, indicator_names, futures_cache = args[:3]
+    trace_ctx = args[3] if len(args) > 3 else None
 
-    # 设置期货缓存
-    if futures_cache:
-        try:
-            from src.indicators.incremental.futures_sentiment import set_metrics_cache
-            set_metrics_cache(futures_cache)
-        except ImportError:
-            pass
+    # 释放上一轮挂载、本批次不再使用的共享内存段
+    release_attached({item[2].shm_name for item in batch if isinstance(item[2], KlineRef)})
 
     indicators = get_all_indicators()
     if indicator_names:
@@ -73,30 +197,44 @@ def _compute_batch(args: Tuple) -> Dict[str, List[dict]]:
 
     results = {name: [] for name in indicators}
 
-    for symbol, interval, df_bytes in batch:
-        # 反序列化 DataFrame（兼容已序列化和未序列化）
-        df = pickle.loads(df_bytes) if isinstance(df_bytes, bytes) else df_bytes
-        last_ts = df.index[-1].isoformat() if len(df) > 0 and hasattr(df.index[-1], 'isoformat') else None
+    state_store = _get_state_store() if service_config.incremental_state else None
 
-        for name, cls in indicators.items():
-            ind = cls()
-            placeholder = [{"交易对": symbol, "周期": interval, "数据时间": last_ts, "指标": None}]
-
-            if len(df) < ind.meta.lookback // 2:
-                if last_ts:
-                    results[name].append(placeholder)
-                continue
-            try:
-                result = ind.compute(df, symbol, interval)
-                if result is not None and not result.empty:
-                    results[name].append(result.to_dict('records'))
-                elif last_ts:
-                    results[name].append(placeholder)
-            except Exception:
-                if last_ts:
-                    results[name].append(placeholder)
+    frames = []
+    for symbol, interval, data in batch:
+        # 共享内存引用 -> 零拷贝视图；兼容已序列化和未序列化的 DataFrame
+        if isinstance(data, KlineRef):
+            df = attach_frame(data)
+        elif isinstance(data, bytes):
+            df = pickle.loads(data)
+        else:
+            df = data
+        last_ts = df.index[-1].isoformat() if len(df) > 0 and hasattr(df.index[-1], 'isoformat') else None
+        frames.append((symbol, interval, df, last_ts))
 
-    return results
+    def run_node(name: str):
+        if name == KLINES:
+            return  # K线已在上方挂载
+        if name == FUTURES:
+            _load_futures(frames, futures_cache)
+            return
+        costs = {}
+        results[name] = _run_indicator(indicators[name](), frames, state_store, costs)
+        for interval, cost in costs.items():
+            node_costs[(name, interval)] = cost
+
+    node_costs: Dict[Tuple[str, str], list] = {}
+    symbols = sorted({f[0] for f in frames})
+    with trace("compute.batch", parent=trace_ctx, pid=os.getpid(), tasks=len(frames),
+               intervals=sorted({f[1] for f in frames}), symbols=symbols[:20]) as span:
+        run = DagScheduler(build_graph(indicators), service_config.dag_workers).run(run_node)
+        span.set_tag("critical_path", run.critical_path)
+    run.primitives = get_primitive_cache().report()
+    run.costs = node_costs
+    if parent_process() is not None:
+        # 进程池子进程：本进程记录的指标与 Span 随结果带回主进程合并
+        run.metrics = metrics.drain()
+        run.spans = pop_trace_spans(span.trace_id)
+    return results, run
 
 
 class Engine:
@@ -118,8 +256,11 @@ class Engine:
         self.max_workers = max_workers or min(cpu_count(), 8)
         self.compute_backend = (compute_backend or config.compute_backend or "thread").lower()
 
-    def run(self, mode: str = "all"):
-        """运行计算 - 使用缓存，只读取一次"""
+    def run(self, mode: str = "all") -> Optional[Dict[str, float]]:
+        """运行计算 - 使用缓存，只读取一次
+
+        返回本次耗时统计 {read, compute, write, total, rows, symbols, critical_path}，未执行计算时返回 None
+        """
         from ..db.cache import get_cache, init_cache
 
         with trace("engine.run", mode=mode) as span:
@@ -195,12 +336,8 @@ class Engine:
                 alert(AlertLevel.WARNING, "无K线数据", "数据库中无可用K线数据")
                 return
 
-            # 准备计算任务 - 线程模式直接传 DataFrame，进程模式使用 pickle
-            use_pickle = self.compute_backend == "process"
-            task_list = [
-                (sym, iv, pickle.dumps(df, protocol=5) if use_pickle else df)
-                for (sym, iv), df in all_klines.items()
-            ]
+            # 准备计算任务 - 线程模式直接传 DataFrame，进程模式传共享内存引用
+            task_list = self._build_tasks(cache, all_klines)
 
             # 预加载期货缓存
             try:
@@ -215,9 +352,9 @@ class Engine:
                 indicator_names = list(indicators.keys())
 
                 if len(task_list) <= 20:
-                    all_results = _compute_batch((task_list, indicator_names, futures_cache))
+                    all_results, dag_run = _compute_batch((task_list, indicator_names, futures_cache))
                 else:
-                    all_results = self._compute_parallel(
+                    all_results, dag_run = self._compute_parallel(
                         task_list,
                         indicator_names,
                         indicators,
@@ -228,6 +365,12 @@ class Engine:
                 t_compute = time.time() - t1
                 _compute_duration.observe(t_compute)
                 compute_span.set_tag("duration_s", round(t_compute, 2))
+                compute_span.set_tag("critical_path", dag_run.critical_path)
+                dag_report(dag_run, f"[{','.join(self.intervals)}] ")
+                self._report_primitives(dag_run.primitives)
+                cost_model = get_cost_model()
+                cost_model.observe(dag_run.costs)
+                cost_model.save()
 
             # 写入数据库
             with trace("db.write") as write_span:
@@ -254,10 +397,54 @@ class Engine:
             if total_time > 120:
                 alert(AlertLevel.WARNING, "计算耗时过长", f"总耗时 {total_time:.1f}s 超过阈值", symbols=len(symbols), rows=total_rows)
 
+            return {
+                "read": t_read,
+                "compute": t_compute,
+                "write": t_write,
+                "total": total_time,
+                "rows": total_rows,
+                "symbols": len(symbols),
+                "critical_path": dag_run.critical_path,
+            }
+
+    @staticmethod
+    def _report_primitives(report: Dict[str, Dict[str, float]]):
+        """本轮原语缓存命中率与节省耗时"""
+        if not report:
+            return
+        for name, stat in report.items():
+            _primitive_hits.inc(stat["hits"], primitive=name)
+            _primitive_misses.inc(stat["misses"], primitive=name)
+            _primitive_saved.inc(stat["saved_s"], primitive=name)
+        LOG.info(f"原语缓存: {format_report(report)}")
+
+    def _build_tasks(self, cache, all_klines: Dict[tuple, pd.DataFrame]) -> list:
+        """构建计算任务列表
+
+        进程模式下把每个周期导出到共享内存，任务里只携带 KlineRef，
+        子进程按名称挂载后零拷贝读取；导出失败时回退到 pickle。
+        """
+        if self.compute_backend != "process":
+            return [(sym, iv, df) for (sym, iv), df in all_klines.items()]
+
+        refs = {}
+        for interval in self.intervals:
+            try:
+                for sym, ref in cache.export_shared(interval).items():
+                    refs[(sym, interval)] = ref
+            except Exception as e:
+                LOG.warning(f"[{interval}] 共享内存导出失败，回退 pickle: {e}")
+
+        return [
+            (sym, iv, refs.get((sym, iv)) or pickle.dumps(df, protocol=5))
+            for (sym, iv), df in all_klines.items()
+        ]
+
     def _write_simple_db(self, all_results: Dict[str, list]):
-        """写入 market_data.db - 每个指标一张表，全量覆盖"""
+        """写入 market_data.db - 每个指标一张表，所有表一次事务提交"""
         from ..db.reader import writer as sqlite_writer
 
+        tables = {}
         for indicator_name, records_list in all_results.items():
             if not records_list:
                 continue
@@ -270,8 +457,12 @@ class Engine:
                     all_records.append(records)
 
             if all_records:
-                df = pd.DataFrame(all_records)
-                sqlite_writer.write(indicator_name, df)
+                tables[indicator_name] = pd.DataFrame(all_records)
+
+        stats = sqlite_writer.write_batch(tables)
+        if stats:
+            LOG.info(f"SQLite 写入: {stats['tables']}表 {stats['rows']}行, "
+                     f"{stats['seconds']:.2f}s, {stats['rows_per_s']:.0f} rows/s")
 
         # 全局计算：市场占比
         self._update_market_share()
@@ -351,52 +542,122 @@ class Engine:
         indicators: dict,
         futures_cache: dict = None,
         backend: str = "thread",
-    ) -> Dict[str, list]:
+    ) -> Tuple[Dict[str, list], DagRun]:
         """并行计算
-        
+
+        任务按代价模型估算耗时，LPT 装箱成 工作者数 × chunks_per_worker 个分片并按代价降序提交，
+        先完成的工作者继续领取剩余分片。
+
+        流式状态（INCREMENTAL_STATE=1）按进程保存，进程模式下改为每个工作者一个固定进程：
+        (symbol, interval) 首次出现时分给预估负载最小的工作者，之后始终由它计算，
+        LPT 只在各工作者自己的任务内切分片（不再跨工作者窃取）。
+
         backend:
             - thread: 全部用线程池（适合IO密集）
             - process: 全部用进程池（适合CPU密集）
-            - hybrid: IO任务用线程池，CPU任务用进程池
+            - hybrid: 预估总耗时不超过 hybrid_process_seconds 用线程池，否则用进程池
+              （流式状态在线程 / 进程后端之间不共享，切换后端时重新预热）
         """
-        batch_size = max(1, len(task_list) // self.max_workers)
-        batches = []
-        for i in range(0, len(task_list), batch_size):
-            batch = task_list[i:i + batch_size]
-            batches.append((batch, indicator_names, futures_cache))
+        if backend not in ("thread", "process"):
+            return self._compute_parallel(task_list, indicator_names, indicators, futures_cache,
+                                          self._hybrid_backend(task_list, indicator_names))
+
+        workers = config.max_io_workers if backend == "thread" else config.max_cpu_workers
+        pinned = backend == "process" and config.incremental_state
+        if pinned:
+            executors = _get_pinned_executors(workers)   # 先于装箱：工作者数变化时归属已清空
+            owned = self._pin_partition(task_list, indicator_names, workers, max(1, config.chunks_per_worker))
+            chunks = [(load, batch) for _, load, batch in owned]
+        else:
+            chunks = self._partition(task_list, indicator_names, workers * max(1, config.chunks_per_worker))
+        if chunks:
+            loads = [load for load, _ in chunks]
+            LOG.debug(f"分片 {len(chunks)} 个 / {workers} 工作者, 预估最大 {max(loads):.2f}s, "
+                      f"合计 {sum(loads):.2f}s")
+        trace_ctx = current_context()
+        batches = [(batch, indicator_names, futures_cache, trace_ctx) for _, batch in chunks]
 
         all_results = {name: [] for name in indicators}
+        runs = []
 
         if backend == "thread":
             with ThreadPoolExecutor(max_workers=config.max_io_workers) as executor:
                 futures = [executor.submit(_compute_batch, batch) for batch in batches]
                 for future in as_completed(futures):
                     try:
-                        batch_results = future.result()
+                        batch_results, run = future.result()
+                        runs.append(run)
                         for name, records_list in batch_results.items():
                             all_results[name].extend(records_list)
                     except Exception as e:
                         _compute_errors.inc(1, backend="thread")
                         LOG.error(f"计算失败: {e}")
         elif backend == "process":
-            executor = _get_executor(config.max_cpu_workers)
-            futures = [executor.submit(_compute_batch, batch) for batch in batches]
+            if pinned:
+                futures = [executors[w].submit(_compute_batch, batch)
+                           for (w, _, _), batch in zip(owned, batches, strict=True)]
+            else:
+                executor = _get_executor(config.max_cpu_workers)
+                futures = [executor.submit(_compute_batch, batch) for batch in batches]
             for future in as_completed(futures):
                 try:
-                    batch_results = future.result()
+                    batch_results, run = future.result()
+                    metrics.merge(run.metrics)
+                    ingest_spans(run.spans)
+                    run.metrics = run.spans = None
+                    runs.append(run)
                     for name, records_list in batch_results.items():
                         all_results[name].extend(records_list)
                 except Exception as e:
                     _compute_errors.inc(1, backend="process")
                     LOG.error(f"计算失败: {e}")
-        else:
-            # hybrid: 小批量用线程，大批量用进程
-            if len(task_list) <= 50:
-                return self._compute_parallel(task_list, indicator_names, indicators, futures_cache, "thread")
-            else:
-                return self._compute_parallel(task_list, indicator_names, indicators, futures_cache, "process")
 
-        return all_results
+        return all_results, merge_runs(runs)
+
+    @staticmethod
+    def _task_costs(task_list: list, indicator_names: list) -> List[float]:
+        """各 (symbol, interval) 任务的预估耗时"""
+        per_interval = get_cost_model().interval_costs({t[1] for t in task_list}, indicator_names)
+        return [per_interval[t[1]] for t in task_list]
+
+    def _partition(self, task_list: list, indicator_names: list, chunks: int) -> List[Tuple[float, list]]:
+        """LPT 装箱：[(预估耗时, 任务列表)]，按预估耗时降序"""
+        return lpt_partition(task_list, self._task_costs(task_list, indicator_names), chunks)
+
+    def _pin_partition(self, task_list: list, indicator_names: list, workers: int,
+                       chunks_per_worker: int) -> List[Tuple[int, float, list]]:
+        """固定归属装箱：[(工作者, 预估耗时, 任务列表)]
+
+        已分配过的 (symbol, interval) 沿用原工作者；新任务按代价降序分给当前预估负载最小的工作者。
+        """
+        costs = self._task_costs(task_list, indicator_names)
+        loads = [0.0] * workers
+        fresh = []
+        for i, task in enumerate(task_list):
+            owner = _owners.get((task[0], task[1]))
+            if owner is None or owner >= workers:
+                fresh.append(i)
+            else:
+                loads[owner] += costs[i]
+        for i in sorted(fresh, key=lambda k: -costs[k]):
+            owner = min(range(workers), key=loads.__getitem__)
+            _owners[(task_list[i][0], task_list[i][1])] = owner
+            loads[owner] += costs[i]
+
+        out = []
+        for w in range(workers):
+            mine = [i for i, task in enumerate(task_list) if _owners[(task[0], task[1])] == w]
+            if mine:
+                parts = lpt_partition([task_list[i] for i in mine], [costs[i] for i in mine], chunks_per_worker)
+                out.extend((w, load, batch) for load, batch in parts)
+        return out
+
+    def _hybrid_backend(self, task_list: list, indicator_names: list) -> str:
+        """按预估总耗时选择后端；尚无实测数据时按任务数判断"""
+        if not get_cost_model().has_data():
+            return "thread" if len(task_list) <= 50 else "process"
+        estimate = sum(self._task_costs(task_list, indicator_names))
+        return "thread" if estimate <= config.hybrid_process_seconds else "process"
 
     def run_single(self, symbol: str, interval: str, indicator_name: str):
         """单次增量计算 - 走缓存"""
@@ -1,27 +1,35 @@
 """
 事件驱动指标计算引擎
 
-监听 PostgreSQL NOTIFY 通道，K线闭合后自动触发对应周期计算。
+监听 PostgreSQL NOTIFY 通道，K线闭合后只重算闭合的币种。
 
 架构:
-  启动 → 全量计算（用 Engine）
-  candles_1m (NOTIFY) → 触发对应周期增量计算
+  启动 → 全量计算（用 Engine，同时初始化缓存）
+  candles_1m (NOTIFY, 每行一条) → CloseBatcher 按周期合并闭合币种
+    → 等待 CA 刷新延迟后出批 → 缓存增量刷新 + 只算这批币种 → 写库
+  candle_rollup (NOTIFY, data-service WSCollector 进程内合成的高周期闭合 K线)
+    → 该周期批次立即到期（连续聚合视图为实时聚合，最后一根 1m 已写库即可读到）
+  同一周期同时最多一批在算，期间到达的闭合并入下一批（背压，不丢不堆积）
+  每批记录 "K线闭合 → 指标写入" 延迟分位数
 """
 import json
 import logging
 import signal
 import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from queue import Queue
+from queue import Empty, Queue
 from typing import Dict, List, Optional
 
+import numpy as np
 import psycopg
 import select
 
 from ..config import config
+from ..observability import metrics
 
 LOG = logging.getLogger("indicator_service.event")
 
@@ -36,6 +44,120 @@ INTERVALS = [
     ("1w", 10080, 10),
 ]
 
+# 周线按周一对齐（1970-01-01 为周四）
+_ALIGN_OFFSET_MINUTES = {"1w": 4 * 1440}
+
+_close_to_write = metrics.histogram(
+    "event_close_to_write_seconds", "K线闭合到指标写入延迟", (1, 2, 5, 10, 20, 30, 60, 120, 300)
+)
+_close_to_write_quantile = metrics.gauge("event_close_to_write_quantile_seconds", "K线闭合到指标写入延迟分位数")
+_notify_total = metrics.counter("event_notify_total", "收到的K线闭合通知数")
+_coalesced_total = metrics.counter("event_coalesced_total", "并入未完成批次的重复闭合数")
+_batch_symbols = metrics.histogram("event_batch_symbols", "每批重算币种数", (1, 10, 50, 100, 200, 500, 1000))
+_rollup_total = metrics.counter("event_rollup_total", "收到的高周期合成闭合K线数")
+
+ROLLUP_CHANNEL = "candle_rollup"
+
+
+def closed_intervals(close_ts: datetime, intervals: List[str]) -> List[str]:
+    """1m K线在 close_ts 闭合时，同时闭合的周期"""
+    epoch_minutes = int(close_ts.timestamp()) // 60
+    return [
+        interval for interval, minutes, _ in INTERVALS
+        if interval in intervals and (epoch_minutes - _ALIGN_OFFSET_MINUTES.get(interval, 0)) % minutes == 0
+    ]
+
+
+@dataclass
+class CloseBatch:
+    """一个周期的待算批次: {symbol: 最早未处理的闭合时间}"""
+    interval: str
+    deadline: float
+    symbols: Dict[str, datetime] = field(default_factory=dict)
+
+
+class CloseBatcher:
+    """按周期合并K线闭合通知
+
+    - 每个周期一个待算批次，首条闭合到达后等待 delay 秒（CA 刷新）出批
+    - 周期正在计算时不出批，新闭合继续并入，算完后立即出下一批
+    - 同一币种重复闭合只保留最早的闭合时间（延迟按最坏情况统计）
+    """
+
+    def __init__(self, delays: Dict[str, float]):
+        self.delays = delays
+        self._pending: Dict[str, CloseBatch] = {}
+        self._busy: set = set()
+        self._lock = threading.Lock()
+
+    def add(self, symbol: str, close_ts: datetime, intervals: List[str], now: float, delay: float = None):
+        """delay 覆盖该周期的默认等待（高周期合成通知到达时为 0，批次提前到期）"""
+        with self._lock:
+            for interval in intervals:
+                wait = self.delays.get(interval, 0) if delay is None else delay
+                batch = self._pending.get(interval)
+                if batch is None:
+                    batch = self._pending[interval] = CloseBatch(interval, now + wait)
+                elif now + wait < batch.deadline:
+                    batch.deadline = now + wait
+                prev = batch.symbols.get(symbol)
+                if prev is None:
+                    batch.symbols[symbol] = close_ts
+                else:
+                    _coalesced_total.inc(1, interval=interval)
+                    if close_ts < prev:
+                        batch.symbols[symbol] = close_ts
+
+    def pop_due(self, now: float) -> List[CloseBatch]:
+        """取出已到期且该周期空闲的批次，并标记为计算中"""
+        with self._lock:
+            due = [b for iv, b in self._pending.items() if b.deadline <= now and iv not in self._busy]
+            for batch in due:
+                del self._pending[batch.interval]
+                self._busy.add(batch.interval)
+            return due
+
+    def acquire(self, interval: str):
+        """标记周期计算中（全量计算期间暂停出批）"""
+        with self._lock:
+            self._busy.add(interval)
+
+    def release(self, interval: str):
+        with self._lock:
+            self._busy.discard(interval)
+
+    def pending(self) -> Dict[str, int]:
+        with self._lock:
+            return {iv: len(b.symbols) for iv, b in self._pending.items()}
+
+
+class LatencyTracker:
+    """K线闭合到写入延迟（每周期保留最近 window 个样本求分位数）"""
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, window: int = 4096):
+        self._samples: Dict[str, deque] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, interval: str, latencies: List[float]):
+        with self._lock:
+            samples = self._samples.setdefault(interval, deque(maxlen=self._window))
+            samples.extend(latencies)
+        for value in latencies:
+            _close_to_write.observe(value, interval=interval)
+        for q, value in self.percentiles(interval).items():
+            _close_to_write_quantile.set(value, interval=interval, quantile=q)
+
+    def percentiles(self, interval: str) -> Dict[str, float]:
+        with self._lock:
+            samples = list(self._samples.get(interval, ()))
+        if not samples:
+            return {}
+        values = np.percentile(samples, self.QUANTILES)
+        return {f"p{q}": float(v) for q, v in zip(self.QUANTILES, values)}
+
 
 @dataclass
 class TriggerEvent:
@@ -46,7 +168,7 @@ class TriggerEvent:
 
 
 class EventEngine:
-    """事件驱动引擎 - 简化版，直接调用 Engine 计算"""
+    """事件驱动引擎 - 按周期合并闭合币种，只重算这些币种"""
 
     def __init__(self,
                  symbols: Optional[List[str]] = None,
@@ -58,11 +180,12 @@ class EventEngine:
 
         self._running = False
         self._trigger_queue: Queue = Queue()
-        self._last_triggered: Dict[str, datetime] = {}
+        self._batcher = CloseBatcher({iv: delay for iv, _, delay in INTERVALS})
+        self.latency = LatencyTracker()
         self._initialized = False  # 计算线程已就绪
         self._ready_for_events = False  # 已识别高优先级币种，可以接受 NOTIFY
         self._high_symbols = []
-        self._interval_locks: Dict[str, threading.Lock] = {}
+        self._tracked: set = set()
 
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -96,13 +219,21 @@ class EventEngine:
 
     def _init_engine(self):
         """后台初始化 - 识别高优先级币种并全量计算"""
-        from .async_full_engine import get_high_priority_symbols_fast
-
-        # 识别高优先级币种
-        LOG.info("识别高优先级币种...")
-        t0 = time.time()
-        self._high_symbols = list(get_high_priority_symbols_fast(top_n=30))
-        LOG.info(f"高优先级: {len(self._high_symbols)} 币种, {time.time()-t0:.1f}s")
+        if self.symbols:
+            self._high_symbols = list(self.symbols)
+        else:
+            from .async_full_engine import get_high_priority_symbols_fast
+
+            # 识别高优先级币种
+            LOG.info("识别高优先级币种...")
+            t0 = time.time()
+            self._high_symbols = list(get_high_priority_symbols_fast(top_n=30))
+            LOG.info(f"高优先级: {len(self._high_symbols)} 币种, {time.time()-t0:.1f}s")
+        self._tracked = set(self._high_symbols)
+
+        # 全量计算完成前暂停出批（闭合照常合并）
+        for interval in self.intervals:
+            self._batcher.acquire(interval)
         self._ready_for_events = True
 
         # 启动时全量计算一次（不阻塞通知消费）
@@ -119,32 +250,38 @@ class EventEngine:
         conn = psycopg.connect(config.db_url, autocommit=True)
         conn.execute("LISTEN candle_1m_update")
         conn.execute("LISTEN metrics_5m_update")
-        LOG.info("开始监听: candle_1m_update, metrics_5m_update")
+        conn.execute(f"LISTEN {ROLLUP_CHANNEL}")
+        LOG.info(f"开始监听: candle_1m_update, metrics_5m_update, {ROLLUP_CHANNEL}")
 
         while self._running:
             if select.select([conn], [], [], 1.0)[0]:
-                for notify in conn.notifies():
+                for notify in conn.notifies(timeout=0):
                     self._handle_notify(notify.channel, notify.payload)
 
         conn.close()
 
     def _handle_notify(self, channel: str, payload: str):
-        """处理 NOTIFY 消息"""
+        """处理 NOTIFY 消息（只做解析和合并，不阻塞监听）"""
         # 高优先级币种未准备时忽略
         if not self._ready_for_events:
             return
 
         try:
             data = json.loads(payload)
+            if channel == ROLLUP_CHANNEL:
+                self._on_rollup(data)
+                return
+
             is_closed = data.get("is_closed", False)
 
             if not is_closed:
                 return
 
             if channel == "candle_1m_update":
+                symbol = data.get("symbol")
                 bucket_ts = data.get("bucket_ts")
-                if bucket_ts:
-                    self._schedule_candle_triggers(bucket_ts)
+                if symbol in self._tracked and bucket_ts:
+                    self._on_candle_closed(symbol, bucket_ts)
 
             elif channel == "metrics_5m_update":
                 create_time = data.get("create_time")
@@ -154,92 +291,98 @@ class EventEngine:
         except Exception as e:
             LOG.error(f"处理通知失败: {e}")
 
-    def _schedule_candle_triggers(self, bucket_ts_str: str):
-        """根据 1m K线闭合时间，调度对应周期计算"""
-        try:
-            # 解析时间
-            if isinstance(bucket_ts_str, str):
-                bucket_ts = datetime.fromisoformat(bucket_ts_str.replace("Z", "+00:00"))
-            else:
-                bucket_ts = bucket_ts_str
-
-            minute = bucket_ts.hour * 60 + bucket_ts.minute
-
-            for interval, minutes, delay in INTERVALS:
-                if interval not in self.intervals:
-                    continue
-
-                # 检查是否是该周期的闭合点
-                if minute % minutes == 0:
-                    # 避免重复触发
-                    last = self._last_triggered.get(interval)
-                    if last and (bucket_ts - last).total_seconds() < minutes * 60 - 10:
-                        continue
-
-                    self._last_triggered[interval] = bucket_ts
-
-                    # 延迟触发（等待 CA 刷新）
-                    trigger_time = datetime.now(timezone.utc) + timedelta(seconds=delay)
-                    event = TriggerEvent(interval=interval, trigger_time=trigger_time)
-                    self._trigger_queue.put(event)
-                    LOG.info(f"[{interval}] 调度计算 @ {bucket_ts}, 延迟 {delay}s")
-
-        except Exception as e:
-            LOG.error(f"调度失败: {e}")
+    def _on_candle_closed(self, symbol: str, bucket_ts_str):
+        """1m K线闭合，并入所有同时闭合的周期批次"""
+        if isinstance(bucket_ts_str, str):
+            bucket_ts = datetime.fromisoformat(bucket_ts_str.replace("Z", "+00:00"))
+        else:
+            bucket_ts = bucket_ts_str
+        if bucket_ts.tzinfo is None:
+            bucket_ts = bucket_ts.replace(tzinfo=timezone.utc)
+
+        close_ts = bucket_ts + timedelta(minutes=1)
+        intervals = closed_intervals(close_ts, self.intervals)
+        if intervals:
+            _notify_total.inc(1)
+            self._batcher.add(symbol, close_ts, intervals, time.time())
+
+    def _on_rollup(self, data: dict):
+        """高周期合成K线闭合：已跟踪币种并入该周期批次并立即到期"""
+        interval = data.get("interval")
+        minutes = next((m for iv, m, _ in INTERVALS if iv == interval), None)
+        if minutes is None or interval not in self.intervals:
+            return
+        bucket_ts = datetime.fromisoformat(data["bucket_ts"].replace("Z", "+00:00"))
+        close_ts = bucket_ts + timedelta(minutes=minutes)
+        symbols = [bar[0] for bar in data.get("bars", ()) if bar and bar[0] in self._tracked]
+        now = time.time()
+        for symbol in symbols:
+            self._batcher.add(symbol, close_ts, [interval], now, delay=0)
+        if symbols:
+            _rollup_total.inc(len(symbols), interval=interval)
 
     def _schedule_metrics_triggers(self, create_time_str: str):
         """根据期货数据时间，调度期货指标计算"""
         # 期货指标单独处理，这里简化为同样的逻辑
         pass
 
-    def _do_compute(self, interval: str):
-        """执行单个周期的计算 - 直接用 Engine"""
+    def _do_compute(self, interval: str, symbols: Optional[List[str]] = None):
+        """执行计算 - 直接用 Engine（缓存增量刷新 + 只算给定币种）"""
         from .engine import Engine
-        LOG.info(f"[{interval}] 计算 {len(self._high_symbols)} 币种...")
+        symbols = symbols or self._high_symbols
+        LOG.info(f"[{interval}] 计算 {len(symbols)} 币种...")
         t0 = time.time()
 
-        if interval == "__full__":
-            Engine(
-                symbols=self._high_symbols,
-                intervals=self.intervals,
-                max_workers=self.workers,
-            ).run(mode="all")
-        else:
-            Engine(
-                symbols=self._high_symbols,
-                intervals=[interval],
-                max_workers=self.workers,
-            ).run(mode="all")
+        Engine(
+            symbols=symbols,
+            intervals=self.intervals if interval == "__full__" else [interval],
+            max_workers=self.workers,
+        ).run(mode="all")
 
         LOG.info(f"[{interval}] 完成: {time.time()-t0:.1f}s")
 
     def _calculation_loop(self):
-        """计算循环 - 处理触发队列"""
+        """计算循环 - 处理全量触发与到期批次"""
         with ThreadPoolExecutor(max_workers=self.workers) as executor:
             while self._running:
                 try:
-                    event = self._trigger_queue.get(timeout=1.0)
-                except Exception:
-                    continue
+                    event = self._trigger_queue.get(timeout=0.2)
+                    executor.submit(self._run_single_event, event)
+                except Empty:
+                    pass
 
-                executor.submit(self._run_single_event, event)
+                for batch in self._batcher.pop_due(time.time()):
+                    executor.submit(self._run_batch, batch)
 
     def _run_single_event(self, event: TriggerEvent):
-        """带互斥的单事件执行，避免同周期重入"""
-        lock = self._interval_locks.setdefault(event.interval, threading.Lock())
-        if not lock.acquire(blocking=False):
-            LOG.info(f"[{event.interval}] 正在计算，跳过重复触发")
-            return
+        """全量计算，完成后恢复各周期出批"""
         try:
             now = datetime.now(timezone.utc)
             wait_seconds = (event.trigger_time - now).total_seconds()
             if wait_seconds > 0:
                 time.sleep(wait_seconds)
-            self._do_compute(event.interval)
+            self._do_compute(event.interval, event.symbols)
         except Exception as e:
             LOG.error(f"计算错误: {e}")
         finally:
-            lock.release()
+            if event.interval == "__full__":
+                for interval in self.intervals:
+                    self._batcher.release(interval)
+
+    def _run_batch(self, batch: CloseBatch):
+        """重算一批闭合币种并记录闭合到写入延迟"""
+        symbols = sorted(batch.symbols)
+        _batch_symbols.observe(len(symbols), interval=batch.interval)
+        try:
+            self._do_compute(batch.interval, symbols)
+            written = datetime.now(timezone.utc)
+            self.latency.record(batch.interval, [(written - ts).total_seconds() for ts in batch.symbols.values()])
+            p = self.latency.percentiles(batch.interval)
+            LOG.info(f"[{batch.interval}] 闭合→写入延迟 p50={p['p50']:.1f}s p95={p['p95']:.1f}s p99={p['p99']:.1f}s")
+        except Exception as e:
+            LOG.error(f"[{batch.interval}] 计算错误: {e}")
+        finally:
+            self._batcher.release(batch.interval)
 
 
 def run_event_engine(symbols=None, intervals=None, workers=4):
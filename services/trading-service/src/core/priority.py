@@ -0,0 +1,310 @@
+"""
+高优先级币种增量排名
+
+原先每次识别高优先级都要对 candles_5m 近 24h 做多 CTE 聚合、对期货指标做 DISTINCT ON 扫描。
+这里改为常驻内存的滚动统计：
+
+- K线维度：每个币种保留近 25h 的已闭合 5m K线，增量维护 24h 成交额之和与振幅均值；
+  数据来自 DataCache 摄入的 5m K线（全局排名器创建时注册的摄入监听器），缓存之外的币种按全局水位线只取新K线
+- 期货维度：每个币种最新一条持仓价值 / 主动买卖比 / 多空比，按 create_time 水位线增量更新
+
+rank() 只做内存 top-k（微秒级），调度器可以每轮都刷新优先级。
+仅首次启动（无任何数据）时做一次 24h 范围扫描作为种子。
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..db.shm import KLINE_COLUMNS
+
+LOG = logging.getLogger("indicator_service.priority")
+
+SOURCE_INTERVAL = "5m"
+
+_NS = 1_000_000_000
+_HOUR = 3600 * _NS
+_WINDOW = 24 * _HOUR           # 成交额 / 振幅统计窗口
+_KEEP = 25 * _HOUR             # 涨跌幅需要 23~25h 前的收盘价
+_FUTURES_MAX_AGE = 7 * 24 * _HOUR
+
+# 缓存摄入数组中排名使用的列位置
+_HIGH, _LOW, _CLOSE, _QUOTE_VOLUME = (KLINE_COLUMNS.index(c) for c in ("high", "low", "close", "quote_volume"))
+
+
+class _Window:
+    """单币种近 25h 的 5m K线，[start:] 为 24h 统计窗口"""
+
+    __slots__ = ("ts", "qv", "rng", "close", "start", "qv_sum", "rng_sum", "rng_n")
+
+    def __init__(self):
+        self.ts: List[int] = []
+        self.qv: List[float] = []
+        self.rng: List[float] = []
+        self.close: List[float] = []
+        self.start = 0
+        self.qv_sum = 0.0
+        self.rng_sum = 0.0
+        self.rng_n = 0
+
+    def _account(self, i: int, sign: int):
+        self.qv_sum += sign * self.qv[i]
+        if not math.isnan(self.rng[i]):
+            self.rng_sum += sign * self.rng[i]
+            self.rng_n += sign
+
+    def add(self, ts: int, qv: float, high: float, low: float, close: float):
+        qv = 0.0 if math.isnan(qv) else qv
+        rng = (high - low) / close if close else math.nan   # NULLIF(close, 0)
+        if self.ts and ts <= self.ts[-1]:
+            if ts < self.ts[-1]:
+                return
+            # 同一根K线重复到达：替换
+            last = len(self.ts) - 1
+            if last >= self.start:
+                self._account(last, -1)
+            self.qv[last], self.rng[last], self.close[last] = qv, rng, close
+            if last >= self.start:
+                self._account(last, 1)
+            return
+        self.ts.append(ts)
+        self.qv.append(qv)
+        self.rng.append(rng)
+        self.close.append(close)
+        self._account(len(self.ts) - 1, 1)
+
+    def advance(self, now: int):
+        """滑出 24h 窗口的K线从统计中扣除，超过 25h 的丢弃"""
+        cut = now - _WINDOW
+        while self.start < len(self.ts) and self.ts[self.start] <= cut:
+            self._account(self.start, -1)
+            self.start += 1
+        if self.start and self.ts[0] < now - _KEEP:
+            k = bisect_left(self.ts, now - _KEEP)
+            k = min(k, self.start)
+            del self.ts[:k], self.qv[:k], self.rng[:k], self.close[:k]
+            self.start -= k
+        if self.start == len(self.ts):
+            # 窗口清空时归零，避免浮点累计误差
+            self.qv_sum = self.rng_sum = 0.0
+            self.rng_n = 0
+
+    def change(self, now: int) -> Optional[float]:
+        """|近 1h 最新收盘 / 23~25h 前最后一根收盘 - 1|"""
+        if not self.ts or self.ts[-1] <= now - _HOUR:
+            return None
+        i = bisect_right(self.ts, now - 23 * _HOUR) - 1
+        if i < 0 or self.ts[i] < now - _KEEP:
+            return None
+        prev = self.close[i]
+        if not prev or math.isnan(prev) or math.isnan(self.close[-1]):
+            return None
+        return abs((self.close[-1] - prev) / prev)
+
+
+class PriorityRanker:
+    """{币种: 滚动统计} + {币种: 最新期货指标}，rank() 取各维度 top-k 并集"""
+
+    def __init__(self, db_url: str = None, exchange: str = None, sync_seconds: float = None):
+        from ..config import config
+        self.db_url = db_url or config.db_url
+        self.exchange = exchange or config.exchange
+        self.sync_seconds = config.priority_sync_seconds if sync_seconds is None else sync_seconds
+        self._klines: Dict[str, _Window] = {}
+        # {币种: (create_time 纳秒, 持仓价值, 主动买卖比, 多空比)}
+        self._futures: Dict[str, Tuple[int, Optional[float], Optional[float], Optional[float]]] = {}
+        self._kline_mark: Optional[pd.Timestamp] = None     # 已从库中同步到的 bucket_ts
+        self._futures_mark = None                           # 已从库中同步到的 create_time
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+
+    # ==================== 摄入 ====================
+
+    def ingest(self, symbol: str, ts: np.ndarray, high, low, close, quote_volume):
+        """追加一个币种按时间升序的已闭合K线（ts 为 int64 纳秒 UTC）"""
+        with self._lock:
+            window = self._klines.get(symbol)
+            if window is None:
+                window = self._klines[symbol] = _Window()
+            for t, h, lo, c, qv in zip(ts.tolist(), np.asarray(high).tolist(), np.asarray(low).tolist(),
+                                       np.asarray(close).tolist(), np.asarray(quote_volume).tolist(), strict=True):
+                window.add(t, qv, h, lo, c)
+
+    def on_cache_ingest(self, interval: str, symbol: str, ts: np.ndarray, values: np.ndarray):
+        """DataCache 摄入监听器：只接收 SOURCE_INTERVAL 周期，values 按 KLINE_COLUMNS 排列"""
+        if interval == SOURCE_INTERVAL:
+            self.ingest(symbol, ts, values[_HIGH], values[_LOW], values[_CLOSE], values[_QUOTE_VOLUME])
+
+    def ingest_rows(self, rows: list):
+        """(symbol, bucket_ts, high, low, close, quote_volume) 行，按 (symbol, bucket_ts) 排序"""
+        if not rows:
+            return
+        index = pd.DatetimeIndex([r[1] for r in rows])
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        ts = index.as_unit("ns").asi8
+        values = np.array([r[2:6] for r in rows], dtype=np.float64)
+        syms = [r[0] for r in rows]
+        bounds = [0] + [i for i in range(1, len(syms)) if syms[i] != syms[i - 1]] + [len(syms)]
+        for a, b in zip(bounds[:-1], bounds[1:], strict=True):
+            v = values[a:b]
+            self.ingest(syms[a], ts[a:b], v[:, 0], v[:, 1], v[:, 2], v[:, 3])
+
+    def ingest_futures(self, rows: list):
+        """(symbol, create_time, 持仓价值, 主动买卖比, 多空比) 行，同币种取 create_time 最新的一条"""
+        with self._lock:
+            for sym, created, oi_val, taker, ls in rows:
+                t = pd.Timestamp(created)
+                t = (t.tz_convert("UTC").tz_localize(None) if t.tzinfo else t).value
+                prev = self._futures.get(sym)
+                if prev is None or t >= prev[0]:
+                    self._futures[sym] = (t, *(float(v) if v is not None else None for v in (oi_val, taker, ls)))
+
+    # ==================== 同步 ====================
+
+    def sync(self, force: bool = False) -> bool:
+        """从库中拉取水位线之后的新数据（首次为种子扫描）；sync_seconds 内重复调用直接返回"""
+        if not force and time.time() - self._last_sync < self.sync_seconds:
+            return False
+        import psycopg
+
+        self._last_sync = time.time()
+        try:
+            with psycopg.connect(self.db_url) as conn:
+                self._sync_klines(conn)
+                self._sync_futures(conn)
+            return True
+        except Exception as e:
+            LOG.warning(f"优先级数据同步失败: {e}")
+            return False
+
+    def _sync_klines(self, conn):
+        if self._kline_mark is None:
+            sql = f"""
+                SELECT symbol, bucket_ts, high, low, close, quote_volume
+                FROM market_data.candles_{SOURCE_INTERVAL}
+                WHERE exchange = %s AND bucket_ts > NOW() - INTERVAL '25 hours'
+                ORDER BY symbol, bucket_ts
+            """
+            params = (self.exchange,)
+        else:
+            # 含水位线那一根：未闭合时写入的值在闭合后会被覆盖
+            sql = f"""
+                SELECT symbol, bucket_ts, high, low, close, quote_volume
+                FROM market_data.candles_{SOURCE_INTERVAL}
+                WHERE exchange = %s AND bucket_ts >= %s
+                ORDER BY symbol, bucket_ts
+            """
+            params = (self.exchange, self._kline_mark)
+        rows = conn.execute(sql, params).fetchall()
+        self.ingest_rows(rows)
+        if rows:
+            mark = max(r[1] for r in rows)
+            self._kline_mark = mark if self._kline_mark is None else max(self._kline_mark, mark)
+        elif self._kline_mark is None:
+            self._kline_mark = pd.Timestamp.now(tz="UTC").to_pydatetime()
+
+    def _sync_futures(self, conn):
+        if self._futures_mark is None:
+            rows = conn.execute("""
+                SELECT DISTINCT ON (symbol)
+                    symbol, create_time, sum_open_interest_value,
+                    sum_taker_long_short_vol_ratio, count_long_short_ratio
+                FROM market_data.binance_futures_metrics_5m
+                WHERE create_time > NOW() - INTERVAL '7 days'
+                ORDER BY symbol, create_time DESC
+            """).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT symbol, create_time, sum_open_interest_value,
+                       sum_taker_long_short_vol_ratio, count_long_short_ratio
+                FROM market_data.binance_futures_metrics_5m
+                WHERE create_time >= %s
+            """, (self._futures_mark,)).fetchall()
+        self.ingest_futures(rows)
+        if rows:
+            mark = max(r[1] for r in rows)
+            self._futures_mark = mark if self._futures_mark is None else max(self._futures_mark, mark)
+        elif self._futures_mark is None:
+            self._futures_mark = pd.Timestamp.now(tz="UTC").to_pydatetime()
+
+    # ==================== 排名 ====================
+
+    def rank_klines(self, top_n: int, now: int = None) -> Tuple[Set[str], dict]:
+        """24h 成交额 / 振幅均值 / 涨跌幅各取 top_n 的并集"""
+        now = time.time_ns() if now is None else now
+        volume, volatility, change = [], [], []
+        with self._lock:
+            for sym, w in self._klines.items():
+                w.advance(now)
+                if w.start == len(w.ts):
+                    continue
+                volume.append((w.qv_sum, sym))
+                if w.rng_n:
+                    volatility.append((w.rng_sum / w.rng_n, sym))
+                c = w.change(now)
+                if c is not None:
+                    change.append((c, sym))
+        top_volume = {s for _, s in heapq.nlargest(top_n, volume)}
+        top_volatility = {s for _, s in heapq.nlargest(top_n, volatility)}
+        top_change = {s for _, s in heapq.nlargest(top_n, change)}
+        result = top_volume | top_volatility | top_change
+        return result, {"volume": len(top_volume), "volatility": len(top_volatility),
+                        "change": len(top_change), "kline_total": len(result)}
+
+    def rank_futures(self, top_n: int, now: int = None) -> Tuple[Set[str], dict]:
+        """持仓价值 top_n + 主动买卖比极端 (<0.2 或 >5.0) + 多空比极端 (<0.5 或 >4.0)"""
+        now = time.time_ns() if now is None else now
+        oi_rank, taker_extreme, ls_extreme = [], set(), set()
+        with self._lock:
+            for sym, (t, oi_val, taker, ls) in self._futures.items():
+                if t <= now - _FUTURES_MAX_AGE:
+                    continue
+                if oi_val:
+                    oi_rank.append((oi_val, sym))
+                if taker and (taker < 0.2 or taker > 5.0):
+                    taker_extreme.add(sym)
+                if ls and (ls < 0.5 or ls > 4.0):
+                    ls_extreme.add(sym)
+        top_oi = {s for _, s in heapq.nlargest(top_n, oi_rank)}
+        result = top_oi | taker_extreme | ls_extreme
+        return result, {"oi_value": len(top_oi), "oi_change": 0, "taker_extreme": len(taker_extreme),
+                        "ls_extreme": len(ls_extreme), "top_ls_change": 0, "futures_total": len(result)}
+
+    def rank(self, top_n: int = 30, now: int = None) -> Set[str]:
+        """K线维度 + 期货维度并集"""
+        return self.rank_klines(top_n, now)[0] | self.rank_futures(top_n, now)[0]
+
+    def by_volume(self, now: int = None) -> List[str]:
+        """按 24h 成交额降序的全部币种（分层调度用来切分第二、三层）"""
+        now = time.time_ns() if now is None else now
+        with self._lock:
+            for w in self._klines.values():
+                w.advance(now)
+            items = [(w.qv_sum, sym) for sym, w in self._klines.items() if w.start < len(w.ts)]
+        return [s for _, s in sorted(items, key=lambda x: (-x[0], x[1]))]
+
+    def has_data(self) -> bool:
+        return bool(self._klines or self._futures)
+
+
+_ranker: Optional[PriorityRanker] = None
+_ranker_lock = threading.Lock()
+
+
+def get_priority_ranker() -> PriorityRanker:
+    """全局排名器"""
+    global _ranker
+    if _ranker is None:
+        with _ranker_lock:
+            if _ranker is None:
+                _ranker = PriorityRanker()
+                from ..db.cache import add_ingest_listener
+                add_ingest_listener(_ranker.on_cache_ingest)
+    return _ranker
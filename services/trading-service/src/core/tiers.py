@@ -0,0 +1,232 @@
+"""
+分层币种调度
+
+全市场 ~600 个永续合约按优先级分三层，各层刷新节奏、计算预算与截止时间不同：
+
+    第一层  高优先级（priority.rank 的并集）   每根K线收盘都重算，前台执行，可抢占下层
+    第二层  其余币种按 24h 成交额前 TIER2_SIZE   每 TIER2_EVERY 根收盘重算一次
+    第三层  长尾                              按需（用户打开卡片 / NOTIFY indicator_demand），
+                                              TIER3_EVERY > 0 时另按该节奏轮转补算
+
+下层任务按 TIER_CHUNK 个币种切片在后台线程逐片执行：每片开始前让出给正在运行的第一层，
+超过本层截止时间（收盘后 deadline × 周期秒数）放弃本次，超过本层预算（秒）则剩余币种
+顺延到下次触发（游标轮转，多次触发后覆盖整层）。
+"""
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from ..observability import metrics
+
+LOG = logging.getLogger("indicator_service.tiers")
+
+DEMAND_CHANNEL = "indicator_demand"
+
+_tier_symbols = metrics.counter("tier_symbols_computed_total", "分层调度已计算的币种数")
+_tier_deadline_miss = metrics.counter("tier_deadline_miss_total", "分层调度超过截止时间放弃的任务数")
+_tier_preempted = metrics.counter("tier_preempted_total", "下层切片让出给第一层的次数")
+_tier_lag = metrics.histogram(
+    "tier_start_lag_seconds", "收盘到各层开始计算的延迟", (0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+
+
+@dataclass
+class Tier:
+    """一层的调度参数"""
+    level: int
+    every: int          # 每 N 根收盘触发一次；0 = 仅按需
+    budget: float       # 单次触发的计算预算（秒），0 = 不限
+    deadline: float     # 截止时间（收盘后 deadline × 周期秒数内必须开始）
+
+
+def default_tiers() -> Dict[int, Tier]:
+    """按 config 构造三层参数"""
+    from ..config import config
+    return {
+        1: Tier(1, every=1, budget=0, deadline=1.0),
+        2: Tier(2, every=config.tier2_every, budget=config.tier2_budget, deadline=0.8),
+        3: Tier(3, every=config.tier3_every, budget=config.tier3_budget, deadline=0.8),
+    }
+
+
+class TierPlan:
+    """币种 → 层级"""
+
+    def __init__(self, tier1: Sequence[str], tier2: Sequence[str], tier3: Sequence[str]):
+        self.tiers: Dict[int, List[str]] = {1: list(tier1), 2: list(tier2), 3: list(tier3)}
+        self._level = {s: level for level, syms in self.tiers.items() for s in syms}
+
+    @classmethod
+    def build(cls, universe: Iterable[str], high: Set[str], order: Sequence[str], tier2_size: int) -> "TierPlan":
+        """high 为第一层；其余按 order（24h 成交额降序）取前 tier2_size 为第二层，剩余为第三层"""
+        universe = list(dict.fromkeys(universe))
+        tier1 = [s for s in universe if s in high]
+        rank = {s: i for i, s in enumerate(order)}
+        rest = sorted((s for s in universe if s not in high), key=lambda s: (rank.get(s, len(rank)), s))
+        return cls(tier1, rest[:tier2_size], rest[tier2_size:])
+
+    def tier_of(self, symbol: str) -> Optional[int]:
+        return self._level.get(symbol)
+
+    def counts(self) -> Dict[int, int]:
+        return {level: len(syms) for level, syms in self.tiers.items()}
+
+    def all_symbols(self) -> List[str]:
+        return [s for level in (1, 2, 3) for s in self.tiers[level]]
+
+
+class TierScheduler:
+    """收盘计数、游标轮转与第一层抢占"""
+
+    def __init__(self, tiers: Dict[int, Tier] = None, chunk: int = None):
+        from ..config import config
+        self.tiers = tiers or default_tiers()
+        self.chunk = max(1, chunk or config.tier_chunk)
+        self._closes: Dict[str, int] = {}
+        self._cursor: Dict[Tuple[int, str], int] = {}
+        self._foreground = 0
+        self._cond = threading.Condition()
+
+    # ==================== 触发 ====================
+
+    def due(self, interval: str) -> List[int]:
+        """记录一次收盘，返回按节奏应触发的层级（every=0 的层只按需触发，不在此返回）"""
+        n = self._closes[interval] = self._closes.get(interval, 0) + 1
+        return [level for level, tier in sorted(self.tiers.items())
+                if tier.every and (n - 1) % tier.every == 0]
+
+    # ==================== 轮转 ====================
+
+    def rotate(self, level: int, interval: str, symbols: Sequence[str]) -> List[str]:
+        """从本层游标处开始的币种顺序（上次预算用尽时停在哪里，这次从哪里继续）"""
+        if not symbols:
+            return []
+        start = self._cursor.get((level, interval), 0) % len(symbols)
+        return list(symbols[start:]) + list(symbols[:start])
+
+    def advance(self, level: int, interval: str, done: int, total: int):
+        if total:
+            key = (level, interval)
+            self._cursor[key] = (self._cursor.get(key, 0) + done) % total
+
+    def chunks(self, symbols: Sequence[str]) -> List[List[str]]:
+        return [list(symbols[i:i + self.chunk]) for i in range(0, len(symbols), self.chunk)]
+
+    # ==================== 抢占 ====================
+
+    @contextmanager
+    def foreground(self):
+        """第一层执行期间，下层切片不开始"""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def wait_turn(self, level: int, deadline: float) -> bool:
+        """下层切片开始前调用：等第一层让出；超过截止时间返回 False"""
+        with self._cond:
+            if self._foreground:
+                _tier_preempted.inc(1, tier=str(level))
+            while self._foreground:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, 1.0))
+        if time.time() >= deadline:
+            _tier_deadline_miss.inc(1, tier=str(level))
+            return False
+        return True
+
+    def busy(self) -> bool:
+        return self._foreground > 0
+
+
+class TierJob:
+    """后台任务：(层级, 周期, 收盘时间, 币种)"""
+
+    __slots__ = ("level", "interval", "close_ts", "symbols", "deadline", "rotating")
+
+    def __init__(self, level: int, interval: str, close_ts: float, symbols: Sequence[str],
+                 deadline: float, rotating: bool = True):
+        self.level = level
+        self.interval = interval
+        self.close_ts = close_ts
+        self.symbols = list(symbols)
+        self.deadline = deadline
+        self.rotating = rotating
+
+    def __lt__(self, other: "TierJob"):
+        return (self.level, self.deadline) < (other.level, other.deadline)
+
+
+class TierQueue:
+    """后台任务优先队列：层级小的先出，同层截止时间早的先出；同一 (层级, 周期) 只保留最新一次"""
+
+    def __init__(self):
+        self._heap: List[TierJob] = []
+        self._cond = threading.Condition()
+
+    def put(self, job: TierJob):
+        with self._cond:
+            self._heap = [j for j in self._heap
+                          if not (j.rotating and j.level == job.level and j.interval == job.interval)]
+            heapq.heapify(self._heap)
+            heapq.heappush(self._heap, job)
+            self._cond.notify()
+
+    def get(self, timeout: float = None) -> Optional[TierJob]:
+        with self._cond:
+            if not self._heap:
+                self._cond.wait(timeout)
+            return heapq.heappop(self._heap) if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def run_job(job: TierJob, tier: Tier, scheduler: TierScheduler, compute) -> int:
+    """
+    逐片执行后台任务，返回已计算的币种数
+
+    compute(symbols, interval) 计算一个切片；预算用尽 / 超过截止时间时停止，轮转任务的游标前移已完成数量
+    """
+    symbols = scheduler.rotate(job.level, job.interval, job.symbols) if job.rotating else job.symbols
+    budget_end = time.time() + tier.budget if tier.budget else None
+    _tier_lag.observe(max(0.0, time.time() - job.close_ts), tier=str(job.level))
+    done = 0
+    for chunk in scheduler.chunks(symbols):
+        if budget_end is not None and time.time() >= budget_end:
+            LOG.debug(f"[T{job.level} {job.interval}] 预算用尽，{len(symbols) - done} 币种顺延")
+            break
+        if not scheduler.wait_turn(job.level, job.deadline):
+            LOG.info(f"[T{job.level} {job.interval}] 超过截止时间，放弃剩余 {len(symbols) - done} 币种")
+            break
+        try:
+            compute(chunk, job.interval)
+        except Exception as e:
+            LOG.warning(f"[T{job.level} {job.interval}] 切片计算失败: {e}")
+        done += len(chunk)
+    if job.rotating:
+        scheduler.advance(job.level, job.interval, done, len(job.symbols))
+    _tier_symbols.inc(done, tier=str(job.level))
+    return done
+
+
+def request_symbols(symbols: Iterable[str], db_url: str = None):
+    """从其他服务请求按需计算（NOTIFY indicator_demand，payload 为逗号分隔的币种）"""
+    import psycopg
+    from ..config import config
+
+    payload = ",".join(s.strip().upper() for s in symbols if s.strip())
+    if not payload:
+        return
+    with psycopg.connect(db_url or config.db_url, autocommit=True) as conn:
+        conn.execute("SELECT pg_notify(%s, %s)", (DEMAND_CHANNEL, payload))
@@ -4,19 +4,24 @@
 优化点：
 1. 多周期并行初始化
 2. 单SQL批量查询所有币种
-3. 增量更新优化
+3. 增量更新：每周期一条 SQL（按币种水位线），新K线追加到预分配缓冲（ring.py）
 """
+import atexit
 import logging
 import time
 import psycopg
-from psycopg.rows import dict_row
 from threading import Thread, Event, RLock
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Any
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 
 from ..config import config
+from ..observability import metrics
+from .ring import KlineRing, rows_to_arrays
+from .shm import KLINE_COLUMNS
 
 LOG = logging.getLogger("indicator_service.cache")
 
@@ -27,8 +32,46 @@ INTERVAL_SECONDS = {
 }
 
 
+# 查询列顺序: symbol, bucket_ts, KLINE_COLUMNS（与 rows_to_arrays(ts_pos=1) 对应）
+_KLINE_SELECT = "symbol, bucket_ts, " + ", ".join(KLINE_COLUMNS)
+_KLINE_SELECT_C = ", ".join(f"c.{col}" for col in _KLINE_SELECT.split(", "))
+
+# 摄入监听器: fn(interval, symbol, ts, values)，ts 为 int64 纳秒，values 为 [len(KLINE_COLUMNS), n] 数组
+IngestListener = Callable[[str, str, np.ndarray, np.ndarray], None]
+_ingest_listeners: List[IngestListener] = []
+
+
+def add_ingest_listener(fn: IngestListener):
+    """注册K线摄入监听器（上层模块如高优先级排名在此订阅，缓存不反向依赖它们）"""
+    if fn not in _ingest_listeners:
+        _ingest_listeners.append(fn)
+
+
+def remove_ingest_listener(fn: IngestListener):
+    """注销K线摄入监听器"""
+    if fn in _ingest_listeners:
+        _ingest_listeners.remove(fn)
+
+# 增量刷新耗时 / 行数
+_refresh_duration = metrics.histogram(
+    "cache_refresh_duration_seconds", "K线缓存增量刷新耗时", (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+)
+_refresh_rows = metrics.counter("cache_refresh_rows_total", "K线缓存增量刷新行数")
+
+
+class KlineSnapshot(NamedTuple):
+    """某周期一代K线快照（数据只读，生成后不再修改）"""
+    version: int
+    frames: Mapping[str, pd.DataFrame]
+
+
 class DataCache:
-    """全局数据缓存（高性能版）"""
+    """全局数据缓存（高性能版）
+
+    每个 (周期, 币种) 一个预分配的 KlineRing；增量刷新每个周期只发一条 SQL，
+    按各币种水位线取新K线直接追加到缓冲，不重建 DataFrame。
+    每次刷新后生成一代只读快照并原子替换，读者不加锁、不拷贝。
+    """
 
     MAX_ROWS = 500  # 每个交易对周期最多缓存 500 根 K 线
 
@@ -37,14 +80,20 @@ class DataCache:
         self.exchange = exchange or config.exchange
         self.lookback = min(lookback, self.MAX_ROWS)  # 不超过 MAX_ROWS
 
-        # K线缓存: {interval: {symbol: DataFrame}}
-        self._klines: Dict[str, Dict[str, pd.DataFrame]] = {}
-        # 最后更新时间: {interval: {symbol: bucket_ts}}
-        self._last_ts: Dict[str, Dict[str, Any]] = {}
+        # K线缓冲: {interval: {symbol: KlineRing}}
+        self._rings: Dict[str, Dict[str, KlineRing]] = {}
         # 锁
         self._lock = RLock()
         # 初始化标记
         self._initialized: Dict[str, bool] = {}
+        # 数据版本号（每次写入缓存递增）: {interval: version}
+        self._version: Dict[str, int] = {}
+        # 共享内存块: {interval: (version, 当前块, 上一代块)}
+        self._shared: Dict[str, tuple] = {}
+        # 只读快照: {interval: KlineSnapshot}，读者无锁获取
+        self._snapshots: Dict[str, KlineSnapshot] = {}
+        # 最近一次刷新统计: {interval: {"seconds", "rows", "symbols"}}
+        self.refresh_stats: Dict[str, Dict[str, float]] = {}
 
     def init_interval(self, symbols: List[str], interval: str):
         """初始化单个周期 - 单SQL批量查询"""
@@ -52,135 +101,209 @@ class DataCache:
         t0 = time.time()
 
         with self._lock:
-            self._klines[interval] = {}
-            self._last_ts[interval] = {}
+            self._rings[interval] = {}
 
-        table = f"candles_{interval}"
-        symbols_set = set(symbols)
         count = 0
-
-        # 计算时间范围，避免扫描全部分区
-        interval_minutes = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440, "1w": 10080}
-        minutes = interval_minutes.get(interval, 5) * self.lookback * 2
-
         try:
-            with psycopg.connect(self.db_url, row_factory=dict_row) as conn:
-                # 使用窗口函数限制每个币种的行数，加时间范围过滤
-                sql = f"""
-                    WITH ranked AS (
-                        SELECT symbol, bucket_ts, open, high, low, close, volume,
-                               quote_volume, trade_count, taker_buy_volume, taker_buy_quote_volume,
-                               ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY bucket_ts DESC) as rn
-                        FROM market_data.{table}
-                        WHERE exchange = %s AND symbol = ANY(%s) AND bucket_ts > NOW() - INTERVAL '{minutes} minutes'
-                    )
-                    SELECT symbol, bucket_ts, open, high, low, close, volume,
-                           quote_volume, trade_count, taker_buy_volume, taker_buy_quote_volume
-                    FROM ranked WHERE rn <= %s
-                    ORDER BY symbol, bucket_ts ASC
-                """
-                rows = conn.execute(sql, (self.exchange, list(symbols), self.lookback)).fetchall()
-
-                # 按币种分组
-                from itertools import groupby
-                for symbol, group in groupby(rows, key=lambda x: x['symbol']):
-                    row_list = list(group)
-                    if row_list and symbol in symbols_set:
-                        df = self._rows_to_df(row_list)
-                        with self._lock:
-                            self._klines[interval][symbol] = df
-                            self._last_ts[interval][symbol] = df.index[-1]
-                        count += 1
-
+            with psycopg.connect(self.db_url) as conn:
+                rows = self._fetch_recent(conn, interval, symbols)
+            count = self._ingest(interval, rows, set(symbols))
         except Exception as e:
             LOG.error(f"[{interval}] 初始化失败: {e}")
 
         with self._lock:
             self._initialized[interval] = True
+            self._version[interval] = self._version.get(interval, 0) + 1
+            self._publish(interval)
 
         LOG.info(f"[{interval}] 缓存完成: {count} 币种, {time.time()-t0:.1f}s")
 
     def update_interval(self, symbols: List[str], interval: str) -> int:
-        """增量更新单个周期"""
+        """增量更新单个周期 - 一条 SQL 按各币种水位线取新K线"""
         if not self._initialized.get(interval):
             self.init_interval(symbols, interval)
             return len(symbols)
 
         table = f"candles_{interval}"
-        updated = 0
+        t0 = time.perf_counter()
+        updated = rows_count = 0
+
+        with self._lock:
+            rings = self._rings.get(interval, {})
+            watermarks = {s: rings[s].last_ts for s in symbols if s in rings and len(rings[s])}
+        new_symbols = [s for s in symbols if s not in watermarks]
 
         try:
-            with psycopg.connect(self.db_url, row_factory=dict_row) as conn:
-                for symbol in symbols:
-                    last_ts = self._last_ts.get(interval, {}).get(symbol)
-                    if not last_ts:
-                        # 新币种，全量获取
-                        sql = f"""
-                            SELECT bucket_ts, open, high, low, close, volume,
-                                   quote_volume, trade_count, taker_buy_volume, taker_buy_quote_volume
-                            FROM market_data.{table}
-                            WHERE symbol = %s AND exchange = %s
-                            ORDER BY bucket_ts DESC LIMIT %s
-                        """
-                        rows = conn.execute(sql, (symbol, self.exchange, self.lookback)).fetchall()
-                    else:
-                        # 增量获取
-                        sql = f"""
-                            SELECT bucket_ts, open, high, low, close, volume,
-                                   quote_volume, trade_count, taker_buy_volume, taker_buy_quote_volume
-                            FROM market_data.{table}
-                            WHERE symbol = %s AND exchange = %s AND bucket_ts > %s
-                            ORDER BY bucket_ts ASC
-                        """
-                        rows = conn.execute(sql, (symbol, self.exchange, last_ts)).fetchall()
-
-                    if rows:
-                        new_df = self._rows_to_df(rows if last_ts else list(reversed(rows)))
-                        with self._lock:
-                            if symbol in self._klines.get(interval, {}):
-                                # 合并
-                                old_df = self._klines[interval][symbol]
-                                combined = pd.concat([old_df, new_df])
-                                combined = combined[~combined.index.duplicated(keep='last')]
-                                combined = combined.tail(self.lookback)
-                                self._klines[interval][symbol] = combined
-                            else:
-                                self._klines[interval][symbol] = new_df
-                            self._last_ts[interval][symbol] = self._klines[interval][symbol].index[-1]
-                        updated += 1
+            with psycopg.connect(self.db_url) as conn:
+                rows = []
+                if watermarks:
+                    syms = list(watermarks)
+                    marks = [watermarks[s].to_pydatetime() for s in syms]
+                    # 全局最小水位线用于分区裁剪，逐币种水位线经 unnest 连接过滤
+                    sql = f"""
+                        SELECT {_KLINE_SELECT_C}
+                        FROM market_data.{table} c
+                        JOIN unnest(%s::text[], %s::timestamptz[]) AS w(symbol, last_ts) ON c.symbol = w.symbol
+                        WHERE c.exchange = %s AND c.symbol = ANY(%s)
+                          AND c.bucket_ts > %s AND c.bucket_ts > w.last_ts
+                        ORDER BY c.symbol, c.bucket_ts ASC
+                    """
+                    rows = conn.execute(sql, (syms, marks, self.exchange, syms, min(marks))).fetchall()
+                if new_symbols:
+                    # 新币种，按初始化方式获取最近 lookback 根
+                    rows += self._fetch_recent(conn, interval, new_symbols)
+            rows_count = len(rows)
+            updated = self._ingest(interval, rows)
         except Exception as e:
             LOG.error(f"[{interval}] 更新失败: {e}")
 
+        elapsed = time.perf_counter() - t0
+        _refresh_duration.observe(elapsed, interval=interval)
+        _refresh_rows.inc(rows_count, interval=interval)
+        self.refresh_stats[interval] = {"seconds": elapsed, "rows": rows_count, "symbols": updated}
+
+        if updated:
+            with self._lock:
+                self._version[interval] = self._version.get(interval, 0) + 1
+                self._publish(interval)
+
         return updated
 
+    def _fetch_recent(self, conn, interval: str, symbols: List[str]) -> list:
+        """每个币种最近 lookback 根K线，按 (symbol, bucket_ts) 升序"""
+        table = f"candles_{interval}"
+        # 计算时间范围，避免扫描全部分区
+        interval_minutes = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440, "1w": 10080}
+        minutes = interval_minutes.get(interval, 5) * self.lookback * 2
+
+        # 使用窗口函数限制每个币种的行数，加时间范围过滤
+        sql = f"""
+            WITH ranked AS (
+                SELECT {_KLINE_SELECT},
+                       ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY bucket_ts DESC) as rn
+                FROM market_data.{table}
+                WHERE exchange = %s AND symbol = ANY(%s) AND bucket_ts > NOW() - INTERVAL '{minutes} minutes'
+            )
+            SELECT {_KLINE_SELECT}
+            FROM ranked WHERE rn <= %s
+            ORDER BY symbol, bucket_ts ASC
+        """
+        return conn.execute(sql, (self.exchange, list(symbols), self.lookback)).fetchall()
+
+    def _ingest(self, interval: str, rows: list, symbols: set = None) -> int:
+        """把按 (symbol, bucket_ts) 排序的行追加到各币种缓冲，返回有新数据的币种数"""
+        if not rows:
+            return 0
+        ts, values, utc = rows_to_arrays(rows, ts_pos=1)
+        syms = [r[0] for r in rows]
+        bounds = [0] + [i for i in range(1, len(syms)) if syms[i] != syms[i - 1]] + [len(syms)]
+
+        listeners = list(_ingest_listeners)
+        segments = []
+        updated = 0
+        with self._lock:
+            rings = self._rings.setdefault(interval, {})
+            for start, end in zip(bounds, bounds[1:]):
+                symbol = syms[start]
+                if symbols is not None and symbol not in symbols:
+                    continue
+                ring = rings.get(symbol)
+                if ring is None:
+                    ring = rings[symbol] = KlineRing(self.lookback, utc)
+                if ring.append(ts[start:end], values[:, start:end]):
+                    updated += 1
+                if listeners:
+                    segments.append((symbol, ts[start:end], values[:, start:end]))
+        # 锁外通知，监听器自身加锁不会与缓存锁交错
+        for fn in listeners:
+            for symbol, seg_ts, seg_values in segments:
+                try:
+                    fn(interval, symbol, seg_ts, seg_values)
+                except Exception as e:
+                    LOG.warning(f"[{interval}] 摄入监听器失败 {symbol}: {e}")
+        return updated
+
+    def _publish(self, interval: str):
+        """由缓冲生成新一代只读快照并原子替换（调用方持有锁）
+
+        整个周期拷贝为一块只读数组，各币种 DataFrame 为其切片视图；
+        缓存只引用当前一代，上一代在最后一个读者释放后回收。
+        """
+        live = [(s, ring) for s, ring in self._rings.get(interval, {}).items() if len(ring)]
+        frames: Dict[str, pd.DataFrame] = {}
+        if live:
+            arrays = [ring.arrays() for _, ring in live]
+            ts = np.concatenate([a[0] for a in arrays])
+            values = np.concatenate([a[1] for a in arrays], axis=1)
+            values.flags.writeable = False
+            index = pd.DatetimeIndex(ts.view("M8[ns]"), name="bucket_ts")
+            if live[0][1].utc:
+                index = index.tz_localize("UTC")
+            block = pd.DataFrame(values.T, index=index, columns=list(KLINE_COLUMNS), copy=False)
+            offset = 0
+            for symbol, ring in live:
+                frames[symbol] = block.iloc[offset:offset + len(ring)]
+                offset += len(ring)
+        self._snapshots[interval] = KlineSnapshot(self._version.get(interval, 0), MappingProxyType(frames))
+
+    def snapshot(self, interval: str) -> Optional[KlineSnapshot]:
+        """当前一代快照（不加锁、不拷贝；frames 为各读者共享的对象，不可修改）"""
+        return self._snapshots.get(interval)
+
     def get_klines(self, interval: str, symbol: str = None) -> Dict[str, pd.DataFrame]:
-        """获取K线数据（从缓存）"""
+        """获取K线数据（浅拷贝视图：新 DataFrame 对象，共享只读数据，不复制数组）"""
+        snap = self._snapshots.get(interval)
+        if snap is None:
+            return {}
+        if symbol:
+            df = snap.frames.get(symbol)
+            return {symbol: df.copy(deep=False)} if df is not None else {}
+        return {s: df.copy(deep=False) for s, df in snap.frames.items()}
+
+    def export_shared(self, interval: str) -> Dict[str, Any]:
+        """导出周期数据到共享内存，返回 {symbol: KlineRef}
+
+        数据版本未变时复用已有共享内存块；版本变化时重建，
+        并保留上一代块，避免仍在挂载的子进程读到已删除的段。
+        """
+        from .shm import SharedKlineBlock
+
         with self._lock:
-            if interval not in self._klines:
+            if interval not in self._rings:
                 return {}
-            if symbol:
-                df = self._klines[interval].get(symbol)
-                return {symbol: df.copy()} if df is not None else {}
-            # 返回全部（复制）
-            return {s: df.copy() for s, df in self._klines[interval].items()}
+            version = self._version.get(interval, 0)
+            cached = self._shared.get(interval)
+            if cached and cached[0] == version:
+                return cached[1].refs()
+
+            snap = self._snapshots.get(interval)
+            block = SharedKlineBlock(dict(snap.frames) if snap else {})
+            if cached:
+                if cached[2] is not None:
+                    cached[2].close()
+                self._shared[interval] = (version, block, cached[1])
+            else:
+                self._shared[interval] = (version, block, None)
+            return block.refs()
+
+    def release_shared(self):
+        """释放全部共享内存块"""
+        with self._lock:
+            for _, block, prev in self._shared.values():
+                block.close()
+                if prev is not None:
+                    prev.close()
+            self._shared.clear()
 
     def get_all_intervals(self) -> List[str]:
         """获取已缓存的周期"""
         with self._lock:
-            return list(self._klines.keys())
+            return list(self._rings.keys())
 
     def get_symbols(self, interval: str) -> List[str]:
         """获取已缓存的币种"""
         with self._lock:
-            return list(self._klines.get(interval, {}).keys())
-
-    def _rows_to_df(self, rows: list) -> pd.DataFrame:
-        df = pd.DataFrame(rows)
-        df['bucket_ts'] = pd.to_datetime(df['bucket_ts'])
-        df.set_index('bucket_ts', inplace=True)
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        return df
+            return list(self._rings.get(interval, {}).keys())
 
 
 class CacheUpdater(Thread):
@@ -239,6 +362,8 @@ def init_cache(symbols: List[str], intervals: List[str], lookback: int = 300):
     """初始化全局缓存 - 多周期并行"""
     global _global_cache, _cache_updater
 
+    if _global_cache is not None:
+        _global_cache.release_shared()
     _global_cache = DataCache(lookback=lookback)
 
     # 并行初始化所有周期
@@ -266,3 +391,11 @@ def stop_cache():
     if _cache_updater:
         _cache_updater.stop()
         _cache_updater = None
+    if _global_cache:
+        _global_cache.release_shared()
+
+
+@atexit.register
+def _release_shared_at_exit():
+    if _global_cache is not None:
+        _global_cache.release_shared()
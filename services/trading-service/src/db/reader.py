@@ -11,6 +11,7 @@
 import sqlite3
 import threading
 import logging
+import time
 from pathlib import Path
 from typing import Dict, List, Sequence
 from contextlib import contextmanager
@@ -231,152 +232,156 @@ class DataReader:
             self._pool = None
 
 
+# SQLite 指标表唯一键
+KEY_COLUMNS = ("交易对", "周期", "数据时间")
+
+# 保留条数配置（约4GB总量），未列出的周期保留 60 条
+RETENTION = {
+    '1m': 120,   # 2小时
+    '5m': 120,   # 10小时
+    '15m': 96,   # 24小时
+    '1h': 144,   # 6天
+    '4h': 120,   # 20天，满足长窗口计算
+    '1d': 180,   # 6个月
+    '1w': 104,   # 2年
+}
+DEFAULT_RETENTION = 60
+
+
 class DataWriter:
-    """将指标结果写入 SQLite（优化版）"""
+    """将指标结果写入 SQLite（优化版）
+
+    - 有 (交易对, 周期, 数据时间) 的表建唯一索引，INSERT ... ON CONFLICT DO UPDATE 覆盖写
+    - 保留条数用一条窗口函数 DELETE 按表裁剪
+    - write_batch 一次事务写入所有表，last_stats 记录行数与 rows/s
+    """
 
     def __init__(self, sqlite_path: Path = None):
         self.sqlite_path = sqlite_path or config.sqlite_path
         self._conn = None
         self._lock = threading.Lock()
+        self._keyed_tables: set = set()  # 已确认存在唯一索引的表
+        self.last_stats: Dict[str, float] = {}
 
     def _get_conn(self) -> sqlite3.Connection:
-        """获取或创建连接"""
+        """获取或创建连接（手动管理事务）"""
         if self._conn is None:
             self.sqlite_path.parent.mkdir(parents=True, exist_ok=True)
-            self._conn = sqlite3.connect(str(self.sqlite_path), check_same_thread=False)
+            self._conn = sqlite3.connect(str(self.sqlite_path), check_same_thread=False, isolation_level=None)
             self._conn.execute("PRAGMA auto_vacuum=FULL")
             self._conn.execute("PRAGMA journal_mode=WAL")
             self._conn.execute("PRAGMA synchronous=NORMAL")
             self._conn.execute("PRAGMA cache_size=10000")
+            self._keyed_tables.clear()
         return self._conn
 
     def write(self, table: str, df: pd.DataFrame, interval: str = None):
-        """写入单个表 - 批量 INSERT"""
+        """写入单个表"""
         if df.empty:
             return
+        self.write_batch({table: df}, interval)
 
+    def write_batch(self, data: Dict[str, pd.DataFrame], interval: str = None) -> Dict[str, float]:
+        """批量写入多个表 - 单次事务，返回 {"tables", "rows", "seconds", "rows_per_s"}"""
+        data = {t: df for t, df in (data or {}).items() if df is not None and not df.empty}
+        if not data:
+            return {}
+
+        start = time.perf_counter()
+        rows = 0
         with self._lock:
             conn = self._get_conn()
-
-            # 检查表是否存在及列是否匹配
             try:
-                existing_cols = [c[1] for c in conn.execute(f'PRAGMA table_info([{table}])').fetchall()]
+                conn.execute("BEGIN IMMEDIATE")
+                for table, df in data.items():
+                    rows += self._write_table(conn, table, df)
+                conn.execute("COMMIT")
             except Exception:
-                existing_cols = []
-
-            df_cols = list(df.columns)
-
-            if existing_cols:
-                # 对齐列：缺失的补 None，多余的丢弃，避免因列不匹配重建表
-                missing = [c for c in existing_cols if c not in df_cols]
-                for c in missing:
-                    df[c] = None
-                df = df[existing_cols]
-                df_cols = existing_cols
-            else:
-                # 表不存在，按当前列创建
-                df.head(0).to_sql(table, conn, if_exists="replace", index=False)
-                existing_cols = df_cols
-
-            # 先删除同一 (交易对, 周期, 数据时间) 的旧数据
-            if "交易对" in df_cols and "周期" in df_cols and "数据时间" in df_cols:
-                for _, row in df[["交易对", "周期", "数据时间"]].drop_duplicates().iterrows():
-                    conn.execute(f"DELETE FROM [{table}] WHERE [交易对]=? AND [周期]=? AND [数据时间]=?",
-                                 (row["交易对"], row["周期"], row["数据时间"]))
-
-            # 批量 INSERT - 列名用方括号包裹以支持特殊字符
-            placeholders = ",".join(["?"] * len(df_cols))
-            cols_escaped = ",".join(f"[{c}]" for c in df_cols)
-            sql = f"INSERT INTO [{table}] ({cols_escaped}) VALUES ({placeholders})"
-            data = [tuple(row) for row in df.itertuples(index=False, name=None)]
-            conn.executemany(sql, data)
-
-            # 清理旧数据
-            self._cleanup_old_data(conn, table, df)
-            conn.commit()
-
-    def _cleanup_old_data(self, conn, table: str, df: pd.DataFrame):
-        """清理旧数据，保留每个币种每个周期最新N条"""
-        # 保留条数配置（约4GB总量）
-        RETENTION = {
-            '1m': 120,   # 2小时
-            '5m': 120,   # 10小时
-            '15m': 96,   # 24小时
-            '1h': 144,   # 6天
-            '4h': 120,   # 20天，满足长窗口计算
-            '1d': 180,   # 6个月
-            '1w': 104,   # 2年
+                conn.execute("ROLLBACK")
+                self._keyed_tables.clear()  # 回滚可能撤销了本事务内建的索引
+                raise
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            "tables": len(data),
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_s": rows / elapsed if elapsed > 0 else 0.0,
         }
+        LOG.debug(f"SQLite 写入: {len(data)} 表, {rows} 行, {elapsed * 1000:.1f}ms, "
+                  f"{self.last_stats['rows_per_s']:.0f} rows/s")
+        return self.last_stats
 
-        if "周期" not in df.columns or "交易对" not in df.columns or "数据时间" not in df.columns:
+    def _write_table(self, conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> int:
+        """写入单表（调用方持有事务），返回写入行数"""
+        try:
+            existing_cols = [c[1] for c in conn.execute(f'PRAGMA table_info([{table}])').fetchall()]
+        except Exception:
+            existing_cols = []
+
+        if existing_cols:
+            # 对齐列：缺失的补 None，多余的丢弃，避免因列不匹配重建表
+            missing = [c for c in existing_cols if c not in df.columns]
+            if missing:
+                df = df.assign(**{c: None for c in missing})
+            df = df[existing_cols]
+        else:
+            # 表不存在，按当前列创建（与 to_sql 建表语句一致，但不会提交当前事务）
+            self._keyed_tables.discard(table)
+            conn.execute(pd.io.sql.get_schema(df.head(0), table, con=conn))
+
+        df_cols = list(df.columns)
+        placeholders = ",".join(["?"] * len(df_cols))
+        cols_escaped = ",".join(f"[{c}]" for c in df_cols)
+        sql = f"INSERT INTO [{table}] ({cols_escaped}) VALUES ({placeholders})"
+
+        keyed = all(c in df_cols for c in KEY_COLUMNS)
+        if keyed:
+            self._ensure_unique_index(conn, table)
+            keys = ",".join(f"[{c}]" for c in KEY_COLUMNS)
+            updates = ",".join(f"[{c}]=excluded.[{c}]" for c in df_cols if c not in KEY_COLUMNS)
+            sql += f" ON CONFLICT({keys}) " + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+
+        conn.executemany(sql, df.itertuples(index=False, name=None))
+
+        if keyed:
+            self._trim_retention(conn, table)
+        return len(df)
+
+    def _ensure_unique_index(self, conn: sqlite3.Connection, table: str):
+        """为 (交易对, 周期, 数据时间) 建唯一索引，建之前先去掉历史重复行（保留最后写入的）"""
+        if table in self._keyed_tables:
             return
-
-        for _, row in df[["交易对", "周期"]].drop_duplicates().iterrows():
-            symbol = row["交易对"]
-            interval = row["周期"]
-            limit = RETENTION.get(interval, 60)
-
-            try:
-                # 删除超出保留数量的旧数据
-                conn.execute(f"""
-                    DELETE FROM [{table}]
-                    WHERE 交易对 = ? AND 周期 = ?
-                    AND 数据时间 NOT IN (
-                        SELECT 数据时间 FROM [{table}]
-                        WHERE 交易对 = ? AND 周期 = ?
-                        ORDER BY 数据时间 DESC
-                        LIMIT ?
+        index = f"uq_{table}_key"
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index,)
+        ).fetchone()
+        if not exists:
+            keys = ",".join(f"[{c}]" for c in KEY_COLUMNS)
+            conn.execute(f"""
+                DELETE FROM [{table}] WHERE rowid NOT IN (
+                    SELECT MAX(rowid) FROM [{table}] GROUP BY {keys}
+                )
+            """)
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS [{index}] ON [{table}] ({keys})")
+        self._keyed_tables.add(table)
+
+    def _trim_retention(self, conn: sqlite3.Connection, table: str):
+        """清理旧数据，保留每个币种每个周期最新N条（单条窗口函数 DELETE）"""
+        limits = " ".join(f"WHEN '{iv}' THEN {n}" for iv, n in RETENTION.items())
+        try:
+            conn.execute(f"""
+                DELETE FROM [{table}] WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, 周期,
+                               ROW_NUMBER() OVER (PARTITION BY 交易对, 周期 ORDER BY 数据时间 DESC) AS rn
+                        FROM [{table}]
                     )
-                """, (symbol, interval, symbol, interval, limit))
-            except Exception:
-                pass
-
-    def write_batch(self, data: Dict[str, pd.DataFrame], interval: str = None):
-        """批量写入多个表 - 单次事务，executemany 批量插入"""
-        if not data:
-            return
-
-        with self._lock:
-            conn = self._get_conn()
-            try:
-                conn.execute("BEGIN IMMEDIATE")
-
-                for table, df in data.items():
-                    if df.empty:
-                        continue
-
-                    df_cols = list(df.columns)
-
-                    # 检查表
-                    try:
-                        existing_cols = [c[1] for c in conn.execute(f'PRAGMA table_info([{table}])').fetchall()]
-                    except Exception:
-                        existing_cols = []
-
-                    if existing_cols:
-                        missing = [c for c in existing_cols if c not in df_cols]
-                        for c in missing:
-                            df[c] = None
-                        df = df[existing_cols]
-                        df_cols = existing_cols
-                    else:
-                        conn.execute(f"DROP TABLE IF EXISTS [{table}]")
-                        df.head(0).to_sql(table, conn, if_exists="replace", index=False)
-
-                    # 批量 INSERT - 列名用方括号包裹以支持特殊字符
-                    placeholders = ",".join(["?"] * len(df_cols))
-                    cols_escaped = ",".join(f"[{c}]" for c in df_cols)
-                    sql = f"INSERT INTO [{table}] ({cols_escaped}) VALUES ({placeholders})"
-                    data_tuples = [tuple(row) for row in df.itertuples(index=False, name=None)]
-                    conn.executemany(sql, data_tuples)
-
-                    # 清理旧数据
-                    self._cleanup_old_data(conn, table, df)
-
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                raise e
+                    WHERE rn > CASE 周期 {limits} ELSE {DEFAULT_RETENTION} END
+                )
+            """)
+        except Exception:
+            pass
 
     def close(self):
         """关闭连接"""
@@ -0,0 +1,99 @@
+"""
+K线滑动缓冲
+
+每个 (周期, 币种) 预分配 2 倍容量的列式数组，新K线追加到尾部；
+写满时把最近 capacity 行整体前移（均摊 O(1)），有效区间始终连续，
+可直接构造 DataFrame 视图，增量刷新不再 concat / 去重 / tail 重建 DataFrame。
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .shm import KLINE_COLUMNS
+
+
+class KlineRing:
+    """单个币种的K线缓冲（列顺序同 KLINE_COLUMNS，时间为 UTC 纳秒）"""
+
+    __slots__ = ("capacity", "utc", "_ts", "_values", "_start", "_end")
+
+    def __init__(self, capacity: int, utc: bool = True):
+        self.capacity = capacity
+        self.utc = utc
+        self._ts = np.empty(capacity * 2, dtype=np.int64)
+        self._values = np.empty((len(KLINE_COLUMNS), capacity * 2), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def last_ts(self) -> Optional[pd.Timestamp]:
+        """最后一根K线时间（水位线）"""
+        if self._end == self._start:
+            return None
+        return pd.Timestamp(int(self._ts[self._end - 1]), tz="UTC" if self.utc else None)
+
+    def append(self, ts: np.ndarray, values: np.ndarray) -> int:
+        """追加按时间升序的K线（不晚于水位线的行忽略），返回实际追加行数
+
+        ts: int64 纳秒时间戳 (n,)；values: float64 (len(KLINE_COLUMNS), n)
+        """
+        if len(self) and len(ts):
+            keep = ts > self._ts[self._end - 1]
+            if not keep.all():
+                ts, values = ts[keep], values[:, keep]
+        n = len(ts)
+        if n == 0:
+            return 0
+        if n >= self.capacity:
+            ts, values = ts[-self.capacity:], values[:, -self.capacity:]
+            self._start, self._end = 0, 0
+            n = self.capacity
+        elif self._end + n > len(self._ts):
+            # 空间不足：把仍需保留的最近行前移到开头
+            keep_rows = min(len(self), self.capacity - n)
+            src = slice(self._end - keep_rows, self._end)
+            self._ts[:keep_rows] = self._ts[src]
+            self._values[:, :keep_rows] = self._values[:, src]
+            self._start, self._end = 0, keep_rows
+
+        self._ts[self._end:self._end + n] = ts
+        self._values[:, self._end:self._end + n] = values
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+        return n
+
+    def arrays(self):
+        """当前有效区间的 (ts, values) 视图"""
+        sl = slice(self._start, self._end)
+        return self._ts[sl], self._values[:, sl]
+
+    def frame(self, copy: bool = True) -> pd.DataFrame:
+        """当前有效区间的 DataFrame（copy=False 时为视图，后续追加可能覆盖其内容）"""
+        sl = slice(self._start, self._end)
+        index = pd.DatetimeIndex(self._ts[sl].view("M8[ns]"), name="bucket_ts")
+        if self.utc:
+            index = index.tz_localize("UTC")
+        block = self._values[:, sl]
+        if copy:
+            block = block.copy()
+        return pd.DataFrame(block.T, index=index, columns=list(KLINE_COLUMNS), copy=False)
+
+
+def rows_to_arrays(rows: list, ts_pos: int = 0):
+    """查询结果行 -> (ts int64 纳秒, values (列数, 行数))
+
+    rows 为元组，ts_pos 处为 bucket_ts，其后依次为 KLINE_COLUMNS；
+    Decimal 转 float，None 转 NaN。返回 (ts, values, utc)。
+    """
+    index = pd.DatetimeIndex([r[ts_pos] for r in rows])
+    utc = index.tz is not None
+    if utc:
+        index = index.tz_convert("UTC").tz_localize(None)
+    ts = index.as_unit("ns").asi8
+    start = ts_pos + 1
+    values = np.array([r[start:start + len(KLINE_COLUMNS)] for r in rows], dtype=np.float64).T
+    return ts, np.ascontiguousarray(values), utc
@@ -0,0 +1,159 @@
+"""
+K线列式共享内存存储
+
+主进程把每个周期的 OHLCV 打包成一块连续的 float64 列式数组（shared_memory），
+子进程按名称挂载后直接构造零拷贝 DataFrame，省去 pickle 序列化与复制。
+
+布局（单个周期一块）：
+    [ts: int64 * total_rows][values: float64 * (len(KLINE_COLUMNS) * total_rows)]
+    values 为 (列数, 总行数) 的行优先数组，每个币种占据 [start, start+length) 列区间
+"""
+import logging
+import weakref
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+LOG = logging.getLogger("indicator_service.shm")
+
+KLINE_COLUMNS = (
+    "open", "high", "low", "close", "volume",
+    "quote_volume", "trade_count", "taker_buy_volume", "taker_buy_quote_volume",
+)
+
+
+class KlineRef(NamedTuple):
+    """共享内存中单个币种K线的引用（可廉价 pickle）"""
+    shm_name: str
+    total_rows: int
+    start: int
+    length: int
+    utc: bool = True
+
+
+def _layout(buf, total_rows: int):
+    """在共享内存上构造 ts / values 视图"""
+    ts = np.ndarray((total_rows,), dtype=np.int64, buffer=buf, offset=0)
+    values = np.ndarray((len(KLINE_COLUMNS), total_rows), dtype=np.float64, buffer=buf, offset=total_rows * 8)
+    return ts, values
+
+
+def _to_float(col: pd.Series) -> np.ndarray:
+    if col.dtype == object:
+        col = pd.to_numeric(col, errors="coerce")
+    return col.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class SharedKlineBlock:
+    """单个周期的列式共享内存块（主进程持有，负责释放）"""
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        frames = {s: df for s, df in frames.items() if df is not None and len(df) > 0}
+        self.total_rows = sum(len(df) for df in frames.values())
+        size = max(1, self.total_rows) * 8 * (len(KLINE_COLUMNS) + 1)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        _owned[self._shm.name] = self._shm
+        self._refs: Dict[str, KlineRef] = {}
+        self.utc = True
+
+        ts, values = _layout(self._shm.buf, self.total_rows)
+        start = 0
+        for symbol, df in frames.items():
+            n = len(df)
+            end = start + n
+            index = pd.DatetimeIndex(df.index)
+            self.utc = index.tz is not None
+            if self.utc:
+                index = index.tz_convert("UTC").tz_localize(None)
+            ts[start:end] = index.as_unit("ns").asi8
+            for i, col in enumerate(KLINE_COLUMNS):
+                if col in df.columns:
+                    values[i, start:end] = _to_float(df[col])
+                else:
+                    values[i, start:end] = np.nan
+            self._refs[symbol] = KlineRef(self._shm.name, self.total_rows, start, n, self.utc)
+            start = end
+        del ts, values
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def refs(self) -> Dict[str, KlineRef]:
+        return dict(self._refs)
+
+    def close(self):
+        """关闭并删除共享内存段"""
+        _owned.pop(self._shm.name, None)
+        try:
+            self._shm.unlink()
+        except Exception:
+            pass
+        try:
+            self._shm.close()
+        except Exception:
+            pass  # 仍有视图引用时由 GC 回收映射
+
+
+# 本进程创建的共享内存段: {shm_name: SharedMemory}
+_owned: Dict[str, shared_memory.SharedMemory] = {}
+# 子进程已挂载的共享内存段: {shm_name: SharedMemory}
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+# 挂载段上构造的数组视图: {shm_name: [weakref]}，仍存活时不能关闭映射
+_views: Dict[str, List[weakref.ref]] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # 本进程（或 fork 前的父进程）创建的段直接复用，不重复挂载
+    shm = _owned.get(name) or _attached.get(name)
+    if shm is None:
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 没有 track 参数，挂载方不应登记到 resource_tracker
+            shm = shared_memory.SharedMemory(name=name)
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        _attached[name] = shm
+    return shm
+
+
+def release_attached(keep: Optional[set] = None):
+    """释放当前进程挂载的旧共享内存段（keep 中的保留）"""
+    keep = keep or set()
+    for name in list(_attached):
+        if name in keep:
+            continue
+        # numpy 视图持有独立的缓冲区导出，close() 不一定报 BufferError，提前解除映射会让读者段错误
+        if any(r() is not None for r in _views.get(name, ())):
+            continue
+        try:
+            _attached[name].close()
+        except BufferError:
+            continue  # 仍有视图引用，下次再释放
+        except Exception:
+            pass
+        _attached.pop(name, None)
+        _views.pop(name, None)
+
+
+def attach_frame(ref: KlineRef) -> pd.DataFrame:
+    """按引用挂载共享内存，返回零拷贝（只读）DataFrame"""
+    shm = _attach(ref.shm_name)
+    ts, values = _layout(shm.buf, ref.total_rows)
+    if ref.shm_name in _attached:
+        live = [r for r in _views.get(ref.shm_name, ()) if r() is not None]
+        _views[ref.shm_name] = live + [weakref.ref(ts), weakref.ref(values)]
+    end = ref.start + ref.length
+    block = values[:, ref.start:end]
+    block.flags.writeable = False
+    index = pd.DatetimeIndex(ts[ref.start:end].view("M8[ns]"), name="bucket_ts")
+    if ref.utc:
+        index = index.tz_localize("UTC")
+    # DataFrame 内部按 (列, 行) 存储，block.T 正好对应同一块内存，不发生复制
+    return pd.DataFrame(block.T, index=index, columns=list(KLINE_COLUMNS), copy=False)
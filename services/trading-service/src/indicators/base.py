@@ -10,13 +10,18 @@
 """
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+import numpy as np
 import pandas as pd
 
 
 # 默认最小数据量
 DEFAULT_MIN_DATA = 5
 
+# 指标输入源（DAG 数据源节点）
+KLINES = "klines"    # 原始 K 线
+FUTURES = "futures"  # 期货情绪数据
+
 
 @dataclass
 class IndicatorMeta:
@@ -25,6 +30,8 @@ class IndicatorMeta:
     lookback: int = 300          # 所需 K 线窗口
     is_incremental: bool = True  # True=增量计算, False=批量计算
     min_data: int = 5            # 最小数据量要求
+    inputs: Tuple[str, ...] = (KLINES,)  # 输入源: KLINES / FUTURES
+    deps: Tuple[str, ...] = ()           # 依赖的其他指标（meta.name），调度时先于本指标计算
 
 
 class Indicator(ABC):
@@ -47,6 +54,100 @@ class Indicator(ABC):
         """
         pass
 
+    def compute_batch(self, frames: Dict[str, pd.DataFrame], interval: str) -> Dict[str, List[dict]]:
+        """
+        多币种批量计算（同一周期），返回 {symbol: 记录列表}
+
+        默认逐个调用 compute()；向量化指标覆盖此方法，在 Panel 宽表上一次算完全部币种，
+        记录须与 compute(df).to_dict("records") 完全一致，无结果时为空列表。
+        """
+        out = {}
+        for symbol, df in frames.items():
+            result = self.compute(df, symbol, interval)
+            out[symbol] = result.to_dict("records") if result is not None and not result.empty else []
+        return out
+
+    @classmethod
+    def has_batch(cls) -> bool:
+        """是否实现了向量化批量计算"""
+        return cls.compute_batch is not Indicator.compute_batch
+
+    def compute_series(self, df: pd.DataFrame, symbol: str, interval: str, start: int = None) -> pd.DataFrame:
+        """
+        全序列计算（历史回填），返回 df 第 start 行起每根K线一行
+
+        第 i 行等价于 compute(df.iloc[max(0, i + 1 - lookback):i + 1])。
+        窗口有界的指标实现 _series()，窗口满 lookback 之后的行一次遍历算完；
+        其余行与未实现的指标逐行调用 compute()（窗口为切片视图，不拷贝）。
+        """
+        n = len(df)
+        if start is None:
+            start = getattr(self.meta, "min_data", DEFAULT_MIN_DATA) - 1
+        start = max(0, start)
+        full = max(start, self.meta.lookback - 1)
+
+        records = self._series_rows(df, symbol, interval, start, min(full, n))
+        if full < n:
+            tail = self._series(df, symbol, interval, full)
+            records += tail if tail is not None else self._series_rows(df, symbol, interval, full, n)
+        return pd.DataFrame(records)
+
+    def _series_rows(self, df: pd.DataFrame, symbol: str, interval: str, start: int, stop: int) -> List[dict]:
+        """逐行回退：对 [start, stop) 每行的 lookback 窗口调用 compute()，出错的行跳过"""
+        lookback = self.meta.lookback
+        records = []
+        for i in range(start, stop):
+            try:
+                result = self.compute(df.iloc[max(0, i + 1 - lookback):i + 1], symbol, interval)
+            except Exception:
+                continue
+            if result is not None and not result.empty:
+                records.extend(result.to_dict("records"))
+        return records
+
+    def _series(self, df: pd.DataFrame, symbol: str, interval: str, start: int) -> Optional[List[dict]]:
+        """
+        子类实现：第 start 行起（start >= lookback - 1，窗口已满）的全部记录
+
+        返回 None 表示不支持，走逐行回退
+        """
+        return None
+
+    @classmethod
+    def has_series(cls) -> bool:
+        """是否实现了全序列一次计算"""
+        return cls._series is not Indicator._series
+
+    def create_state(self):
+        """
+        创建流式状态（见 incremental/state.py）
+
+        返回 None 表示该指标不支持逐根推进，只能走 compute()
+        """
+        return None
+
+    def update(self, state, bar: Dict[str, Any], symbol: str, interval: str, timestamp) -> pd.DataFrame:
+        """
+        推进一根K线，O(1) 更新状态
+
+        结果与对同一段历史K线调用 compute() 完全一致
+        """
+        result = self._update(state, bar, symbol, interval, timestamp)
+        state.count += 1
+        state.last_ts = timestamp
+        state.result = result
+        return result
+
+    def seed(self, state, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
+        """用历史K线预热流式状态，返回最后一根的结果"""
+        for ts, bar in zip(df.index, df.to_dict("records")):
+            self.update(state, bar, symbol, interval, ts)
+        return state.result
+
+    def _update(self, state, bar: Dict[str, Any], symbol: str, interval: str, timestamp) -> pd.DataFrame:
+        """子类实现：单根K线的状态推进"""
+        raise NotImplementedError
+
     def _check_data(self, df: pd.DataFrame, min_required: int = None) -> bool:
         """检查数据是否充足"""
         min_req = min_required or getattr(self.meta, 'min_data', DEFAULT_MIN_DATA)
@@ -55,11 +156,20 @@ class Indicator(ABC):
     def _make_insufficient_result(self, df: pd.DataFrame, symbol: str, interval: str,
                                    fields: Dict[str, Any]) -> pd.DataFrame:
         """生成数据不足时的结果（所有值为None，状态标记为数据不足）"""
+        return self._make_result(df, symbol, interval, self._insufficient_data(fields))
+
+    def _make_insufficient_record(self, df: pd.DataFrame, symbol: str, interval: str,
+                                  fields: Dict[str, Any]) -> dict:
+        """_make_insufficient_result 的单行记录版本"""
+        return self._make_record(df, symbol, interval, self._insufficient_data(fields))
+
+    @staticmethod
+    def _insufficient_data(fields: Dict[str, Any]) -> dict:
         data = {k: None for k in fields}
         if "信号" in fields or "信号概述" in fields:
             key = "信号" if "信号" in fields else "信号概述"
             data[key] = "数据不足"
-        return self._make_result(df, symbol, interval, data)
+        return data
 
     def _make_result(self, df: pd.DataFrame, symbol: str, interval: str, data: dict, timestamp=None) -> pd.DataFrame:
         """构建标准输出格式，前3列固定为: 交易对, 周期, 数据时间"""
@@ -74,6 +184,21 @@ class Indicator(ABC):
         cols = ["交易对", "周期", "数据时间"] + [c for c in result.columns if c not in ("交易对", "周期", "数据时间")]
         return result[cols]
 
+    def _make_record(self, df: pd.DataFrame, symbol: str, interval: str, data: dict, timestamp=None) -> dict:
+        """
+        构建单行记录，等价于 _make_result(...).to_dict("records")[0]
+
+        批量路径直接产出记录，省去逐行构建 DataFrame 的开销
+        """
+        if timestamp is None:
+            timestamp = df.index[-1] if not df.empty else None
+        ts_str = timestamp.isoformat() if hasattr(timestamp, "isoformat") else str(timestamp)
+
+        row = {"交易对": symbol, "周期": interval, "数据时间": ts_str}
+        for k, v in data.items():
+            row[k] = v.item() if isinstance(v, np.generic) else v
+        return row
+
 
 # 指标注册表
 _registry: dict[str, type[Indicator]] = {}
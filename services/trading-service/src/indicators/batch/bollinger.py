@@ -2,8 +2,34 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel, last_turnover, turnover
 from ..safe_calc import safe_bollinger
 
+_EMPTY_FIELDS = {
+    "带宽": None, "中轨斜率": None, "中轨价格": None,
+    "上轨价格": None, "下轨价格": None, "百分比b": None,
+    "价格": None, "成交额": None
+}
+
+
+def _fields(close: float, quote: float, m: float, u: float, low: float, mid_prev: float, half: int):
+    """由末值构建输出；中轨/上下轨无效时返回 None"""
+    if any(map(np.isnan, [m, u, low])) or m == 0:
+        return None
+    bandwidth = (u - low) / m * 100
+    pct_b = (close - low) / (u - low) if u != low else 0
+    slope = (m - mid_prev) / half if half > 0 else 0
+    return {
+        "带宽": round(bandwidth, 4),
+        "中轨斜率": round(slope, 6),
+        "中轨价格": round(m, 6),
+        "上轨价格": round(u, 6),
+        "下轨价格": round(low, 6),
+        "百分比b": round(pct_b, 4),
+        "价格": close,
+        "成交额": quote,
+    }
+
 
 @register
 class Bollinger(Indicator):
@@ -11,37 +37,58 @@ class Bollinger(Indicator):
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if not self._check_data(df):
-            return self._make_insufficient_result(df, symbol, interval, {
-                "带宽": None, "中轨斜率": None, "中轨价格": None,
-                "上轨价格": None, "下轨价格": None, "百分比b": None,
-                "价格": None, "成交额": None
-            })
+            return self._make_insufficient_result(df, symbol, interval, _EMPTY_FIELDS)
 
         close = df["close"]
         upper, mid, lower, status = safe_bollinger(close, 20, 2.0, min_period=5)
 
-        m, u, low = float(mid.iloc[-1]), float(upper.iloc[-1]), float(lower.iloc[-1])
-        if any(map(np.isnan, [m, u, low])) or m == 0:
-            return self._make_insufficient_result(df, symbol, interval, {
-                "带宽": None, "中轨斜率": None, "中轨价格": None,
-                "上轨价格": None, "下轨价格": None, "百分比b": None,
-                "价格": None, "成交额": None
-            })
-
-        bandwidth = (u - low) / m * 100
-        pct_b = (float(close.iloc[-1]) - low) / (u - low) if u != low else 0
         half = min(10, len(df) - 1)
-        slope = (m - float(mid.iloc[-half])) / half if half > 0 else 0
-        quote = df.get("quote_volume", df["volume"] * df["close"])
-        turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
-
-        return self._make_result(df, symbol, interval, {
-            "带宽": round(bandwidth, 4),
-            "中轨斜率": round(slope, 6),
-            "中轨价格": round(m, 6),
-            "上轨价格": round(u, 6),
-            "下轨价格": round(low, 6),
-            "百分比b": round(pct_b, 4),
-            "价格": float(close.iloc[-1]),
-            "成交额": turnover,
-        })
+        fields = _fields(float(close.iloc[-1]), last_turnover(df), float(mid.iloc[-1]),
+                         float(upper.iloc[-1]), float(lower.iloc[-1]), float(mid.iloc[-half]), half)
+        if fields is None:
+            return self._make_insufficient_result(df, symbol, interval, _EMPTY_FIELDS)
+        return self._make_result(df, symbol, interval, fields)
+
+    def compute_batch(self, frames, interval):
+        out = {}
+        # safe_bollinger 的窗口为 min(20, n)，按实际窗口分组
+        groups = {}
+        for symbol, df in frames.items():
+            if not self._check_data(df):
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, _EMPTY_FIELDS)]
+            else:
+                groups.setdefault(min(20, len(df)), {})[symbol] = df
+
+        for period, group in groups.items():
+            panel = Panel(group)
+            close = panel["close"]
+            rolling = close.rolling(window=period, min_periods=min(3, period))
+            middle, std = rolling.mean(), rolling.std()
+            upper = panel.tail(middle + 2.0 * std)[0]
+            lower = panel.tail(middle - 2.0 * std)[0]
+            mid = panel.tail(middle, 10)
+            for j, (symbol, df) in enumerate(group.items()):
+                half = min(10, len(df) - 1)
+                fields = _fields(float(df["close"].iloc[-1]), last_turnover(df), float(mid[-1, j]),
+                                 float(upper[j]), float(lower[j]), float(mid[-half, j]), half)
+                if fields is None:
+                    out[symbol] = [self._make_insufficient_record(df, symbol, interval, _EMPTY_FIELDS)]
+                else:
+                    out[symbol] = [self._make_record(df, symbol, interval, fields)]
+        return {symbol: out[symbol] for symbol in frames}
+
+    def _series(self, df, symbol, interval, start):
+        # 窗口已满（lookback=30 >= 20），各行均为 20 周期布林带
+        close = df["close"]
+        upper, mid, lower, _ = safe_bollinger(close, 20, 2.0, min_period=5)
+        upper, mid, lower = upper.to_numpy(), mid.to_numpy(), lower.to_numpy()
+        closes, quotes = close.to_numpy(dtype=np.float64), turnover(df)
+        records = []
+        for i in range(start, len(df)):
+            fields = _fields(float(closes[i]), quotes[i], float(mid[i]), float(upper[i]), float(lower[i]),
+                             float(mid[i - 9]), 10)
+            if fields is None:
+                records.append(self._make_record(df, symbol, interval, self._insufficient_data(_EMPTY_FIELDS), df.index[i]))
+            else:
+                records.append(self._make_record(df, symbol, interval, fields, df.index[i]))
+        return records
@@ -12,7 +12,8 @@ def _calc_expected_bars(interval: str, days: int = 7) -> int:
 
 @register
 class DataMonitor(Indicator):
-    meta = IndicatorMeta(name="数据监控.py", lookback=1, is_incremental=False, min_data=1)
+    meta = IndicatorMeta(name="数据监控.py", lookback=1, is_incremental=False, min_data=1,
+                         deps=("基础数据同步器.py",))
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if df.empty:
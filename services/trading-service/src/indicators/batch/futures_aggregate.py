@@ -1,161 +1,204 @@
-"""期货情绪聚合表 - 完整复刻原代码"""
-import statistics
+"""期货情绪聚合表 - 完整复刻原代码
+
+期货情绪历史由 futures_history 按周期批量加载；窗口统计（波动率、斜率、Z 分数、
+分位、连续根数）在全部币种的右对齐矩阵上一次算完。
+"""
+import math
+import numpy as np
 import pandas as pd
 from datetime import datetime, timezone
-from typing import Optional, List
-from ..base import Indicator, IndicatorMeta, register
+from typing import Dict, List, Optional, Tuple
+from ..base import FUTURES, Indicator, IndicatorMeta, register
+from ..futures_history import MetricsHistory, load_history
+
+PERIOD_SECONDS = {"5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800}
 
 
 def _f(v) -> Optional[float]:
     if v is None:
         return None
     try:
-        return float(v)
+        v = float(v)
     except (ValueError, TypeError):
         return None
+    return None if math.isnan(v) else v
 
 
-def _linreg_slope(values: List[float]) -> Optional[float]:
-    """线性回归斜率（绝对值）"""
-    if not values or len(values) < 2:
-        return None
-    n = len(values)
-    x_sum = (n - 1) * n / 2
-    x2_sum = (n - 1) * n * (2 * n - 1) / 6
-    y_sum = sum(values)
-    xy_sum = sum(i * v for i, v in enumerate(values))
-    denom = n * x2_sum - x_sum * x_sum
-    return (n * xy_sum - x_sum * y_sum) / denom if denom else None
+def _py(v) -> Optional[float]:
+    return None if np.isnan(v) else float(v)
 
 
-def _linreg_slope_pct(values: List[float]) -> Optional[float]:
-    """线性回归斜率（百分比，相对于最新值）"""
-    if not values or len(values) < 2:
-        return None
-    slope = _linreg_slope(values)
-    if slope is None:
-        return None
-    latest = values[-1]
-    if not latest or latest == 0:
-        return None
-    # 斜率占最新值的百分比
-    return (slope / latest) * 100
+def _truthy(a: np.ndarray) -> np.ndarray:
+    """等价于逐值 `if v`（None/NaN/0 为假）"""
+    return ~np.isnan(a) & (a != 0)
 
 
-def _std_over_mean(values: List[float]) -> Optional[float]:
-    if not values or len(values) < 2:
-        return None
-    mean_v = statistics.fmean(values)
-    return statistics.pstdev(values) / mean_v if mean_v else None
+def _compact(rows: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """各币种序列去掉缺失/零值后右对齐为 NaN 填充矩阵，返回 (矩阵, 有效根数)"""
+    width = max(max((len(r) for r in rows), default=0), 1)
+    mat = np.full((len(rows), width), np.nan)
+    for i, r in enumerate(rows):
+        if len(r):
+            mat[i, width - len(r):] = r
+    valid = _truthy(mat)
+    order = np.argsort(valid, axis=1, kind="stable")
+    mat = np.take_along_axis(np.where(valid, mat, np.nan), order, axis=1)
+    return mat, valid.sum(axis=1)
 
 
-def _z_score(latest: float, series: List[float]) -> Optional[float]:
-    if series is None or len(series) < 2:
-        return None
-    mean_v = statistics.fmean(series)
-    std_v = statistics.pstdev(series)
-    return (latest - mean_v) / std_v if std_v else 0.0
+def _mean_std(mat: np.ndarray, n: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """逐行均值与总体标准差（NaN 为缺失），常数序列标准差精确为 0"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(mat, axis=1) / n
+        std = np.sqrt(np.nansum((mat - mean[:, None]) ** 2, axis=1) / n)
+        missing = np.isnan(mat)
+        const = np.where(missing, -np.inf, mat).max(axis=1) == np.where(missing, np.inf, mat).min(axis=1)
+    return mean, np.where(const, 0.0, std)
 
 
-def _percentile_rank(values: List[float], latest: float) -> Optional[float]:
-    if not values:
-        return None
-    count = sum(1 for v in values if v is not None and v <= latest)
-    total = sum(1 for v in values if v is not None)
-    return count / total if total else None
+def _std_over_mean(mat: np.ndarray, n: np.ndarray) -> np.ndarray:
+    mean, std = _mean_std(mat, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((n >= 2) & (mean != 0), std / mean, np.nan)
 
 
-def _尾部连续根数(sign_list: List[int]) -> Optional[int]:
-    if not sign_list:
-        return None
-    count, last_sign = 0, None
-    for s in reversed(sign_list):
-        if s == 0:
-            count += 1
-        elif last_sign is None:
-            last_sign, count = s, count + 1
-        elif s == last_sign:
-            count += 1
-        else:
-            break
-    return (count if last_sign > 0 else -count) if last_sign else 0
-
-
-def get_metrics_history(symbol: str, limit: int = 100, interval: str = "5m") -> List[dict]:
-    """从 PostgreSQL 读取期货情绪历史数据"""
-    import psycopg
-    from ...config import config
-
-    # 根据周期选择表和列名（期货只有 5m/15m/1h/4h/1d/1w）
-    if interval == "5m":
-        table = "binance_futures_metrics_5m"
-        time_col = "create_time"
-        closed_col = "is_closed"
-    else:
-        table = f"binance_futures_metrics_{interval}_last"
-        time_col = "bucket"
-        closed_col = "complete"
+def _z_score(latest: np.ndarray, mat: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """latest 为 NaN 的行不计算；序列不足 2 根为 NaN，标准差为 0 时为 0.0"""
+    mean, std = _mean_std(mat, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(std != 0, (latest - mean) / std, 0.0)
+    return np.where((n >= 2) & ~np.isnan(latest), z, np.nan)
 
-    try:
-        with psycopg.connect(config.db_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(f"""
-                    SELECT {time_col}, sum_open_interest, sum_open_interest_value,
-                           count_toptrader_long_short_ratio, sum_toptrader_long_short_ratio,
-                           count_long_short_ratio, sum_taker_long_short_vol_ratio, {closed_col}
-                    FROM market_data.{table}
-                    WHERE symbol = %s AND {time_col} > NOW() - INTERVAL '30 days'
-                    ORDER BY {time_col} DESC
-                    LIMIT %s
-                """, (symbol, limit))
-                rows = cur.fetchall()
-                if not rows:
-                    return []
-                result = []
-                for row in reversed(rows):
-                    result.append({
-                        "datetime": row[0].replace(tzinfo=timezone.utc) if row[0] else None,
-                        "ts": int(row[0].timestamp()) if row[0] else 0,
-                        "oi": row[1], "oiv": row[2], "ctlsr": row[3],
-                        "tlsr": row[4], "lsr": row[5], "tlsvr": row[6], "x": row[7],
-                    })
-                return result
-    except Exception:
-        return []
+
+def _linreg_slope_pct(mat: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """线性回归斜率（百分比，相对于最新值），x 为各行有效段内的序号"""
+    x = np.arange(mat.shape[1]) - (mat.shape[1] - n)[:, None]
+    x_sum = (n - 1) * n / 2
+    x2_sum = (n - 1) * n * (2 * n - 1) / 6
+    y_sum = np.nansum(mat, axis=1)
+    xy_sum = np.nansum(mat * x, axis=1)
+    denom = n * x2_sum - x_sum * x_sum
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * xy_sum - x_sum * y_sum) / denom
+        return np.where((n >= 2) & (denom != 0), slope / mat[:, -1] * 100, np.nan)
+
+
+def _percentile_rank(mat: np.ndarray, n: np.ndarray, latest: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rank = (mat <= latest[:, None]).sum(axis=1) / n
+    return np.where((n > 0) & ~np.isnan(latest), rank, np.nan)
+
+
+def _tail_streak(signs: np.ndarray, m: np.ndarray) -> List[Optional[int]]:
+    """各行右对齐符号序列的尾部连续根数（0 计入当前方向，遇反向截止；空序列为 None）"""
+    rows, width = signs.shape
+    if width == 0:
+        return [None] * rows
+    cols = np.arange(width)
+    valid = ~np.isnan(signs)
+    nonzero = valid & (signs != 0)
+    has = nonzero.any(axis=1)
+    p = width - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+    last = np.where(has, signs[np.arange(rows), p], 0)
+    opposite = has[:, None] & valid & (signs == -last[:, None]) & (cols < p[:, None])
+    q = np.where(opposite.any(axis=1), width - 1 - np.argmax(opposite[:, ::-1], axis=1), width - m - 1)
+    streak = np.where(has, (width - 1 - q) * last, 0)
+    return [None if k == 0 else int(s) for s, k in zip(streak, m)]
+
+
+def _signs(a: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(a), np.nan, np.sign(a))
+
+
+def _window_stats(histories: List[MetricsHistory]) -> Dict[str, list]:
+    """全部币种的窗口统计，返回 {字段: 按币种顺序的值列表}"""
+    def last(field, k):
+        return np.array([h.values[field][-k] if len(h) >= k else np.nan for h in histories])
+
+    oiv, prev_oiv, tlsr, tlsvr = last("oiv", 1), last("oiv", 2), last("tlsr", 1), last("tlsvr", 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        oi_change = np.where(_truthy(oiv) & _truthy(prev_oiv), oiv - prev_oiv, np.nan)
+        oi_change_pct = np.where(_truthy(oi_change) & _truthy(prev_oiv), oi_change / prev_oiv, np.nan)
+    top_dev = np.where(_truthy(tlsr), np.abs(tlsr - 1), np.nan)
+    taker_dev = np.where(_truthy(tlsvr), np.abs(tlsvr - 1), np.nan)
+
+    oi, n_oi = _compact([h.values["oiv"] for h in histories])
+    top, n_top = _compact([h.values["tlsr"] for h in histories])
+    retail, n_retail = _compact([h.values["lsr"] for h in histories])
+    taker, n_taker = _compact([h.values["tlsvr"] for h in histories])
+
+    volatility = _std_over_mean(oi, n_oi)
+
+    # 相邻持仓变动（压缩后仍右对齐，有效 n-1 根）
+    diff = oi[:, 1:] - oi[:, :-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta_pct = diff / oi[:, :-1]
+    n_delta = np.maximum(n_oi - 1, 0)
+
+    taker_signs = np.where(np.abs(taker - 1) < 1e-9, 0.0, _signs(taker - 1))
+
+    # 风险分 (Z分数之和)
+    z_delta = _z_score(np.where(_truthy(oi_change_pct), oi_change_pct, np.nan), delta_pct, n_delta)
+    z_top = _z_score(np.where(_truthy(top_dev), top_dev, np.nan), np.abs(top - 1), n_top)
+    z_taker = _z_score(np.where(_truthy(taker_dev), taker_dev, np.nan), np.abs(taker - 1), n_taker)
+    components = np.stack([z_delta, z_top, z_taker])
+    risk = np.where(np.isnan(components).all(axis=0), np.nan, np.nansum(components, axis=0))
+
+    return {
+        "持仓变动": [_py(v) for v in oi_change],
+        "持仓变动%": [_py(v) for v in oi_change_pct],
+        "波动率": [_py(v) for v in volatility],
+        "OI连续根数": _tail_streak(_signs(diff), n_delta),
+        "主动连续根数": _tail_streak(taker_signs, n_taker),
+        "风险分": [_py(v) for v in risk],
+        "大户波动": [_py(v) for v in _std_over_mean(top, n_top)],
+        "全体波动": [_py(v) for v in _std_over_mean(retail, n_retail)],
+        "持仓斜率": [_py(v) for v in _linreg_slope_pct(oi, n_oi)],
+        "持仓Z分数": [_py(v) for v in _z_score(np.where(_truthy(oiv), oiv, np.nan), oi, n_oi)],
+        "稳定度分位": [_py(v) for v in _percentile_rank(oi, n_oi, np.where(_truthy(volatility), volatility, np.nan))],
+    }
 
 
 @register
 class FuturesAggregate(Indicator):
-    meta = IndicatorMeta(name="期货情绪聚合表.py", lookback=1, is_incremental=False, min_data=1)
+    meta = IndicatorMeta(name="期货情绪聚合表.py", lookback=1, is_incremental=False, min_data=1,
+                         inputs=(FUTURES,), deps=("期货情绪元数据.py",))
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
+        return pd.DataFrame(self.compute_batch({symbol: df}, interval)[symbol])
+
+    def compute_batch(self, frames, interval):
         # 期货数据只有 5m/15m/1h/4h/1d/1w，跳过1m
         if interval == "1m":
-            return self._make_insufficient_result(df, symbol, interval, {"信号": "不支持1m周期"})
-        history = get_metrics_history(symbol, 240, interval)
-        if not history:
-            return self._make_insufficient_result(df, symbol, interval, {"信号": None})
-
-        latest = history[-1]
-        prev = history[-2] if len(history) >= 2 else None
-        ts = latest.get("datetime")
-        now_ts = datetime.now(timezone.utc)
+            return {symbol: [self._make_insufficient_record(df, symbol, interval, {"信号": "不支持1m周期"})]
+                    for symbol, df in frames.items()}
+        histories = load_history(frames, interval)
+        out = {symbol: [self._make_insufficient_record(df, symbol, interval, {"信号": None})]
+               for symbol, df in frames.items() if symbol not in histories}
+        if histories:
+            stats = _window_stats(list(histories.values()))
+            now_ts = datetime.now(timezone.utc)
+            for j, (symbol, history) in enumerate(histories.items()):
+                ts = pd.Timestamp(int(history.ts[-1]), tz="UTC").to_pydatetime()
+                data = self._data(history, {k: v[j] for k, v in stats.items()}, ts, now_ts, interval)
+                out[symbol] = [self._make_record(frames[symbol], symbol, interval, data, timestamp=ts)]
+        return {symbol: out[symbol] for symbol in frames}
+
+    @staticmethod
+    def _data(history: MetricsHistory, stats: dict, ts: datetime, now_ts: datetime, interval: str) -> dict:
+        latest = {k: _f(v[-1]) for k, v in history.values.items()}
+        prev = {k: _f(v[-2]) for k, v in history.values.items()} if len(history) >= 2 else {}
 
         # 基础数据
-        oi = _f(latest.get("oi"))
-        oiv = _f(latest.get("oiv"))
-        tlsr = _f(latest.get("tlsr"))   # 大户多空比
-        lsr = _f(latest.get("lsr"))     # 全体多空比
-        tlsvr = _f(latest.get("tlsvr")) # 主动成交多空比
-        is_closed = 1 if latest.get("x", False) else 0
+        oi = latest["oi"]
+        oiv = latest["oiv"]
+        tlsr = latest["tlsr"]   # 大户多空比
+        lsr = latest["lsr"]     # 全体多空比
+        tlsvr = latest["tlsvr"] # 主动成交多空比
+        is_closed = 1 if history.closed[-1] else 0
 
         # 数据新鲜秒
-        freshness = (now_ts - ts).total_seconds() if ts else None
-
-        # 持仓变动
-        prev_oiv = _f(prev.get("oiv")) if prev else None
-        oi_change = oiv - prev_oiv if oiv and prev_oiv else None
-        oi_change_pct = oi_change / prev_oiv if oi_change and prev_oiv else None
+        freshness = (now_ts - ts).total_seconds()
 
         # 偏离度 (距离1的绝对值)
         top_dev = abs(tlsr - 1) if tlsr else None
@@ -166,45 +209,9 @@ class FuturesAggregate(Indicator):
         bias_diff = tlsr - lsr if tlsr and lsr else None
         bias_spread = abs(bias_diff) if bias_diff else None
 
-        # 窗口统计
-        oi_series = [_f(h.get("oiv")) for h in history if _f(h.get("oiv"))]
-        top_series = [_f(h.get("tlsr")) for h in history if _f(h.get("tlsr"))]
-        retail_series = [_f(h.get("lsr")) for h in history if _f(h.get("lsr"))]
-        taker_series = [_f(h.get("tlsvr")) for h in history if _f(h.get("tlsvr"))]
-
-        volatility = _std_over_mean(oi_series)
-        oi_slope = _linreg_slope_pct(oi_series)  # 改用百分比斜率
-        oi_z = _z_score(oiv, oi_series) if oiv else None
-        stability_pct = _percentile_rank(oi_series, volatility) if volatility else None
-
-        # OI连续根数
-        oi_deltas = []
-        for a, b in zip(oi_series[:-1], oi_series[1:]):
-            diff = b - a if a and b else 0
-            oi_deltas.append(0 if diff == 0 else (1 if diff > 0 else -1))
-        oi_streak = _尾部连续根数(oi_deltas)
-
-        # 主动连续根数
-        taker_signs = [0 if abs(v - 1) < 1e-9 else (1 if v > 1 else -1) for v in taker_series]
-        taker_streak = _尾部连续根数(taker_signs)
-
-        # 波动率
-        top_vol = _std_over_mean(top_series)
-        retail_vol = _std_over_mean(retail_series)
-
-        # 风险分 (Z分数之和)
-        delta_pct_series = [(b - a) / a for a, b in zip(oi_series[:-1], oi_series[1:]) if a and b and a != 0]
-        z_delta = _z_score(oi_change_pct, delta_pct_series) if oi_change_pct else None
-        top_dev_series = [abs(v - 1) for v in top_series]
-        taker_dev_series = [abs(v - 1) for v in taker_series]
-        z_top = _z_score(top_dev, top_dev_series) if top_dev else None
-        z_taker = _z_score(taker_dev, taker_dev_series) if taker_dev else None
-        components = [z for z in (z_delta, z_top, z_taker) if z is not None]
-        risk_score = sum(components) if components else None
-
         # 情绪动量
-        prev_tlsr = _f(prev.get("tlsr")) if prev else None
-        prev_tlsvr = _f(prev.get("tlsvr")) if prev else None
+        prev_tlsr = prev.get("tlsr")
+        prev_tlsvr = prev.get("tlsvr")
         top_momentum = tlsr - prev_tlsr if tlsr and prev_tlsr else None
         taker_momentum = tlsvr - prev_tlsvr if tlsvr and prev_tlsvr else None
 
@@ -220,11 +227,10 @@ class FuturesAggregate(Indicator):
         taker_jump = abs(tlsvr - prev_tlsvr) if tlsvr and prev_tlsvr else None
 
         # 陈旧标记
-        period_seconds = {"5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800}
-        threshold = period_seconds.get(interval, 600) * 3
-        stale = 1 if (freshness is None or freshness > threshold) else 0
+        threshold = PERIOD_SECONDS.get(interval, 600) * 3
+        stale = 1 if freshness > threshold else 0
 
-        return self._make_result(df, symbol, interval, {
+        return {
             "是否闭合": is_closed,
             "数据新鲜秒": freshness,
             "持仓金额": oiv,
@@ -233,27 +239,27 @@ class FuturesAggregate(Indicator):
             "全体多空比": lsr,
             "主动成交多空比": tlsvr,
             "大户样本": None,  # Redis 无此数据
-            "持仓变动": oi_change,
-            "持仓变动%": oi_change_pct,
+            "持仓变动": stats["持仓变动"],
+            "持仓变动%": stats["持仓变动%"],
             "大户偏离": top_dev,
             "全体偏离": retail_dev,
             "主动偏离": taker_dev,
             "情绪差值": bias_diff,
             "情绪差值绝对值": bias_spread,
-            "波动率": volatility,
-            "OI连续根数": oi_streak,
-            "主动连续根数": taker_streak,
-            "风险分": risk_score,
+            "波动率": stats["波动率"],
+            "OI连续根数": stats["OI连续根数"],
+            "主动连续根数": stats["主动连续根数"],
+            "风险分": stats["风险分"],
             "市场占比": None,  # 需要全局计算
-            "大户波动": top_vol,
-            "全体波动": retail_vol,
-            "持仓斜率": oi_slope,
-            "持仓Z分数": oi_z,
+            "大户波动": stats["大户波动"],
+            "全体波动": stats["全体波动"],
+            "持仓斜率": stats["持仓斜率"],
+            "持仓Z分数": stats["持仓Z分数"],
             "大户情绪动量": top_momentum,
             "主动情绪动量": taker_momentum,
             "情绪翻转信号": flip_signal,
             "主动跳变幅度": taker_jump,
-            "稳定度分位": stability_pct,
+            "稳定度分位": stats["稳定度分位"],
             "贡献度排名": None,  # 需要全局计算
             "陈旧标记": stale,
-        }, timestamp=ts)
+        }
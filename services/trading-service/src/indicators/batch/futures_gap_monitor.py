@@ -1,36 +1,9 @@
-"""期货情绪缺口监控 - 检测5m情绪数据缺口"""
+"""期货情绪缺口监控 - 检测5m情绪数据缺口（时间戳来自共享的期货情绪历史缓存）"""
 import pandas as pd
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 from typing import List, Dict
-from ..base import Indicator, IndicatorMeta, register
-
-
-def get_metrics_times(symbol: str, limit: int = 240, interval: str = "5m") -> List[datetime]:
-    """从 PostgreSQL 获取时间戳列表"""
-    import psycopg
-    from ...config import config
-
-    # 根据周期选择表和列名
-    if interval == "5m":
-        table = "binance_futures_metrics_5m"
-        time_col = "create_time"
-    else:
-        table = f"binance_futures_metrics_{interval}_last"
-        time_col = "bucket"
-
-    try:
-        with psycopg.connect(config.db_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(f"""
-                    SELECT {time_col} FROM market_data.{table}
-                    WHERE symbol = %s AND {time_col} > NOW() - INTERVAL '30 days'
-                    ORDER BY {time_col} DESC
-                    LIMIT %s
-                """, (symbol, limit))
-                rows = cur.fetchall()
-                return [r[0].replace(tzinfo=timezone.utc) for r in reversed(rows) if r[0]]
-    except Exception:
-        return []
+from ..base import FUTURES, Indicator, IndicatorMeta, register
+from ..futures_history import load_history
 
 
 def detect_gaps(times: List[datetime], interval_sec: int = 300) -> Dict:
@@ -62,16 +35,23 @@ def detect_gaps(times: List[datetime], interval_sec: int = 300) -> Dict:
 
 @register
 class FuturesGapMonitor(Indicator):
-    meta = IndicatorMeta(name="期货情绪缺口监控.py", lookback=1, is_incremental=False, min_data=1)
+    meta = IndicatorMeta(name="期货情绪缺口监控.py", lookback=1, is_incremental=False, min_data=1,
+                         inputs=(FUTURES,), deps=("期货情绪元数据.py",))
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
+        return pd.DataFrame(self.compute_batch({symbol: df}, interval)[symbol])
+
+    def compute_batch(self, frames, interval):
         # 只监控 5m 周期
         if interval != "5m":
-            return self._make_insufficient_result(df, symbol, interval, {"信号": "仅支持5m周期"})
-
-        times = get_metrics_times(symbol, 240, interval)
-        gap_info = detect_gaps(times, 300)
-
-        # 不使用 _make_result，直接构建（因为没有数据时间字段）
-        row = {"交易对": symbol, **gap_info}
-        return pd.DataFrame([row])
+            return {symbol: [self._make_insufficient_record(df, symbol, interval, {"信号": "仅支持5m周期"})]
+                    for symbol, df in frames.items()}
+
+        histories = load_history(frames, interval)
+        out = {}
+        for symbol in frames:
+            history = histories.get(symbol)
+            gap_info = detect_gaps(history.datetimes() if history is not None else [], 300)
+            # 不使用 _make_record，直接构建（因为没有数据时间字段）
+            out[symbol] = [{"交易对": symbol, **gap_info}]
+        return out
@@ -2,6 +2,7 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel
 
 RSI_PERIODS = list(range(2, 34))  # 2~33
 
@@ -11,15 +12,28 @@ def calc_harmonic(df: pd.DataFrame) -> float:
     if len(df) < max(RSI_PERIODS) + 2:
         return None
 
-    typ_price = (df["high"] + df["low"] + df["close"]) / 3
+    gain, loss = _gain_loss(df)
+    return _mean_rsi([
+        (gain.ewm(alpha=1/n, adjust=False).mean().iloc[-1], loss.ewm(alpha=1/n, adjust=False).mean().iloc[-1])
+        for n in RSI_PERIODS
+    ])
+
+
+def _gain_loss(data, mask=None):
+    """data 可为单币种 DataFrame 或 Panel；宽表需传 mask 还原左侧补位"""
+    typ_price = (data["high"] + data["low"] + data["close"]) / 3
     delta = typ_price.diff()
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
+    if mask is not None:
+        gain, loss = mask(gain), mask(loss)
+    return gain, loss
 
+
+def _mean_rsi(pairs) -> float:
+    """pairs: 各周期 (avg_gain, avg_loss) 末值"""
     rsi_vals = []
-    for n in RSI_PERIODS:
-        avg_gain = gain.ewm(alpha=1/n, adjust=False).mean().iloc[-1]
-        avg_loss = loss.ewm(alpha=1/n, adjust=False).mean().iloc[-1]
+    for avg_gain, avg_loss in pairs:
         if avg_loss == 0:
             continue
         rs = avg_gain / avg_loss
@@ -43,3 +57,28 @@ class Harmonic(Indicator):
         return self._make_result(df, symbol, interval, {
             "谐波值": round(val, 2),
         })
+
+    def compute_batch(self, frames, interval):
+        out = {}
+        ready = {}
+        for symbol, df in frames.items():
+            if not self._check_data(df) or len(df) < max(RSI_PERIODS) + 2:
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"谐波值": None})]
+            else:
+                ready[symbol] = df
+        if ready:
+            panel = Panel(ready)
+            gain, loss = _gain_loss(panel, panel.mask)
+            # 每个周期一次 ewm 覆盖全部币种: [(avg_gain[S], avg_loss[S]), ...]
+            lasts = [
+                (panel.tail(gain.ewm(alpha=1/n, adjust=False).mean())[0],
+                 panel.tail(loss.ewm(alpha=1/n, adjust=False).mean())[0])
+                for n in RSI_PERIODS
+            ]
+            for j, (symbol, df) in enumerate(ready.items()):
+                val = _mean_rsi([(avg_gain[j], avg_loss[j]) for avg_gain, avg_loss in lasts])
+                if val is None:
+                    out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"谐波值": None})]
+                else:
+                    out[symbol] = [self._make_record(df, symbol, interval, {"谐波值": round(val, 2)})]
+        return {symbol: out[symbol] for symbol in frames}
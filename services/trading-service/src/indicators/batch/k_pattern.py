@@ -1,5 +1,15 @@
-"""K线形态指标 - 蜡烛形态 + 价格图形形态"""
+"""K线形态指标 - 蜡烛形态 + 价格图形形态
+
+蜡烛形态只取末根：每个 CDL 函数只需要末尾 lookback+1 根，按 lookback 分组把各币种的
+末尾窗口拼成一列，一个 CDL 函数对整批币种只调用一次，再取各段末根的值。
+整组形态结果按币种缓存，末根 K 线（含未闭合 K 线的 OHLCV）不变时直接复用。
+K_PATTERNS 可限定启用的形态（CDL 函数名或 tradingpatterns / patternpy / trendln）。
+"""
 import logging
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
 
@@ -48,41 +58,96 @@ PRICE_PATTERN_NAMES = {
 }
 
 
-# 缓存 talib CDL 函数列表
+# 缓存 talib CDL 函数列表 [(函数名, 函数, lookback)]
 _TALIB_CDL_FUNCS = None
 
+
 def _get_talib_cdl_funcs():
-    """获取并缓存 talib CDL 函数"""
+    """获取并缓存 talib CDL 函数及其 lookback（末根结果只依赖末尾 lookback+1 根，取不到时为 None）"""
     global _TALIB_CDL_FUNCS
     if _TALIB_CDL_FUNCS is None:
         try:
             import talib
-            _TALIB_CDL_FUNCS = [
-                (fname, getattr(talib, fname))
-                for fname in talib.get_function_groups().get("Pattern Recognition", [])
-                if hasattr(talib, fname)
-            ]
+            from talib import abstract
         except ImportError:
             _TALIB_CDL_FUNCS = []
+            return _TALIB_CDL_FUNCS
+        funcs = []
+        for fname in talib.get_function_groups().get("Pattern Recognition", []):
+            if not hasattr(talib, fname):
+                continue
+            try:
+                lookback = int(abstract.Function(fname).lookback)
+            except Exception:
+                lookback = None
+            funcs.append((fname, getattr(talib, fname), lookback))
+        _TALIB_CDL_FUNCS = funcs
     return _TALIB_CDL_FUNCS
 
 
-def _detect_talib(df: pd.DataFrame) -> dict:
-    """talib CDL 蜡烛形态检测"""
-    if len(df) < 5:
-        return {}
-    cdl_funcs = _get_talib_cdl_funcs()
-    if not cdl_funcs:
-        return {}
-    o, h, low, c = df["open"].values, df["high"].values, df["low"].values, df["close"].values
-    results = {}
-    for fname, fn in cdl_funcs:
+def _active_set():
+    """K_PATTERNS 配置的形态集合，未配置时为 None（全部启用）"""
+    from ...config import config
+    return set(config.k_patterns) or None
+
+
+def _active_cdl_funcs(active=None):
+    funcs = _get_talib_cdl_funcs()
+    if active is None:
+        return funcs
+    return [f for f in funcs if f[0] in active]
+
+
+def _detect_talib(df: pd.DataFrame, funcs=None) -> dict:
+    """talib CDL 蜡烛形态检测（单币种）"""
+    return _detect_talib_batch({"": df}, funcs).get("", {})
+
+
+def _detect_talib_batch(frames: Dict[str, pd.DataFrame], funcs=None) -> Dict[str, dict]:
+    """
+    多币种 CDL 扫描，返回 {symbol: {函数名: 值}}（只含非零结果，按函数顺序）
+
+    lookback 相同的函数共用一个拼接矩阵：各币种末尾 lookback+1 根首尾相接，
+    每段末根的结果只由本段数据决定；不足 lookback+1 根的币种末根必为 0，直接跳过。
+    """
+    funcs = _get_talib_cdl_funcs() if funcs is None else funcs
+    results: Dict[str, dict] = {symbol: {} for symbol in frames}
+    frames = {symbol: df for symbol, df in frames.items() if len(df) >= 5}
+    if not funcs or not frames:
+        return results
+
+    arrays = {symbol: tuple(df[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close"))
+              for symbol, df in frames.items()}
+    blocks: Dict[int, Tuple[List[str], tuple, np.ndarray]] = {}
+
+    def block(width: int):
+        if width not in blocks:
+            symbols = [s for s, cols in arrays.items() if len(cols[0]) >= width]
+            matrix = tuple(np.ascontiguousarray(np.concatenate([arrays[s][k][-width:] for s in symbols]))
+                           if symbols else np.empty(0) for k in range(4))
+            blocks[width] = (symbols, matrix, np.arange(1, len(symbols) + 1) * width - 1)
+        return blocks[width]
+
+    for fname, fn, lookback in funcs:
+        if lookback is None:
+            # lookback 未知：逐币种整段计算
+            for symbol, (o, h, low, c) in arrays.items():
+                try:
+                    val = float(fn(o, h, low, c)[-1])
+                    if val != 0:
+                        results[symbol][fname] = val / 100.0
+                except Exception:
+                    pass
+            continue
+        symbols, (o, h, low, c), ends = block(lookback + 1)
+        if not symbols:
+            continue
         try:
-            val = float(fn(o, h, low, c)[-1])
-            if val != 0:
-                results[fname] = val / 100.0
+            values = fn(o, h, low, c)[ends]
         except Exception:
-            pass
+            continue
+        for j in np.flatnonzero(values):
+            results[symbols[j]][fname] = float(values[j]) / 100.0
     return results
 
 
@@ -201,27 +266,81 @@ def _to_chinese(key: str) -> str:
     return key
 
 
+def _detect_price_patterns(df: pd.DataFrame, active=None) -> dict:
+    """价格图形形态检测（tradingpatterns / patternpy / trendln）"""
+    results = {}
+    if active is None or "tradingpatterns" in active:
+        ohlcv = df.copy()
+        for col in ["open", "high", "low", "close", "volume"]:
+            if col in ohlcv.columns:
+                ohlcv[col.capitalize()] = ohlcv[col]
+        results.update(_detect_tradingpatterns(ohlcv))
+    if active is None or "patternpy" in active:
+        results.update(_detect_patternpy(df))
+    if active is None or "trendln" in active:
+        results.update(_detect_trendln(df))
+    return results
+
+
+def _bar_key(df: pd.DataFrame) -> tuple:
+    """窗口标识：根数、首末时间与末根 OHLCV（历史 K 线已闭合，不会变化）"""
+    last = df.iloc[-1]
+    return (len(df), df.index[0], df.index[-1],
+            tuple(float(last[c]) for c in ("open", "high", "low", "close", "volume") if c in df.columns))
+
+
+# 形态结果缓存 {(symbol, interval): (窗口标识, 启用集合, {形态: 值})}
+_RESULTS: Dict[Tuple[str, str], tuple] = {}
+_RESULTS_LOCK = threading.Lock()
+
+
+def clear_pattern_cache():
+    with _RESULTS_LOCK:
+        _RESULTS.clear()
+
+
 @register
 class KPattern(Indicator):
     meta = IndicatorMeta(name="K线形态扫描器.py", lookback=50, is_incremental=False, min_data=10)
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
-        if not self._check_data(df):
-            return self._make_insufficient_result(df, symbol, interval, {"形态": None})
+        return pd.DataFrame(self.compute_batch({symbol: df}, interval)[symbol])
 
-        # 准备 OHLCV 数据
-        ohlcv = df.copy()
-        for col in ["open", "high", "low", "close", "volume"]:
-            if col in ohlcv.columns:
-                ohlcv[col.capitalize()] = ohlcv[col]
+    def compute_batch(self, frames, interval):
+        active = _active_set()
+        found: Dict[str, dict] = {}
+        todo: Dict[str, pd.DataFrame] = {}
+        keys = {}
+        for symbol, df in frames.items():
+            if not self._check_data(df):
+                continue
+            keys[symbol] = key = _bar_key(df)
+            with _RESULTS_LOCK:
+                hit = _RESULTS.get((symbol, interval))
+            if hit is not None and hit[0] == key and hit[1] == active:
+                found[symbol] = hit[2]
+            else:
+                todo[symbol] = df
+
+        # 检测所有形态：蜡烛形态整批一次扫描，价格形态逐币种
+        candles = _detect_talib_batch(todo, _active_cdl_funcs(active))
+        for symbol, df in todo.items():
+            patterns = candles[symbol]
+            patterns.update(_detect_price_patterns(df, active))
+            found[symbol] = patterns
+            with _RESULTS_LOCK:
+                _RESULTS[(symbol, interval)] = (keys[symbol], active, patterns)
 
-        # 检测所有形态
-        all_patterns = {}
-        all_patterns.update(_detect_talib(df))
-        all_patterns.update(_detect_tradingpatterns(ohlcv))
-        all_patterns.update(_detect_patternpy(df))
-        all_patterns.update(_detect_trendln(df))
+        out = {}
+        for symbol, df in frames.items():
+            if symbol not in found:
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"形态": None})]
+            else:
+                out[symbol] = [self._make_record(df, symbol, interval, self._data(df, found[symbol]))]
+        return out
 
+    @staticmethod
+    def _data(df: pd.DataFrame, all_patterns: dict) -> dict:
         # 转中文
         cn_patterns = [_to_chinese(k) for k in all_patterns.keys()]
         pattern_str = ",".join(cn_patterns) if cn_patterns else "无形态"
@@ -232,10 +351,10 @@ class KPattern(Indicator):
         quote = df.get("quote_volume", df["volume"] * df["close"])
         turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
 
-        return self._make_result(df, symbol, interval, {
+        return {
             "形态类型": pattern_str,
             "检测数量": len(all_patterns),
             "强度": round(strength, 2),
             "成交额（USDT）": turnover,
             "当前价格": float(df["close"].iloc[-1]),
-        })
+        }
@@ -2,27 +2,18 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from .. import kernels
 
 
 # ==================== NumPy 向量化工具 ====================
 def wilder_smooth(arr: np.ndarray, period: int) -> np.ndarray:
     """Wilder 平滑 - 向量化"""
-    result = np.zeros_like(arr, dtype=float)
-    result[0] = arr[0]
-    alpha = 1.0 / period
-    for i in range(1, len(arr)):
-        result[i] = result[i-1] * (1 - alpha) + arr[i] * alpha
-    return result
+    return kernels.wilder_smooth(arr, period)
 
 
 def ema_np(arr: np.ndarray, period: int) -> np.ndarray:
     """EMA - 向量化"""
-    alpha = 2.0 / (period + 1)
-    result = np.zeros_like(arr, dtype=float)
-    result[0] = arr[0]
-    for i in range(1, len(arr)):
-        result[i] = arr[i] * alpha + result[i-1] * (1 - alpha)
-    return result
+    return kernels.ema(arr, period)
 
 
 # ==================== SuperTrend ====================
@@ -32,42 +23,15 @@ def calc_supertrend(high: np.ndarray, low: np.ndarray, close: np.ndarray, period
         return {}
 
     # TR 和 ATR
-    tr = np.zeros(n)
-    tr[0] = high[0] - low[0]
-    for i in range(1, n):
-        tr[i] = max(high[i] - low[i], abs(high[i] - close[i-1]), abs(low[i] - close[i-1]))
-    atr = wilder_smooth(tr, period)
+    atr = wilder_smooth(kernels.true_range(high, low, close), period)
 
     # 上下轨
     hl2 = (high + low) / 2
     upper = hl2 + mult * atr
     lower = hl2 - mult * atr
 
-    # SuperTrend 计算
-    final_upper = np.copy(upper)
-    final_lower = np.copy(lower)
-    supertrend = np.zeros(n)
-    direction = np.ones(n, dtype=int)  # 1=下跌, -1=上涨
-
-    for i in range(1, n):
-        # 调整上下轨
-        if close[i-1] > final_upper[i-1]:
-            final_upper[i] = upper[i]
-        else:
-            final_upper[i] = min(upper[i], final_upper[i-1])
-
-        if close[i-1] < final_lower[i-1]:
-            final_lower[i] = lower[i]
-        else:
-            final_lower[i] = max(lower[i], final_lower[i-1])
-
-        # 方向判断
-        if supertrend[i-1] == final_upper[i-1]:
-            direction[i] = -1 if close[i] > final_upper[i] else 1
-        else:
-            direction[i] = 1 if close[i] < final_lower[i] else -1
-
-        supertrend[i] = final_upper[i] if direction[i] == 1 else final_lower[i]
+    # SuperTrend 计算（direction: 1=下跌, -1=上涨）
+    final_upper, final_lower, supertrend, direction = kernels.supertrend(close, upper, lower)
 
     return {"SuperTrend": supertrend[-1], "方向": "空" if direction[-1] == 1 else "多",
             "上轨": final_upper[-1], "下轨": final_lower[-1]}
@@ -91,16 +55,9 @@ def calc_adx(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int =
         return {}
 
     # TR, +DM, -DM
-    tr = np.zeros(n)
-    plus_dm = np.zeros(n)
-    minus_dm = np.zeros(n)
-
-    for i in range(1, n):
-        tr[i] = max(high[i] - low[i], abs(high[i] - close[i-1]), abs(low[i] - close[i-1]))
-        up = high[i] - high[i-1]
-        down = low[i-1] - low[i]
-        plus_dm[i] = up if up > down and up > 0 else 0
-        minus_dm[i] = down if down > up and down > 0 else 0
+    tr = kernels.true_range(high, low, close)
+    tr[0] = 0
+    plus_dm, minus_dm = kernels.directional_movement(high, low)
 
     # Wilder 平滑
     smooth_tr = wilder_smooth(tr, period)
@@ -140,14 +97,19 @@ def calc_cci(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int =
     sma = np.convolve(tp, np.ones(period)/period, mode='valid')
 
     # MAD
-    mad = np.zeros(len(sma))
-    for i in range(len(sma)):
-        mad[i] = np.mean(np.abs(tp[i:i+period] - sma[i]))
+    mad = kernels.rolling_mad(tp, sma, period)
 
     cci = (tp[period-1:] - sma) / (0.015 * mad + 1e-10)
     return {"CCI": cci[-1]}
 
 
+def calc_cci_series(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 20) -> np.ndarray:
+    """逐根 CCI，第 k 项对应第 k + period - 1 根"""
+    tp = (high + low + close) / 3
+    sma = np.convolve(tp, np.ones(period)/period, mode='valid')
+    return (tp[period-1:] - sma) / (0.015 * kernels.rolling_mad(tp, sma, period) + 1e-10)
+
+
 @register
 class CCIIndicator(Indicator):
     meta = IndicatorMeta(name="CCI.py", lookback=60, is_incremental=False, min_data=20)
@@ -158,6 +120,11 @@ class CCIIndicator(Indicator):
         res = calc_cci(df["high"].values, df["low"].values, df["close"].values)
         return self._make_result(df, symbol, interval, res) if res else self._make_insufficient_result(df, symbol, interval, {"CCI": None})
 
+    def _series(self, df, symbol, interval, start):
+        cci = calc_cci_series(df["high"].values, df["low"].values, df["close"].values)
+        return [self._make_record(df, symbol, interval, {"CCI": cci[i - 19]}, df.index[i])
+                for i in range(start, len(df))]
+
 
 # ==================== WilliamsR ====================
 def calc_williams_r(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> dict:
@@ -166,13 +133,20 @@ def calc_williams_r(high: np.ndarray, low: np.ndarray, close: np.ndarray, period
         return {}
 
     # 滚动最高最低
-    hh = np.array([high[max(0,i-period+1):i+1].max() for i in range(period-1, n)])
-    ll = np.array([low[max(0,i-period+1):i+1].min() for i in range(period-1, n)])
+    hh = kernels.rolling_max(high, period)
+    ll = kernels.rolling_min(low, period)
 
     wr = -100 * (hh - close[period-1:]) / (hh - ll + 1e-10)
     return {"WilliamsR": wr[-1]}
 
 
+def calc_williams_r_series(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """逐根 WilliamsR，第 k 项对应第 k + period - 1 根"""
+    hh = kernels.rolling_max(high, period)
+    ll = kernels.rolling_min(low, period)
+    return -100 * (hh - close[period-1:]) / (hh - ll + 1e-10)
+
+
 @register
 class WilliamsRIndicator(Indicator):
     meta = IndicatorMeta(name="WilliamsR.py", lookback=42, is_incremental=False, min_data=14)
@@ -183,6 +157,11 @@ class WilliamsRIndicator(Indicator):
         res = calc_williams_r(df["high"].values, df["low"].values, df["close"].values)
         return self._make_result(df, symbol, interval, res) if res else self._make_insufficient_result(df, symbol, interval, {"WilliamsR": None})
 
+    def _series(self, df, symbol, interval, start):
+        wr = calc_williams_r_series(df["high"].values, df["low"].values, df["close"].values)
+        return [self._make_record(df, symbol, interval, {"WilliamsR": wr[i - 13]}, df.index[i])
+                for i in range(start, len(df))]
+
 
 # ==================== Donchian ====================
 def calc_donchian(high: np.ndarray, low: np.ndarray, period: int = 20) -> dict:
@@ -203,6 +182,16 @@ class DonchianIndicator(Indicator):
         res = calc_donchian(df["high"].values, df["low"].values)
         return self._make_result(df, symbol, interval, res) if res else self._make_insufficient_result(df, symbol, interval, {"上轨": None})
 
+    def _series(self, df, symbol, interval, start):
+        upper = kernels.rolling_max(df["high"].values, 20)
+        lower = kernels.rolling_min(df["low"].values, 20)
+        return [
+            self._make_record(df, symbol, interval,
+                              {"上轨": upper[i - 19], "中轨": (upper[i - 19] + lower[i - 19]) / 2, "下轨": lower[i - 19]},
+                              df.index[i])
+            for i in range(start, len(df))
+        ]
+
 
 # ==================== Keltner ====================
 def calc_keltner(high: np.ndarray, low: np.ndarray, close: np.ndarray,
@@ -213,11 +202,7 @@ def calc_keltner(high: np.ndarray, low: np.ndarray, close: np.ndarray,
 
     mid = ema_np(close, ema_period)
 
-    tr = np.zeros(n)
-    tr[0] = high[0] - low[0]
-    for i in range(1, n):
-        tr[i] = max(high[i] - low[i], abs(high[i] - close[i-1]), abs(low[i] - close[i-1]))
-    atr = wilder_smooth(tr, atr_period)
+    atr = wilder_smooth(kernels.true_range(high, low, close), atr_period)
 
     return {"上轨": mid[-1] + mult * atr[-1], "中轨": mid[-1], "下轨": mid[-1] - mult * atr[-1], "ATR": atr[-1]}
 
@@ -245,10 +230,12 @@ def calc_ichimoku(high: np.ndarray, low: np.ndarray, close: np.ndarray,
 
     tenkan_val = donchian_mid(high, low, tenkan)
     kijun_val = donchian_mid(high, low, kijun)
-    senkou_a = (tenkan_val + kijun_val) / 2
     senkou_b_val = donchian_mid(high, low, senkou_b) if n >= senkou_b else 0
+    return _ichimoku_fields(tenkan_val, kijun_val, senkou_b_val, close[-1])
 
-    price = close[-1]
+
+def _ichimoku_fields(tenkan_val, kijun_val, senkou_b_val, price) -> dict:
+    senkou_a = (tenkan_val + kijun_val) / 2
     cloud_top = max(senkou_a, senkou_b_val)
     cloud_bottom = min(senkou_a, senkou_b_val)
 
@@ -279,3 +266,18 @@ class IchimokuIndicator(Indicator):
             return self._make_insufficient_result(df, symbol, interval, {"信号": None, "方向": None})
         res = calc_ichimoku(df["high"].values, df["low"].values, df["close"].values)
         return self._make_result(df, symbol, interval, res) if res else self._make_insufficient_result(df, symbol, interval, {"信号": None})
+
+    def _series(self, df, symbol, interval, start):
+        high, low, close = df["high"].values, df["low"].values, df["close"].values
+
+        def donchian_mid(period):
+            # 第 i 根对应下标 i - period + 1
+            return (kernels.rolling_max(high, period) + kernels.rolling_min(low, period)) / 2
+
+        tenkan, kijun, senkou_b = donchian_mid(9), donchian_mid(26), donchian_mid(52)
+        return [
+            self._make_record(df, symbol, interval,
+                              _ichimoku_fields(tenkan[i - 8], kijun[i - 25], senkou_b[i - 51], close[i]),
+                              df.index[i])
+            for i in range(start, len(df))
+        ]
@@ -2,6 +2,22 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel
+
+
+def calc_mfi(data, mask=None):
+    """data 可为单币种 DataFrame 或 Panel；宽表需传 mask 还原左侧补位"""
+    tp = (data["high"] + data["low"] + data["close"]) / 3
+    mf = tp * data["volume"]
+    direction = np.sign(tp.diff())
+    pos_mf = mf.where(direction > 0, 0)
+    neg_mf = mf.where(direction < 0, 0)
+    if mask is not None:
+        pos_mf, neg_mf = mask(pos_mf), mask(neg_mf)
+    pos = pos_mf.rolling(14).sum()
+    neg = neg_mf.rolling(14).sum().abs()
+    mfr = pos / neg.replace(0, np.nan)
+    return 100 - (100 / (1 + mfr))
 
 
 @register
@@ -11,16 +27,42 @@ class MFI(Indicator):
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if not self._check_data(df):
             return self._make_insufficient_result(df, symbol, interval, {"MFI值": None})
-        tp = (df["high"] + df["low"] + df["close"]) / 3
-        mf = tp * df["volume"]
-        direction = np.sign(tp.diff())
-        pos = mf.where(direction > 0, 0).rolling(14).sum()
-        neg = mf.where(direction < 0, 0).rolling(14).sum().abs()
-        mfr = pos / neg.replace(0, np.nan)
-        mfi = 100 - (100 / (1 + mfr))
-        val = mfi.iloc[-1]
-        if np.isnan(val):
+        data = self._data(calc_mfi(df).iloc[-1])
+        if data is None:
             return self._make_insufficient_result(df, symbol, interval, {"MFI值": None})
-        return self._make_result(df, symbol, interval, {
-            "MFI值": round(float(val), 2),
-        })
+        return self._make_result(df, symbol, interval, data)
+
+    def compute_batch(self, frames, interval):
+        out = {}
+        ready = {}
+        for symbol, df in frames.items():
+            if self._check_data(df):
+                ready[symbol] = df
+            else:
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"MFI值": None})]
+        if ready:
+            panel = Panel(ready)
+            last = panel.tail(calc_mfi(panel, panel.mask))[0]
+            for j, (symbol, df) in enumerate(ready.items()):
+                data = self._data(last[j])
+                if data is None:
+                    out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"MFI值": None})]
+                else:
+                    out[symbol] = [self._make_record(df, symbol, interval, data)]
+        return {symbol: out[symbol] for symbol in frames}
+
+    def _series(self, df, symbol, interval, start):
+        mfi = calc_mfi(df).to_numpy()
+        records = []
+        for i in range(start, len(df)):
+            data = self._data(mfi[i])
+            if data is None:
+                data = self._insufficient_data({"MFI值": None})
+            records.append(self._make_record(df, symbol, interval, data, df.index[i]))
+        return records
+
+    @staticmethod
+    def _data(val):
+        if np.isnan(val):
+            return None
+        return {"MFI值": round(float(val), 2)}
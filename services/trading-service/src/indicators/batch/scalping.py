@@ -2,6 +2,24 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel
+from ..primitives import primitives
+
+
+def calc_scalping(close, mask=None):
+    """close 可为 Series 或宽表；宽表需传 mask 还原左侧补位。返回 (rsi, ema9, ema21)"""
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    if mask is not None:
+        gain, loss = mask(gain), mask(loss)
+    gain = gain.ewm(alpha=1/14, adjust=False).mean()
+    loss = loss.ewm(alpha=1/14, adjust=False).mean()
+    rs = gain / loss.replace(0, np.nan)
+    rsi = 100 - (100 / (1 + rs))
+    ema9 = close.ewm(span=9, adjust=False).mean()
+    ema21 = close.ewm(span=21, adjust=False).mean()
+    return rsi, ema9, ema21
 
 
 @register
@@ -11,19 +29,30 @@ class Scalping(Indicator):
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if not self._check_data(df):
             return self._make_insufficient_result(df, symbol, interval, {"剥头皮信号": None})
-        close = df["close"]
-        # RSI
-        delta = close.diff()
-        gain = delta.where(delta > 0, 0).ewm(alpha=1/14, adjust=False).mean()
-        loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-        rs = gain / loss.replace(0, np.nan)
-        rsi = 100 - (100 / (1 + rs))
-        rsi_val = float(rsi.iloc[-1])
-        # EMA
-        ema9 = close.ewm(span=9, adjust=False).mean()
-        ema21 = close.ewm(span=21, adjust=False).mean()
-        price = float(close.iloc[-1])
-        e9, e21 = float(ema9.iloc[-1]), float(ema21.iloc[-1])
+        p = primitives(df, symbol, interval)
+        rsi, ema9, ema21 = p.rsi(14), p.ema(9), p.ema(21)
+        return self._make_result(df, symbol, interval, self._data(
+            df, float(rsi.iloc[-1]), float(ema9.iloc[-1]), float(ema21.iloc[-1])))
+
+    def compute_batch(self, frames, interval):
+        out = {}
+        ready = {}
+        for symbol, df in frames.items():
+            if self._check_data(df):
+                ready[symbol] = df
+            else:
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"剥头皮信号": None})]
+        if ready:
+            panel = Panel(ready)
+            rsi, ema9, ema21 = (panel.tail(x)[0] for x in calc_scalping(panel["close"], panel.mask))
+            for j, (symbol, df) in enumerate(ready.items()):
+                out[symbol] = [self._make_record(df, symbol, interval, self._data(
+                    df, float(rsi[j]), float(ema9[j]), float(ema21[j])))]
+        return {symbol: out[symbol] for symbol in frames}
+
+    @staticmethod
+    def _data(df, rsi_val: float, e9: float, e21: float) -> dict:
+        price = float(df["close"].iloc[-1])
         # 信号
         if rsi_val < 30 and price > e9 > e21:
             signal = "超卖反弹"
@@ -35,10 +64,10 @@ class Scalping(Indicator):
             signal = "空头"
         else:
             signal = "观望"
-        return self._make_result(df, symbol, interval, {
+        return {
             "剥头皮信号": signal,
             "RSI": round(rsi_val, 2),
             "EMA9": round(e9, 6),
             "EMA21": round(e21, 6),
             "当前价格": price,
-        })
+        }
@@ -5,8 +5,9 @@
 """
 import numpy as np
 import pandas as pd
-from typing import Optional
 from ..base import Indicator, IndicatorMeta, register
+from .. import kernels
+from ..primitives import primitives
 
 DEFAULT_LENGTH = 70
 DEFAULT_MULT = 1.2
@@ -16,26 +17,18 @@ HIGHEST_WIN = DEFAULT_LENGTH * 3
 
 def _rma(series: pd.Series, length: int) -> pd.Series:
     """Wilder RMA，与 ta.rma/ta.atr 一致"""
-    alpha = 1 / length
-    vals = []
-    prev = np.nan
-    for i, v in enumerate(series):
-        if i == 0:
-            prev = v
-        else:
-            prev = alpha * v + (1 - alpha) * prev
-        vals.append(prev)
-    return pd.Series(vals, index=series.index)
-
-
-def _atr_wilder(df: pd.DataFrame, length: int = DEFAULT_LENGTH) -> pd.Series:
-    high, low, close = df["high"], df["low"], df["close"]
-    prev_close = close.shift(1)
-    tr = pd.concat([
-        (high - low).abs(),
-        (high - prev_close).abs(),
-        (low - prev_close).abs(),
-    ], axis=1).max(axis=1)
+    return pd.Series(kernels.wilder_smooth(series.to_numpy(dtype=float), length), index=series.index)
+
+
+def _atr_wilder(df: pd.DataFrame, length: int = DEFAULT_LENGTH, tr: pd.Series = None) -> pd.Series:
+    if tr is None:
+        high, low, close = df["high"], df["low"], df["close"]
+        prev_close = close.shift(1)
+        tr = pd.concat([
+            (high - low).abs(),
+            (high - prev_close).abs(),
+            (low - prev_close).abs(),
+        ], axis=1).max(axis=1)
     return _rma(tr, length)
 
 
@@ -58,24 +51,10 @@ class SuperTrend(Indicator):
 
         close = df["close"]
         zlema = _zlema(close, DEFAULT_LENGTH, DEFAULT_LAG)
-        atr = _atr_wilder(df, DEFAULT_LENGTH)
+        atr = _atr_wilder(df, DEFAULT_LENGTH, primitives(df, symbol, interval).tr())
         vol_band = atr.rolling(HIGHEST_WIN, min_periods=1).max() * DEFAULT_MULT
 
-        trend = [0] * len(close)
-        last_cross_idx: Optional[int] = None
-        for i in range(1, len(close)):
-            upper = zlema.iloc[i] + vol_band.iloc[i]
-            lower = zlema.iloc[i] - vol_band.iloc[i]
-            if close.iloc[i - 1] <= upper and close.iloc[i] > upper:
-                trend[i] = 1
-                if trend[i] != trend[i - 1]:
-                    last_cross_idx = i
-            elif close.iloc[i - 1] >= lower and close.iloc[i] < lower:
-                trend[i] = -1
-                if trend[i] != trend[i - 1]:
-                    last_cross_idx = i
-            else:
-                trend[i] = trend[i - 1]
+        trend, last_cross_idx = kernels.band_trend(close, zlema + vol_band, zlema - vol_band)
 
         upper_last = zlema.iloc[-1] + vol_band.iloc[-1]
         lower_last = zlema.iloc[-1] - vol_band.iloc[-1]
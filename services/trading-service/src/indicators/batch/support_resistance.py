@@ -1,6 +1,7 @@
 """支撑阻力指标"""
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..primitives import primitives
 
 
 @register
@@ -16,9 +17,7 @@ class SupportResistance(Indicator):
         support = float(low.tail(20).min())
         resistance = float(high.tail(20).max())
         # ATR
-        prev_close = close.shift(1)
-        tr = pd.concat([(high - low).abs(), (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
-        atr = float(tr.ewm(alpha=1/14, adjust=False).mean().iloc[-1])
+        atr = float(primitives(df, symbol, interval).atr(14).iloc[-1])
         dist_support = (price - support) / price * 100 if price else 0
         dist_resistance = (resistance - price) / price * 100 if price else 0
         dist_key = min(abs(dist_support), abs(dist_resistance))
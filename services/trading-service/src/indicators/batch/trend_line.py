@@ -1,26 +1,9 @@
 """趋势线扫描器 - Pine Trend Lines v2 完整复刻"""
 import numpy as np
 import pandas as pd
-from typing import List, Optional, Tuple
+from typing import List, Tuple
 from ..base import Indicator, IndicatorMeta, register
-
-
-def _pivot_high(highs: np.ndarray, idx: int, prd: int) -> Optional[float]:
-    """pivothigh(prd, prd)"""
-    if idx < 2 * prd:
-        return None
-    window = highs[idx - 2 * prd : idx + 1]
-    pivot_val = highs[idx - prd]
-    return pivot_val if pivot_val == window.max() else None
-
-
-def _pivot_low(lows: np.ndarray, idx: int, prd: int) -> Optional[float]:
-    """pivotlow(prd, prd)"""
-    if idx < 2 * prd:
-        return None
-    window = lows[idx - 2 * prd : idx + 1]
-    pivot_val = lows[idx - prd]
-    return pivot_val if pivot_val == window.min() else None
+from .. import kernels
 
 
 def _add_to_array(vals: List, poss: List, val: float, bar_index: int, keep: int):
@@ -157,13 +140,15 @@ class TrendLine(Indicator):
         bpos: List = [None] * PPnum
 
         bar_index = len(df) - 1
-        for i in range(len(df)):
-            ph = _pivot_high(highs, i, prd)
-            pl = _pivot_low(lows, i, prd)
-            if ph is not None:
-                _add_to_array(tval, tpos, ph, i, PPnum)
-            if pl is not None:
-                _add_to_array(bval, bpos, pl, i, PPnum)
+        # pivothigh/pivotlow(prd, prd)：第 i 根K线确认 i-prd 处的枢轴
+        ph_mask = kernels.pivot_mask(highs, prd, prd, "max")
+        pl_mask = kernels.pivot_mask(lows, prd, prd, "min")
+        for p in np.flatnonzero(ph_mask | pl_mask):
+            i = int(p) + prd
+            if ph_mask[p]:
+                _add_to_array(tval, tpos, highs[p], i, PPnum)
+            if pl_mask[p]:
+                _add_to_array(bval, bpos, lows[p], i, PPnum)
 
         blines, tlines = _build_lines(bval, bpos, tval, tpos, prd, maxline=3, bar_index=bar_index, closes=closes)
         direction, dist_pct = _pick_direction_and_distance(blines, tlines, bar_index, closes[-1])
@@ -1,8 +1,11 @@
 """大资金操盘扫描器 - Smart Money Concepts 完整复刻"""
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Sequence
 from ..base import Indicator, IndicatorMeta, register
+from .. import kernels
+from ..primitives import primitives
 
 PIVOT = 5
 
@@ -39,20 +42,20 @@ def identify_swing_points(df: pd.DataFrame, pivot: int) -> List[Dict]:
     low = df["low"].values
 
     # 使用滚动窗口找局部极值
-    for idx in range(pivot, n - pivot):
-        window_high = high[idx - pivot : idx + pivot + 1]
-        window_low = low[idx - pivot : idx + pivot + 1]
-
-        if high[idx] >= window_high.max():
+    high_mask = kernels.pivot_mask(high, pivot, pivot, "max")
+    low_mask = kernels.pivot_mask(low, pivot, pivot, "min")
+    for idx in np.flatnonzero(high_mask | low_mask).tolist():
+        if high_mask[idx]:
             points.append({"index": idx, "price": float(high[idx]), "type": "high"})
-        if low[idx] <= window_low.min():
+        if low_mask[idx]:
             points.append({"index": idx, "price": float(low[idx]), "type": "low"})
 
     return points
 
 
-def evaluate_structure(df: pd.DataFrame, pivots: Sequence[Dict]) -> StructureState:
-    ema = df["close"].ewm(span=34, adjust=False).mean()
+def evaluate_structure(df: pd.DataFrame, pivots: Sequence[Dict], ema: pd.Series = None) -> StructureState:
+    if ema is None:
+        ema = df["close"].ewm(span=34, adjust=False).mean()
     bias = "bull" if df["close"].iloc[-1] >= ema.iloc[-1] else "bear"
     swing_high = next((p["price"] for p in reversed(pivots) if p["type"] == "high"), None)
     swing_low = next((p["price"] for p in reversed(pivots) if p["type"] == "low"), None)
@@ -169,7 +172,7 @@ class TvBigMoney(Indicator):
             return self._make_insufficient_result(df, symbol, interval, {"信号": None})
 
         pivots = identify_swing_points(df, PIVOT)
-        structure = evaluate_structure(df, pivots)
+        structure = evaluate_structure(df, pivots, primitives(df, symbol, interval).ema(34))
         order_block = detect_order_block(df, structure.bias)
         fvg = detect_fvg(df)
         zone = calc_zone(df, 100)
@@ -1,7 +1,7 @@
 """多空信号扫描器 - Smoothed Heikin Ashi 完整复刻"""
-import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from .. import kernels
 
 SMOOTH1 = 10
 SMOOTH2 = 10
@@ -18,10 +18,8 @@ def calculate_smoothed_heikin_ashi(df: pd.DataFrame) -> dict:
     df_raw["c_smooth"] = df_raw["close"].ewm(span=SMOOTH1, adjust=False).mean()
 
     ha_close = (df_raw["o_smooth"] + df_raw["h_smooth"] + df_raw["l_smooth"] + df_raw["c_smooth"]) / 4
-    ha_open = pd.Series(np.nan, index=df_raw.index)
-    ha_open.iloc[0] = (df_raw["o_smooth"].iloc[0] + df_raw["c_smooth"].iloc[0]) / 2
-    for i in range(1, len(df_raw)):
-        ha_open.iloc[i] = (ha_open.iloc[i - 1] + ha_close.iloc[i - 1]) / 2
+    first = (df_raw["o_smooth"].iloc[0] + df_raw["c_smooth"].iloc[0]) / 2
+    ha_open = pd.Series(kernels.half_avg(first, ha_close.to_numpy(dtype=float)), index=df_raw.index)
 
     ha_high = pd.concat([df_raw["h_smooth"], ha_open, ha_close], axis=1).max(axis=1)
     ha_low = pd.concat([df_raw["l_smooth"], ha_open, ha_close], axis=1).min(axis=1)
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 from typing import Dict, Tuple
 from ..base import Indicator, IndicatorMeta, register
+from ..primitives import primitives
 from ..safe_calc import safe_rsi, safe_atr
 
 RSI_PERIODS = [7, 14, 21]
@@ -54,7 +55,7 @@ def detect_divergence(df: pd.DataFrame, rsi: pd.Series, lookback: int = 50) -> T
 
 
 def evaluate_rsi_state(df: pd.DataFrame, rsi_7: pd.Series, rsi_14: pd.Series,
-                       rsi_21: pd.Series, overbought: float, oversold: float) -> Dict:
+                       rsi_21: pd.Series, overbought: float, oversold: float, ema: pd.Series = None) -> Dict:
     current_rsi_7 = rsi_7.iloc[-1]
     current_rsi_14 = rsi_14.iloc[-1]
     current_rsi_21 = rsi_21.iloc[-1]
@@ -66,7 +67,8 @@ def evaluate_rsi_state(df: pd.DataFrame, rsi_7: pd.Series, rsi_14: pd.Series,
 
     rsi_avg = np.mean(valid_rsi)
     close = df["close"]
-    ema = close.ewm(span=EMA_TREND_PERIOD, adjust=False).mean()
+    if ema is None:
+        ema = close.ewm(span=EMA_TREND_PERIOD, adjust=False).mean()
     trend = "bullish" if close.iloc[-1] > ema.iloc[-1] else "bearish"
 
     in_oversold = sum(1 for v in valid_rsi if v < oversold)
@@ -140,7 +142,8 @@ class TvRSI(Indicator):
         rsi_14, status_14 = safe_rsi(close, RSI_PERIODS[1], min_period=3)
         rsi_21, status_21 = safe_rsi(close, RSI_PERIODS[2], min_period=3)
 
-        rsi_state = evaluate_rsi_state(df, rsi_7, rsi_14, rsi_21, overbought, oversold)
+        rsi_state = evaluate_rsi_state(df, rsi_7, rsi_14, rsi_21, overbought, oversold,
+                                       primitives(df, symbol, interval).ema(EMA_TREND_PERIOD))
 
         # 背离检测需要更多数据
         if len(df) >= 50:
@@ -1,16 +1,14 @@
 """趋势云反转扫描器 - SMMA200 + K线反转形态完整复刻"""
-import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from .. import kernels
+from ..primitives import primitives
 
 
 def calculate_smma(src: pd.Series, length: int) -> pd.Series:
-    smma = pd.Series(np.nan, index=src.index)
     sma_first = src.rolling(window=length).mean()
-    smma.iloc[length - 1] = sma_first.iloc[length - 1]
-    for i in range(length, len(src)):
-        smma.iloc[i] = (smma.iloc[i - 1] * (length - 1) + src.iloc[i]) / length
-    return smma
+    seed = sma_first.iloc[length - 1]
+    return pd.Series(kernels.smma(src.to_numpy(dtype=float), length, seed), index=src.index)
 
 
 def detect_3line_strike(df: pd.DataFrame) -> str:
@@ -50,7 +48,7 @@ class TvTrendCloud(Indicator):
 
         close = df["close"]
         smma200 = calculate_smma(close, 200)
-        ema2 = close.ewm(span=2, adjust=False).mean()
+        ema2 = primitives(df, symbol, interval).ema(2)
 
         signal_3ls = detect_3line_strike(df)
         signal_eng = detect_engulfing(df)
@@ -2,16 +2,19 @@
 import pandas as pd
 from typing import Dict
 from ..base import Indicator, IndicatorMeta, register
+from ..primitives import primitives
 
 MA_PERIODS = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 90, 100]
 
 
-def calculate_ribbon(df: pd.DataFrame) -> Dict:
+def calculate_ribbon(df: pd.DataFrame, ema=None) -> Dict:
+    """ema: 可选 EMA 取用函数 ema(period) -> Series（共享原语缓存）"""
     if len(df) < MA_PERIODS[-1]:
         return {"signal": "观望", "strength": 0.0, "direction": "震荡"}
 
     close = df["close"]
-    ma_lines = {period: close.ewm(span=period, adjust=False).mean() for period in MA_PERIODS}
+    ma_lines = {period: ema(period) if ema else close.ewm(span=period, adjust=False).mean()
+                for period in MA_PERIODS}
     ma_last = {period: ma_lines[period].iloc[-1] for period in MA_PERIODS}
     ma100 = ma_last[100]
     current = close.iloc[-1]
@@ -48,7 +51,7 @@ class TvVolumeSignal(Indicator):
         if not self._check_data(df):
             return self._make_insufficient_result(df, symbol, interval, {"信号": None})
 
-        result = calculate_ribbon(df)
+        result = calculate_ribbon(df, primitives(df, symbol, interval).ema)
         return self._make_result(df, symbol, interval, {
             "信号": result["signal"],
             "方向": result["direction"],
@@ -2,6 +2,7 @@
 import math
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel, last_turnover, turnover
 
 
 @register
@@ -14,9 +15,47 @@ class VolumeRatio(Indicator):
         vol = df["volume"]
         avg = vol.rolling(20, min_periods=20).mean()
         ratio = vol / avg
-        cur = ratio.iloc[-1]
-        if math.isnan(cur) or math.isinf(cur):
+        data = self._data(ratio.iloc[-1], float(df["close"].iloc[-1]), last_turnover(df))
+        if data is None:
             return self._make_insufficient_result(df, symbol, interval, {"量比": None, "信号概述": None})
+        return self._make_result(df, symbol, interval, data)
+
+    def compute_batch(self, frames, interval):
+        out = {}
+        ready = {}
+        for symbol, df in frames.items():
+            if self._check_data(df):
+                ready[symbol] = df
+            else:
+                out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"量比": None, "信号概述": None})]
+        if ready:
+            panel = Panel(ready)
+            vol = panel["volume"]
+            last = panel.tail(vol / vol.rolling(20, min_periods=20).mean())[0]
+            for j, (symbol, df) in enumerate(ready.items()):
+                data = self._data(last[j], float(df["close"].iloc[-1]), last_turnover(df))
+                if data is None:
+                    out[symbol] = [self._make_insufficient_record(df, symbol, interval, {"量比": None, "信号概述": None})]
+                else:
+                    out[symbol] = [self._make_record(df, symbol, interval, data)]
+        return {symbol: out[symbol] for symbol in frames}
+
+    def _series(self, df, symbol, interval, start):
+        vol = df["volume"]
+        ratio = (vol / vol.rolling(20, min_periods=20).mean()).to_numpy()
+        closes, quotes = df["close"].to_numpy(dtype=float), turnover(df)
+        records = []
+        for i in range(start, len(df)):
+            data = self._data(ratio[i], float(closes[i]), quotes[i])
+            if data is None:
+                data = self._insufficient_data({"量比": None, "信号概述": None})
+            records.append(self._make_record(df, symbol, interval, data, df.index[i]))
+        return records
+
+    @staticmethod
+    def _data(cur, close, quote):
+        if math.isnan(cur) or math.isinf(cur):
+            return None
         if cur > 5:
             signal = "极值放量"
         elif cur > 2:
@@ -27,11 +66,9 @@ class VolumeRatio(Indicator):
             signal = "缩量"
         else:
             signal = "正常"
-        quote = df.get("quote_volume", df["volume"] * df["close"])
-        turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
-        return self._make_result(df, symbol, interval, {
+        return {
             "量比": round(float(cur), 4),
             "信号概述": signal,
-            "成交额": turnover,
-            "当前价格": float(df["close"].iloc[-1]),
-        })
+            "成交额": quote,
+            "当前价格": close,
+        }
@@ -0,0 +1,175 @@
+"""
+期货情绪历史缓存
+
+按周期批量加载各币种最近 limit 根期货情绪数据（一条 symbol = ANY(...) 窗口查询），
+之后按各币种水位线增量刷新（CACHE_TTL 秒内不重复查询）；
+期货情绪聚合表、缺口监控共用，一轮计算每个周期至多一到两次查询。
+数据按列存放（每币种一组 numpy 数组，NULL 为 NaN），便于跨币种向量化统计。
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+LOG = logging.getLogger("indicator_service.futures_history")
+
+# 列顺序与查询一致
+FIELDS = ("oi", "oiv", "ctlsr", "tlsr", "lsr", "tlsvr")
+HISTORY_LIMIT = 240
+CACHE_TTL = 60
+_WINDOW = pd.Timedelta(days=30)
+
+_SELECT = ("sum_open_interest, sum_open_interest_value, count_toptrader_long_short_ratio, "
+           "sum_toptrader_long_short_ratio, count_long_short_ratio, sum_taker_long_short_vol_ratio")
+
+
+@dataclass
+class MetricsHistory:
+    """单币种期货情绪历史（按时间升序）"""
+    ts: np.ndarray                  # int64 UTC 纳秒
+    values: Dict[str, np.ndarray]   # FIELDS -> float64
+    closed: np.ndarray              # bool
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def datetimes(self) -> List[datetime]:
+        return list(pd.DatetimeIndex(self.ts, tz="UTC").to_pydatetime())
+
+    def tail(self, limit: int, since: int) -> "MetricsHistory":
+        """保留 since 之后的最近 limit 根"""
+        keep = np.flatnonzero(self.ts > since)[-limit:]
+        return MetricsHistory(self.ts[keep], {k: v[keep] for k, v in self.values.items()}, self.closed[keep])
+
+
+# {interval: {symbol: MetricsHistory}}
+_HISTORY: Dict[str, Dict[str, MetricsHistory]] = {}
+# 已查询过的币种（含无数据的），避免重复窗口查询: {interval: set}
+_KNOWN: Dict[str, set] = {}
+_REFRESHED: Dict[str, float] = {}
+_LOCK = threading.Lock()
+
+
+def _table(interval: str):
+    """期货只有 5m 原始表与 15m/1h/4h/1d/1w 物化视图；时间列均为 UTC naive TIMESTAMP"""
+    if interval == "5m":
+        return "binance_futures_metrics_5m", "create_time", "is_closed"
+    return f"binance_futures_metrics_{interval}_last", "bucket", "complete"
+
+
+def _fetch(sql: str, params: tuple) -> list:
+    import psycopg
+    from ..config import config
+
+    with psycopg.connect(config.db_url) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _group(rows: list) -> Dict[str, MetricsHistory]:
+    """(symbol, time, *FIELDS, closed) 行（按 symbol, time 排序）-> {symbol: MetricsHistory}"""
+    if not rows:
+        return {}
+    index = pd.DatetimeIndex([r[1] for r in rows])
+    index = index.tz_convert("UTC") if index.tz is not None else index.tz_localize("UTC")
+    ts = index.as_unit("ns").asi8
+    values = np.array([r[2:2 + len(FIELDS)] for r in rows], dtype=np.float64).reshape(len(rows), len(FIELDS))
+    closed = np.array([bool(r[-1]) for r in rows])
+    syms = [r[0] for r in rows]
+    bounds = [0] + [i for i in range(1, len(syms)) if syms[i] != syms[i - 1]] + [len(syms)]
+
+    out = {}
+    for a, b in zip(bounds, bounds[1:]):
+        out[syms[a]] = MetricsHistory(
+            ts[a:b].copy(), {f: values[a:b, j].copy() for j, f in enumerate(FIELDS)}, closed[a:b].copy()
+        )
+    return out
+
+
+def _load_window(interval: str, symbols: List[str], limit: int) -> Dict[str, MetricsHistory]:
+    table, time_col, closed_col = _table(interval)
+    sql = f"""
+        WITH ranked AS (
+            SELECT symbol, {time_col} AS t, {_SELECT}, {closed_col} AS x,
+                   ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY {time_col} DESC) AS rn
+            FROM market_data.{table}
+            WHERE symbol = ANY(%s) AND {time_col} > (NOW() AT TIME ZONE 'UTC') - INTERVAL '30 days'
+        )
+        SELECT symbol, t, {_SELECT}, x FROM ranked WHERE rn <= %s
+        ORDER BY symbol, t
+    """
+    return _group(_fetch(sql, (symbols, limit)))
+
+
+def _load_delta(interval: str, watermarks: Dict[str, int]) -> Dict[str, MetricsHistory]:
+    """各币种水位线（含）之后的行；最新一根可能未闭合，重新取回覆盖
+
+    时间列是 naive TIMESTAMP，水位线按 naive UTC 传入；若传 timestamptz，比较时列值会按会话时区转换而错位
+    """
+    table, time_col, closed_col = _table(interval)
+    syms = list(watermarks)
+    marks = [pd.Timestamp(watermarks[s]).to_pydatetime() for s in syms]
+    sql = f"""
+        SELECT m.symbol, m.{time_col}, {", ".join("m." + c for c in _SELECT.split(", "))}, m.{closed_col}
+        FROM market_data.{table} m
+        JOIN unnest(%s::text[], %s::timestamp[]) AS w(symbol, last_ts) ON m.symbol = w.symbol
+        WHERE m.symbol = ANY(%s) AND m.{time_col} >= %s AND m.{time_col} >= w.last_ts
+        ORDER BY m.symbol, m.{time_col}
+    """
+    return _group(_fetch(sql, (syms, marks, syms, min(marks))))
+
+
+def _merge(old: MetricsHistory, new: MetricsHistory, limit: int, since: int) -> MetricsHistory:
+    keep = old.ts < new.ts[0]
+    merged = MetricsHistory(
+        np.concatenate([old.ts[keep], new.ts]),
+        {f: np.concatenate([old.values[f][keep], new.values[f]]) for f in FIELDS},
+        np.concatenate([old.closed[keep], new.closed]),
+    )
+    return merged.tail(limit, since)
+
+
+def load_history(symbols: Iterable[str], interval: str, limit: int = HISTORY_LIMIT) -> Dict[str, MetricsHistory]:
+    """获取各币种最近 limit 根期货情绪历史，返回 {symbol: MetricsHistory}（无数据的币种缺省）"""
+    symbols = list(dict.fromkeys(symbols))
+    with _LOCK:
+        cache = _HISTORY.setdefault(interval, {})
+        known = _KNOWN.setdefault(interval, set())
+        now = time.time()
+        stale = now - _REFRESHED.get(interval, 0) >= CACHE_TTL
+        since = (pd.Timestamp.now(tz="UTC") - _WINDOW).value
+
+        try:
+            if stale and cache:
+                watermarks = {s: int(h.ts[-1]) for s, h in cache.items() if len(h)}
+                for symbol, new in _load_delta(interval, watermarks).items():
+                    cache[symbol] = _merge(cache[symbol], new, limit, since)
+                for symbol in list(cache):
+                    cache[symbol] = cache[symbol].tail(limit, since)
+                    if not len(cache[symbol]):
+                        del cache[symbol]
+                # 无数据（含已过期）的币种重新窗口查询
+                known.intersection_update(cache)
+            if stale:
+                _REFRESHED[interval] = now
+
+            missing = [s for s in symbols if s not in known]
+            if missing:
+                cache.update(_load_window(interval, missing, limit))
+                known.update(missing)
+        except Exception as e:
+            LOG.debug("期货情绪历史加载失败 %s: %s", interval, e)
+
+        return {s: cache[s] for s in symbols if s in cache and len(cache[s])}
+
+
+def clear_history():
+    """清空缓存（测试 / 重连后使用）"""
+    with _LOCK:
+        _HISTORY.clear()
+        _KNOWN.clear()
+        _REFRESHED.clear()
@@ -1,7 +1,13 @@
 """ATR 波幅指标"""
 import math
+from collections import deque
+
+import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel, last_turnover
+from ..primitives import primitives
+from .state import NAN, EwmState, RollingMeanState, StreamState, bar_turnover, to_float
 
 
 def calc_atr(df: pd.DataFrame) -> pd.Series:
@@ -14,6 +20,36 @@ def calc_atr(df: pd.DataFrame) -> pd.Series:
     return tr.ewm(alpha=1/14, adjust=False, min_periods=14).mean()
 
 
+def calc_atr_wide(panel: Panel) -> pd.DataFrame:
+    """宽表版 calc_atr：三者取最大（跳过 NaN）与 concat().max(axis=1) 一致"""
+    high, low, close = panel["high"], panel["low"], panel["close"]
+    prev_close = close.shift(1)
+    tr = np.fmax(np.fmax((high - low).abs().to_numpy(), (high - prev_close).abs().to_numpy()),
+                 (low - prev_close).abs().to_numpy())
+    return pd.DataFrame(tr, columns=panel.symbols).ewm(alpha=1/14, adjust=False, min_periods=14).mean()
+
+
+def _fields(atr_val: float, close: float, mid: float, recent: np.ndarray, turnover: float) -> dict:
+    """recent: 最近 30 个 ATR 中的非 NaN 值"""
+    atr_pct = atr_val / close * 100 if close else 0
+    upper = mid + 2 * atr_val
+    lower = mid - 2 * atr_val
+    if not len(recent):
+        category = "未知"
+    else:
+        median = float(np.median(recent))
+        category = "升温" if atr_val > median * 1.1 else "降温" if atr_val < median * 0.9 else "稳定"
+    return {
+        "波动分类": category,
+        "ATR百分比": round(atr_pct, 4),
+        "上轨": round(upper, 6),
+        "中轨": round(mid, 6),
+        "下轨": round(lower, 6),
+        "成交额": turnover,
+        "当前价格": close,
+    }
+
+
 @register
 class ATR(Indicator):
     meta = IndicatorMeta(name="ATR波幅扫描器.py", lookback=60, is_incremental=True)
@@ -21,29 +57,51 @@ class ATR(Indicator):
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if len(df) < 60:
             return pd.DataFrame()
-        atr = calc_atr(df)
-        atr_val = float(atr.iloc[-1])
-        close = float(df["close"].iloc[-1])
-        atr_pct = atr_val / close * 100 if close else 0
-        mid = df["close"].rolling(20, min_periods=20).mean().iloc[-1]
+        p = primitives(df, symbol, interval)
+        atr = p.atr(14, min_periods=14)
+        mid = p.sma(20, min_periods=20).iloc[-1]
         if math.isnan(mid):
             return pd.DataFrame()
-        upper = mid + 2 * atr_val
-        lower = mid - 2 * atr_val
-        recent = atr.tail(30).dropna()
-        if recent.empty:
-            category = "未知"
-        else:
-            median = recent.median()
-            category = "升温" if atr_val > median * 1.1 else "降温" if atr_val < median * 0.9 else "稳定"
-        quote = df.get("quote_volume", df["volume"] * df["close"])
-        turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
-        return self._make_result(df, symbol, interval, {
-            "波动分类": category,
-            "ATR百分比": round(atr_pct, 4),
-            "上轨": round(upper, 6),
-            "中轨": round(mid, 6),
-            "下轨": round(lower, 6),
-            "成交额": turnover,
-            "当前价格": close,
-        })
+        recent = atr.tail(30).dropna().to_numpy()
+        return self._make_result(df, symbol, interval, _fields(
+            float(atr.iloc[-1]), float(df["close"].iloc[-1]), mid, recent, last_turnover(df)))
+
+    def compute_batch(self, frames, interval):
+        panel = Panel(frames)
+        if not len(panel):
+            return {}
+        atr = panel.tail(calc_atr_wide(panel), 30)
+        mid = panel.tail(panel["close"].rolling(20, min_periods=20).mean())[0]
+        out = {}
+        for j, (symbol, df) in enumerate(frames.items()):
+            if len(df) < 60 or math.isnan(mid[j]):
+                out[symbol] = []
+                continue
+            recent = atr[:, j]
+            recent = recent[~np.isnan(recent)]
+            out[symbol] = [self._make_record(df, symbol, interval, _fields(
+                float(atr[-1, j]), float(df["close"].iloc[-1]), mid[j], recent, last_turnover(df)))]
+        return out
+
+    def create_state(self):
+        state = StreamState()
+        state.prev_close = NAN
+        state.atr = EwmState(alpha=1/14, min_periods=14)
+        state.mid = RollingMeanState(20)
+        state.recent = deque(maxlen=30)
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        high, low, close = to_float(bar["high"]), to_float(bar["low"]), to_float(bar["close"])
+        prev_close, state.prev_close = state.prev_close, close
+        parts = [v for v in (abs(high - low), abs(high - prev_close), abs(low - prev_close)) if v == v]
+        tr = max(parts) if parts else NAN
+        atr_val = state.atr.update(tr)
+        state.recent.append(atr_val)
+        mid = state.mid.update(close)
+        if state.count + 1 < 60 or math.isnan(mid):
+            return pd.DataFrame()
+
+        recent = np.array([v for v in state.recent if v == v])
+        return self._make_result(None, symbol, interval, _fields(
+            atr_val, close, mid, recent, bar_turnover(bar)), timestamp=timestamp)
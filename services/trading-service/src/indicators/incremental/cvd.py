@@ -1,6 +1,9 @@
 """CVD 主动成交差指标"""
+from collections import deque
+
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from .state import CumSumState, StreamState, to_float
 
 
 @register
@@ -22,3 +25,34 @@ class CVD(Indicator):
             "CVD值": float(cvd.iloc[-1]),
             "变化率": float(change),
         })
+
+    def create_state(self):
+        state = StreamState()
+        state.cvd = CumSumState()
+        state.recent = deque(maxlen=360)
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        if "taker_buy_volume" not in bar:
+            return pd.DataFrame()
+        vol = to_float(bar["volume"])
+        if vol != vol:
+            vol = 0.0
+        buy = to_float(bar["taker_buy_volume"])
+        if buy != buy:
+            buy = vol * 0.5
+        sell = vol - buy
+        if sell < 0.0:
+            sell = 0.0
+        cvd = state.cvd.update(buy - sell)
+        state.recent.append(cvd)
+        n = state.count + 1
+        if n < 2:
+            return pd.DataFrame()
+        # 与 compute 一致: base = cvd[-min(360, n-1)]
+        base = state.recent[1] if n <= 360 else state.recent[0]
+        change = (cvd - base) / (abs(base) + 1e-9)
+        return self._make_result(None, symbol, interval, {
+            "CVD值": float(cvd),
+            "变化率": float(change),
+        }, timestamp=timestamp)
@@ -2,6 +2,8 @@
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..primitives import primitives
+from .state import EwmState, StreamState, to_float
 
 EMA_PERIODS = (7, 25, 99)
 
@@ -39,9 +41,8 @@ class EmaGC(Indicator):
             return pd.DataFrame()
 
         close = df["close"].astype(float)
-        ema7 = close.ewm(span=7, adjust=False, min_periods=1).mean()
-        ema25 = close.ewm(span=25, adjust=False, min_periods=1).mean()
-        ema99 = close.ewm(span=99, adjust=False, min_periods=1).mean()
+        p = primitives(df, symbol, interval)
+        ema7, ema25, ema99 = (p.ema(span, min_periods=1) for span in EMA_PERIODS)
 
         price = float(close.iloc[-1])
         e7, e25, e99 = float(ema7.iloc[-1]), float(ema25.iloc[-1]), float(ema99.iloc[-1])
@@ -57,3 +58,22 @@ class EmaGC(Indicator):
             "趋势方向": trend,
             "带宽评分": round(bandwidth, 2),
         })
+
+    def create_state(self):
+        state = StreamState()
+        state.emas = [EwmState(span=p, min_periods=1) for p in EMA_PERIODS]
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        price = to_float(bar["close"])
+        e7, e25, e99 = (ema.update(price) for ema in state.emas)
+        if state.count + 1 < 100:
+            return pd.DataFrame()
+        return self._make_result(None, symbol, interval, {
+            "EMA7": round(e7, 6),
+            "EMA25": round(e25, 6),
+            "EMA99": round(e99, 6),
+            "价格": price,
+            "趋势方向": _trend_bias(e7, e25, e99, price),
+            "带宽评分": round(_bandwidth_score(e7, e25, e99, price), 2),
+        }, timestamp=timestamp)
@@ -2,7 +2,7 @@
 import pandas as pd
 from datetime import timezone
 from typing import Optional, Dict
-from ..base import Indicator, IndicatorMeta, register
+from ..base import FUTURES, Indicator, IndicatorMeta, register
 
 # 缓存 {interval: {symbol: data}}
 _METRICS_CACHE: Dict[str, Dict[str, dict]] = {}
@@ -74,7 +74,7 @@ def get_metrics_cache(interval: str = "5m") -> Dict[str, dict]:
 
 @register
 class FuturesSentiment(Indicator):
-    meta = IndicatorMeta(name="期货情绪元数据.py", lookback=1, is_incremental=True)
+    meta = IndicatorMeta(name="期货情绪元数据.py", lookback=1, is_incremental=True, inputs=(FUTURES,))
 
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         # 期货数据只有 5m/15m/1h/4h/1d/1w，跳过1m
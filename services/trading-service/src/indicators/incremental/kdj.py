@@ -1,6 +1,9 @@
 """KDJ 随机指标"""
+import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel, last_turnover
+from .state import NAN, EwmState, RollingExtremaState, StreamState, bar_turnover, to_float
 
 
 def calc_kdj(df: pd.DataFrame):
@@ -16,17 +19,32 @@ def calc_kdj(df: pd.DataFrame):
 def get_signal(k: pd.Series, d: pd.Series, j: pd.Series) -> str:
     if len(k) < 2:
         return "数据不足"
-    if k.iloc[-2] <= d.iloc[-2] and k.iloc[-1] > d.iloc[-1]:
+    return _cross_signal(k.iloc[-2], k.iloc[-1], d.iloc[-2], d.iloc[-1], j.iloc[-1])
+
+
+def _cross_signal(k0, k1, d0, d1, j1) -> str:
+    if k0 <= d0 and k1 > d1:
         return "金叉"
-    if k.iloc[-2] >= d.iloc[-2] and k.iloc[-1] < d.iloc[-1]:
+    if k0 >= d0 and k1 < d1:
         return "死叉"
-    if j.iloc[-1] > 100:
+    if j1 > 100:
         return "J>100 极值"
-    if j.iloc[-1] < 0:
+    if j1 < 0:
         return "J<0 极值"
     return "延续"
 
 
+def _fields(signal: str, k, d, j, turnover: float, close) -> dict:
+    return {
+        "J值": round(float(j), 3),
+        "K值": round(float(k), 3),
+        "D值": round(float(d), 3),
+        "信号概述": signal,
+        "成交额": turnover,
+        "当前价格": float(close),
+    }
+
+
 @register
 class KDJ(Indicator):
     meta = IndicatorMeta(name="KDJ随机指标扫描器.py", lookback=50, is_incremental=True)
@@ -38,13 +56,47 @@ class KDJ(Indicator):
         if k.isna().iloc[-1] or d.isna().iloc[-1] or j.isna().iloc[-1]:
             return pd.DataFrame()
         signal = get_signal(k, d, j)
-        quote = df.get("quote_volume", df["volume"] * df["close"])
-        turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
-        return self._make_result(df, symbol, interval, {
-            "J值": round(float(j.iloc[-1]), 3),
-            "K值": round(float(k.iloc[-1]), 3),
-            "D值": round(float(d.iloc[-1]), 3),
-            "信号概述": signal,
-            "成交额": turnover,
-            "当前价格": float(df["close"].iloc[-1]),
-        })
+        return self._make_result(df, symbol, interval, _fields(
+            signal, k.iloc[-1], d.iloc[-1], j.iloc[-1], last_turnover(df), df["close"].iloc[-1]))
+
+    def compute_batch(self, frames, interval):
+        panel = Panel(frames)
+        if not len(panel):
+            return {}
+        k, d, j = (panel.tail(x, 2) for x in calc_kdj(panel))
+        out = {}
+        for c, (symbol, df) in enumerate(frames.items()):
+            k1, d1, j1 = k[1, c], d[1, c], j[1, c]
+            if len(df) < 40 or np.isnan(k1) or np.isnan(d1) or np.isnan(j1):
+                out[symbol] = []
+                continue
+            signal = _cross_signal(k[0, c], k1, d[0, c], d1, j1)
+            out[symbol] = [self._make_record(df, symbol, interval, _fields(
+                signal, k1, d1, j1, last_turnover(df), df["close"].iloc[-1]))]
+        return out
+
+    def create_state(self):
+        state = StreamState()
+        state.low_n = RollingExtremaState(9, mode="min")
+        state.high_n = RollingExtremaState(9, mode="max")
+        state.k = EwmState(alpha=1/3, min_periods=3)
+        state.d = EwmState(alpha=1/3, min_periods=3)
+        state.prev = (NAN, NAN)
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        close = to_float(bar["close"])
+        low_n = state.low_n.update(bar["low"])
+        high_n = state.high_n.update(bar["high"])
+        span = high_n - low_n
+        # 区间为 0 时 pandas 得到 inf/NaN，ewm 会按 NaN 处理
+        rsv = (close - low_n) / span * 100 if span != 0 else NAN
+        k = state.k.update(rsv)
+        d = state.d.update(k)
+        j = 3 * k - 2 * d
+        prev, state.prev = state.prev, (k, d)
+        if state.count + 1 < 40 or k != k or d != d or j != j:
+            return pd.DataFrame()
+        signal = _cross_signal(prev[0], k, prev[1], d, j)
+        return self._make_result(None, symbol, interval, _fields(
+            signal, k, d, j, bar_turnover(bar), bar["close"]), timestamp=timestamp)
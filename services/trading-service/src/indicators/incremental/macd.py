@@ -1,11 +1,16 @@
 """MACD 柱状指标"""
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from ..panel import Panel, last_turnover
+from ..primitives import primitives
+from .state import EwmState, StreamState, bar_turnover
 
 
-def calc_macd(close: pd.Series):
-    ema12 = close.ewm(span=12, adjust=False).mean()
-    ema26 = close.ewm(span=26, adjust=False).mean()
+def calc_macd(close: pd.Series, ema12: pd.Series = None, ema26: pd.Series = None):
+    if ema12 is None:
+        ema12 = close.ewm(span=12, adjust=False).mean()
+    if ema26 is None:
+        ema26 = close.ewm(span=26, adjust=False).mean()
     dif = ema12 - ema26
     dea = dif.ewm(span=9, adjust=False).mean()
     macd = 2 * (dif - dea)
@@ -15,18 +20,35 @@ def calc_macd(close: pd.Series):
 def get_signal(macd: pd.Series, dif: pd.Series, dea: pd.Series) -> str:
     if len(macd) < 2:
         return "数据不足"
+    return _cross_signal(macd.iloc[-2], macd.iloc[-1], dif.iloc[-2], dif.iloc[-1], dea.iloc[-2], dea.iloc[-1])
+
+
+def _cross_signal(macd0, macd1, dif0, dif1, dea0, dea1) -> str:
     crossed = ""
-    if macd.iloc[-2] <= 0 < macd.iloc[-1]:
+    if macd0 <= 0 < macd1:
         crossed = "零轴上穿"
-    elif macd.iloc[-2] >= 0 > macd.iloc[-1]:
+    elif macd0 >= 0 > macd1:
         crossed = "零轴下破"
-    if dif.iloc[-2] <= dea.iloc[-2] and dif.iloc[-1] > dea.iloc[-1]:
+    if dif0 <= dea0 and dif1 > dea1:
         return "金叉" + (f"/{crossed}" if crossed else "")
-    if dif.iloc[-2] >= dea.iloc[-2] and dif.iloc[-1] < dea.iloc[-1]:
+    if dif0 >= dea0 and dif1 < dea1:
         return "死叉" + (f"/{crossed}" if crossed else "")
     return crossed or "延续"
 
 
+def _fields(signal: str, dif, dea, macd, turnover: float, close) -> dict:
+    return {
+        "信号概述": signal,
+        "MACD": round(float(dif), 6),
+        "MACD信号线": round(float(dea), 6),
+        "MACD柱状图": round(float(macd), 6),
+        "DIF": round(float(dif), 6),
+        "DEA": round(float(dea), 6),
+        "成交额": turnover,
+        "当前价格": float(close),
+    }
+
+
 @register
 class MACD(Indicator):
     meta = IndicatorMeta(name="MACD柱状扫描器.py", lookback=50, is_incremental=True)
@@ -34,17 +56,43 @@ class MACD(Indicator):
     def compute(self, df: pd.DataFrame, symbol: str, interval: str) -> pd.DataFrame:
         if len(df) < 35:
             return pd.DataFrame()
-        dif, dea, macd = calc_macd(df["close"])
+        p = primitives(df, symbol, interval)
+        dif, dea, macd = calc_macd(df["close"], p.ema(12), p.ema(26))
         signal = get_signal(macd, dif, dea)
-        quote = df.get("quote_volume", df["volume"] * df["close"])
-        turnover = float(quote.iloc[-1]) if not pd.isna(quote.iloc[-1]) else 0
-        return self._make_result(df, symbol, interval, {
-            "信号概述": signal,
-            "MACD": round(float(dif.iloc[-1]), 6),
-            "MACD信号线": round(float(dea.iloc[-1]), 6),
-            "MACD柱状图": round(float(macd.iloc[-1]), 6),
-            "DIF": round(float(dif.iloc[-1]), 6),
-            "DEA": round(float(dea.iloc[-1]), 6),
-            "成交额": turnover,
-            "当前价格": float(df["close"].iloc[-1]),
-        })
+        return self._make_result(df, symbol, interval, _fields(
+            signal, dif.iloc[-1], dea.iloc[-1], macd.iloc[-1], last_turnover(df), df["close"].iloc[-1]))
+
+    def compute_batch(self, frames, interval):
+        panel = Panel(frames)
+        if not len(panel):
+            return {}
+        dif, dea, macd = (panel.tail(x, 2) for x in calc_macd(panel["close"]))
+        out = {}
+        for j, (symbol, df) in enumerate(frames.items()):
+            if len(df) < 35:
+                out[symbol] = []
+                continue
+            signal = _cross_signal(macd[0, j], macd[1, j], dif[0, j], dif[1, j], dea[0, j], dea[1, j])
+            out[symbol] = [self._make_record(df, symbol, interval, _fields(
+                signal, dif[1, j], dea[1, j], macd[1, j], last_turnover(df), df["close"].iloc[-1]))]
+        return out
+
+    def create_state(self):
+        state = StreamState()
+        state.ema12 = EwmState(span=12)
+        state.ema26 = EwmState(span=26)
+        state.dea = EwmState(span=9)
+        state.prev = None
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        close = bar["close"]
+        dif = state.ema12.update(close) - state.ema26.update(close)
+        dea = state.dea.update(dif)
+        macd = 2 * (dif - dea)
+        prev, state.prev = state.prev, (macd, dif, dea)
+        if state.count + 1 < 35:
+            return pd.DataFrame()
+        signal = _cross_signal(prev[0], macd, prev[1], dif, prev[2], dea)
+        return self._make_result(None, symbol, interval, _fields(
+            signal, dif, dea, macd, bar_turnover(bar), close), timestamp=timestamp)
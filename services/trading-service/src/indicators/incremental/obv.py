@@ -1,7 +1,10 @@
 """OBV 能量潮指标"""
+from collections import deque
+
 import numpy as np
 import pandas as pd
 from ..base import Indicator, IndicatorMeta, register
+from .state import NAN, CumSumState, StreamState, to_float
 
 
 @register
@@ -20,3 +23,26 @@ class OBV(Indicator):
             "OBV值": float(obv.iloc[-1]),
             "OBV变化率": float(change),
         })
+
+    def create_state(self):
+        state = StreamState()
+        state.prev_close = NAN
+        state.obv = CumSumState()
+        state.recent = deque(maxlen=30)
+        return state
+
+    def _update(self, state, bar, symbol, interval, timestamp) -> pd.DataFrame:
+        close = to_float(bar["close"])
+        diff = close - state.prev_close
+        state.prev_close = close
+        direction = float(np.sign(diff)) if diff == diff else 0.0
+        obv = state.obv.update(direction * to_float(bar["volume"]))
+        state.recent.append(obv)
+        if state.count + 1 < 32:
+            return pd.DataFrame()
+        base = state.recent[0]
+        change = (obv - base) / max(abs(base), 1e-9)
+        return self._make_result(None, symbol, interval, {
+            "OBV值": float(obv),
+            "OBV变化率": float(change),
+        }, timestamp=timestamp)
@@ -0,0 +1,97 @@
+"""
+流式计算一致性校验
+
+对同一段K线历史，逐根比较 update() 与 compute() 的输出，任何字段不一致即记录。
+
+用法:
+    python -m src.indicators.incremental.parity --csv klines.csv --symbol BTCUSDT --interval 5m
+    （csv 需包含 bucket_ts, open, high, low, close, volume 等列）
+"""
+import argparse
+import math
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from ..base import get_incremental_indicators
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b and type(a) is type(b)
+
+
+def _diff_records(expected: pd.DataFrame, actual: pd.DataFrame) -> Optional[Dict]:
+    if expected.empty and actual.empty:
+        return None
+    if expected.empty != actual.empty or list(expected.columns) != list(actual.columns):
+        return {"expected": expected.to_dict("records"), "actual": actual.to_dict("records")}
+    exp, act = expected.to_dict("records")[0], actual.to_dict("records")[0]
+    fields = {k: (exp[k], act[k]) for k in exp if not _same(exp[k], act[k])}
+    return fields or None
+
+
+def check_parity(indicator, df: pd.DataFrame, symbol: str, interval: str, warmup: int = 0) -> List[Dict]:
+    """
+    校验单个指标的流式结果与 compute() 是否逐位一致
+
+    前 warmup 根K线通过 seed() 预热，之后逐根 update()，
+    每一步都与 compute(df[:i+1]) 对比。返回不一致列表（空列表表示完全一致）。
+    """
+    state = indicator.create_state()
+    if state is None:
+        raise ValueError(f"{indicator.meta.name} 不支持流式计算")
+
+    mismatches = []
+    if warmup > 0:
+        indicator.seed(state, df.iloc[:warmup], symbol, interval)
+        diff = _diff_records(indicator.compute(df.iloc[:warmup], symbol, interval), state.result)
+        if diff:
+            mismatches.append({"index": warmup - 1, "ts": df.index[warmup - 1], "diff": diff})
+
+    records = df.to_dict("records")
+    for i in range(warmup, len(df)):
+        actual = indicator.update(state, records[i], symbol, interval, df.index[i])
+        expected = indicator.compute(df.iloc[:i + 1], symbol, interval)
+        diff = _diff_records(expected, actual)
+        if diff:
+            mismatches.append({"index": i, "ts": df.index[i], "diff": diff})
+    return mismatches
+
+
+def check_all(df: pd.DataFrame, symbol: str, interval: str, warmup: int = 0) -> Dict[str, List[Dict]]:
+    """校验所有支持流式计算的增量指标"""
+    report = {}
+    for name, cls in get_incremental_indicators().items():
+        ind = cls()
+        if ind.create_state() is None:
+            continue
+        report[name] = check_parity(ind, df, symbol, interval, warmup)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式指标一致性校验")
+    parser.add_argument("--csv", required=True, help="K线 CSV 文件")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--interval", default="5m")
+    parser.add_argument("--warmup", type=int, default=0, help="seed 预热K线数")
+    args = parser.parse_args()
+
+    from ... import indicators  # noqa - 触发指标注册
+
+    df = pd.read_csv(args.csv, parse_dates=["bucket_ts"]).set_index("bucket_ts")
+    report = check_all(df, args.symbol, args.interval, args.warmup)
+    failed = 0
+    for name, mismatches in report.items():
+        status = "OK" if not mismatches else f"{len(mismatches)} 处不一致"
+        print(f"{name}: {status}")
+        for m in mismatches[:3]:
+            print(f"    #{m['index']} {m['ts']}: {m['diff']}")
+        failed += bool(mismatches)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
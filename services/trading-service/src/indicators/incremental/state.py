@@ -0,0 +1,284 @@
+"""
+流式计算状态
+
+逐根K线推进的 O(1) 状态原语，数值上逐位复刻 pandas 的实现：
+- EwmState: Series.ewm(adjust=False, ignore_na=False).mean()
+- RollingMeanState: Series.rolling(n).mean()（含 Kahan 补偿与同值修正）
+- RollingExtremaState: Series.rolling(n).min() / max()（单调队列）
+
+StateStore 按 (指标名, 交易对, 周期) 保存各指标的流式状态。
+"""
+import math
+from collections import deque
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+NAN = float("nan")
+
+
+def to_float(x) -> float:
+    """转 float，无法转换时返回 NaN（与 astype(float) 一致）"""
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _clean(x) -> float:
+    """与 pandas 窗口函数的预处理一致：转 float，inf 视为 NaN"""
+    try:
+        x = float(x)
+    except (TypeError, ValueError):
+        return NAN
+    return NAN if math.isinf(x) else x
+
+
+class EwmState:
+    """指数加权均值（adjust=False）"""
+
+    __slots__ = ("old_wt_factor", "new_wt", "min_periods", "weighted", "old_wt", "nobs", "started")
+
+    def __init__(self, span: float = None, alpha: float = None, min_periods: int = 0):
+        # 与 pandas 相同：先换算为质心再求 alpha，保证浮点结果一致
+        if span is not None:
+            com = (span - 1) / 2
+        elif alpha is not None:
+            com = (1 - alpha) / alpha
+        else:
+            raise ValueError("span 或 alpha 必须指定其一")
+        a = 1.0 / (1.0 + float(com))
+        self.old_wt_factor = 1.0 - a
+        self.new_wt = a
+        self.min_periods = max(int(min_periods), 1)
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+        self.started = False
+
+    def update(self, x) -> float:
+        x = _clean(x)
+        is_obs = x == x
+        if not self.started:
+            self.started = True
+            self.weighted = x
+            self.nobs = int(is_obs)
+        else:
+            self.nobs += is_obs
+            if self.weighted == self.weighted:
+                self.old_wt *= self.old_wt_factor
+                if is_obs:
+                    # 常数序列时避免数值误差
+                    if self.weighted != x:
+                        self.weighted = (self.old_wt * self.weighted + self.new_wt * x) / (self.old_wt + self.new_wt)
+                    self.old_wt = 1.0
+            elif is_obs:
+                self.weighted = x
+        return self.weighted if self.nobs >= self.min_periods else NAN
+
+
+class RollingMeanState:
+    """滚动均值（复刻 pandas roll_mean 的增删补偿逻辑）"""
+
+    __slots__ = ("window", "min_periods", "values", "nobs", "sum_x", "neg_ct",
+                 "comp_add", "comp_remove", "same_ct", "prev_value")
+
+    def __init__(self, window: int, min_periods: int = None):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.comp_add = 0.0
+        self.comp_remove = 0.0
+        self.same_ct = 0
+        self.prev_value = None
+
+    def _add(self, val: float):
+        if val == val:
+            self.nobs += 1
+            y = val - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.same_ct += 1
+            else:
+                self.same_ct = 1
+            self.prev_value = val
+
+    def _remove(self, val: float):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.comp_remove
+            t = self.sum_x + y
+            self.comp_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def update(self, x) -> float:
+        x = _clean(x)
+        if self.prev_value is None:
+            self.prev_value = x
+        # pandas 先删后加
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(x)
+        self._add(x)
+
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.same_ct >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.0
+            return result
+        return NAN
+
+
+class RollingExtremaState:
+    """滚动最小/最大值（单调队列，均摊 O(1)）"""
+
+    __slots__ = ("window", "min_periods", "is_max", "queue", "flags", "nobs", "index")
+
+    def __init__(self, window: int, min_periods: int = None, mode: str = "min"):
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.is_max = mode == "max"
+        self.queue = deque()   # (序号, 值)，值单调
+        self.flags = deque()   # 窗口内每个位置是否为有效值
+        self.nobs = 0
+        self.index = 0
+
+    def update(self, x) -> float:
+        x = _clean(x)
+        i = self.index
+        self.index += 1
+
+        is_obs = x == x
+        self.flags.append(is_obs)
+        self.nobs += is_obs
+        if len(self.flags) > self.window:
+            self.nobs -= self.flags.popleft()
+
+        if is_obs:
+            q = self.queue
+            if self.is_max:
+                while q and q[-1][1] <= x:
+                    q.pop()
+            else:
+                while q and q[-1][1] >= x:
+                    q.pop()
+            q.append((i, x))
+        while self.queue and self.queue[0][0] <= i - self.window:
+            self.queue.popleft()
+
+        if self.nobs >= max(self.min_periods, 1) and self.queue:
+            return self.queue[0][1]
+        return NAN
+
+
+class CumSumState:
+    """累计和（NaN 位置输出 NaN，不中断累加，与 Series.cumsum 一致）"""
+
+    __slots__ = ("total",)
+
+    def __init__(self):
+        self.total = None
+
+    def update(self, x) -> float:
+        x = to_float(x)
+        if x != x:
+            return NAN
+        self.total = x if self.total is None else self.total + x
+        return self.total
+
+
+class StreamState:
+    """单个 (指标, 交易对, 周期) 的流式状态容器"""
+
+    def __init__(self):
+        self.count = 0          # 已推进的K线数
+        self.last_ts = None     # 最后一根K线时间
+        self.last_bar = None    # 最后一根K线的 OHLCV（用于检测回写）
+        self.result = pd.DataFrame()
+
+
+_BAR_KEYS = ("open", "high", "low", "close", "volume")
+
+
+def bar_turnover(bar: Dict[str, Any]) -> float:
+    """单根K线成交额，与 df.get("quote_volume", volume * close) 取末值一致"""
+    if "quote_volume" in bar:
+        quote = bar["quote_volume"]
+    else:
+        quote = to_float(bar.get("volume")) * to_float(bar.get("close"))
+    return float(quote) if not pd.isna(quote) else 0
+
+
+def _bar_key(bar: Dict[str, Any]) -> Tuple:
+    """K线指纹（NaN 记为 None，便于比较）"""
+    key = []
+    for k in _BAR_KEYS:
+        v = _clean(bar.get(k))
+        key.append(v if v == v else None)
+    return tuple(key)
+
+
+def iter_bars(df: pd.DataFrame):
+    """逐行产出 (时间戳, K线字典)"""
+    for ts, bar in zip(df.index, df.to_dict("records")):
+        yield ts, bar
+
+
+class StateStore:
+    """流式状态仓库 {(指标名, 交易对, 周期): StreamState}"""
+
+    def __init__(self):
+        self._states: Dict[Tuple[str, str, str], StreamState] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def advance(self, indicator, df: pd.DataFrame, symbol: str, interval: str) -> Optional[pd.DataFrame]:
+        """把 df 中新出现的K线推进到状态，返回最新结果
+
+        以下情况用 df 重新预热（O(N)）：首次出现、K线不连续、最后一根K线被回写。
+        指标不支持流式计算时返回 None。
+        """
+        key = (indicator.meta.name, symbol, interval)
+        with self._lock:
+            state = self._states.get(key)
+        if df is None or df.empty:
+            return pd.DataFrame()
+
+        if state is not None and state.last_ts is not None:
+            index = df.index
+            pos = index.searchsorted(state.last_ts)
+            continuous = pos < len(index) and index[pos] == state.last_ts
+            if continuous and _bar_key(df.iloc[pos].to_dict()) == state.last_bar:
+                for ts, bar in iter_bars(df.iloc[pos + 1:]):
+                    indicator.update(state, bar, symbol, interval, ts)
+                state.last_bar = _bar_key(df.iloc[-1].to_dict())
+                return state.result
+
+        state = indicator.create_state()
+        if state is None:
+            return None
+        indicator.seed(state, df, symbol, interval)
+        state.last_bar = _bar_key(df.iloc[-1].to_dict())
+        with self._lock:
+            self._states[key] = state
+        return state.result
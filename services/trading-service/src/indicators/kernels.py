@@ -0,0 +1,270 @@
+"""
+指标数值内核
+
+各指标中逐元素递推 / 滑窗的 Python 循环集中到这里，按可用性选择后端：
+- numba: 递推循环 JIT 编译
+- scipy: 线性递推（EMA / Wilder）走 scipy.signal.lfilter
+- numpy: 滑窗与逐元素运算向量化；非线性递推在 Python list 上循环（避免 ndarray 标量索引开销）
+
+所有后端与原循环实现逐位一致（同样的运算顺序），可用 KERNEL_BACKEND 环境变量强制指定。
+基准: python src/scripts/bench_kernels.py
+"""
+import logging
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LOG = logging.getLogger("indicator_service.kernels")
+
+
+def _detect_backend() -> str:
+    forced = os.environ.get("KERNEL_BACKEND", "").strip().lower()
+    if forced == "numpy":
+        return "numpy"
+    if forced in ("", "numba"):
+        try:
+            import numba  # noqa
+            return "numba"
+        except ImportError:
+            pass
+    if forced in ("", "numba", "scipy"):
+        try:
+            from scipy.signal import lfilter  # noqa
+            return "scipy"
+        except ImportError:
+            pass
+    return "numpy"
+
+
+BACKEND = _detect_backend()
+LOG.debug("指标内核后端: %s", BACKEND)
+
+
+# ==================== 递推循环 ====================
+# 只用下标访问和 len()，同一份代码既可在 list 上运行，也可交给 numba 编译
+
+def _ewm_loop(x, alpha, out):
+    beta = 1.0 - alpha
+    prev = x[0]
+    out[0] = prev
+    for i in range(1, len(x)):
+        prev = prev * beta + x[i] * alpha
+        out[i] = prev
+
+
+def _smma_loop(x, length, seed, out):
+    prev = seed
+    out[length - 1] = prev
+    for i in range(length, len(x)):
+        prev = (prev * (length - 1) + x[i]) / length
+        out[i] = prev
+
+
+def _half_avg_loop(src, first, out):
+    prev = first
+    out[0] = prev
+    for i in range(1, len(src)):
+        prev = (prev + src[i - 1]) / 2
+        out[i] = prev
+
+
+def _supertrend_loop(close, upper, lower, final_upper, final_lower, supertrend, direction):
+    final_upper[0] = upper[0]
+    final_lower[0] = lower[0]
+    supertrend[0] = 0.0
+    direction[0] = 1
+    for i in range(1, len(close)):
+        # 与内置 min/max 的比较顺序一致（含 NaN 时结果相同）
+        if close[i - 1] > final_upper[i - 1]:
+            final_upper[i] = upper[i]
+        else:
+            final_upper[i] = final_upper[i - 1] if final_upper[i - 1] < upper[i] else upper[i]
+        if close[i - 1] < final_lower[i - 1]:
+            final_lower[i] = lower[i]
+        else:
+            final_lower[i] = final_lower[i - 1] if final_lower[i - 1] > lower[i] else lower[i]
+
+        if supertrend[i - 1] == final_upper[i - 1]:
+            direction[i] = -1 if close[i] > final_upper[i] else 1
+        else:
+            direction[i] = 1 if close[i] < final_lower[i] else -1
+        supertrend[i] = final_upper[i] if direction[i] == 1 else final_lower[i]
+
+
+def _band_trend_loop(close, upper, lower, trend):
+    last_cross = -1
+    trend[0] = 0
+    for i in range(1, len(close)):
+        if close[i - 1] <= upper[i] and close[i] > upper[i]:
+            trend[i] = 1
+            if trend[i - 1] != 1:
+                last_cross = i
+        elif close[i - 1] >= lower[i] and close[i] < lower[i]:
+            trend[i] = -1
+            if trend[i - 1] != -1:
+                last_cross = i
+        else:
+            trend[i] = trend[i - 1]
+    return last_cross
+
+
+if BACKEND == "numba":
+    from numba import njit
+
+    _ewm_loop = njit(cache=True)(_ewm_loop)
+    _smma_loop = njit(cache=True)(_smma_loop)
+    _half_avg_loop = njit(cache=True)(_half_avg_loop)
+    _supertrend_loop = njit(cache=True)(_supertrend_loop)
+    _band_trend_loop = njit(cache=True)(_band_trend_loop)
+
+
+def _run(loop, inputs, params, outputs):
+    """执行递推循环：numba 直接传 ndarray，其余后端转 list 循环后写回"""
+    if BACKEND == "numba":
+        return loop(*inputs, *params, *outputs)
+    bufs = [out.tolist() for out in outputs]
+    ret = loop(*[x.tolist() for x in inputs], *params, *bufs)
+    for out, buf in zip(outputs, bufs):
+        out[:] = buf
+    return ret
+
+
+def _as_float(x) -> np.ndarray:
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+# ==================== 公开内核 ====================
+
+def ewm_recursive(x, alpha: float) -> np.ndarray:
+    """y[0] = x[0], y[i] = y[i-1]*(1-alpha) + x[i]*alpha（Wilder 平滑 alpha=1/n，EMA alpha=2/(n+1)）"""
+    x = _as_float(x)
+    if len(x) == 0:
+        return x.copy()
+    if BACKEND == "scipy":
+        return _ewm_lfilter(x, alpha)
+    out = np.empty_like(x)
+    _run(_ewm_loop, (x,), (float(alpha),), (out,))
+    return out
+
+
+def _ewm_lfilter(x: np.ndarray, alpha: float) -> np.ndarray:
+    # 直接II型转置: y[n] = b0*x[n] + z, z = -a1*y[n]，与循环的乘加顺序相同
+    from scipy.signal import lfilter
+    beta = 1.0 - alpha
+    out = np.empty_like(x)
+    out[0] = x[0]
+    if len(x) > 1:
+        out[1:], _ = lfilter([alpha], [1.0, -beta], x[1:], zi=[beta * x[0]])
+    return out
+
+
+def wilder_smooth(x, period: int) -> np.ndarray:
+    """Wilder 平滑 (RMA)"""
+    return ewm_recursive(x, 1.0 / period)
+
+
+def ema(x, period: int) -> np.ndarray:
+    """EMA（首值为种子）"""
+    return ewm_recursive(x, 2.0 / (period + 1))
+
+
+def smma(x, length: int, seed: float) -> np.ndarray:
+    """Pine SMMA: 第 length-1 位取种子（通常为 SMA），之后 y = (y*(n-1) + x) / n，之前为 NaN"""
+    x = _as_float(x)
+    out = np.full_like(x, np.nan)
+    if len(x) >= length:
+        _run(_smma_loop, (x,), (length, float(seed)), (out,))
+    return out
+
+
+def half_avg(first: float, src) -> np.ndarray:
+    """y[0] = first, y[i] = (y[i-1] + src[i-1]) / 2（Heikin Ashi 开盘价）"""
+    src = _as_float(src)
+    out = np.empty_like(src)
+    if len(src):
+        _run(_half_avg_loop, (src,), (float(first),), (out,))
+    return out
+
+
+def true_range(high, low, close) -> np.ndarray:
+    """TR = max(H-L, |H-前C|, |L-前C|)，首根为 H-L"""
+    high, low, close = _as_float(high), _as_float(low), _as_float(close)
+    tr = high - low
+    if len(tr) > 1:
+        prev = close[:-1]
+        tr[1:] = np.maximum(np.maximum(tr[1:], np.abs(high[1:] - prev)), np.abs(low[1:] - prev))
+    return tr
+
+
+def directional_movement(high, low):
+    """+DM / -DM（首根为 0）"""
+    high, low = _as_float(high), _as_float(low)
+    plus_dm = np.zeros_like(high)
+    minus_dm = np.zeros_like(low)
+    if len(high) > 1:
+        up = high[1:] - high[:-1]
+        down = low[:-1] - low[1:]
+        plus_dm[1:] = np.where((up > down) & (up > 0), up, 0.0)
+        minus_dm[1:] = np.where((down > up) & (down > 0), down, 0.0)
+    return plus_dm, minus_dm
+
+
+def rolling_max(x, window: int) -> np.ndarray:
+    """完整窗口的滚动最大值，长度 len(x) - window + 1"""
+    x = _as_float(x)
+    if len(x) < window:
+        return np.empty(0)
+    return sliding_window_view(x, window).max(axis=1)
+
+
+def rolling_min(x, window: int) -> np.ndarray:
+    """完整窗口的滚动最小值，长度 len(x) - window + 1"""
+    x = _as_float(x)
+    if len(x) < window:
+        return np.empty(0)
+    return sliding_window_view(x, window).min(axis=1)
+
+
+def rolling_mad(x, center, window: int) -> np.ndarray:
+    """平均绝对偏差: mean(|x[i:i+window] - center[i]|)，center 长度为 len(x) - window + 1"""
+    x = _as_float(x)
+    center = _as_float(center)
+    if len(center) == 0:
+        return np.empty(0)
+    dev = np.abs(sliding_window_view(x, window)[:len(center)] - center[:, None])
+    return dev.mean(axis=1)
+
+
+def pivot_mask(x, left: int, right: int, mode: str = "max") -> np.ndarray:
+    """x[i] 是否为 [i-left, i+right] 窗口内的极值（边界处为 False）"""
+    x = _as_float(x)
+    mask = np.zeros(len(x), dtype=bool)
+    span = left + right + 1
+    if len(x) < span:
+        return mask
+    windows = sliding_window_view(x, span)
+    extreme = windows.max(axis=1) if mode == "max" else windows.min(axis=1)
+    mask[left:len(x) - right] = x[left:len(x) - right] == extreme
+    return mask
+
+
+def supertrend(close, upper, lower):
+    """SuperTrend 轨道递推，返回 (final_upper, final_lower, supertrend, direction)；direction 1=下跌, -1=上涨"""
+    close, upper, lower = _as_float(close), _as_float(upper), _as_float(lower)
+    n = len(close)
+    final_upper, final_lower, st = np.empty(n), np.empty(n), np.empty(n)
+    direction = np.empty(n, dtype=np.int64)
+    if n:
+        _run(_supertrend_loop, (close, upper, lower), (), (final_upper, final_lower, st, direction))
+    return final_upper, final_lower, st, direction
+
+
+def band_trend(close, upper, lower):
+    """收盘价突破上下轨的趋势状态，返回 (trend, 最近一次翻转位置或 None)"""
+    close, upper, lower = _as_float(close), _as_float(upper), _as_float(lower)
+    trend = np.zeros(len(close), dtype=np.int64)
+    if len(close) == 0:
+        return trend, None
+    last_cross = _run(_band_trend_loop, (close, upper, lower), (), (trend,))
+    return trend, (None if last_cross < 0 else int(last_cross))
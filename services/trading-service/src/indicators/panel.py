@@ -0,0 +1,73 @@
+"""
+多币种宽表
+
+把同一周期多个币种的K线按列右对齐拼成 (bars × symbols) 宽表，左侧补 NaN。
+pandas 的 rolling / ewm / diff 在宽表上按列独立计算，与逐币种 Series 结果逐位一致，
+一次调用即可完成全部币种，用于 Indicator.compute_batch 的向量化实现。
+
+注意: where(cond, 0) 之类会把左侧补位的 NaN 变成 0，需用 Panel.mask 还原。
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+class Panel:
+    """右对齐宽表：panel["close"] -> (bars × symbols) DataFrame"""
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self.frames = frames
+        self.symbols: List[str] = list(frames)
+        self.lengths = np.array([len(df) for df in frames.values()], dtype=np.int64)
+        self.rows = int(self.lengths.max()) if len(self.lengths) else 0
+        self._cache: Dict[str, pd.DataFrame] = {}
+        self._valid = None
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, column: str) -> pd.DataFrame:
+        wide = self._cache.get(column)
+        if wide is None:
+            arr = np.full((self.rows, len(self.symbols)), np.nan)
+            for j, df in enumerate(self.frames.values()):
+                n = len(df)
+                if n:
+                    arr[self.rows - n:, j] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            wide = pd.DataFrame(arr, columns=self.symbols)
+            self._cache[column] = wide
+        return wide
+
+    @property
+    def valid(self) -> np.ndarray:
+        """(bars × symbols) 布尔矩阵，True 表示真实数据（非左侧补位）"""
+        if self._valid is None:
+            self._valid = np.arange(self.rows)[:, None] >= (self.rows - self.lengths)[None, :]
+        return self._valid
+
+    def mask(self, wide: pd.DataFrame) -> pd.DataFrame:
+        """把左侧补位还原为 NaN"""
+        return wide.where(self.valid)
+
+    def tail(self, wide: pd.DataFrame, k: int = 1) -> np.ndarray:
+        """取最后 k 行，返回 (k × symbols) ndarray"""
+        return wide.to_numpy()[-k:]
+
+
+def last_turnover(df: pd.DataFrame) -> float:
+    """末根K线成交额，与各指标 df.get("quote_volume", volume * close) 取值一致"""
+    if "quote_volume" in df.columns:
+        quote = df["quote_volume"].iloc[-1]
+    else:
+        quote = df["volume"].iloc[-1] * df["close"].iloc[-1]
+    return float(quote) if not pd.isna(quote) else 0
+
+
+def turnover(df: pd.DataFrame) -> List[float]:
+    """逐根成交额，每项与对应位置的 last_turnover 取值一致"""
+    if "quote_volume" in df.columns:
+        quote = df["quote_volume"].to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        quote = df["volume"].to_numpy(dtype=np.float64, na_value=np.nan) * df["close"].to_numpy(dtype=np.float64)
+    return [float(q) if not np.isnan(q) else 0 for q in quote]
@@ -0,0 +1,205 @@
+"""
+K线派生原语缓存
+
+同一轮计算中多个指标在同一份 K 线上重复计算相同的中间序列（EMA、真实波幅 / ATR、
+Wilder RSI、滚动均值与高低点）。这里按 (symbol, interval) 记录当前帧签名，
+签名内按 (原语, 参数) 缓存结果，指标通过 primitives(df, symbol, interval) 取用：
+
+    p = primitives(df, symbol, interval)
+    ema12, atr = p.ema(12), p.atr(14, min_periods=14)
+
+帧签名 = 根数、首末时间、末根 OHLCV 与收盘价缓冲区地址；K 线推进（末根时间变化）时
+整组淘汰，未闭合 K 线更新或缓存刷新出新快照时签名随之变化，不会读到旧值。
+各原语与指标原有的 pandas 写法逐位一致；返回的 Series 为共享对象，调用方只读。
+PRIMITIVE_CACHE=0 关闭缓存（每次直接计算）。
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+import numpy as np
+import pandas as pd
+
+LOG = logging.getLogger("indicator_service.primitives")
+
+ENABLED = os.environ.get("PRIMITIVE_CACHE", "1") != "0"
+_FRAMES_PER_KEY = 2      # 每个 (symbol, interval) 同时保留的帧签名数（同一根 K 线的不同窗口切片）
+_MAX_KEYS = 4096         # (symbol, interval) 上限，超出按最久未用淘汰
+
+
+def _signature(df: pd.DataFrame) -> Tuple:
+    if df.empty:
+        return (0,)
+    close = df["close"].to_numpy()
+    last = df.iloc[-1]
+    ohlcv = tuple(float(last[c]) if c in df.columns else None for c in ("open", "high", "low", "close", "volume"))
+    return (len(df), df.index[0], df.index[-1], ohlcv, close.__array_interface__["data"][0])
+
+
+class PrimitiveCache:
+    """进程内原语缓存：{(symbol, interval): {帧签名: {(原语, 参数): (值, 计算秒数)}}}"""
+
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self._frames: "OrderedDict[Tuple[str, str], OrderedDict]" = OrderedDict()
+        # {原语: [命中, 未命中, 计算秒数, 节省秒数]}
+        self._stats: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, symbol: str, interval: str, key: Tuple[Hashable, ...], fn: Callable):
+        if not self.enabled:
+            return fn()
+        owner, sig = (symbol, interval), _signature(df)
+        with self._lock:
+            frame = self._frames.get(owner, {}).get(sig)
+            if frame is not None and key in frame:
+                value, cost = frame[key]
+                stat = self._stats.setdefault(key[0], [0, 0, 0.0, 0.0])
+                stat[0] += 1
+                stat[3] += cost
+                self._frames.move_to_end(owner)
+                return value
+
+        t0 = time.perf_counter()
+        value = fn()
+        cost = time.perf_counter() - t0
+
+        with self._lock:
+            stat = self._stats.setdefault(key[0], [0, 0, 0.0, 0.0])
+            stat[1] += 1
+            stat[2] += cost
+            frames = self._frames.setdefault(owner, OrderedDict())
+            self._frames.move_to_end(owner)
+            if sig not in frames:
+                # K 线推进：淘汰末根时间更早的帧
+                for old in [s for s in frames if len(s) > 1 and len(sig) > 1 and s[2] < sig[2]]:
+                    del frames[old]
+                frames[sig] = {}
+                while len(frames) > _FRAMES_PER_KEY:
+                    frames.popitem(last=False)
+            frames[sig][key] = (value, cost)
+            while len(self._frames) > _MAX_KEYS:
+                self._frames.popitem(last=False)
+        return value
+
+    def report(self, reset: bool = True) -> Dict[str, Dict[str, float]]:
+        """{原语: {hits, misses, compute_s, saved_s}}；reset=True 时取走计数（每轮计算调用一次）"""
+        with self._lock:
+            out = {name: {"hits": s[0], "misses": s[1], "compute_s": s[2], "saved_s": s[3]}
+                   for name, s in self._stats.items()}
+            if reset:
+                self._stats = {}
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._stats = {}
+
+
+_cache = PrimitiveCache()
+
+
+def get_primitive_cache() -> PrimitiveCache:
+    return _cache
+
+
+def merge_reports(*reports: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """累加多个分片的原语报告"""
+    out: Dict[str, Dict[str, float]] = {}
+    for report in reports:
+        for name, stat in (report or {}).items():
+            acc = out.setdefault(name, {"hits": 0, "misses": 0, "compute_s": 0.0, "saved_s": 0.0})
+            for k, v in stat.items():
+                acc[k] += v
+    return out
+
+
+def format_report(report: Dict[str, Dict[str, float]]) -> str:
+    """单行摘要: 总命中率 / 节省耗时 + 各原语命中数"""
+    hits = sum(s["hits"] for s in report.values())
+    total = hits + sum(s["misses"] for s in report.values())
+    if not total:
+        return "无原语调用"
+    saved = sum(s["saved_s"] for s in report.values())
+    parts = ", ".join(f"{name} {int(s['hits'])}/{int(s['hits'] + s['misses'])}"
+                      for name, s in sorted(report.items(), key=lambda kv: -kv[1]["saved_s"]))
+    return f"命中率 {hits / total:.0%} ({hits}/{total}), 节省 {saved * 1000:.1f}ms: {parts}"
+
+
+class Primitives:
+    """单帧原语访问器"""
+
+    __slots__ = ("df", "symbol", "interval")
+
+    def __init__(self, df: pd.DataFrame, symbol: str, interval: str):
+        self.df = df
+        self.symbol = symbol
+        self.interval = interval
+
+    def _get(self, key: Tuple[Hashable, ...], fn: Callable):
+        return _cache.get(self.df, self.symbol, self.interval, key, fn)
+
+    @staticmethod
+    def _min_periods(series: pd.Series, base: pd.Series, min_periods: int) -> pd.Series:
+        # ewm 的 min_periods 只遮盖有效观测不足的位置，递推值与 min_periods=0 相同
+        if min_periods <= 1:
+            return base
+        return base.where(series.notna().cumsum() >= min_periods)
+
+    def ema(self, span: int, col: str = "close", min_periods: int = 0) -> pd.Series:
+        """df[col].ewm(span=span, adjust=False, min_periods=min_periods).mean()"""
+        base = self._get(("ema", col, span), lambda: self.df[col].ewm(span=span, adjust=False).mean())
+        if min_periods <= 1:
+            return base
+        return self._get(("ema", col, span, min_periods),
+                         lambda: self._min_periods(self.df[col], base, min_periods))
+
+    def tr(self) -> pd.Series:
+        """真实波幅: max(|H-L|, |H-前C|, |L-前C|)（跳过 NaN，首根为 |H-L|）"""
+        def calc():
+            high, low = self.df["high"], self.df["low"]
+            prev_close = self.df["close"].shift(1)
+            return pd.concat([(high - low).abs(), (high - prev_close).abs(), (low - prev_close).abs()],
+                             axis=1).max(axis=1)
+        return self._get(("tr",), calc)
+
+    def atr(self, length: int = 14, min_periods: int = 0) -> pd.Series:
+        """Wilder ATR: tr.ewm(alpha=1/length, adjust=False, min_periods=min_periods).mean()"""
+        tr = self.tr()
+        base = self._get(("atr", length), lambda: tr.ewm(alpha=1 / length, adjust=False).mean())
+        if min_periods <= 1:
+            return base
+        return self._get(("atr", length, min_periods), lambda: self._min_periods(tr, base, min_periods))
+
+    def rsi(self, period: int = 14, col: str = "close") -> pd.Series:
+        """Wilder RSI（adjust=False，平均跌幅为 0 时为 NaN）"""
+        def calc():
+            delta = self.df[col].diff()
+            gain = delta.where(delta > 0, 0).ewm(alpha=1 / period, adjust=False).mean()
+            loss = (-delta.where(delta < 0, 0)).ewm(alpha=1 / period, adjust=False).mean()
+            return 100 - (100 / (1 + gain / loss.replace(0, np.nan)))
+        return self._get(("rsi", col, period), calc)
+
+    def sma(self, window: int, col: str = "close", min_periods: int = None) -> pd.Series:
+        """df[col].rolling(window, min_periods=min_periods).mean()"""
+        return self._get(("sma", col, window, min_periods),
+                         lambda: self.df[col].rolling(window, min_periods=min_periods).mean())
+
+    def highest(self, window: int, col: str = "high", min_periods: int = None) -> pd.Series:
+        """df[col].rolling(window, min_periods=min_periods).max()"""
+        return self._get(("highest", col, window, min_periods),
+                         lambda: self.df[col].rolling(window, min_periods=min_periods).max())
+
+    def lowest(self, window: int, col: str = "low", min_periods: int = None) -> pd.Series:
+        """df[col].rolling(window, min_periods=min_periods).min()"""
+        return self._get(("lowest", col, window, min_periods),
+                         lambda: self.df[col].rolling(window, min_periods=min_periods).min())
+
+
+def primitives(df: pd.DataFrame, symbol: str, interval: str) -> Primitives:
+    """取当前帧的原语访问器"""
+    return Primitives(df, symbol, interval)
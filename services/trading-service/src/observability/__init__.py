@@ -9,12 +9,13 @@
 """
 from .logger import setup_logging, get_logger, log_context
 from .metrics import metrics, MetricsCollector
-from .tracing import Span, trace
+from .exporter import start_http_server
+from .tracing import Span, trace, current_context, export_traces
 from .alerting import alert, AlertLevel
 
 __all__ = [
     "setup_logging", "get_logger", "log_context",
-    "metrics", "MetricsCollector",
-    "Span", "trace",
+    "metrics", "MetricsCollector", "start_http_server",
+    "Span", "trace", "current_context", "export_traces",
     "alert", "AlertLevel",
 ]
@@ -0,0 +1,79 @@
+"""
+内嵌指标 HTTP 端点
+
+    GET /metrics       Prometheus 文本格式
+    GET /metrics.json  JSON 格式
+    GET /traces        最近的 trace（Chrome trace-event 格式，?format=otlp 为 OTLP-JSON）
+    GET /healthz       存活检查
+
+守护线程运行，随主进程退出；端口由 --metrics-port / METRICS_PORT 指定（0 为不启动）。
+"""
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .metrics import MetricsCollector, metrics
+from .tracing import to_chrome_trace, to_otlp_json
+
+LOG = logging.getLogger("indicator_service.exporter")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def _handler(collector: MetricsCollector):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            try:
+                if path == "/metrics":
+                    body, ctype = collector.to_prometheus(), PROMETHEUS_CONTENT_TYPE
+                elif path == "/metrics.json":
+                    body, ctype = collector.to_json(), "application/json; charset=utf-8"
+                elif path == "/traces":
+                    data = to_otlp_json() if "format=otlp" in query else to_chrome_trace()
+                    body, ctype = json.dumps(data, ensure_ascii=False), "application/json; charset=utf-8"
+                elif path == "/healthz":
+                    body, ctype = "ok\n", "text/plain; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+            except Exception as e:
+                LOG.warning(f"指标导出失败: {e}")
+                self.send_error(500)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):  # noqa: A002 - 抓取请求不写日志
+            pass
+
+    return Handler
+
+
+def start_http_server(port: int, host: str = "0.0.0.0", collector: MetricsCollector = None) -> ThreadingHTTPServer:
+    """启动指标端点（同一进程重复调用返回已启动的实例）；port=0 时由系统分配端口"""
+    global _server
+    if _server is not None:
+        return _server
+    server = ThreadingHTTPServer((host, port), _handler(collector or metrics))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    _server = server
+    LOG.info(f"指标端点: http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_http_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
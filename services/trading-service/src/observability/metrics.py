@@ -7,11 +7,14 @@
 - Histogram: 直方图（分布统计）
 - Summary: 摘要（百分位统计）
 
-指标存储在内存中，可通过 /metrics 端点暴露或写入文件
+指标存储在内存中，可通过 /metrics 端点暴露（见 exporter.py）或写入文件。
+进程池子进程用 drain() 取走本进程增量，随计算结果带回主进程 merge()。
 """
+import math
 import time
 import threading
 import json
+from bisect import bisect_left
 from pathlib import Path
 from datetime import datetime, timezone
 from dataclasses import dataclass, field
@@ -88,43 +91,100 @@ class Gauge:
 
 
 class Histogram:
-    """直方图 - 分布统计"""
+    """直方图 - 分布统计（桶计数非累积存储，导出时累积）"""
 
     DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
 
     def __init__(self, name: str, help_text: str = "", buckets: tuple = None):
         self.name = name
         self.help = help_text
-        self.buckets = buckets or self.DEFAULT_BUCKETS
-        self._counts: Dict[tuple, Dict[float, int]] = defaultdict(lambda: {b: 0 for b in self.buckets})
+        buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        if buckets[-1] != float("inf"):
+            buckets += (float("inf"),)
+        self.buckets = buckets
+        self._counts: Dict[tuple, List[int]] = {}
         self._sums: Dict[tuple, float] = defaultdict(float)
         self._totals: Dict[tuple, int] = defaultdict(int)
         self._lock = threading.Lock()
 
     def observe(self, value: float, **labels):
         key = tuple(sorted(labels.items()))
+        # 二分定位第一个 >= value 的桶；NaN 只计入总数
+        idx = bisect_left(self.buckets, value) if value == value else None
         with self._lock:
-            self._sums[key] += value
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+            if idx is not None:
+                counts[idx] += 1
+                self._sums[key] += value
             self._totals[key] += 1
-            for bucket in self.buckets:
-                if value <= bucket:
-                    self._counts[key][bucket] += 1
+
+    def cumulative(self, **labels) -> List[int]:
+        """各桶累积计数（le 语义）"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = list(self._counts.get(key, [0] * len(self.buckets)))
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+        return counts
+
+    def quantile(self, q: float, **labels) -> float:
+        """按桶线性插值估计分位数（同 PromQL histogram_quantile），无数据时为 NaN"""
+        counts = self.cumulative(**labels)
+        total = counts[-1]
+        if not total:
+            return math.nan
+        rank = q * total
+        for i, c in enumerate(counts):
+            if c >= rank:
+                upper = self.buckets[i]
+                lower = self.buckets[i - 1] if i else 0.0
+                if math.isinf(upper):
+                    return lower
+                prev = counts[i - 1] if i else 0
+                return lower + (upper - lower) * ((rank - prev) / (c - prev) if c > prev else 1.0)
+        return self.buckets[-2] if len(self.buckets) > 1 else math.nan
 
     def collect(self) -> List[MetricValue]:
         results = []
         with self._lock:
-            for key, buckets in self._counts.items():
-                labels = dict(key)
-                for bucket, count in buckets.items():
-                    results.append(MetricValue(
-                        count,
-                        {**labels, "le": str(bucket)},
-                    ))
-                results.append(MetricValue(self._sums[key], {**labels, "type": "sum"}))
-                results.append(MetricValue(self._totals[key], {**labels, "type": "count"}))
+            items = [(key, list(counts)) for key, counts in self._counts.items()]
+            sums, totals = dict(self._sums), dict(self._totals)
+        for key, counts in items:
+            labels = dict(key)
+            running = 0
+            for bucket, count in zip(self.buckets, counts):
+                running += count
+                results.append(MetricValue(running, {**labels, "le": _fmt_le(bucket)}))
+            results.append(MetricValue(sums.get(key, 0.0), {**labels, "type": "sum"}))
+            results.append(MetricValue(totals.get(key, 0), {**labels, "type": "count"}))
         return results
 
 
+def _fmt_le(bucket: float) -> str:
+    return "+Inf" if math.isinf(bucket) else repr(float(bucket))
+
+
+def _fmt_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _fmt_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
 class MetricsCollector:
     """指标收集器"""
 
@@ -159,20 +219,79 @@ class MetricsCollector:
         return result
 
     def to_prometheus(self) -> str:
-        """导出为 Prometheus 格式"""
+        """导出为 Prometheus 文本格式（直方图展开为 _bucket / _sum / _count）"""
+        with self._lock:
+            items = list(self._metrics.items())
         lines = []
-        for name, values in self.collect_all().items():
-            metric = self._metrics[name]
+        for name, metric in items:
             if metric.help:
                 lines.append(f"# HELP {name} {metric.help}")
             lines.append(f"# TYPE {name} {type(metric).__name__.lower()}")
-            for mv in values:
-                label_str = ",".join(f'{k}="{v}"' for k, v in mv.labels.items())
-                if label_str:
-                    lines.append(f"{name}{{{label_str}}} {mv.value}")
+            for mv in metric.collect():
+                labels = dict(mv.labels)
+                if isinstance(metric, Histogram):
+                    kind = labels.pop("type", None)
+                    suffix = f"_{kind}" if kind else "_bucket"
+                    lines.append(f"{name}{suffix}{_fmt_labels(labels)} {_fmt_value(mv.value)}")
+                else:
+                    lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(mv.value)}")
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> Dict[str, tuple]:
+        """
+        取走本进程的指标增量并清零计数器 / 直方图（进程池子进程调用）
+
+        返回 {name: (类型, help, buckets, 数据)}，可 pickle，由主进程 merge()
+        """
+        out = {}
+        with self._lock:
+            items = list(self._metrics.items())
+        for name, metric in items:
+            with metric._lock:
+                if isinstance(metric, Histogram):
+                    if not metric._totals:
+                        continue
+                    data = (metric._counts, dict(metric._sums), dict(metric._totals))
+                    metric._counts = {}
+                    metric._sums = defaultdict(float)
+                    metric._totals = defaultdict(int)
+                    out[name] = ("histogram", metric.help, metric.buckets, data)
+                elif isinstance(metric, Counter):
+                    if not metric._values:
+                        continue
+                    out[name] = ("counter", metric.help, None, dict(metric._values))
+                    metric._values = defaultdict(float)
                 else:
-                    lines.append(f"{name} {mv.value}")
-        return "\n".join(lines)
+                    if metric._values:
+                        out[name] = ("gauge", metric.help, None, dict(metric._values))
+        return out
+
+    def merge(self, snapshot: Dict[str, tuple]):
+        """合并子进程 drain() 的增量：计数器 / 直方图累加，仪表盘取子进程最新值"""
+        for name, (kind, help_text, buckets, data) in (snapshot or {}).items():
+            if kind == "histogram":
+                metric = self.histogram(name, help_text, buckets)
+                counts, sums, totals = data
+                with metric._lock:
+                    if metric.buckets != buckets:
+                        continue
+                    for key, c in counts.items():
+                        acc = metric._counts.setdefault(key, [0] * len(metric.buckets))
+                        for i, v in enumerate(c):
+                            acc[i] += v
+                    for key, v in sums.items():
+                        metric._sums[key] += v
+                    for key, v in totals.items():
+                        metric._totals[key] += v
+            elif kind == "counter":
+                metric = self.counter(name, help_text)
+                with metric._lock:
+                    for key, v in data.items():
+                        metric._values[key] += v
+            else:
+                metric = self.gauge(name, help_text)
+                with metric._lock:
+                    metric._values.update(data)
 
     def to_json(self) -> str:
         """导出为 JSON 格式"""
@@ -210,6 +329,12 @@ indicator_compute_duration = metrics.histogram(
     "指标计算耗时",
     buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
 )
+# 单指标单周期的单币种计算耗时（一批的总耗时 / 币种数；按 indicator / interval 标签看 p50 / p99）
+indicator_duration = metrics.histogram(
+    "indicator_duration_seconds",
+    "单指标单周期单币种计算耗时（批耗时 / 币种数）",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
 db_read_duration = metrics.histogram(
     "db_read_duration_seconds",
     "数据库读取耗时",
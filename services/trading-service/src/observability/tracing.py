@@ -4,17 +4,24 @@
 提供轻量级的分布式追踪能力：
 - Span: 追踪单元
 - trace: 装饰器/上下文管理器
-- 支持嵌套调用链
+- 支持嵌套调用链；跨线程 / 进程池用 current_context() 显式传递父上下文
+- 采样：根 Span 按 TRACE_SAMPLE_RATE 采样，未采样的 trace 若根 Span 超过 TRACE_SLOW_MS 或出错仍保留
+- 完成的 trace 存入有界环形缓冲（TRACE_BUFFER 条），可导出为 Chrome trace-event 或 OTLP-JSON
+
+进程池子进程：子进程内以 trace(..., parent=ctx) 开启本地根 Span，结束后 pop_trace_spans()
+取走该 trace 在子进程内的全部 Span，随结果带回主进程 ingest_spans() 合并。
 """
+import os
+import random
 import time
-import uuid
 import threading
 import json
 import logging
+from collections import OrderedDict, deque
 from pathlib import Path
 from datetime import datetime, timezone
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from contextlib import contextmanager
 from functools import wraps
 
@@ -23,19 +30,39 @@ LOG = logging.getLogger("tracing")
 # 线程本地存储当前 Span
 _current_span = threading.local()
 
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1"))
+SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "5000"))
+_max_traces = int(os.environ.get("TRACE_BUFFER", "50"))
+_MAX_SPANS_PER_TRACE = 20000
+_MAX_PENDING = 1000          # 进行中 trace 上限（根 Span 已结束后才完成的游离 Span 不会无限堆积）
+
+# 跨线程 / 进程传递的父上下文: (trace_id, span_id, sampled)
+SpanContext = Tuple[str, str, bool]
+
+
+def _trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
 
 @dataclass
 class Span:
     """追踪单元"""
     name: str
-    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
-    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    trace_id: str = field(default_factory=_trace_id)
+    span_id: str = field(default_factory=_span_id)
     parent_id: Optional[str] = None
     start_time: float = field(default_factory=time.time)
     end_time: Optional[float] = None
     status: str = "ok"
     tags: Dict[str, Any] = field(default_factory=dict)
     events: List[Dict[str, Any]] = field(default_factory=list)
+    sampled: bool = True
+    pid: int = field(default_factory=os.getpid)
+    tid: int = field(default_factory=threading.get_ident)
 
     def set_tag(self, key: str, value: Any) -> "Span":
         self.tags[key] = value
@@ -58,6 +85,10 @@ class Span:
         end = self.end_time or time.time()
         return (end - self.start_time) * 1000
 
+    @property
+    def context(self) -> SpanContext:
+        return (self.trace_id, self.span_id, self.sampled)
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "trace_id": self.trace_id,
@@ -77,23 +108,55 @@ def get_current_span() -> Optional[Span]:
     return getattr(_current_span, "span", None)
 
 
+def current_context() -> Optional[SpanContext]:
+    """当前 Span 的上下文（传给线程池 / 进程池任务作为 trace(parent=...)）"""
+    span = get_current_span()
+    return span.context if span else None
+
+
 def _set_current_span(span: Optional[Span]):
     _current_span.span = span
 
 
-# Span 存储（内存，可替换为外部存储）
-_spans: List[Span] = []
+# 进行中的 trace {trace_id: [已完成 Span]}，根 Span 结束时按采样决定是否进入环形缓冲
+_pending: Dict[str, List[Span]] = {}
+# 完成的 trace（每条为该 trace 的 Span 列表），保留最近 _max_traces 条
+_traces: deque = deque(maxlen=_max_traces)
+# 最近已结束的 trace_id（迟到的子进程 Span 据此丢弃）
+_finished: "OrderedDict[str, None]" = OrderedDict()
 _spans_lock = threading.Lock()
-_max_spans = 1000
+
+
+def configure(sample_rate: float = None, buffer: int = None, slow_ms: float = None):
+    """调整采样率 / 环形缓冲大小 / 慢 trace 阈值"""
+    global SAMPLE_RATE, SLOW_MS, _traces
+    with _spans_lock:
+        if sample_rate is not None:
+            SAMPLE_RATE = sample_rate
+        if slow_ms is not None:
+            SLOW_MS = slow_ms
+        if buffer is not None:
+            _traces = deque(_traces, maxlen=buffer)
 
 
 def _report_span(span: Span):
     """记录 Span"""
     with _spans_lock:
-        _spans.append(span)
-        # 保留最近的 span
-        if len(_spans) > _max_spans:
-            _spans.pop(0)
+        spans = _pending.get(span.trace_id)
+        if spans is None:
+            if len(_pending) >= _MAX_PENDING:
+                del _pending[next(iter(_pending))]
+            spans = _pending[span.trace_id] = []
+        if len(spans) < _MAX_SPANS_PER_TRACE:
+            spans.append(span)
+        if span.parent_id is None:
+            # 整个 trace 的根 Span：采样命中、慢或出错则保留
+            spans = _pending.pop(span.trace_id)
+            _finished[span.trace_id] = None
+            if len(_finished) > _MAX_PENDING:
+                _finished.popitem(last=False)
+            if span.sampled or span.status == "error" or span.duration_ms >= SLOW_MS:
+                _traces.append(spans)
 
     # 日志输出
     if span.status == "error":
@@ -102,21 +165,49 @@ def _report_span(span: Span):
         LOG.warning(f"Span {span.name} 慢操作 {span.duration_ms:.0f}ms", extra={"ctx": span.to_dict()})
 
 
+def pop_trace_spans(trace_id: str) -> List[Span]:
+    """取走本进程内某个 trace 已完成的 Span（进程池子进程把 Span 带回主进程）"""
+    with _spans_lock:
+        return _pending.pop(trace_id, [])
+
+
+def ingest_spans(spans: Optional[List[Span]]):
+    """合并子进程带回的 Span；所属 trace 已结束时丢弃"""
+    if not spans:
+        return
+    with _spans_lock:
+        for span in spans:
+            if span.trace_id in _finished:
+                continue
+            pending = _pending.setdefault(span.trace_id, [])
+            if len(pending) < _MAX_SPANS_PER_TRACE:
+                pending.append(span)
+
+
 @contextmanager
-def trace(name: str, **tags):
+def trace(name: str, parent: Optional[SpanContext] = None, **tags):
     """
     追踪上下文管理器
-    
+
     用法:
         with trace("计算MACD", symbol="BTCUSDT", interval="5m"):
             compute_macd()
+
+    parent: 来自其他线程 / 进程的 current_context()；为空时取本线程当前 Span
     """
-    parent = get_current_span()
+    current = get_current_span()
+    if parent is None and current is not None:
+        parent = current.context
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id, sampled = _trace_id(), None, random.random() < SAMPLE_RATE
     span = Span(
         name=name,
-        trace_id=parent.trace_id if parent else uuid.uuid4().hex[:16],
-        parent_id=parent.span_id if parent else None,
+        trace_id=trace_id,
+        parent_id=parent_id,
         tags=tags,
+        sampled=sampled,
     )
     _set_current_span(span)
 
@@ -128,7 +219,7 @@ def trace(name: str, **tags):
         span.finish("error")
         raise
     finally:
-        _set_current_span(parent)
+        _set_current_span(current)
 
 
 def traced(name: str = None):
@@ -147,16 +238,107 @@ def traced(name: str = None):
     return decorator
 
 
+def get_traces(limit: int = None) -> List[List[Span]]:
+    """最近完成的 trace（旧 → 新）"""
+    with _spans_lock:
+        traces = list(_traces)
+    return traces[-limit:] if limit else traces
+
+
 def get_recent_spans(limit: int = 100) -> List[Dict]:
     """获取最近的 Span"""
-    with _spans_lock:
-        return [s.to_dict() for s in _spans[-limit:]]
+    spans = [s for t in get_traces() for s in t]
+    return [s.to_dict() for s in spans[-limit:]]
 
 
 def get_trace(trace_id: str) -> List[Dict]:
     """获取指定 trace 的所有 span"""
-    with _spans_lock:
-        return [s.to_dict() for s in _spans if s.trace_id == trace_id]
+    return [s.to_dict() for t in get_traces() for s in t if s.trace_id == trace_id]
+
+
+def _json_safe(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return str(value)
+
+
+def to_chrome_trace(traces: List[List[Span]] = None) -> Dict[str, Any]:
+    """Chrome trace-event 格式（chrome://tracing / Perfetto 打开），进程 / 线程各占一条泳道"""
+    traces = get_traces() if traces is None else traces
+    events = []
+    for spans in traces:
+        for s in spans:
+            end = s.end_time or s.start_time
+            events.append({
+                "name": s.name,
+                "cat": s.status,
+                "ph": "X",
+                "ts": round(s.start_time * 1e6, 3),
+                "dur": round((end - s.start_time) * 1e6, 3),
+                "pid": s.pid,
+                "tid": s.tid,
+                "args": {"trace_id": s.trace_id, "span_id": s.span_id, "parent_id": s.parent_id,
+                         **{k: _json_safe(v) for k, v in s.tags.items()}},
+            })
+            for e in s.events:
+                events.append({"name": e["name"], "ph": "i", "s": "t", "ts": round(e["timestamp"] * 1e6, 3),
+                               "pid": s.pid, "tid": s.tid,
+                               "args": {k: _json_safe(v) for k, v in e.items() if k not in ("name", "timestamp")}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(traces: List[List[Span]] = None, service: str = "trading-service") -> Dict[str, Any]:
+    """OTLP/JSON（ExportTraceServiceRequest）格式，可直接 POST 到 OTLP collector 的 /v1/traces"""
+    traces = get_traces() if traces is None else traces
+    spans = []
+    for t in traces:
+        for s in t:
+            end = s.end_time or s.start_time
+            attrs = [{"key": k, "value": _otlp_value(v)} for k, v in s.tags.items()]
+            attrs += [{"key": "process.pid", "value": _otlp_value(s.pid)},
+                      {"key": "thread.id", "value": _otlp_value(s.tid)}]
+            span = {
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(s.start_time * 1e9)),
+                "endTimeUnixNano": str(int(end * 1e9)),
+                "attributes": attrs,
+                "events": [{"name": e["name"], "timeUnixNano": str(int(e["timestamp"] * 1e9)),
+                            "attributes": [{"key": k, "value": _otlp_value(v)}
+                                           for k, v in e.items() if k not in ("name", "timestamp")]}
+                           for e in s.events],
+                "status": {"code": 2 if s.status == "error" else 1},
+            }
+            if s.parent_id:
+                span["parentSpanId"] = s.parent_id
+            spans.append(span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "indicator_service"}, "spans": spans}],
+    }]}
+
+
+def export_traces(path: Path, fmt: str = "chrome", limit: int = None):
+    """导出环形缓冲中的 trace：fmt = chrome | otlp"""
+    traces = get_traces(limit)
+    data = to_otlp_json(traces) if fmt == "otlp" else to_chrome_trace(traces)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
 
 
 def save_traces(path: Path):
@@ -164,6 +346,6 @@ def save_traces(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
     data = {
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "spans": get_recent_spans(limit=_max_spans),
+        "spans": get_recent_spans(limit=_MAX_SPANS_PER_TRACE),
     }
     path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -1,79 +1,63 @@
 """
 历史指标回填脚本
 根据 RETENTION 配置，为每个币种每个周期计算并写入历史指标数据
+
+每个 (币种, 周期) 只读取 保留条数 + lookback 根K线，指标通过 compute_series()
+一次产出保留区间的整段结果（窗口有界的指标一次遍历，其余逐行回退）；
+(币种, 周期) 任务在进程池中并行，结果按周期汇总后单事务写入。
 """
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 import pandas as pd
-from src.db.reader import writer, reader
+from src.db.reader import writer, reader, RETENTION, DEFAULT_RETENTION
 from src.indicators.base import get_batch_indicators
 from src.core.async_full_engine import get_high_priority_symbols_fast
 
-# 保留条数配置（与 reader.py 一致）
-RETENTION = {
-    '1m': 120,
-    '5m': 120,
-    '15m': 96,
-    '1h': 144,
-    '4h': 84,
-    '1d': 120,
-    '1w': 48,
-}
-
 INTERVALS = ['1m', '5m', '15m', '1h', '4h', '1d', '1w']
 
 
-def backfill_symbol_interval(symbol: str, interval: str, indicators: dict, retention: int):
-    """为单个币种单个周期回填历史指标"""
-    max(ind.meta.lookback for ind in indicators.values())
-
-    # 获取尽可能多的K线数据
-    klines = reader.get_klines([symbol], interval, 10000)
-    df = klines.get(symbol)
+def compute_symbol_interval(df: pd.DataFrame, symbol: str, interval: str, indicator_names: list,
+                            retention: int) -> dict:
+    """计算单个币种单个周期最近 retention 根的历史指标，返回 {指标名: DataFrame}"""
+    indicators = get_batch_indicators()
+    results = {}
     if df is None or len(df) < 10:
-        return 0
-
-    total_bars = len(df)
-    computed = 0
+        return results
 
-    for name, ind_cls in indicators.items():
-        indicator = ind_cls()
-        lookback = indicator.meta.lookback
-        min_data = getattr(indicator.meta, 'min_data', 5)
+    start = len(df) - retention
+    for name in indicator_names:
+        indicator = indicators[name]()
+        try:
+            result = indicator.compute_series(df, symbol, interval, start=max(start, indicator.meta.min_data - 1))
+        except Exception:
+            continue
+        if result.empty:
+            continue
+        keys = [c for c in ('交易对', '周期', '数据时间') if c in result.columns]
+        results[name] = result.drop_duplicates(subset=keys, keep='last') if len(keys) == 3 else result
+    return results
 
-        results = []
-        # 从能计算的最早位置开始
-        for end_idx in range(min_data, total_bars + 1):
-            window_df = df.iloc[max(0, end_idx - lookback):end_idx].copy()
 
-            if len(window_df) < min_data:
-                continue
-
-            try:
-                result = indicator.compute(window_df, symbol, interval)
-                if result is not None and not result.empty:
-                    results.append(result)
-            except Exception:
-                continue
+def _compute_task(args) -> tuple:
+    symbol, interval, df, indicator_names, retention = args
+    return symbol, interval, compute_symbol_interval(df, symbol, interval, indicator_names, retention)
 
-        if results:
-            all_results = pd.concat(results, ignore_index=True)
-            all_results = all_results.drop_duplicates(
-                subset=['交易对', '周期', '数据时间'],
-                keep='last'
-            ).tail(retention)
 
-            writer.write(indicator.meta.name, all_results, interval)
-            computed += len(all_results)
-
-    return computed
+def backfill_symbol_interval(symbol: str, interval: str, indicators: dict, retention: int):
+    """为单个币种单个周期回填历史指标"""
+    limit = retention + max(ind.meta.lookback for ind in indicators.values())
+    df = reader.get_klines([symbol], interval, limit).get(symbol)
+    results = compute_symbol_interval(df, symbol, interval, list(indicators), retention)
+    writer.write_batch(results, interval)
+    return sum(len(r) for r in results.values())
 
 
-def backfill_all(symbols: list = None, intervals: list = None, indicator_names: list = None):
-    """回填所有历史指标"""
+def backfill_all(symbols: list = None, intervals: list = None, indicator_names: list = None, workers: int = None):
+    """回填所有历史指标（币种 × 周期并行）"""
     if symbols is None:
         symbols = get_high_priority_symbols_fast(top_n=50) or []
         if not symbols:
@@ -86,29 +70,52 @@ def backfill_all(symbols: list = None, intervals: list = None, indicator_names:
     indicators = get_batch_indicators()
     if indicator_names:
         indicators = {k: v for k, v in indicators.items() if k in indicator_names}
+    if not indicators:
+        print("无指标需要回填")
+        return
+
+    names = list(indicators)
+    max_lookback = max(ind.meta.lookback for ind in indicators.values())
+    series = [n for n, cls in indicators.items() if cls.has_series()]
 
-    print(f"开始回填: {len(symbols)} 币种, {len(intervals)} 周期, {len(indicators)} 指标")
+    print(f"开始回填: {len(symbols)} 币种, {len(intervals)} 周期, {len(indicators)} 指标"
+          f"（{len(series)} 个全序列计算）")
     print(f"保留配置: {RETENTION}")
     print("-" * 60)
 
     total_start = time.time()
     total_computed = 0
 
-    for interval in intervals:
-        retention = RETENTION.get(interval, 60)
-        print(f"\n[{interval}] 保留 {retention} 条")
-
-        for i, symbol in enumerate(symbols):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for interval in intervals:
+            retention = RETENTION.get(interval, DEFAULT_RETENTION)
             t0 = time.time()
-            computed = backfill_symbol_interval(symbol, interval, indicators, retention)
-            total_computed += computed
-
-            if computed > 0:
-                print(f"  {symbol}: {computed} 条, {time.time()-t0:.1f}s")
-
-            # 进度
-            if (i + 1) % 10 == 0:
-                print(f"  进度: {i+1}/{len(symbols)}")
+            klines = reader.get_klines(symbols, interval, retention + max_lookback)
+            print(f"[{interval}] 保留 {retention} 条, 读取 {len(klines)} 币种 {time.time()-t0:.1f}s")
+            for symbol, df in klines.items():
+                fut = executor.submit(_compute_task, (symbol, interval, df, names, retention))
+                futures[fut] = interval
+
+        # 按周期汇总，周期内任务全部完成后单事务写入
+        pending = {iv: sum(1 for v in futures.values() if v == iv) for iv in intervals}
+        tables = {iv: {} for iv in intervals}
+        for fut in as_completed(futures):
+            interval = futures[fut]
+            try:
+                symbol, _, results = fut.result()
+                for name, df in results.items():
+                    tables[interval].setdefault(name, []).append(df)
+            except Exception as e:
+                print(f"  [{interval}] 计算失败: {e}")
+
+            pending[interval] -= 1
+            if pending[interval] == 0:
+                data = {name: pd.concat(parts, ignore_index=True) for name, parts in tables.pop(interval).items()}
+                stats = writer.write_batch(data, interval)
+                rows = stats.get("rows", 0) if stats else 0
+                total_computed += rows
+                print(f"  [{interval}] 写入 {rows} 条, 累计 {time.time()-total_start:.1f}s")
 
     print("-" * 60)
     print(f"完成! 总计 {total_computed} 条, 耗时 {time.time()-total_start:.1f}s")
@@ -121,10 +128,11 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--intervals", nargs="+", help="指定周期")
     parser.add_argument("-n", "--indicators", nargs="+", help="指定指标")
     parser.add_argument("--top", type=int, default=50, help="高优先级币种数量")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="并行进程数（默认 CPU 核数）")
     args = parser.parse_args()
 
     symbols = args.symbols
     if not symbols:
         symbols = get_high_priority_symbols_fast(top_n=args.top)
 
-    backfill_all(symbols, args.intervals, args.indicators)
+    backfill_all(symbols, args.intervals, args.indicators, args.workers)
@@ -0,0 +1,178 @@
+"""
+指标内核微基准
+对比原逐元素循环实现与 src/indicators/kernels.py 的耗时，并校验结果逐位一致
+
+用法:
+    python src/scripts/bench_kernels.py [--bars 1000] [--repeat 20]
+    KERNEL_BACKEND=numpy python src/scripts/bench_kernels.py   # 强制指定后端
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from src.indicators import kernels
+
+
+# ==================== 原循环实现 ====================
+def legacy_wilder(arr, period):
+    result = np.zeros_like(arr, dtype=float)
+    result[0] = arr[0]
+    alpha = 1.0 / period
+    for i in range(1, len(arr)):
+        result[i] = result[i-1] * (1 - alpha) + arr[i] * alpha
+    return result
+
+
+def legacy_tr(high, low, close):
+    tr = np.zeros(len(close))
+    tr[0] = high[0] - low[0]
+    for i in range(1, len(close)):
+        tr[i] = max(high[i] - low[i], abs(high[i] - close[i-1]), abs(low[i] - close[i-1]))
+    return tr
+
+
+def legacy_dm(high, low):
+    plus_dm, minus_dm = np.zeros(len(high)), np.zeros(len(high))
+    for i in range(1, len(high)):
+        up, down = high[i] - high[i-1], low[i-1] - low[i]
+        plus_dm[i] = up if up > down and up > 0 else 0
+        minus_dm[i] = down if down > up and down > 0 else 0
+    return plus_dm, minus_dm
+
+
+def legacy_rolling_max(x, period):
+    return np.array([x[max(0, i-period+1):i+1].max() for i in range(period-1, len(x))])
+
+
+def legacy_mad(tp, sma, period):
+    mad = np.zeros(len(sma))
+    for i in range(len(sma)):
+        mad[i] = np.mean(np.abs(tp[i:i+period] - sma[i]))
+    return mad
+
+
+def legacy_smma(src: pd.Series, length):
+    smma = pd.Series(np.nan, index=src.index)
+    smma.iloc[length - 1] = src.rolling(window=length).mean().iloc[length - 1]
+    for i in range(length, len(src)):
+        smma.iloc[i] = (smma.iloc[i - 1] * (length - 1) + src.iloc[i]) / length
+    return smma.to_numpy()
+
+
+def legacy_half_avg(first, src: pd.Series):
+    out = pd.Series(np.nan, index=src.index)
+    out.iloc[0] = first
+    for i in range(1, len(src)):
+        out.iloc[i] = (out.iloc[i - 1] + src.iloc[i - 1]) / 2
+    return out.to_numpy()
+
+
+def legacy_supertrend(close, upper, lower):
+    n = len(close)
+    fu, fl, st = np.copy(upper), np.copy(lower), np.zeros(n)
+    direction = np.ones(n, dtype=int)
+    for i in range(1, n):
+        fu[i] = upper[i] if close[i-1] > fu[i-1] else min(upper[i], fu[i-1])
+        fl[i] = lower[i] if close[i-1] < fl[i-1] else max(lower[i], fl[i-1])
+        if st[i-1] == fu[i-1]:
+            direction[i] = -1 if close[i] > fu[i] else 1
+        else:
+            direction[i] = 1 if close[i] < fl[i] else -1
+        st[i] = fu[i] if direction[i] == 1 else fl[i]
+    return fu, fl, st, direction
+
+
+def legacy_band_trend(close: pd.Series, upper: pd.Series, lower: pd.Series):
+    trend = [0] * len(close)
+    last_cross = None
+    for i in range(1, len(close)):
+        up, low = upper.iloc[i], lower.iloc[i]
+        if close.iloc[i - 1] <= up and close.iloc[i] > up:
+            trend[i] = 1
+            if trend[i] != trend[i - 1]:
+                last_cross = i
+        elif close.iloc[i - 1] >= low and close.iloc[i] < low:
+            trend[i] = -1
+            if trend[i] != trend[i - 1]:
+                last_cross = i
+        else:
+            trend[i] = trend[i - 1]
+    return np.array(trend), last_cross
+
+
+def legacy_pivots(high, prd):
+    mask = np.zeros(len(high), dtype=bool)
+    for i in range(2 * prd, len(high)):
+        window = high[i - 2 * prd:i + 1]
+        mask[i - prd] = high[i - prd] == window.max()
+    return mask
+
+
+# ==================== 基准 ====================
+def _timeit(fn, repeat: int) -> float:
+    fn()  # 预热（numba 首次调用触发编译）
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, tuple):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b, strict=True))
+    if isinstance(a, np.ndarray):
+        return np.array_equal(a, b, equal_nan=True)
+    return a == b
+
+
+def build_cases(bars: int):
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    high = close * (1 + rng.uniform(0, 0.005, bars))
+    low = close * (1 - rng.uniform(0, 0.005, bars))
+    tp = (high + low + close) / 3
+    sma = np.convolve(tp, np.ones(20) / 20, mode="valid")
+    atr = legacy_wilder(legacy_tr(high, low, close), 10)
+    upper, lower = (high + low) / 2 + 3 * atr, (high + low) / 2 - 3 * atr
+    s_close = pd.Series(close)
+    mid = s_close.ewm(span=30, adjust=False).mean()
+    seed = s_close.rolling(200).mean().iloc[199]
+
+    return [
+        ("wilder_smooth", lambda: legacy_wilder(close, 14), lambda: kernels.wilder_smooth(close, 14)),
+        ("true_range", lambda: legacy_tr(high, low, close), lambda: kernels.true_range(high, low, close)),
+        ("directional_movement", lambda: legacy_dm(high, low), lambda: kernels.directional_movement(high, low)),
+        ("rolling_max", lambda: legacy_rolling_max(high, 14), lambda: kernels.rolling_max(high, 14)),
+        ("rolling_mad", lambda: legacy_mad(tp, sma, 20), lambda: kernels.rolling_mad(tp, sma, 20)),
+        ("smma", lambda: legacy_smma(s_close, 200), lambda: kernels.smma(close, 200, seed)),
+        ("half_avg", lambda: legacy_half_avg(close[0], s_close), lambda: kernels.half_avg(close[0], close)),
+        ("supertrend", lambda: legacy_supertrend(close, upper, lower), lambda: kernels.supertrend(close, upper, lower)),
+        ("band_trend", lambda: legacy_band_trend(s_close, mid * 1.005, mid * 0.995),
+         lambda: kernels.band_trend(close, (mid * 1.005).to_numpy(), (mid * 0.995).to_numpy())),
+        ("pivot_mask", lambda: legacy_pivots(high, 20), lambda: kernels.pivot_mask(high, 20, 20, "max")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标内核微基准")
+    parser.add_argument("--bars", type=int, default=1000, help="K线根数")
+    parser.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    args = parser.parse_args()
+
+    print(f"后端: {kernels.BACKEND}  K线: {args.bars}  重复: {args.repeat}")
+    print(f"{'内核':<22}{'原实现(ms)':>12}{'内核(ms)':>12}{'加速比':>10}  一致")
+    for name, legacy, kernel in build_cases(args.bars):
+        t_old = _timeit(legacy, args.repeat)
+        t_new = _timeit(kernel, args.repeat)
+        same = _same(legacy(), kernel())
+        print(f"{name:<22}{t_old * 1000:>12.3f}{t_new * 1000:>12.3f}{t_old / t_new:>9.1f}x  {'✓' if same else '✗'}")
+
+
+if __name__ == "__main__":
+    main()
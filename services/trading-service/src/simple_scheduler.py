@@ -7,16 +7,23 @@
 2. 只计算高优先级币种
 
 运行时：
-1. 每10秒检查新数据
-2. 每小时重新评估优先级
+1. 每10秒检查新数据，前台算高优先级（第一层）；第二层按 TIER2_EVERY / TIER2_BUDGET 轮转，
+   在后台线程逐片计算，切片之间让出给第一层（不占用轮询循环）
+2. 第三层（长尾）按需计算：监听 NOTIFY indicator_demand（用户打开单币卡片）；
+   TIER3_EVERY > 0 时另按该节奏轮转补算
+3. 每 PRIORITY_REFRESH_SECONDS 秒（默认每轮）重新评估优先级（内存排名，见 core/priority.py）
+
+运行模式（SCHEDULER_MODE）：
+- resident（默认）：进程内常驻 Engine、已预热的 DataCache 和进程池，每次只算有新数据的周期
+- subprocess：每次启动 python -m src 子进程（旧模式）
 """
 import os
 import sqlite3
 import sys
+import threading
 import time
 import atexit
 from datetime import datetime, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import psycopg
 from psycopg.rows import dict_row
@@ -42,8 +49,12 @@ SQLITE_PATH = _resolve_sqlite_path(
     os.path.join(PROJECT_ROOT, "libs/database/services/telegram-service/market_data.db"),
 )
 
+# 调度模式: resident | subprocess
+SCHEDULER_MODE = os.environ.get("SCHEDULER_MODE", "resident").strip().lower()
+
 # 币种管理配置
 HIGH_PRIORITY_TOP_N = int(os.environ.get("HIGH_PRIORITY_TOP_N", "50"))
+PRIORITY_REFRESH_SECONDS = float(os.environ.get("PRIORITY_REFRESH_SECONDS", "10"))
 
 # 周期配置
 INTERVALS = [i.strip() for i in os.environ.get("INTERVALS", "1m,5m,15m,1h,4h,1d,1w").split(",") if i.strip()]
@@ -55,6 +66,8 @@ INDICATORS_DISABLED = [i.strip().lower() for i in os.environ.get("INDICATORS_DIS
 last_computed = {i: None for i in INTERVALS}
 last_priority_update = None
 high_priority_symbols = []
+tier2_symbols = []
+tier3_symbols = []
 
 # SQLite 连接复用（避免频繁开关连接）
 _sqlite_conn = None
@@ -90,122 +103,39 @@ if _libs_path not in _sys.path:
 from common.symbols import get_configured_symbols
 
 
-# ============ 高优先级币种识别（复用 async_full_engine 完整逻辑）============
+# ============ 高优先级币种识别（复用 core/priority.py 增量排名）============
 
-def _query_kline_priority(top_n: int = 30) -> set:
-    """K线维度优先级 - 交易量+波动率+涨跌幅"""
-    symbols = set()
-    try:
-        with psycopg.connect(DB_URL) as conn:
-            sql = """
-                WITH base AS (
-                    SELECT symbol, 
-                           SUM(quote_volume) as total_qv,
-                           AVG((high-low)/NULLIF(close,0)) as volatility
-                    FROM market_data.candles_5m
-                    WHERE bucket_ts > NOW() - INTERVAL '24 hours'
-                    GROUP BY symbol
-                ),
-                volume_rank AS (
-                    SELECT symbol FROM base ORDER BY total_qv DESC LIMIT %s
-                ),
-                volatility_rank AS (
-                    SELECT symbol FROM base ORDER BY volatility DESC LIMIT %s
-                ),
-                change_rank AS (
-                    WITH latest AS (
-                        SELECT DISTINCT ON (symbol) symbol, close
-                        FROM market_data.candles_5m
-                        WHERE bucket_ts > NOW() - INTERVAL '1 hour'
-                        ORDER BY symbol, bucket_ts DESC
-                    ),
-                    prev AS (
-                        SELECT DISTINCT ON (symbol) symbol, close as prev_close
-                        FROM market_data.candles_5m
-                        WHERE bucket_ts BETWEEN NOW() - INTERVAL '25 hours' AND NOW() - INTERVAL '23 hours'
-                        ORDER BY symbol, bucket_ts DESC
-                    )
-                    SELECT l.symbol
-                    FROM latest l JOIN prev p ON l.symbol = p.symbol
-                    ORDER BY ABS((l.close - p.prev_close) / NULLIF(p.prev_close, 0)) DESC
-                    LIMIT %s
-                )
-                SELECT DISTINCT symbol FROM (
-                    SELECT symbol FROM volume_rank
-                    UNION SELECT symbol FROM volatility_rank
-                    UNION SELECT symbol FROM change_rank
-                ) combined
-            """
-            cur = conn.execute(sql, (top_n, top_n, top_n))
-            symbols.update(r[0] for r in cur.fetchall())
-    except Exception as e:
-        log(f"K线优先级查询失败: {e}")
-    return symbols
+def _get_ranker():
+    """全局高优先级排名器（与常驻 Engine 的缓存共享，缓存摄入的 5m K线直接计入滚动统计）"""
+    if TRADING_SERVICE_DIR not in sys.path:
+        sys.path.insert(0, TRADING_SERVICE_DIR)
+    from src.core.priority import get_priority_ranker
+    return get_priority_ranker()
 
 
-def _query_futures_priority(top_n: int = 30) -> set:
-    """期货维度优先级 - 持仓价值+主动买卖比+多空比"""
-    result = set()
-    try:
-        with psycopg.connect(DB_URL) as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT DISTINCT ON (symbol) 
-                        symbol, sum_open_interest_value as oi_val,
-                        sum_taker_long_short_vol_ratio as taker_ratio,
-                        count_long_short_ratio as ls_ratio
-                    FROM market_data.binance_futures_metrics_5m 
-                    WHERE create_time > NOW() - INTERVAL '7 days'
-                    ORDER BY symbol, create_time DESC
-                """)
-                rows = cur.fetchall()
-
-                oi_value_rank = []
-                taker_extreme = set()
-                ls_extreme = set()
-
-                for row in rows:
-                    sym, oi_val, taker, ls = row
-
-                    # 持仓价值 Top N
-                    if oi_val:
-                        oi_value_rank.append((sym, float(oi_val)))
-
-                    # 主动买卖比极端 (<0.2 或 >5.0)
-                    if taker:
-                        t = float(taker)
-                        if t < 0.2 or t > 5.0:
-                            taker_extreme.add(sym)
-
-                    # 多空比极端 (<0.5 或 >4.0)
-                    if ls:
-                        ls_val = float(ls)
-                        if ls_val < 0.5 or ls_val > 4.0:
-                            ls_extreme.add(sym)
-
-                top_oi_value = {s for s, _ in sorted(oi_value_rank, key=lambda x: x[1], reverse=True)[:top_n]}
-                result = top_oi_value | taker_extreme | ls_extreme
-    except Exception as e:
-        log(f"期货优先级查询失败: {e}")
-    return result
+_tier_scheduler = None
 
 
-def get_high_priority_symbols_fast(top_n: int = 30) -> set:
-    """快速获取高优先级币种 - K线+期货并行查询"""
-    result = set()
-
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = [
-            executor.submit(_query_kline_priority, top_n),
-            executor.submit(_query_futures_priority, top_n),
-        ]
-        for f in as_completed(futures):
-            try:
-                result.update(f.result())
-            except Exception as e:
-                log(f"优先级查询失败: {e}")
+def _get_tier_scheduler():
+    """分层调度器（收盘计数与第二层游标跨轮次保留）"""
+    global _tier_scheduler
+    if _tier_scheduler is None:
+        if TRADING_SERVICE_DIR not in sys.path:
+            sys.path.insert(0, TRADING_SERVICE_DIR)
+        from src.core.tiers import TierScheduler
+        _tier_scheduler = TierScheduler()
+    return _tier_scheduler
 
-    return result
+
+def get_high_priority_symbols_fast(top_n: int = 30) -> set:
+    """快速获取高优先级币种 - 增量同步 + 内存排名（K线+期货）"""
+    try:
+        ranker = _get_ranker()
+        ranker.sync()
+        return ranker.rank(top_n)
+    except Exception as e:
+        log(f"优先级排名失败: {e}")
+        return set()
 
 
 # ============ 数据检查 ============
@@ -261,10 +191,58 @@ def check_need_calc() -> list:
     return need_calc
 
 
+# 常驻引擎（resident 模式下跨轮次复用）
+_engine = None
+# 前台（第一层）与后台（下层切片）共用同一个 Engine，同一时刻只跑一次计算
+_calc_lock = threading.Lock()
+
+
+def _get_engine():
+    """获取常驻 Engine（首次调用时导入指标并初始化日志）"""
+    global _engine
+    if _engine is None:
+        if TRADING_SERVICE_DIR not in sys.path:
+            sys.path.insert(0, TRADING_SERVICE_DIR)
+        import src.indicators  # noqa - 触发指标注册
+        from src.core.engine import Engine
+        from src.observability import setup_logging
+
+        setup_logging(level=os.environ.get("LOG_LEVEL", "INFO"))
+        _engine = Engine(intervals=INTERVALS)
+    return _engine
+
+
+def run_calculation_resident(intervals: list, symbols: list) -> bool:
+    """进程内执行指标计算（复用 Engine / DataCache / 进程池）"""
+    t0 = time.time()
+    engine = _get_engine()
+    engine.symbols = symbols
+    engine.intervals = intervals
+
+    stats = engine.run()
+    if stats:
+        log(f"本轮 {','.join(intervals)}: 读取={stats['read']:.2f}s 计算={stats['compute']:.2f}s "
+            f"写入={stats['write']:.2f}s {stats['rows']}行 总耗时={time.time()-t0:.2f}s")
+    else:
+        log(f"本轮 {','.join(intervals)}: 无结果, 耗时={time.time()-t0:.2f}s")
+    return True
+
+
 def run_calculation(intervals: list, symbols: list):
-    """执行指标计算"""
+    """执行指标计算（前台 / 后台线程串行）"""
     if not intervals or not symbols:
         return
+    with _calc_lock:
+        _run_calculation(intervals, symbols)
+
+
+def _run_calculation(intervals: list, symbols: list):
+    if SCHEDULER_MODE == "resident":
+        try:
+            run_calculation_resident(intervals, symbols)
+            return
+        except Exception as e:
+            log(f"常驻计算失败，回退子进程模式: {e}")
 
     import subprocess
 
@@ -291,9 +269,9 @@ def run_calculation(intervals: list, symbols: list):
         log(f"错误: {result.stderr[:200]}")
 
 
-def update_priority():
-    """更新币种列表"""
-    global high_priority_symbols, last_priority_update
+def update_priority(quiet: bool = False):
+    """更新币种列表（quiet=True 时仅在列表变化时输出日志）"""
+    global high_priority_symbols, tier2_symbols, tier3_symbols, last_priority_update
 
     t0 = time.time()
     configured = get_configured_symbols()
@@ -301,7 +279,8 @@ def update_priority():
     if configured:
         # 使用配置的分组
         symbols = configured
-        log(f"使用配置分组: {len(symbols)} 币种")
+        tier2_symbols, tier3_symbols = [], []
+        msg = f"使用配置分组: {len(symbols)} 币种"
     else:
         # auto模式：动态高优先级
         symbols = list(get_high_priority_symbols_fast(top_n=HIGH_PRIORITY_TOP_N))
@@ -309,21 +288,143 @@ def update_priority():
         extra = [s.strip().upper() for s in os.environ.get("SYMBOLS_EXTRA", "").split(",") if s.strip()]
         exclude = {s.strip().upper() for s in os.environ.get("SYMBOLS_EXCLUDE", "").split(",") if s.strip()}
         symbols = sorted((set(symbols) | set(extra)) - exclude)
-        log(f"自动高优先级: {len(symbols)} 币种")
+        tier2_symbols, tier3_symbols = _build_lower_tiers(symbols, exclude)
+        msg = (f"自动高优先级: {len(symbols)} 币种, 第二层 {len(tier2_symbols)} 币种, "
+               f"第三层 {len(tier3_symbols)} 币种")
+
+    changed = symbols != high_priority_symbols
+    if quiet and not changed:
+        last_priority_update = time.time()
+        return
+    if quiet:
+        added, removed = set(symbols) - set(high_priority_symbols), set(high_priority_symbols) - set(symbols)
+        log(f"{msg} (+{len(added)} -{len(removed)})")
+    else:
+        log(msg)
 
     high_priority_symbols = symbols
     last_priority_update = time.time()
-    log(f"币种更新完成, 耗时 {time.time()-t0:.1f}s")
+    log(f"币种更新完成, 耗时 {time.time()-t0:.3f}s")
 
     if high_priority_symbols:
         log(f"前10: {high_priority_symbols[:10]}")
 
 
+def _build_lower_tiers(tier1: list, exclude: set) -> tuple:
+    """高优先级之外按 24h 成交额取前 TIER2_SIZE 个为第二层，其余为第三层"""
+    try:
+        order = _get_ranker().by_volume()
+        from src.config import config
+        from src.core.tiers import TierPlan
+
+        plan = TierPlan.build([s for s in order if s not in exclude], set(tier1), order, config.tier2_size)
+        return plan.tiers[2], plan.tiers[3]
+    except Exception as e:
+        log(f"第二层分层失败: {e}")
+        return [], []
+
+
+_background = None
+
+
+def _get_background():
+    """下层任务队列（首次调用时启动后台线程）"""
+    global _background
+    if _background is None:
+        from src.core.tiers import TierQueue
+        _background = TierQueue()
+        threading.Thread(target=_background_loop, args=(_background,), daemon=True, name="tier-background").start()
+    return _background
+
+
+def _background_loop(queue):
+    """逐个执行下层任务：每片开始前等第一层让出，受本层预算与截止时间约束"""
+    from src.core.tiers import run_job
+
+    scheduler = _get_tier_scheduler()
+    while True:
+        job = queue.get(timeout=1.0)
+        if job is None:
+            continue
+        t0 = time.time()
+        try:
+            done = run_job(job, scheduler.tiers[job.level], scheduler,
+                           lambda symbols, iv: run_calculation([iv], symbols))
+            log(f"第{job.level}层 {job.interval}: {done}/{len(job.symbols)} 币种, 耗时 {time.time()-t0:.1f}s")
+        except Exception as e:
+            log(f"第{job.level}层 {job.interval} 失败: {e}")
+
+
+def run_tier1(intervals: list, symbols: list):
+    """第一层：前台计算，期间后台下层切片不开始"""
+    with _get_tier_scheduler().foreground():
+        run_calculation(intervals, symbols)
+
+
+def run_lower_tiers(intervals: list):
+    """第二层每 TIER2_EVERY、第三层每 TIER3_EVERY（>0 时）根收盘入队一次，由后台线程轮转计算（不阻塞轮询循环）"""
+    scheduler = _get_tier_scheduler()
+    from src.core.tiers import TierJob
+    from src.db.cache import INTERVAL_SECONDS
+
+    lower = {2: tier2_symbols, 3: tier3_symbols}
+    for interval in intervals:
+        levels = [lv for lv in scheduler.due(interval) if lower.get(lv)]
+        if not levels or last_computed[interval] is None:
+            continue
+        period = INTERVAL_SECONDS.get(interval, 60)
+        close_ts = last_computed[interval].timestamp() + period
+        for level in levels:
+            tier = scheduler.tiers[level]
+            _get_background().put(TierJob(level, interval, close_ts, lower[level],
+                                          deadline=close_ts + tier.deadline * period))
+
+
+def request_symbols(symbols: list):
+    """按需计算（用户打开卡片）：第一层之外的已知币种，各周期以第三层优先级入队（不轮转）"""
+    from src.core.tiers import TierJob
+    from src.db.cache import INTERVAL_SECONDS
+
+    known = set(tier2_symbols) | set(tier3_symbols)
+    symbols = [s for s in dict.fromkeys(s.strip().upper() for s in symbols) if s in known]
+    if not symbols:
+        return
+    tier = _get_tier_scheduler().tiers[3]
+    now = time.time()
+    for interval in INTERVALS:
+        period = INTERVAL_SECONDS.get(interval, 60)
+        _get_background().put(TierJob(3, interval, now, symbols, deadline=now + tier.deadline * period,
+                                      rotating=False))
+    log(f"按需计算: {symbols[:10]}")
+
+
+def _listen_demand():
+    """监听 NOTIFY indicator_demand（payload 为逗号分隔或 JSON 数组的币种），断线 30 秒后重连"""
+    import json
+    import select
+
+    from src.core.tiers import DEMAND_CHANNEL
+
+    while True:
+        try:
+            with psycopg.connect(DB_URL, autocommit=True) as conn:
+                conn.execute(f"LISTEN {DEMAND_CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 5.0)[0]:
+                        for notify in conn.notifies(timeout=0):
+                            payload = notify.payload.strip()
+                            symbols = json.loads(payload) if payload.startswith("[") else payload.split(",")
+                            request_symbols([s for s in symbols if s])
+        except Exception as e:
+            log(f"按需通道监听失败: {e}，30 秒后重连")
+            time.sleep(30)
+
+
 def main():
     global last_priority_update
 
     log("=" * 50)
-    log("简单定时计算服务启动")
+    log(f"简单定时计算服务启动 (模式: {SCHEDULER_MODE})")
     log("=" * 50)
 
     # 1. 识别高优先级币种
@@ -335,15 +436,17 @@ def main():
 
     # 2. 启动时强制计算全部周期（确保表里有全周期数据）
     log(f"首次启动，计算全部周期: {INTERVALS}")
-    run_calculation(INTERVALS, high_priority_symbols)
+    run_tier1(INTERVALS, high_priority_symbols)
+
+    threading.Thread(target=_listen_demand, daemon=True, name="tier-demand").start()
 
     log("-" * 50)
-    log("进入轮询检查 (每10秒检查新数据, 每小时更新优先级)...")
+    log(f"进入轮询检查 (每10秒检查新数据, 每{PRIORITY_REFRESH_SECONDS:g}秒更新优先级)...")
 
     while True:
-        # 每小时更新优先级
-        if time.time() - last_priority_update > 3600:
-            update_priority()
+        # 更新优先级（增量同步 + 内存排名，开销很小）
+        if time.time() - last_priority_update >= PRIORITY_REFRESH_SECONDS:
+            update_priority(quiet=True)
 
         # 检查新数据
         to_calc = []
@@ -357,7 +460,8 @@ def main():
                 log(f"检查 {interval} 失败: {e}")
 
         if to_calc:
-            run_calculation(to_calc, high_priority_symbols)
+            run_tier1(to_calc, high_priority_symbols)
+            run_lower_tiers(to_calc)
 
         time.sleep(10)
 
@@ -7,3 +7,36 @@ import pytest
 def sample_symbol():
     """Sample trading symbol for tests."""
     return "BTCUSDT"
+
+
+@pytest.fixture
+def sample_klines():
+    """可复现的合成 K 线（含平盘段与缺失值）"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(42)
+    n = 450
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, n))
+    volume = rng.uniform(10, 1000, n)
+    df = pd.DataFrame({
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": volume,
+        "quote_volume": volume * close,
+        "trade_count": rng.integers(10, 500, n).astype(float),
+        "taker_buy_volume": volume * rng.uniform(0.3, 0.7, n),
+        "taker_buy_quote_volume": volume * close * 0.5,
+    }, index=pd.date_range("2025-01-01", periods=n, freq="5min", tz="UTC", name="bucket_ts"))
+
+    # 平盘段（high == low，RSV 分母为 0）与零星缺失值
+    flat = df["close"].iloc[50]
+    df.iloc[50:60, df.columns.get_indexer(["open", "high", "low", "close"])] = flat
+    df.iloc[100, df.columns.get_loc("volume")] = np.nan
+    df.iloc[120, df.columns.get_loc("taker_buy_volume")] = np.nan
+    return df
@@ -0,0 +1,101 @@
+"""
+多币种批量计算一致性测试
+"""
+import math
+
+import numpy as np
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.indicators.base import get_all_indicators
+
+BATCHED = sorted(name for name, cls in get_all_indicators().items() if cls.has_batch())
+
+
+def _same(expected, actual) -> bool:
+    if len(expected) != len(actual):
+        return False
+    for exp, act in zip(expected, actual):
+        if list(exp) != list(act):
+            return False
+        for k in exp:
+            a, b = exp[k], act[k]
+            if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+                continue
+            if a != b or type(a) is not type(b):
+                return False
+    return True
+
+
+@pytest.fixture
+def mixed_frames(sample_klines):
+    """长度不一的多币种K线（含过短、缺 quote_volume、带缺失值的币种）"""
+    frames = {}
+    for i, n in enumerate([3, 17, 34, 36, 61, 120, 300, 450]):
+        df = sample_klines.iloc[-n:].copy()
+        df[["open", "high", "low", "close"]] *= 1 + i * 0.1
+        if i % 3 == 0:
+            df = df.drop(columns=["quote_volume"])
+        if n > 100:
+            df.iloc[n // 2, df.columns.get_loc("volume")] = np.nan
+        frames[f"SYM{i}USDT"] = df
+    return frames
+
+
+def test_batch_indicators_registered():
+    """测试 MACD/KDJ/ATR/布林带/量比/MFI/剥头皮/谐波/期货情绪聚合/期货缺口监控/K线形态 均支持批量计算"""
+    assert len(BATCHED) == 11
+
+
+@pytest.mark.parametrize("name", BATCHED)
+def test_compute_batch_matches_compute(mixed_frames, name):
+    """测试 compute_batch 与逐币种 compute 逐位一致"""
+    indicator = get_all_indicators()[name]()
+    batch = indicator.compute_batch(mixed_frames, "5m")
+    assert list(batch) == list(mixed_frames)
+    for symbol, df in mixed_frames.items():
+        expected = indicator.compute(df, symbol, "5m").to_dict("records")
+        assert _same(expected, batch[symbol]), symbol
+
+
+def test_batch_failure_falls_back_and_is_counted(mixed_frames, monkeypatch, caplog):
+    """测试批量计算失败时回退逐币种计算，并记录告警与回退计数"""
+    from src.core.engine import _batch_fallbacks, _run_indicator
+
+    name = BATCHED[0]
+    indicator = get_all_indicators()[name]()
+
+    def boom(frames, interval):
+        raise RuntimeError("batch broken")
+
+    monkeypatch.setattr(indicator, "compute_batch", boom)
+    frames = [(symbol, "5m", df, df.index[-1]) for symbol, df in mixed_frames.items()]
+    before = _batch_fallbacks.get(indicator=indicator.meta.name, interval="5m")
+
+    with caplog.at_level("WARNING", logger="indicator_service"):
+        out = _run_indicator(indicator, frames)
+
+    assert _batch_fallbacks.get(indicator=indicator.meta.name, interval="5m") == before + 1
+    assert any("batch broken" in r.getMessage() and indicator.meta.name in r.getMessage() for r in caplog.records)
+    min_len = indicator.meta.lookback // 2
+    expected = []
+    for symbol, interval, df, last_ts in frames:
+        records = indicator.compute(df, symbol, interval).to_dict("records") if len(df) >= min_len else []
+        expected.append(records or [{"交易对": symbol, "周期": interval, "数据时间": last_ts, "指标": None}])
+    assert len(out) == len(expected)
+    assert all(_same(exp, act) for exp, act in zip(expected, out, strict=True))
+
+
+def test_indicator_duration_is_per_symbol(mixed_frames, monkeypatch):
+    """测试 indicator_duration 记录单币种耗时（分片总耗时 / 币种数），与分片大小无关"""
+    from src.core import engine
+
+    observed = []
+    monkeypatch.setattr(engine.indicator_duration, "observe", lambda v, **labels: observed.append((v, labels)))
+    indicator = get_all_indicators()[BATCHED[0]]()
+    frames = [(symbol, "5m", df, df.index[-1]) for symbol, df in mixed_frames.items()]
+    costs = {}
+    engine._run_indicator(indicator, frames, costs=costs)
+
+    seconds, count = costs["5m"]
+    assert observed == [(seconds / count, {"indicator": indicator.meta.name, "interval": "5m"})]
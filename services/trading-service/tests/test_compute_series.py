@@ -0,0 +1,65 @@
+"""
+全序列计算（历史回填）与逐行窗口计算一致性测试
+"""
+import math
+
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.indicators.base import get_all_indicators
+
+SERIES = sorted(name for name, cls in get_all_indicators().items() if cls.has_series())
+# 滚动均值/求和类：全序列与短窗口的累加起点不同，只保证浮点误差内一致
+ROLLING_SUM = {"布林带扫描器.py", "成交量比率扫描器.py", "MFI资金流量扫描器.py"}
+
+
+def _reference(indicator, df, symbol, interval, start):
+    lookback = indicator.meta.lookback
+    rows = []
+    for i in range(start, len(df)):
+        rows.extend(indicator.compute(df.iloc[max(0, i + 1 - lookback):i + 1], symbol, interval).to_dict("records"))
+    return rows
+
+
+def _missing(v) -> bool:
+    return v is None or (isinstance(v, float) and math.isnan(v))
+
+
+def _close(a, b, exact: bool) -> bool:
+    # 整表构建时缺失值统一为 NaN，写库后与 None 同为 NULL
+    if _missing(a) or _missing(b):
+        return _missing(a) and _missing(b)
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b if exact else math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def test_series_indicators_registered():
+    """测试窗口有界指标实现了全序列计算"""
+    assert {"CCI.py", "WilliamsR.py", "Donchian.py", "Ichimoku.py"} | ROLLING_SUM <= set(SERIES)
+
+
+@pytest.mark.parametrize("name", SERIES)
+def test_compute_series_matches_rolling_windows(sample_klines, name):
+    """测试 compute_series 每行与对应 lookback 窗口的 compute 一致"""
+    indicator = get_all_indicators()[name]()
+    start = indicator.meta.min_data - 1
+    got = indicator.compute_series(sample_klines, "BTCUSDT", "5m").to_dict("records")
+    expected = _reference(indicator, sample_klines, "BTCUSDT", "5m", start)
+    assert len(got) == len(expected) == len(sample_klines) - start
+
+    exact = name not in ROLLING_SUM
+    for exp, act in zip(expected, got):
+        assert exp.keys() <= act.keys()
+        assert all(_close(exp[k], act[k], exact) for k in exp), (exp, act)
+
+
+def test_compute_series_fallback_and_start(sample_klines):
+    """测试未实现 _series 的指标逐行回退，start 截取尾部"""
+    name = "ADX.py"
+    indicator = get_all_indicators()[name]()
+    assert not indicator.has_series()
+    start = len(sample_klines) - 15
+    got = indicator.compute_series(sample_klines, "BTCUSDT", "1h", start=start)
+    assert got.to_dict("records") == _reference(indicator, sample_klines, "BTCUSDT", "1h", start)
+    assert got["数据时间"].iloc[-1] == sample_klines.index[-1].isoformat()
@@ -0,0 +1,89 @@
+"""
+分片代价模型与 LPT 装箱测试
+"""
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.core import cost_model as cm  # noqa: E402
+from src.core.cost_model import CostModel, lpt_partition  # noqa: E402
+from src.core.engine import Engine, _compute_batch  # noqa: E402
+
+
+def test_lpt_partition_balances():
+    """测试 LPT 装箱：重任务分散到不同分片，最大负载接近下界"""
+    costs = [10, 9, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    items = list(range(len(costs)))
+    chunks = lpt_partition(items, costs, 3)
+    assert [load for load, _ in chunks] == [10, 10, 9]
+    assert sorted(i for _, bucket in chunks for i in bucket) == items
+    assert not {0, 1} <= set(chunks[0][1])                     # 两个重任务不在同一片
+    assert len(lpt_partition(items[:2], costs[:2], 8)) == 2    # 分片数不超过任务数
+
+
+def test_cost_model_persist_and_fallback(tmp_path):
+    """测试滑动平均、持久化与未实测组合的估计"""
+    path = tmp_path / "cost.json"
+    model = CostModel(path, alpha=0.5)
+    model.observe({("K线形态扫描器.py", "1m"): (2.0, 10), ("MACD柱状扫描器.py", "1m"): (0.1, 10),
+                   ("MACD柱状扫描器.py", "1h"): (0.3, 10), ("空.py", "1m"): (1.0, 0)})
+    model.observe({("K线形态扫描器.py", "1m"): (4.0, 10)})
+    assert model.get("K线形态扫描器.py", "1m") == pytest.approx(0.3)
+    model.save()
+
+    loaded = CostModel(path)
+    assert loaded.snapshot() == pytest.approx(model.snapshot())
+    costs = loaded.interval_costs(["1m", "1h"], ["K线形态扫描器.py", "MACD柱状扫描器.py", "新指标.py"])
+    median = sorted(model.snapshot().values())[1]
+    assert costs["1m"] == pytest.approx(0.3 + 0.01 + median)
+    assert costs["1h"] == pytest.approx(0.3 + 0.03 + median)   # 未实测周期取该指标其他周期均值
+    assert CostModel(tmp_path / "missing.json").interval_costs(["5m"], ["A"])["5m"] == cm.DEFAULT_COST
+
+
+def test_engine_partition_uses_model(tmp_path, monkeypatch, sample_klines):
+    """测试分片按实测代价装箱、hybrid 按预估耗时选后端，并从计算结果更新模型"""
+    model = CostModel(tmp_path / "cost.json")
+    monkeypatch.setattr(cm, "_model", model)
+    engine = Engine(symbols=["X"], intervals=["1m", "1h"], compute_backend="hybrid")
+    tasks = [(f"S{i}", iv, None) for iv in ("1m", "1h") for i in range(6)]
+    names = ["K线形态扫描器.py"]
+    assert engine._hybrid_backend(tasks * 10, names) == "process"          # 无数据：按任务数
+
+    model.observe({("K线形态扫描器.py", "1m"): (1.0, 1), ("K线形态扫描器.py", "1h"): (0.1, 1)})
+    chunks = engine._partition(tasks, names, 4)
+    assert [round(load, 6) for load, _ in chunks] == [2.0, 2.0, 1.3, 1.3]
+    assert all(sum(t[1] == "1m" for t in bucket) in (1, 2) for _, bucket in chunks)
+    assert engine._hybrid_backend(tasks, names) == "process"
+    assert engine._hybrid_backend(tasks[6:], names) == "thread"
+
+    batch = [("BTCUSDT", "1h", sample_klines), ("ETHUSDT", "1h", sample_klines.iloc[-100:])]
+    _, run = _compute_batch((batch, ["MACD柱状扫描器.py", "ATR波幅扫描器.py"], None))
+    assert run.costs[("MACD柱状扫描器.py", "1h")][1] == 2
+    assert set(run.costs) == {("MACD柱状扫描器.py", "1h"), ("ATR波幅扫描器.py", "1h")}
+
+
+def test_pin_partition_keeps_symbols_on_their_worker(tmp_path, monkeypatch):
+    """测试流式状态下 (symbol, interval) 固定归属同一工作者，新币种分给负载最小的工作者"""
+    from src.core import engine as engine_mod
+
+    model = CostModel(tmp_path / "cost.json")
+    model.observe({("K线形态扫描器.py", "1m"): (1.0, 1), ("K线形态扫描器.py", "1h"): (0.1, 1)})
+    monkeypatch.setattr(cm, "_model", model)
+    monkeypatch.setattr(engine_mod, "_owners", {})
+    engine = Engine(symbols=["X"], intervals=["1m", "1h"], compute_backend="process")
+    names = ["K线形态扫描器.py"]
+    tasks = [(f"S{i}", iv, None) for iv in ("1m", "1h") for i in range(6)]
+
+    def owners(parts):
+        return {(t[0], t[1]): w for w, _, batch in parts for t in batch}
+
+    first = engine._pin_partition(tasks, names, 3, 2)
+    assert sorted(t for _, _, batch in first for t in batch) == sorted(tasks)
+    loads = [sum(load for w, load, _ in first if w == k) for k in range(3)]
+    assert max(loads) - min(loads) <= 1.0
+
+    # 下一轮任务顺序变化、新增币种：已有归属不变
+    again = engine._pin_partition(list(reversed(tasks)) + [("NEWUSDT", "1m", None)], names, 3, 2)
+    moved = owners(again)
+    assert all(moved[k] == w for k, w in owners(first).items())
+    assert moved[("NEWUSDT", "1m")] in range(3)
@@ -0,0 +1,161 @@
+"""
+指标依赖 DAG 调度测试
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+import src.indicators  # noqa: E402,F401 - 触发指标注册
+from src.core.dag import DagScheduler, SlowClassifier, build_graph, merge_runs, topo_order  # noqa: E402
+from src.core.engine import _compute_batch  # noqa: E402
+from src.indicators.base import FUTURES, KLINES, IndicatorMeta, get_all_indicators  # noqa: E402
+
+
+def _fake(name, deps=(), inputs=(KLINES,)):
+    return type(name, (), {"meta": IndicatorMeta(name=name, inputs=inputs, deps=deps)})
+
+
+def test_graph_from_meta():
+    """测试按元信息建图：数据源、指标依赖、拓扑序"""
+    indicators = get_all_indicators()
+    graph = build_graph(indicators)
+    assert set(graph["期货情绪聚合表.py"]) == {FUTURES, "期货情绪元数据.py"}
+    assert graph["数据监控.py"] == (KLINES, "基础数据同步器.py")
+    assert graph[KLINES] == () and graph[FUTURES] == ()
+
+    order = topo_order(graph)
+    for node, preds in graph.items():
+        assert all(order.index(p) < order.index(node) for p in preds)
+
+    # 依赖未被选中的指标时忽略该边
+    only = {"期货情绪聚合表.py": indicators["期货情绪聚合表.py"]}
+    assert build_graph(only)["期货情绪聚合表.py"] == (FUTURES,)
+
+
+def test_cycle_rejected():
+    """测试依赖成环时报错"""
+    with pytest.raises(ValueError):
+        build_graph({"A": _fake("A", deps=("B",)), "B": _fake("B", deps=("A",))})
+
+
+def test_scheduler_concurrency_and_critical_path():
+    """测试无依赖节点并发、依赖按序执行、关键路径与失败隔离"""
+    graph = build_graph({
+        "A": _fake("A"), "B": _fake("B"),
+        "C": _fake("C", deps=("A",)), "D": _fake("D", deps=("C",)),
+    })
+    barrier = threading.Barrier(2, timeout=2)
+    done = []
+
+    def fn(node):
+        if node in ("A", "B"):
+            barrier.wait()  # 串行执行会在此超时
+        if node == "C":
+            time.sleep(0.05)
+            raise RuntimeError("boom")
+        done.append(node)
+
+    run = DagScheduler(graph, max_workers=4).run(fn)
+    assert set(run.timings) == set(graph) and run.errors == {"C": "boom"}
+    assert "D" in done and run.timings["D"].start >= run.timings["C"].end
+    assert run.critical_path == [KLINES, "A", "C", "D"]
+    assert run.critical_seconds <= run.wall
+
+    serial = DagScheduler(graph, max_workers=1).run(lambda n: None, nodes=["A", "C"])
+    assert list(serial.timings) == ["A", "C"]
+
+    merged = merge_runs([run, serial])
+    assert merged.critical_path == run.critical_path and merged.errors == {"C": "boom"}
+
+
+def test_slow_classifier_hysteresis():
+    """测试慢节点按滑动平均归类，回落到阈值一半以下才恢复"""
+    c = SlowClassifier(threshold=1.0, alpha=0.5)
+    c.record("X", 3.0)
+    assert c.is_slow("X")
+    c.record("X", 0.9)   # 均值 1.95
+    c.record("X", 0.6)   # 均值 1.275
+    assert c.is_slow("X")
+    c.record("X", 0.1)   # 均值 0.6875
+    c.record("X", 0.1)   # 均值 0.39
+    assert not c.is_slow("X")
+    assert c.split(["X", "Y"]) == (["X", "Y"], [])
+
+
+def test_compute_batch_returns_node_timings(sample_klines):
+    """测试计算分片按 DAG 执行并返回各节点耗时"""
+    names = ["基础数据同步器.py", "数据监控.py", "ADX.py", "MACD柱状扫描器.py"]
+    batch = [("BTCUSDT", "5m", sample_klines), ("ETHUSDT", "5m", sample_klines.iloc[-80:])]
+    results, run = _compute_batch((batch, names, None))
+    assert set(results) == set(names) and all(len(results[n]) == 2 for n in names)
+    assert set(run.timings) == set(names) | {KLINES}
+    assert run.timings["数据监控.py"].start >= run.timings["基础数据同步器.py"].end
+    assert not run.errors
+
+
+def test_slow_classifier_seed_keeps_measurements():
+    """测试先验估计只初始化未实测节点"""
+    c = SlowClassifier(threshold=1.0)
+    c.record("X", 0.1)
+    c.seed({"X": 5.0, "Y": 5.0, "Z": 0.1})
+    assert not c.is_slow("X") and c.is_slow("Y") and not c.is_slow("Z")
+
+
+class _StuckFuture:
+    def result(self, timeout):
+        raise TimeoutError
+
+    def cancel(self):
+        return False
+
+
+class _Pool:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, name, *args):
+        self.submitted.append(name)
+        return _StuckFuture()
+
+
+def _async_engine(monkeypatch, classifier):
+    import queue
+
+    from src.core import async_full_engine as afe
+
+    monkeypatch.setattr(afe, "slow_nodes", classifier)
+    engine = afe.FullAsyncEngine.__new__(afe.FullAsyncEngine)
+    engine._graph = {"X.py": ()}
+    engine.workers = 1
+    engine._fast_executor, engine._slow_executor = _Pool(), _Pool()
+    engine._write_queue = queue.Queue()
+    return engine
+
+
+def test_fast_pool_timeout_moves_node_to_slow_pool(monkeypatch):
+    """测试快池超时的节点计入慢节点归类，下一轮提交到慢池"""
+    classifier = SlowClassifier()
+    engine = _async_engine(monkeypatch, classifier)
+
+    run = engine._run_dag(["X.py"], {"BTCUSDT": b""}, "5m")
+    assert "X.py" in run.errors and classifier.is_slow("X.py")
+    engine._run_dag(["X.py"], {"BTCUSDT": b""}, "5m")
+    assert engine._fast_executor.submitted == ["X.py"] and engine._slow_executor.submitted == ["X.py"]
+
+
+def test_cost_model_seeds_slow_nodes(monkeypatch):
+    """测试冷启动按持久化代价模型（单币种耗时 × 币种数）预置慢节点"""
+    from src.core import async_full_engine as afe
+    from src.core.cost_model import CostModel
+
+    model = CostModel()
+    model.observe({("K.py", "5m"): (0.05, 1), ("K.py", "1h"): (0.01, 1), ("M.py", "5m"): (0.001, 1)})
+    monkeypatch.setattr(afe, "get_cost_model", lambda: model)
+    classifier = SlowClassifier(threshold=2.0)
+    engine = _async_engine(monkeypatch, classifier)
+
+    engine._seed_slow_nodes(["K.py", "M.py"], 100)
+    assert classifier.split(["K.py", "M.py"]) == (["M.py"], ["K.py"])
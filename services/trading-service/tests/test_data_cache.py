@@ -0,0 +1,97 @@
+"""
+DataCache 增量刷新与只读快照测试
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.db import cache as cache_mod  # noqa: E402
+from src.db.shm import KLINE_COLUMNS  # noqa: E402
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+
+
+class _FakeConn:
+    """按调用顺序返回预置结果的连接，记录执行的 SQL"""
+
+    def __init__(self, results, executed):
+        self._results = results
+        self._executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self._executed.append(sql)
+        return self
+
+    def fetchall(self):
+        return self._results.pop(0)
+
+
+def _rows(sample_klines, start, stop):
+    part = sample_klines.iloc[start:stop]
+    rows = []
+    for i, symbol in enumerate(SYMBOLS):
+        values = part[list(KLINE_COLUMNS)].to_numpy() * (1 + i)
+        rows += [(symbol, ts, *vals) for ts, vals in zip(part.index, values.tolist())]
+    return rows
+
+
+@pytest.fixture
+def cache(monkeypatch, sample_klines):
+    results, executed = [], []
+    monkeypatch.setattr(cache_mod.psycopg, "connect", lambda *a, **k: _FakeConn(results, executed))
+    c = cache_mod.DataCache("postgresql://unused", "binance", lookback=100)
+    results.append(_rows(sample_klines, 0, 100))
+    c.init_interval(SYMBOLS, "5m")
+    c.results, c.executed = results, executed
+    return c
+
+
+def test_update_single_query_and_snapshot_generations(cache, sample_klines):
+    """测试增量刷新单条 SQL，旧快照不受新一代影响"""
+    old = cache.snapshot("5m")
+    assert old.version == 1 and set(old.frames) == set(SYMBOLS)
+
+    cache.executed.clear()
+    cache.results.append(_rows(sample_klines, 99, 103))  # 含一根水位线处的重复K线
+    assert cache.update_interval(SYMBOLS, "5m") == 2
+    assert len(cache.executed) == 1
+    assert cache.refresh_stats["5m"]["rows"] == 8
+
+    new = cache.snapshot("5m")
+    assert new.version == 2
+    btc = new.frames["BTCUSDT"]
+    expected = sample_klines.iloc[3:103]
+    assert btc.index.equals(expected.index)
+    assert np.array_equal(btc.to_numpy(), expected[list(KLINE_COLUMNS)].to_numpy(), equal_nan=True)
+    assert old.frames["BTCUSDT"].index[-1] == sample_klines.index[99]
+
+
+def test_snapshot_is_read_only(cache):
+    """测试快照数据只读，get_klines 返回共享数据的视图而非拷贝"""
+    snap = cache.snapshot("5m")
+    with pytest.raises(TypeError):
+        snap.frames["XRPUSDT"] = pd.DataFrame()
+    assert cache.get_klines("1h") == {}
+
+    df = cache.get_klines("5m")["BTCUSDT"]
+    shared = snap.frames["BTCUSDT"]
+    assert df is not shared
+    assert np.shares_memory(df["close"].to_numpy(), shared["close"].to_numpy())
+    assert list(cache.get_klines("5m", "ETHUSDT")) == ["ETHUSDT"]
+
+    close = shared["close"].iloc[-1]
+    with pytest.raises(ValueError):
+        shared.to_numpy()[0, 0] = 0.0
+    try:
+        df.iloc[-1, df.columns.get_loc("close")] = 0.0
+    except ValueError:
+        pass  # 未启用 Copy-on-Write 的 pandas 上只读数组直接拒绝写入
+    assert cache.snapshot("5m").frames["BTCUSDT"]["close"].iloc[-1] == close
@@ -0,0 +1,87 @@
+"""
+事件驱动引擎：闭合通知合并、背压与延迟分位数测试
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.core.event_engine import CloseBatcher, EventEngine, LatencyTracker, closed_intervals  # noqa: E402
+
+T0 = datetime(2025, 1, 6, 0, 0, tzinfo=timezone.utc)  # 周一 00:00
+
+
+def test_closed_intervals_alignment():
+    """测试 1m 闭合时间对应的周期（周线按周一对齐）"""
+    all_iv = ["1m", "5m", "15m", "1h", "4h", "1d", "1w"]
+    assert closed_intervals(T0, all_iv) == all_iv
+    assert closed_intervals(T0 + timedelta(days=1), all_iv) == ["1m", "5m", "15m", "1h", "4h", "1d"]
+    assert closed_intervals(T0 + timedelta(minutes=5), all_iv) == ["1m", "5m"]
+    assert closed_intervals(T0 + timedelta(minutes=7), ["5m", "1h"]) == []
+
+
+def test_batcher_coalesces_and_applies_backpressure():
+    """测试批次到期出批、计算中不出批且新闭合并入下一批"""
+    batcher = CloseBatcher({"1m": 2, "5m": 5})
+    for i in range(600):
+        batcher.add(f"S{i}USDT", T0, ["1m", "5m"], now=100.0 + i / 300)
+
+    assert batcher.pop_due(101.0) == []
+    (batch,) = batcher.pop_due(102.0)
+    assert batch.interval == "1m" and len(batch.symbols) == 600
+    assert batcher.pending() == {"5m": 600}
+
+    # 1m 计算中：下一分钟的闭合只合并，不出批；重复币种保留最早闭合时间
+    later = T0 + timedelta(minutes=1)
+    batcher.add("S0USDT", later, ["1m"], now=160.0)
+    batcher.add("S0USDT", later + timedelta(minutes=1), ["1m"], now=220.0)
+    assert [b.interval for b in batcher.pop_due(300.0)] == ["5m"]
+
+    batcher.release("1m")
+    (batch,) = batcher.pop_due(300.0)
+    assert batch.symbols == {"S0USDT": later}
+
+
+def test_handle_notify_burst(monkeypatch):
+    """测试 NOTIFY 突发：只合并已跟踪且已闭合的 K 线"""
+    monkeypatch.setattr("src.core.event_engine.signal.signal", lambda *a: None)
+    engine = EventEngine(symbols=["BTCUSDT", "ETHUSDT"], intervals=["1m", "5m"])
+    engine._tracked = {"BTCUSDT", "ETHUSDT"}
+    engine._ready_for_events = True
+    bucket = (T0 + timedelta(minutes=4)).isoformat()
+    for _ in range(300):
+        for symbol in ("BTCUSDT", "ETHUSDT", "DOGEUSDT"):
+            engine._handle_notify("candle_1m_update", json.dumps({"symbol": symbol, "bucket_ts": bucket, "is_closed": True}))
+    engine._handle_notify("candle_1m_update", json.dumps({"symbol": "BTCUSDT", "bucket_ts": bucket, "is_closed": False}))
+    assert engine._batcher.pending() == {"1m": 2, "5m": 2}
+
+
+def test_rollup_notify_expedites_batch(monkeypatch):
+    """测试高周期合成通知使该周期批次立即到期，1m 通知仍按 CA 延迟"""
+    monkeypatch.setattr("src.core.event_engine.signal.signal", lambda *a: None)
+    engine = EventEngine(symbols=["BTCUSDT", "ETHUSDT"], intervals=["1m", "5m"])
+    engine._tracked = {"BTCUSDT", "ETHUSDT"}
+    engine._ready_for_events = True
+    bucket = (T0 + timedelta(minutes=4)).isoformat()
+    engine._handle_notify("candle_1m_update", json.dumps({"symbol": "ETHUSDT", "bucket_ts": bucket, "is_closed": True}))
+    rollup = {"interval": "5m", "bucket_ts": T0.isoformat(),
+              "bars": [["BTCUSDT", 1, 2, 0.5, 1.5, 10, 15, 3, 4, 6, 5], ["DOGEUSDT", 1, 1, 1, 1, 0, 0, 0, 0, 0, 5]]}
+    engine._handle_notify("candle_rollup", json.dumps(rollup))
+    engine._handle_notify("candle_rollup", json.dumps({**rollup, "interval": "1h"}))
+
+    due = {b.interval: b for b in engine._batcher.pop_due(datetime.now().timestamp())}
+    assert list(due) == ["5m"]
+    assert due["5m"].symbols == {"ETHUSDT": T0 + timedelta(minutes=5), "BTCUSDT": T0 + timedelta(minutes=5)}
+    assert engine._batcher.pending() == {"1m": 1}
+
+
+def test_latency_percentiles():
+    """测试闭合到写入延迟分位数"""
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentiles("5m") == {}
+    tracker.record("5m", [float(i) for i in range(1, 201)])
+    p = tracker.percentiles("5m")
+    assert p["p50"] == pytest.approx(150.5)
+    assert p["p50"] <= p["p95"] <= p["p99"] <= 200
@@ -0,0 +1,235 @@
+"""
+期货情绪历史批量加载与聚合表向量化统计测试
+"""
+import math
+import statistics
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.indicators import futures_history
+from src.indicators.batch.futures_aggregate import FuturesAggregate
+from src.indicators.batch.futures_gap_monitor import FuturesGapMonitor
+
+T0 = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(hours=30)
+STEP = timedelta(minutes=5)
+
+
+# ---------- 原逐币种实现（参照） ----------
+
+def _ref_slope_pct(values):
+    if len(values) < 2:
+        return None
+    n = len(values)
+    x_sum = (n - 1) * n / 2
+    x2_sum = (n - 1) * n * (2 * n - 1) / 6
+    xy_sum = sum(i * v for i, v in enumerate(values))
+    denom = n * x2_sum - x_sum * x_sum
+    slope = (n * xy_sum - x_sum * sum(values)) / denom if denom else None
+    return slope / values[-1] * 100 if slope is not None and values[-1] else None
+
+
+def _ref_std_over_mean(values):
+    if len(values) < 2:
+        return None
+    mean_v = statistics.fmean(values)
+    return statistics.pstdev(values) / mean_v if mean_v else None
+
+
+def _ref_z(latest, series):
+    if len(series) < 2:
+        return None
+    std_v = statistics.pstdev(series)
+    return (latest - statistics.fmean(series)) / std_v if std_v else 0.0
+
+
+def _ref_streak(signs):
+    if not signs:
+        return None
+    count, last_sign = 0, None
+    for s in reversed(signs):
+        if s == 0:
+            count += 1
+        elif last_sign is None:
+            last_sign, count = s, count + 1
+        elif s == last_sign:
+            count += 1
+        else:
+            break
+    return (count if last_sign > 0 else -count) if last_sign else 0
+
+
+def _ref_stats(rows):
+    """rows: 升序 (oi, oiv, ctlsr, tlsr, lsr, tlsvr)，None 为缺失"""
+    latest, prev = rows[-1], rows[-2] if len(rows) >= 2 else None
+    oiv, tlsr, tlsvr = latest[1], latest[3], latest[5]
+    prev_oiv = prev[1] if prev else None
+    oi_change = oiv - prev_oiv if oiv and prev_oiv else None
+    oi_change_pct = oi_change / prev_oiv if oi_change and prev_oiv else None
+    top_dev = abs(tlsr - 1) if tlsr else None
+    taker_dev = abs(tlsvr - 1) if tlsvr else None
+
+    oi_series = [r[1] for r in rows if r[1]]
+    top_series = [r[3] for r in rows if r[3]]
+    retail_series = [r[4] for r in rows if r[4]]
+    taker_series = [r[5] for r in rows if r[5]]
+    volatility = _ref_std_over_mean(oi_series)
+    deltas = [0 if b == a else (1 if b > a else -1) for a, b in zip(oi_series[:-1], oi_series[1:], strict=True)]
+    delta_pct = [(b - a) / a for a, b in zip(oi_series[:-1], oi_series[1:], strict=True)]
+    z_delta = _ref_z(oi_change_pct, delta_pct) if oi_change_pct else None
+    z_top = _ref_z(top_dev, [abs(v - 1) for v in top_series]) if top_dev else None
+    z_taker = _ref_z(taker_dev, [abs(v - 1) for v in taker_series]) if taker_dev else None
+    components = [z for z in (z_delta, z_top, z_taker) if z is not None]
+    return {
+        "持仓变动": oi_change,
+        "持仓变动%": oi_change_pct,
+        "波动率": volatility,
+        "OI连续根数": _ref_streak(deltas),
+        "主动连续根数": _ref_streak([0 if abs(v - 1) < 1e-9 else (1 if v > 1 else -1) for v in taker_series]),
+        "风险分": sum(components) if components else None,
+        "大户波动": _ref_std_over_mean(top_series),
+        "全体波动": _ref_std_over_mean(retail_series),
+        "持仓斜率": _ref_slope_pct(oi_series),
+        "持仓Z分数": _ref_z(oiv, oi_series) if oiv else None,
+        "稳定度分位": sum(1 for v in oi_series if v <= volatility) / len(oi_series) if volatility else None,
+    }
+
+
+# ---------- 测试数据 ----------
+
+def _series(seed: int, n: int):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n):
+        oiv = float(np.round(1e6 * (1 + 0.01 * rng.standard_normal()), 0))
+        tlsr = float(np.round(1 + 0.2 * rng.standard_normal(), 2))
+        tlsvr = float(np.round(1 + 0.1 * rng.standard_normal(), 2))
+        rows.append([oiv / 10, oiv, 1.0, tlsr, float(np.round(1.5 + 0.3 * rng.standard_normal(), 2)), tlsvr])
+    return rows
+
+
+def _dataset():
+    data = {f"S{i}USDT": _series(i, n) for i, n in enumerate([1, 2, 5, 60, 240])}
+    flat = _series(9, 30)
+    for r in flat:
+        r[1], r[5] = 5e5, 1.0            # 持仓恒定、主动多空比恒为 1
+    data["FLATUSDT"] = flat
+    holes = _series(7, 80)
+    for i in range(0, 80, 7):
+        holes[i][1] = None               # 缺失
+        holes[i + 1][3] = 0.0            # 零值视为无效
+    holes[-1][1] = holes[-2][1]          # 最新持仓与上一根相同
+    data["HOLEUSDT"] = holes
+    return data
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """按 SQL 类型返回假数据，记录查询次数；时间列与库中一致为 UTC naive"""
+    data = _dataset()
+    times = {}
+    calls = []
+    deltas = []
+
+    def fetch(sql, params):
+        calls.append(sql)
+        if "ROW_NUMBER" in sql:
+            symbols, limit = params
+            marks = dict.fromkeys(symbols)
+        else:
+            symbols, dts = params[0], params[1]
+            deltas.append((sql, params))
+            marks = dict(zip(symbols, dts, strict=True))
+            limit = None
+        rows = []
+        for symbol in sorted(symbols):
+            series = data.get(symbol, [])
+            stamps = times.get(symbol) or [(T0 + i * STEP).replace(tzinfo=None) for i in range(len(series))]
+            picked = list(zip(stamps, series, strict=False))
+            if marks[symbol] is not None:
+                picked = [p for p in picked if p[0] >= marks[symbol]]
+            if limit is not None:
+                picked = picked[-limit:]
+            rows.extend((symbol, t, *r, True) for t, r in picked)
+        return rows
+
+    futures_history.clear_history()
+    monkeypatch.setattr(futures_history, "_fetch", fetch)
+    fetch.deltas = deltas
+    yield data, calls, times
+    futures_history.clear_history()
+
+
+def _frames(symbols):
+    df = pd.DataFrame({"close": [1.0]}, index=pd.DatetimeIndex([T0]))
+    return dict.fromkeys(symbols, df)
+
+
+def test_aggregate_matches_reference(fake_db):
+    """测试跨币种向量化统计与逐币种原实现一致（连续根数逐位一致）"""
+    data, calls, _ = fake_db
+    frames = _frames(list(data) + ["NODATAUSDT"])
+    out = FuturesAggregate().compute_batch(frames, "5m")
+    assert len(calls) == 1 and list(out) == list(frames)
+    assert out["NODATAUSDT"][0]["信号"] == "数据不足"
+
+    for symbol, rows in data.items():
+        record = out[symbol][0]
+        assert record["数据时间"] == (T0 + (len(rows) - 1) * STEP).isoformat()
+        assert record["持仓金额"] == rows[-1][1] and record["是否闭合"] == 1
+        for key, exp in _ref_stats(rows).items():
+            act = record[key]
+            if exp is None or act is None:
+                assert exp is act, (symbol, key, exp, act)
+            elif isinstance(exp, int):
+                assert act == exp and type(act) is int, (symbol, key)
+            else:
+                assert math.isclose(act, exp, rel_tol=1e-9, abs_tol=1e-12), (symbol, key, exp, act)
+
+
+def test_history_cache_refresh(fake_db, monkeypatch):
+    """测试 TTL 内命中缓存、过期后按水位线增量合并并保持 limit 根"""
+    data, calls, _ = fake_db
+    symbols = ["S3USDT", "S4USDT"]
+    first = futures_history.load_history(symbols, "5m")
+    assert [len(first[s]) for s in symbols] == [60, 240]
+    futures_history.load_history(symbols, "5m")
+    assert len(calls) == 1
+
+    data["S4USDT"][-1][1] = 123.0                      # 未闭合的最新一根被更新
+    data["S4USDT"].append(list(data["S4USDT"][-1]))     # 新增一根
+    monkeypatch.setitem(futures_history._REFRESHED, "5m", 0)
+    after = futures_history.load_history(symbols + ["S2USDT"], "5m")
+    assert len(calls) == 3 and "ROW_NUMBER" not in calls[1]
+    h = after["S4USDT"]
+    assert len(h) == 240 and h.values["oiv"][-2] == 123.0
+    assert np.all(np.diff(h.ts) > 0) and len(after["S2USDT"]) == 5
+
+
+def test_gap_monitor_from_cache(fake_db):
+    """测试缺口监控复用历史缓存并识别缺口"""
+    data, calls, _ = fake_db
+    del data["S3USDT"][10:13]
+    out = FuturesGapMonitor().compute_batch(_frames(["S3USDT", "NODATAUSDT"]), "5m")
+    gap = out["S3USDT"][0]
+    assert gap["已加载根数"] == 57 and gap["缺失根数"] == 0   # 假数据按序号重排时间，无缺口
+    assert out["NODATAUSDT"][0]["已加载根数"] == 0 and len(calls) == 1
+    assert FuturesGapMonitor().compute_batch(_frames(["S3USDT"]), "1h")["S3USDT"][0]["信号"] == "数据不足"
+
+
+def test_delta_watermark_matches_naive_column(fake_db, monkeypatch):
+    """测试增量查询水位线按 naive UTC 传入 ::timestamp[]（与 naive 时间列直接比较，不受会话时区影响）"""
+    data, calls, _ = fake_db
+    futures_history.load_history(["S3USDT"], "5m")
+    data["S3USDT"].append(list(data["S3USDT"][-1]))
+    monkeypatch.setitem(futures_history._REFRESHED, "5m", 0)
+    h = futures_history.load_history(["S3USDT"], "5m")["S3USDT"]
+
+    (sql, (syms, marks, _, lower)), = futures_history._fetch.deltas
+    last = (T0 + 59 * STEP).replace(tzinfo=None)
+    assert "::timestamp[]" in sql and "timestamptz" not in sql
+    assert syms == ["S3USDT"] and marks == [last] and lower == last and last.tzinfo is None
+    assert len(h) == 61 and pd.Timestamp(h.ts[-1], tz="UTC") == T0 + 60 * STEP
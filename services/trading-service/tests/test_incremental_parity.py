@@ -0,0 +1,40 @@
+"""
+流式增量指标一致性测试
+"""
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.indicators.base import get_incremental_indicators
+from src.indicators.incremental.parity import check_parity
+from src.indicators.incremental.state import StateStore
+
+STREAMING = sorted(name for name, cls in get_incremental_indicators().items() if cls().create_state() is not None)
+
+
+def test_streaming_indicators_registered():
+    """测试 MACD/KDJ/ATR/OBV/CVD/EMA_GC 均支持流式计算"""
+    assert len(STREAMING) == 6
+
+
+@pytest.mark.parametrize("name", STREAMING)
+@pytest.mark.parametrize("warmup", [0, 200])
+def test_update_matches_compute(sample_klines, name, warmup):
+    """测试逐根 update 与 compute 逐位一致"""
+    indicator = get_incremental_indicators()[name]()
+    mismatches = check_parity(indicator, sample_klines, "BTCUSDT", "5m", warmup=warmup)
+    assert mismatches == []
+
+
+def test_state_store_advances_incrementally(sample_klines):
+    """测试 StateStore 只推进新增K线，回写时重新预热"""
+    indicator = get_incremental_indicators()["MACD柱状扫描器.py"]()
+    store = StateStore()
+
+    store.advance(indicator, sample_klines.iloc[:300], "BTCUSDT", "5m")
+    result = store.advance(indicator, sample_klines.iloc[:301], "BTCUSDT", "5m")
+    assert result.equals(indicator.compute(sample_klines.iloc[:301], "BTCUSDT", "5m"))
+
+    revised = sample_klines.iloc[:301].copy()
+    revised.iloc[-1, revised.columns.get_loc("close")] *= 1.01
+    result = store.advance(indicator, revised, "BTCUSDT", "5m")
+    assert result.equals(indicator.compute(revised, "BTCUSDT", "5m"))
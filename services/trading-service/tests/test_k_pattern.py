@@ -0,0 +1,115 @@
+"""
+K线形态扫描器批量扫描与缓存测试
+"""
+import numpy as np
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.config import config
+from src.indicators.batch import k_pattern
+from src.indicators.batch.k_pattern import KPattern
+
+
+def _breakout(lookback):
+    """按 TA-Lib 约定的假 CDL 函数：前 lookback 根输出 0，末根只看末尾 lookback+1 根"""
+    calls = []
+
+    def fn(o, h, low, c):
+        calls.append(len(c))
+        out = np.zeros(len(c), dtype=np.int32)
+        for i in range(lookback, len(c)):
+            window = c[i - lookback:i]
+            if lookback and c[i] > window.max():
+                out[i] = 100
+            elif lookback and c[i] < window.min():
+                out[i] = -100
+            elif not lookback and c[i] > o[i]:
+                out[i] = 100
+        return out
+    fn.calls = calls
+    return fn
+
+
+@pytest.fixture
+def fake_cdl(monkeypatch):
+    funcs = [("CDLDOJI", _breakout(0), 0), ("CDLHAMMER", _breakout(3), 3),
+             ("CDLENGULFING", _breakout(8), 8), ("CDLHIKKAKE", _breakout(2), None)]
+    monkeypatch.setattr(k_pattern, "_TALIB_CDL_FUNCS", funcs)
+    monkeypatch.setattr(config, "k_patterns", [])
+    k_pattern.clear_pattern_cache()
+    yield funcs
+    k_pattern.clear_pattern_cache()
+
+
+@pytest.fixture
+def frames(sample_klines):
+    out = {}
+    for i, n in enumerate([4, 6, 9, 12, 50, 50]):
+        df = sample_klines.iloc[-n - i * 7:len(sample_klines) - i * 7]
+        out[f"SYM{i}USDT"] = df
+    return out
+
+
+def _reference(df, funcs):
+    """原实现：每个函数在整段窗口上计算，取末根"""
+    if len(df) < 5:
+        return {}
+    o, h, low, c = (df[col].values for col in ("open", "high", "low", "close"))
+    out = {}
+    for fname, fn, _ in funcs:
+        val = float(fn(o, h, low, c)[-1])
+        if val != 0:
+            out[fname] = val / 100.0
+    return out
+
+
+def test_batch_scan_matches_full_window(fake_cdl, frames):
+    """测试按 lookback 拼接的整批扫描与逐币种整段计算一致，且每个函数只调用一次"""
+    batch = k_pattern._detect_talib_batch(frames)
+    expected = {s: _reference(df, fake_cdl) for s, df in frames.items()}
+    assert batch == expected and any(batch.values())
+    for _, fn, _ in fake_cdl:
+        fn.calls.clear()
+    k_pattern._detect_talib_batch(frames)
+    assert len(fake_cdl[2][1].calls) == 1 and fake_cdl[2][1].calls[0] == 9 * 4   # 仅 4 个币种够 9 根
+    assert len(fake_cdl[3][1].calls) == 5                                        # lookback 未知时逐币种
+
+
+def test_results_cached_per_bar(fake_cdl, frames):
+    """测试末根未变时复用缓存，末根更新只重算该币种"""
+    ind = KPattern()
+    first = ind.compute_batch(frames, "5m")
+    fn = fake_cdl[1][1]
+    fn.calls.clear()
+    assert ind.compute_batch(frames, "5m") == first and not fn.calls
+
+    updated = dict(frames)
+    df = frames["SYM4USDT"].copy()
+    df.iloc[-1, df.columns.get_loc("close")] = df["close"].max() * 2
+    updated["SYM4USDT"] = df
+    again = ind.compute_batch(updated, "5m")
+    assert fn.calls == [4]
+    assert "锤子线" in again["SYM4USDT"][0]["形态类型"]
+    assert all(again[s] == first[s] for s in frames if s != "SYM4USDT")
+    assert first["SYM0USDT"][0]["形态"] is None
+
+
+def test_active_pattern_set(fake_cdl, frames, monkeypatch):
+    """测试 K_PATTERNS 限定启用的形态"""
+    monkeypatch.setattr(config, "k_patterns", ["CDLHAMMER"])
+    df = frames["SYM3USDT"].copy()
+    df.iloc[-1, df.columns.get_loc("close")] = df["close"].max() * 2
+    out = KPattern().compute_batch({**frames, "SYM3USDT": df}, "5m")
+    kinds = {records[0].get("形态类型") for records in out.values()}
+    assert kinds <= {None, "无形态", "锤子线"} and "锤子线" in kinds
+    assert not fake_cdl[0][1].calls and not fake_cdl[2][1].calls
+
+
+def test_talib_parity(sample_klines, monkeypatch):
+    """测试真实 TA-Lib 下整批扫描与整段计算一致"""
+    pytest.importorskip("talib")
+    monkeypatch.setattr(k_pattern, "_TALIB_CDL_FUNCS", None)
+    funcs = k_pattern._get_talib_cdl_funcs()
+    assert funcs and all(lb is not None for _, _, lb in funcs)
+    frames = {f"S{i}": sample_klines.iloc[i * 40:i * 40 + 50] for i in range(8)}
+    assert k_pattern._detect_talib_batch(frames, funcs) == {s: _reference(df, funcs) for s, df in frames.items()}
@@ -0,0 +1,161 @@
+"""
+指标数值内核测试（与原逐元素循环实现逐位一致）
+"""
+import numpy as np
+import pytest
+
+from src.indicators import kernels
+
+
+@pytest.fixture
+def ohlc(sample_klines):
+    return (sample_klines["high"].to_numpy(), sample_klines["low"].to_numpy(),
+            sample_klines["close"].to_numpy())
+
+
+def _ref_ewm(arr, alpha):
+    result = np.zeros_like(arr, dtype=float)
+    result[0] = arr[0]
+    for i in range(1, len(arr)):
+        result[i] = result[i - 1] * (1 - alpha) + arr[i] * alpha
+    return result
+
+
+def _ref_tr(high, low, close):
+    tr = np.zeros(len(close))
+    tr[0] = high[0] - low[0]
+    for i in range(1, len(close)):
+        tr[i] = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+    return tr
+
+
+def test_backend_detected():
+    """测试后端为 numba / scipy / numpy 之一"""
+    assert kernels.BACKEND in ("numba", "scipy", "numpy")
+
+
+@pytest.mark.parametrize("alpha", [1 / 14, 2 / 21, 0.5])
+def test_ewm_recursive(ohlc, alpha):
+    """测试 Wilder/EMA 递推与循环一致（含 NaN 传播）"""
+    close = ohlc[2].copy()
+    assert np.array_equal(kernels.ewm_recursive(close, alpha), _ref_ewm(close, alpha))
+    close[200] = np.nan
+    assert np.array_equal(kernels.ewm_recursive(close, alpha), _ref_ewm(close, alpha), equal_nan=True)
+
+
+def test_ewm_lfilter_matches_loop(ohlc):
+    """测试 scipy lfilter 路径与循环一致"""
+    pytest.importorskip("scipy")
+    close = ohlc[2]
+    assert np.array_equal(kernels._ewm_lfilter(close, 1 / 14), _ref_ewm(close, 1 / 14))
+
+
+def test_smma(ohlc):
+    """测试 SMMA 递推"""
+    close = ohlc[2]
+    length = 20
+    expected = np.full(len(close), np.nan)
+    expected[length - 1] = close[:length].mean()
+    for i in range(length, len(close)):
+        expected[i] = (expected[i - 1] * (length - 1) + close[i]) / length
+    assert np.array_equal(kernels.smma(close, length, close[:length].mean()), expected, equal_nan=True)
+    assert np.isnan(kernels.smma(close[:5], length, 1.0)).all()
+
+
+def test_half_avg(ohlc):
+    """测试 Heikin Ashi 开盘价递推"""
+    close = ohlc[2]
+    expected = np.empty(len(close))
+    expected[0] = 100.0
+    for i in range(1, len(close)):
+        expected[i] = (expected[i - 1] + close[i - 1]) / 2
+    assert np.array_equal(kernels.half_avg(100.0, close), expected)
+
+
+def test_true_range_and_dm(ohlc):
+    """测试 TR / 方向动量向量化"""
+    high, low, close = ohlc
+    assert np.array_equal(kernels.true_range(high, low, close), _ref_tr(high, low, close))
+
+    plus_dm, minus_dm = np.zeros(len(high)), np.zeros(len(high))
+    for i in range(1, len(high)):
+        up, down = high[i] - high[i - 1], low[i - 1] - low[i]
+        plus_dm[i] = up if up > down and up > 0 else 0
+        minus_dm[i] = down if down > up and down > 0 else 0
+    got_plus, got_minus = kernels.directional_movement(high, low)
+    assert np.array_equal(got_plus, plus_dm)
+    assert np.array_equal(got_minus, minus_dm)
+
+
+def test_rolling_extrema_and_mad(ohlc):
+    """测试滚动极值与平均绝对偏差"""
+    high, low, close = ohlc
+    period = 14
+    hh = np.array([high[i - period + 1:i + 1].max() for i in range(period - 1, len(high))])
+    ll = np.array([low[i - period + 1:i + 1].min() for i in range(period - 1, len(low))])
+    assert np.array_equal(kernels.rolling_max(high, period), hh)
+    assert np.array_equal(kernels.rolling_min(low, period), ll)
+    assert len(kernels.rolling_max(high[:5], period)) == 0
+
+    sma = np.convolve(close, np.ones(20) / 20, mode="valid")
+    mad = np.array([np.mean(np.abs(close[i:i + 20] - sma[i])) for i in range(len(sma))])
+    assert np.array_equal(kernels.rolling_mad(close, sma, 20), mad)
+
+
+def test_pivot_mask(ohlc):
+    """测试枢轴点判定"""
+    high = ohlc[0]
+    prd = 5
+    expected = np.zeros(len(high), dtype=bool)
+    for i in range(prd, len(high) - prd):
+        expected[i] = high[i] >= high[i - prd:i + prd + 1].max()
+    assert np.array_equal(kernels.pivot_mask(high, prd, prd, "max"), expected)
+
+
+def test_supertrend(ohlc):
+    """测试 SuperTrend 轨道递推"""
+    high, low, close = ohlc
+    atr = _ref_ewm(_ref_tr(high, low, close), 1 / 10)
+    upper = (high + low) / 2 + 3 * atr
+    lower = (high + low) / 2 - 3 * atr
+
+    n = len(close)
+    fu, fl, st = upper.copy(), lower.copy(), np.zeros(n)
+    direction = np.ones(n, dtype=int)
+    for i in range(1, n):
+        fu[i] = upper[i] if close[i - 1] > fu[i - 1] else min(upper[i], fu[i - 1])
+        fl[i] = lower[i] if close[i - 1] < fl[i - 1] else max(lower[i], fl[i - 1])
+        if st[i - 1] == fu[i - 1]:
+            direction[i] = -1 if close[i] > fu[i] else 1
+        else:
+            direction[i] = 1 if close[i] < fl[i] else -1
+        st[i] = fu[i] if direction[i] == 1 else fl[i]
+
+    got = kernels.supertrend(close, upper, lower)
+    for actual, expected in zip(got, (fu, fl, st, direction), strict=True):
+        assert np.array_equal(actual, expected)
+
+
+def test_band_trend(ohlc):
+    """测试通道突破趋势状态与最近翻转位置"""
+    close = ohlc[2]
+    mid = _ref_ewm(close, 2 / 31)
+    upper, lower = mid * 1.005, mid * 0.995
+
+    trend = [0] * len(close)
+    last_cross = None
+    for i in range(1, len(close)):
+        if close[i - 1] <= upper[i] and close[i] > upper[i]:
+            trend[i] = 1
+            if trend[i] != trend[i - 1]:
+                last_cross = i
+        elif close[i - 1] >= lower[i] and close[i] < lower[i]:
+            trend[i] = -1
+            if trend[i] != trend[i - 1]:
+                last_cross = i
+        else:
+            trend[i] = trend[i - 1]
+
+    got_trend, got_cross = kernels.band_trend(close, upper, lower)
+    assert got_trend.tolist() == trend
+    assert got_cross == last_cross
@@ -0,0 +1,69 @@
+"""
+K线滑动缓冲测试（与原 concat / 去重 / tail 刷新逐位一致）
+"""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg")  # src.db 包导入时依赖
+
+from src.db.ring import KlineRing, rows_to_arrays  # noqa: E402
+from src.db.shm import KLINE_COLUMNS  # noqa: E402
+
+
+def _rows(df: pd.DataFrame, symbol: str = "BTCUSDT") -> list:
+    cols = list(KLINE_COLUMNS)
+    return [(symbol, ts, *vals) for ts, vals in zip(df.index, df[cols].itertuples(index=False, name=None))]
+
+
+def _append_df(ring: KlineRing, df: pd.DataFrame) -> int:
+    if df.empty:
+        return 0
+    ts, values, _ = rows_to_arrays(_rows(df), ts_pos=1)
+    return ring.append(ts, values)
+
+
+def test_rows_to_arrays_converts_decimal_and_none():
+    """测试 Decimal 转 float、None 转 NaN、时区转 UTC"""
+    ts = pd.Timestamp("2025-01-01 08:00", tz="Asia/Shanghai")
+    row = ("BTCUSDT", ts, Decimal("1.5"), 2, 3.0, None, 5, 6, 7, 8, 9)
+    got_ts, values, utc = rows_to_arrays([row], ts_pos=1)
+    assert utc
+    assert got_ts[0] == pd.Timestamp("2025-01-01 00:00", tz="UTC").value
+    assert values.shape == (len(KLINE_COLUMNS), 1)
+    assert values[0, 0] == 1.5 and np.isnan(values[3, 0])
+
+
+def test_ring_matches_concat_tail(sample_klines):
+    """测试分批追加（含重叠与超容量批次）后与 concat/去重/tail 结果一致"""
+    capacity = 120
+    ring = KlineRing(capacity)
+    expected = None
+    pos = 0
+    for step in [100, 7, 1, 1, 30, 0, 25, 150, 3, 60]:
+        # 每批与上一批重叠 2 行，模拟水位线之前的重复K线
+        batch = sample_klines.iloc[max(0, pos - 2):pos + step]
+        pos += step
+        _append_df(ring, batch)
+        combined = batch if expected is None else pd.concat([expected, batch])
+        expected = combined[~combined.index.duplicated(keep="last")].sort_index().tail(capacity)
+
+        got = ring.frame()
+        assert len(ring) == len(expected)
+        assert ring.last_ts == expected.index[-1]
+        assert got.index.equals(expected.index)
+        assert np.array_equal(got.to_numpy(), expected[list(KLINE_COLUMNS)].to_numpy(), equal_nan=True)
+
+
+def test_ring_ignores_stale_rows(sample_klines):
+    """测试不晚于水位线的K线被忽略，frame 副本不受后续追加影响"""
+    ring = KlineRing(50)
+    assert ring.last_ts is None and ring.frame().empty
+    assert _append_df(ring, sample_klines.iloc[:40]) == 40
+    snapshot = ring.frame()
+    assert _append_df(ring, sample_klines.iloc[30:40]) == 0
+    assert _append_df(ring, sample_klines.iloc[30:80]) == 40
+    assert snapshot.index[-1] == sample_klines.index[39]
+    assert ring.frame().index[0] == sample_klines.index[30]
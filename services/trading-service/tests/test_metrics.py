@@ -0,0 +1,77 @@
+"""
+指标导出、跨进程合并与 /metrics 端点测试
+"""
+import math
+import pickle
+import urllib.request
+
+import pytest
+
+from src.observability.exporter import start_http_server, stop_http_server
+from src.observability.metrics import MetricsCollector
+
+
+def test_prometheus_exposition():
+    """测试 Prometheus 文本格式：直方图展开为 _bucket/_sum/_count、+Inf 桶、标签转义"""
+    m = MetricsCollector()
+    h = m.histogram("compute_seconds", "耗时", (0.1, 1))
+    for v in (0.05, 0.5, 0.5, 3.0, float("nan")):
+        h.observe(v, indicator='A"B', interval="1m")
+    m.counter("rows_total").inc(3)
+    m.gauge("symbols").set(12)
+
+    text = m.to_prometheus()
+    labels = 'indicator="A\\"B",interval="1m"'
+    assert f'compute_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'compute_seconds_bucket{{{labels},le="1.0"}} 3' in text
+    assert f'compute_seconds_bucket{{{labels},le="+Inf"}} 4' in text
+    assert f"compute_seconds_sum{{{labels}}} 4.05" in text
+    assert f"compute_seconds_count{{{labels}}} 5" in text
+    assert "# TYPE compute_seconds histogram" in text and "rows_total 3.0" in text and "symbols 12" in text
+
+
+def test_histogram_quantile():
+    """测试按桶插值估计分位数"""
+    h = MetricsCollector().histogram("x", buckets=(1, 2, 4))
+    assert math.isnan(h.quantile(0.5))
+    for v in [0.5] * 50 + [1.5] * 40 + [3] * 9 + [10]:
+        h.observe(v, k="a")
+    assert h.quantile(0.5, k="a") == pytest.approx(1.0)
+    assert h.quantile(0.9, k="a") == pytest.approx(2.0)
+    assert h.quantile(0.99, k="a") == pytest.approx(4.0)
+    assert h.cumulative(k="a") == [50, 90, 99, 100]
+
+
+def test_drain_and_merge_across_workers():
+    """测试子进程 drain 的增量可 pickle，主进程合并后累加，子进程计数清零"""
+    parent, child = MetricsCollector(), MetricsCollector()
+    parent.counter("c").inc(1, backend="process")
+    parent.histogram("h", buckets=(1,)).observe(0.5, indicator="A")
+    for _ in range(2):
+        child.counter("c").inc(2, backend="process")
+        child.histogram("h", buckets=(1,)).observe(5, indicator="A")
+        child.gauge("g").set(7)
+        parent.merge(pickle.loads(pickle.dumps(child.drain())))
+
+    assert parent.counter("c").get(backend="process") == 5
+    assert parent.histogram("h").cumulative(indicator="A") == [1, 3]
+    assert parent.gauge("g").get() == 7
+    assert child.counter("c").get(backend="process") == 0 and "h" not in child.drain()
+
+
+def test_http_endpoint():
+    """测试内嵌 /metrics 端点"""
+    m = MetricsCollector()
+    m.counter("hits_total", "命中").inc(2)
+    server = start_http_server(0, host="127.0.0.1", collector=m)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as resp:
+            assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "hits_total 2.0" in resp.read().decode()
+        with urllib.request.urlopen(f"{base}/healthz", timeout=5) as resp:
+            assert resp.status == 200
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/nope", timeout=5)
+    finally:
+        stop_http_server()
@@ -0,0 +1,80 @@
+"""
+K线派生原语缓存测试
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.indicators  # noqa - 触发指标注册
+from src.indicators import primitives as prim
+from src.indicators.base import get_all_indicators
+from src.indicators.primitives import PrimitiveCache, format_report, merge_reports, primitives
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = PrimitiveCache(enabled=True)
+    monkeypatch.setattr(prim, "_cache", cache)
+    return cache
+
+
+def _assert_same(a: pd.Series, b: pd.Series):
+    pd.testing.assert_series_equal(a, b, check_exact=True, check_names=False)
+
+
+def test_primitives_match_pandas(sample_klines):
+    """测试各原语与原指标中的 pandas 写法逐位一致"""
+    df = sample_klines.copy()
+    df.iloc[:3, df.columns.get_loc("close")] = np.nan   # 前置缺失，检验 min_periods 遮盖
+    p = primitives(df, "BTCUSDT", "5m")
+    high, low, close = df["high"], df["low"], df["close"]
+    prev_close = close.shift(1)
+    tr = pd.concat([(high - low).abs(), (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+
+    _assert_same(p.tr(), tr)
+    for mp in (0, 1, 14):
+        _assert_same(p.atr(14, min_periods=mp), tr.ewm(alpha=1/14, adjust=False, min_periods=mp).mean())
+        _assert_same(p.ema(12, min_periods=mp), close.ewm(span=12, adjust=False, min_periods=mp).mean())
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).ewm(alpha=1/14, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/14, adjust=False).mean()
+    _assert_same(p.rsi(14), 100 - (100 / (1 + gain / loss.replace(0, np.nan))))
+    _assert_same(p.sma(20, min_periods=20), close.rolling(20, min_periods=20).mean())
+    _assert_same(p.highest(20), high.rolling(20).max())
+    _assert_same(p.lowest(20), low.rolling(20).min())
+
+
+def test_hits_and_eviction(sample_klines, fresh_cache):
+    """测试同帧命中、末根更新失效、K 线推进淘汰旧帧"""
+    df = sample_klines.iloc[:-1]
+    first = primitives(df, "BTCUSDT", "5m").ema(12)
+    assert primitives(df.copy(deep=False), "BTCUSDT", "5m").ema(12) is first
+    assert primitives(df, "ETHUSDT", "5m").ema(12) is not first
+
+    # 未闭合 K 线收盘价更新：签名变化，重新计算
+    updated = df.copy()
+    updated.iloc[-1, updated.columns.get_loc("close")] += 1
+    assert primitives(updated, "BTCUSDT", "5m").ema(12).iloc[-1] != first.iloc[-1]
+
+    # K 线推进：更早的帧全部淘汰
+    primitives(sample_klines, "BTCUSDT", "5m").ema(12)
+    frames = fresh_cache._frames[("BTCUSDT", "5m")]
+    assert len(frames) == 1 and next(iter(frames))[2] == sample_klines.index[-1]
+
+    report = fresh_cache.report()
+    assert report["ema"]["hits"] == 1 and report["ema"]["misses"] == 4
+    assert report["ema"]["saved_s"] > 0 and fresh_cache.report() == {}
+    assert format_report(merge_reports(report, report)).startswith("命中率 20% (2/10)")
+
+
+def test_indicators_share_primitives(sample_klines, fresh_cache):
+    """测试同一帧上多个指标复用 TR / EMA，结果与关闭缓存时一致"""
+    names = ["全量支撑阻力扫描器.py", "超级精准趋势扫描器.py", "智能RSI扫描器.py", "大资金操盘扫描器.py"]
+    indicators = {n: get_all_indicators()[n]() for n in names}
+    cached = {n: ind.compute(sample_klines, "BTCUSDT", "1h") for n, ind in indicators.items()}
+    report = fresh_cache.report()
+    assert report["tr"]["hits"] >= 1 and report["ema"]["hits"] >= 1
+
+    fresh_cache.enabled = False
+    for n, ind in indicators.items():
+        pd.testing.assert_frame_equal(ind.compute(sample_klines, "BTCUSDT", "1h"), cached[n])
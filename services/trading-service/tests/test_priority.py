@@ -0,0 +1,136 @@
+"""
+高优先级增量排名测试
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.core import priority as prio  # noqa: E402
+from src.core.priority import PriorityRanker  # noqa: E402
+
+NOW = datetime(2024, 1, 2, 12, 0, tzinfo=timezone.utc)
+NOW_NS = pd.Timestamp(NOW).value
+
+
+def _rows(symbol, hours=26, seed=0, close0=100.0):
+    """近 hours 小时的 5m K线行 (symbol, bucket_ts, high, low, close, quote_volume)"""
+    rng = np.random.default_rng(seed)
+    n = hours * 12
+    close = close0 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    rows = []
+    for i in range(n):
+        ts = NOW - timedelta(minutes=5 * (n - 1 - i))
+        c = float(close[i])
+        rows.append((symbol, ts, c * 1.002, c * 0.998 - rng.random() * 0.1, c, float(rng.random() * 1e6)))
+    return rows
+
+
+def _brute(rows, now=NOW):
+    """与原 SQL 一致的暴力计算: 24h 成交额、振幅均值、涨跌幅"""
+    win = [r for r in rows if r[1] > now - timedelta(hours=24)]
+    qv = sum(r[5] for r in win)
+    vol = np.mean([(r[2] - r[3]) / r[4] for r in win])
+    latest = [r for r in rows if r[1] > now - timedelta(hours=1)]
+    prev = [r for r in rows if now - timedelta(hours=25) <= r[1] <= now - timedelta(hours=23)]
+    change = abs((latest[-1][4] - prev[-1][4]) / prev[-1][4]) if latest and prev else None
+    return qv, vol, change
+
+
+def test_window_matches_sql_semantics():
+    """测试滚动统计与 24h 聚合 / 23~25h 涨跌幅的暴力计算一致"""
+    ranker = PriorityRanker(db_url="", exchange="x", sync_seconds=0)
+    rows = _rows("BTCUSDT")
+    ranker.ingest_rows(rows)
+    w = ranker._klines["BTCUSDT"]
+    w.advance(NOW_NS)
+    qv, vol, change = _brute(rows)
+    assert w.qv_sum == pytest.approx(qv) and w.rng_sum / w.rng_n == pytest.approx(vol)
+    assert w.change(NOW_NS) == pytest.approx(change)
+    assert w.ts[0] >= NOW_NS - prio._KEEP
+
+    # 时间推进 2h 后：滑出窗口的 K 线被扣除，且不再有 1h 内的最新价
+    later = NOW + timedelta(hours=2)
+    w.advance(pd.Timestamp(later).value)
+    qv2, vol2, _ = _brute(rows, later)
+    assert w.qv_sum == pytest.approx(qv2) and w.rng_sum / w.rng_n == pytest.approx(vol2)
+    assert w.change(pd.Timestamp(later).value) is None
+
+
+def test_incremental_bars_and_replacement():
+    """测试逐根追加、同一根重复到达替换、过期K线忽略"""
+    ranker = PriorityRanker(db_url="", exchange="x", sync_seconds=0)
+    rows = _rows("ETHUSDT")
+    ranker.ingest_rows(rows[:-10])
+    for r in rows[-10:]:
+        ranker.ingest_rows([r])
+    ranker.ingest_rows([rows[-1][:5] + (rows[-1][5] + 500.0,)])    # 最后一根更新
+    ranker.ingest_rows([rows[0]])                                   # 旧K线
+    w = ranker._klines["ETHUSDT"]
+    w.advance(NOW_NS)
+    qv, _, _ = _brute(rows)
+    assert w.qv_sum == pytest.approx(qv + 500.0)
+    assert len(w.ts) == len({r[1] for r in rows if r[1] >= NOW - timedelta(hours=25)})
+
+
+def test_rank_top_k():
+    """测试各维度 top-k 并集与期货极端值 / 过期过滤"""
+    ranker = PriorityRanker(db_url="", exchange="x", sync_seconds=0)
+    for i in range(20):
+        rows = [(s, ts, h, lo, c, qv * (i + 1)) for s, ts, h, lo, c, qv in _rows(f"S{i:02d}", seed=i)]
+        ranker.ingest_rows(rows)
+    top, debug = ranker.rank_klines(3, now=NOW_NS)
+    assert {"S19", "S18", "S17"} <= top and debug["volume"] == 3
+    assert debug["kline_total"] == len(top) <= 9
+
+    ranker.ingest_futures([
+        ("AUSDT", NOW, 5e9, 1.0, 1.0),
+        ("BUSDT", NOW, 1e9, 6.0, 1.0),
+        ("CUSDT", NOW, 2e9, 1.0, 0.3),
+        ("DUSDT", NOW - timedelta(days=8), 9e9, 1.0, 1.0),
+        ("AUSDT", NOW - timedelta(hours=1), 1.0, 9.0, 9.0),       # 更旧的记录不覆盖
+    ])
+    futures, fdebug = ranker.rank_futures(1, now=NOW_NS)
+    assert futures == {"AUSDT", "BUSDT", "CUSDT"}
+    assert fdebug["taker_extreme"] == 1 and fdebug["ls_extreme"] == 1
+    assert ranker.rank(3, now=NOW_NS) == top | futures
+
+
+def test_cache_ingest_feeds_ranker(monkeypatch):
+    """测试 DataCache 摄入 5m K线时经监听器同步计入排名统计"""
+    from src.db import cache as cache_mod
+    from src.db.cache import DataCache
+    from src.db.shm import KLINE_COLUMNS
+
+    ranker = PriorityRanker(db_url="", exchange="x", sync_seconds=0)
+    monkeypatch.setattr(cache_mod, "_ingest_listeners", [])
+    cache_mod.add_ingest_listener(ranker.on_cache_ingest)
+    src = _rows("BTCUSDT", hours=2)
+    rows = []
+    for sym, ts, h, lo, c, qv in src:
+        values = {"open": c, "high": h, "low": lo, "close": c, "volume": 1.0, "quote_volume": qv}
+        rows.append((sym, ts, *(values.get(col, 0.0) for col in KLINE_COLUMNS)))
+
+    cache = DataCache(db_url="", exchange="x")
+    cache._ingest("1h", rows)
+    assert not ranker._klines
+    cache._ingest("5m", rows)
+    w = ranker._klines["BTCUSDT"]
+    w.advance(NOW_NS)
+    assert len(w.ts) == len(src) and w.qv_sum == pytest.approx(sum(r[5] for r in src))
+
+
+def test_global_ranker_registers_ingest_listener(monkeypatch):
+    """测试创建全局排名器时向缓存注册摄入监听器，缓存模块不依赖 core.priority"""
+    import inspect
+
+    from src.db import cache as cache_mod
+
+    monkeypatch.setattr(cache_mod, "_ingest_listeners", [])
+    monkeypatch.setattr(prio, "_ranker", None)
+    ranker = prio.get_priority_ranker()
+    assert cache_mod._ingest_listeners == [ranker.on_cache_ingest]
+    assert "core.priority" not in inspect.getsource(cache_mod)
@@ -0,0 +1,160 @@
+"""
+K线共享内存导出 / 挂载测试
+"""
+import gc
+import multiprocessing as mp
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.core.engine import Engine
+from src.db import shm as shm_mod
+from src.db.shm import KLINE_COLUMNS, KlineRef, SharedKlineBlock, attach_frame, release_attached
+
+
+@pytest.fixture
+def frames(sample_klines):
+    """长度不一的多币种K线（含缺列、空表、非 UTC 时区）"""
+    short = sample_klines.iloc[-20:].drop(columns=["quote_volume"])
+    shifted = sample_klines.iloc[-50:].tz_convert("Asia/Shanghai")
+    return {"AUSDT": sample_klines, "BUSDT": short, "CUSDT": sample_klines.iloc[:0], "DUSDT": shifted}
+
+
+@pytest.fixture
+def block(frames):
+    b = SharedKlineBlock(frames)
+    yield b
+    b.close()
+
+
+def _expected(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.reindex(columns=list(KLINE_COLUMNS)).astype(np.float64)
+    out.index = pd.DatetimeIndex(out.index).tz_convert("UTC").as_unit("ns").rename("bucket_ts")
+    return out
+
+
+def _attach_in_child(ref: KlineRef) -> tuple:
+    frame = attach_frame(ref)
+    result = (frame.index[0].value, frame.index[-1].value, float(np.nansum(frame["close"])), frame.shape)
+    del frame
+    release_attached()
+    return result
+
+
+def test_export_skips_empty_and_packs_rows(block, frames):
+    """测试空表不导出，各币种按顺序占据连续行区间"""
+    refs = block.refs()
+    assert list(refs) == ["AUSDT", "BUSDT", "DUSDT"]
+    assert block.total_rows == sum(len(df) for df in frames.values())
+    assert [(r.start, r.length) for r in refs.values()] == [(0, 450), (450, 20), (470, 50)]
+    assert all(r.shm_name == block.name and r.total_rows == block.total_rows and r.utc for r in refs.values())
+
+
+def test_attach_frame_round_trip(block, frames):
+    """测试挂载结果与原始K线一致（缺列为 NaN，时区统一为 UTC）"""
+    for symbol, ref in block.refs().items():
+        pd.testing.assert_frame_equal(attach_frame(ref), _expected(frames[symbol]), check_freq=False)
+
+
+def test_naive_index_stays_naive(sample_klines):
+    """测试无时区索引导出后挂载仍为无时区"""
+    b = SharedKlineBlock({"AUSDT": sample_klines.tz_localize(None)})
+    try:
+        ref = b.refs()["AUSDT"]
+        assert not ref.utc
+        assert attach_frame(ref).index.tz is None
+    finally:
+        b.close()
+
+
+def test_attach_frame_is_read_only_zero_copy(block):
+    """测试挂载的 DataFrame 直接映射共享内存且不可写"""
+    ref = block.refs()["BUSDT"]
+    frame = attach_frame(ref)
+    with pytest.raises(ValueError):
+        frame["close"].to_numpy()[0] = 1.0
+
+    _, values = shm_mod._layout(block._shm.buf, block.total_rows)
+    values[KLINE_COLUMNS.index("close"), ref.start] = 123.0
+    assert frame["close"].iloc[0] == 123.0
+    del values, frame
+
+
+def _first_close(block: SharedKlineBlock) -> float:
+    _, values = shm_mod._layout(block._shm.buf, block.total_rows)
+    return float(values[KLINE_COLUMNS.index("close"), 0])
+
+
+def test_release_attached(block, monkeypatch):
+    """测试释放挂载段：keep 中的保留，仍有视图引用的延后释放"""
+    monkeypatch.setattr(shm_mod, "_owned", {})   # 模拟子进程：不复用创建方的段
+    monkeypatch.setattr(shm_mod, "_attached", {})
+    monkeypatch.setattr(shm_mod, "_views", {})
+    frame = attach_frame(block.refs()["AUSDT"])
+    assert list(shm_mod._attached) == [block.name]
+
+    release_attached(keep={block.name})
+    assert list(shm_mod._attached) == [block.name]
+    release_attached()
+    assert list(shm_mod._attached) == [block.name]   # frame 仍引用共享内存，不能解除映射
+    assert frame["close"].iloc[0] == _first_close(block)
+
+    del frame
+    gc.collect()
+    release_attached()
+    assert not shm_mod._attached and not shm_mod._views
+
+
+def test_attach_in_child_process(block, frames):
+    """测试子进程按名称挂载读到与主进程相同的数据"""
+    refs = block.refs()
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        results = pool.map(_attach_in_child, list(refs.values()))
+    for symbol, (first, last, total, shape) in zip(refs, results, strict=True):
+        expected = _expected(frames[symbol])
+        assert (first, last) == (expected.index[0].value, expected.index[-1].value)
+        assert total == pytest.approx(float(np.nansum(expected["close"])))
+        assert shape == expected.shape
+
+
+class _Cache:
+    """按周期导出共享内存的假缓存，failing 中的周期导出失败"""
+
+    def __init__(self, blocks, failing):
+        self.blocks = blocks
+        self.failing = failing
+
+    def export_shared(self, interval):
+        if interval in self.failing:
+            raise OSError("no space left on device")
+        return self.blocks[interval].refs()
+
+
+def test_build_tasks_falls_back_to_pickle(block, frames, caplog):
+    """测试进程模式下导出失败的周期回退 pickle，其余携带 KlineRef"""
+    all_klines = {}
+    for symbol, df in frames.items():
+        all_klines[(symbol, "5m")] = df
+        all_klines[(symbol, "1h")] = df
+    engine = Engine(intervals=["5m", "1h"], compute_backend="process")
+
+    with caplog.at_level("WARNING", logger="indicator_service"):
+        tasks = engine._build_tasks(_Cache({"5m": block}, {"1h"}), all_klines)
+
+    assert any("[1h]" in r.getMessage() for r in caplog.records)
+    for symbol, interval, payload in tasks:
+        if interval == "5m" and symbol in block.refs():
+            assert payload == block.refs()[symbol]
+        else:
+            pd.testing.assert_frame_equal(pickle.loads(payload), frames[symbol])
+
+
+def test_build_tasks_thread_backend_passes_frames(frames):
+    """测试线程模式直接传 DataFrame，不导出共享内存"""
+    all_klines = {(symbol, "5m"): df for symbol, df in frames.items()}
+    tasks = Engine(intervals=["5m"], compute_backend="thread")._build_tasks(None, all_klines)
+    assert [(s, iv) for s, iv, _ in tasks] == list(all_klines)
+    assert all(df is all_klines[(s, iv)] for s, iv, df in tasks)
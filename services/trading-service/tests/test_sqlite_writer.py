@@ -0,0 +1,78 @@
+"""
+SQLite 指标写入测试
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.db.reader import RETENTION, DataWriter  # noqa: E402
+
+
+def _frame(times, symbols, interval="1h", value=1.0):
+    return pd.DataFrame([
+        {"交易对": s, "周期": interval, "数据时间": f"2025-01-01T{t:05d}", "值": value, "信号": "x"}
+        for s in symbols for t in times
+    ])
+
+
+@pytest.fixture
+def writer(tmp_path):
+    w = DataWriter(tmp_path / "market_data.db")
+    yield w
+    w.close()
+
+
+def _query(writer, sql):
+    with sqlite3.connect(writer.sqlite_path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def test_upsert_overwrites_same_key(writer):
+    """测试同一 (交易对, 周期, 数据时间) 覆盖写，缺失列置空"""
+    writer.write("A.py", _frame([1, 2], ["BTCUSDT"]))
+    writer.write("A.py", _frame([2], ["BTCUSDT"], value=2.0).drop(columns=["信号"]))
+    rows = _query(writer, "SELECT 数据时间, 值, 信号 FROM [A.py] ORDER BY 数据时间")
+    assert rows == [("2025-01-01T00001", 1.0, "x"), ("2025-01-01T00002", 2.0, None)]
+
+
+def test_retention_trimmed_per_symbol_interval(writer):
+    """测试保留条数按 (交易对, 周期) 裁剪，并返回写入统计"""
+    stats = writer.write_batch({
+        "A.py": _frame(range(200), ["BTCUSDT", "ETHUSDT"]),
+        "B.py": _frame(range(150), ["BTCUSDT"], interval="1w"),
+    })
+    assert stats["tables"] == 2 and stats["rows"] == 550 and stats["rows_per_s"] > 0
+    counts = _query(writer, "SELECT COUNT(*) FROM [A.py] GROUP BY 交易对")
+    assert counts == [(RETENTION["1h"],), (RETENTION["1h"],)]
+    assert _query(writer, "SELECT MIN(数据时间) FROM [A.py]") == [(f"2025-01-01T{200 - RETENTION['1h']:05d}",)]
+    assert _query(writer, "SELECT COUNT(*) FROM [B.py]") == [(RETENTION["1w"],)]
+
+
+def test_legacy_duplicates_removed_before_index(writer):
+    """测试旧表中的重复键在建唯一索引前被去重（保留最后写入的）"""
+    with sqlite3.connect(writer.sqlite_path) as conn:
+        conn.execute("CREATE TABLE [L.py] (交易对 TEXT, 周期 TEXT, 数据时间 TEXT, 值 REAL)")
+        conn.executemany("INSERT INTO [L.py] VALUES (?,?,?,?)",
+                         [("BTCUSDT", "5m", "t1", 1.0), ("BTCUSDT", "5m", "t1", 2.0)])
+    writer.write("L.py", pd.DataFrame([{"交易对": "BTCUSDT", "周期": "5m", "数据时间": "t2", "值": 3.0}]))
+    assert _query(writer, "SELECT 数据时间, 值 FROM [L.py] ORDER BY 数据时间") == [("t1", 2.0), ("t2", 3.0)]
+
+
+def test_table_without_key_columns_appends(writer):
+    """测试无键列的表走普通 INSERT"""
+    writer.write("N.py", pd.DataFrame([{"a": 1.0}, {"a": 1.0}]))
+    writer.write("N.py", pd.DataFrame([{"a": 1.0}]))
+    assert _query(writer, "SELECT COUNT(*) FROM [N.py]") == [(3,)]
+
+
+def test_write_batch_is_atomic(writer):
+    """测试任一表写入失败时整批回滚"""
+    writer.write("A.py", _frame([1], ["BTCUSDT"]))
+    with pytest.raises(sqlite3.ProgrammingError):
+        writer.write_batch({"A.py": _frame([2], ["ETHUSDT"]), "bad.py": pd.DataFrame([{"交易对": object()}])})
+    assert _query(writer, "SELECT COUNT(*) FROM [A.py]") == [(1,)]
+    writer.write("A.py", _frame([3], ["ETHUSDT"]))
+    assert _query(writer, "SELECT COUNT(*) FROM [A.py]") == [(2,)]
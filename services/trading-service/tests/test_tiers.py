@@ -0,0 +1,197 @@
+"""
+分层币种调度测试
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from src.core.tiers import Tier, TierJob, TierPlan, TierQueue, TierScheduler, run_job  # noqa: E402
+
+
+def _scheduler(chunk=2, every2=3, budget2=0.0):
+    return TierScheduler({
+        1: Tier(1, every=1, budget=0, deadline=1.0),
+        2: Tier(2, every=every2, budget=budget2, deadline=0.8),
+        3: Tier(3, every=0, budget=0, deadline=0.8),
+    }, chunk=chunk)
+
+
+def test_plan_and_cadence():
+    """测试分层切分与各层触发节奏"""
+    universe = ["A", "B", "C", "D", "E", "F"]
+    plan = TierPlan.build(universe, high={"C", "X"}, order=["E", "A", "C", "F"], tier2_size=2)
+    assert plan.tiers == {1: ["C"], 2: ["E", "A"], 3: ["F", "B", "D"]}
+    assert plan.tier_of("A") == 2 and plan.tier_of("X") is None
+    assert plan.all_symbols() == ["C", "E", "A", "F", "B", "D"]
+
+    sched = _scheduler()
+    assert [sched.due("1m") for _ in range(4)] == [[1, 2], [1], [1], [1, 2]]
+    assert sched.due("5m") == [1, 2]
+
+
+def test_budget_rotates_cursor():
+    """测试预算用尽时剩余币种顺延，下一次从游标处继续"""
+    sched = _scheduler(chunk=2)
+    tier = Tier(2, every=1, budget=0.15, deadline=1.0)
+    symbols = ["A", "B", "C", "D", "E"]
+    seen = []
+
+    def compute(chunk, interval):
+        seen.append(chunk)
+        time.sleep(0.1)
+
+    far = time.time() + 60
+    done = run_job(TierJob(2, "1m", time.time(), symbols, far), tier, sched, compute)
+    assert done == 4 and seen == [["A", "B"], ["C", "D"]]
+    seen.clear()
+    run_job(TierJob(2, "1m", time.time(), symbols, far), tier, sched, compute)
+    assert seen[0] == ["E", "A"]
+
+    # 按需任务不轮转、不移动游标
+    seen.clear()
+    run_job(TierJob(3, "1m", time.time(), ["Z"], far, rotating=False), Tier(3, 0, 0, 1.0), sched, compute)
+    assert seen == [["Z"]] and sched.rotate(2, "1m", symbols)[0] == "D"
+
+
+def test_tier1_preempts_lower_tiers():
+    """测试第一层执行期间下层切片等待，超过截止时间放弃"""
+    sched = _scheduler(chunk=1)
+    order = []
+    release = threading.Event()
+
+    def tier1():
+        with sched.foreground():
+            order.append("t1-start")
+            release.wait(1)
+            order.append("t1-end")
+
+    t = threading.Thread(target=tier1)
+    t.start()
+    while not sched.busy():
+        time.sleep(0.001)
+    threading.Timer(0.05, release.set).start()
+    done = run_job(TierJob(2, "1m", time.time(), ["A", "B"], time.time() + 5),
+                   sched.tiers[2], sched, lambda chunk, iv: order.append(chunk[0]))
+    t.join()
+    assert done == 2 and order == ["t1-start", "t1-end", "A", "B"]
+
+    # 第一层一直占用：截止时间到达后放弃
+    with sched.foreground():
+        assert run_job(TierJob(2, "5m", time.time(), ["A"], time.time() + 0.05),
+                       sched.tiers[2], sched, lambda chunk, iv: order.append("late")) == 0
+    assert "late" not in order
+
+
+def test_queue_orders_by_tier_and_dedups():
+    """测试后台队列按层级 / 截止时间出队，同层同周期只保留最新"""
+    q = TierQueue()
+    q.put(TierJob(3, "1m", 0, ["A"], deadline=10, rotating=False))
+    q.put(TierJob(2, "5m", 0, ["B"], deadline=30))
+    q.put(TierJob(2, "1m", 0, ["C"], deadline=20))
+    q.put(TierJob(2, "1m", 60, ["D"], deadline=80))
+    jobs = [q.get(timeout=0) for _ in range(len(q))]
+    assert [(j.level, j.interval, j.symbols) for j in jobs] == [
+        (2, "5m", ["B"]), (2, "1m", ["D"]), (3, "1m", ["A"])]
+    assert q.get(timeout=0.01) is None
+
+
+def test_simple_scheduler_runs_tier2_in_background(monkeypatch):
+    """测试简单调度器: 第二层入队后台执行不阻塞轮询循环，第一层到来时下层在切片间让出"""
+    from datetime import datetime, timedelta, timezone
+
+    from src import simple_scheduler as ss
+
+    calls = []
+
+    def calc(intervals, symbols):
+        calls.append(list(symbols))
+        time.sleep(0.2)
+
+    monkeypatch.setattr(ss, "_run_calculation", calc)
+    monkeypatch.setattr(ss, "_tier_scheduler", _scheduler(chunk=1, every2=1))
+    monkeypatch.setattr(ss, "_background", None)
+    monkeypatch.setattr(ss, "tier2_symbols", ["A", "B", "C", "D"])
+    monkeypatch.setitem(ss.last_computed, "1m", datetime.now(timezone.utc) - timedelta(minutes=1))
+
+    t0 = time.time()
+    ss.run_lower_tiers(["1m"])
+    assert time.time() - t0 < 0.05                  # 只入队
+
+    time.sleep(0.3)                                 # 后台正在算第二片
+    ss.run_tier1(["1m"], ["HIGH"])
+    deadline = time.time() + 5
+    while len(calls) < 5 and time.time() < deadline:
+        time.sleep(0.02)
+
+    # 第一层只等正在执行的一片，之后下层才继续
+    assert calls[0] == ["A"] and calls.index(["HIGH"]) == 2
+    assert sorted(map(tuple, calls)) == [("A",), ("B",), ("C",), ("D",), ("HIGH",)]
+
+
+def test_simple_scheduler_tier3_demand_and_cadence(monkeypatch):
+    """测试简单调度器: 按需请求只入队第一层之外的已知币种；TIER3_EVERY > 0 时第三层轮转入队"""
+    from datetime import datetime, timedelta, timezone
+
+    from src import simple_scheduler as ss
+
+    queue = TierQueue()
+    sched = TierScheduler({
+        1: Tier(1, every=1, budget=0, deadline=1.0),
+        2: Tier(2, every=2, budget=0, deadline=0.8),
+        3: Tier(3, every=1, budget=0, deadline=0.8),
+    }, chunk=2)
+    monkeypatch.setattr(ss, "_background", queue)
+    monkeypatch.setattr(ss, "_tier_scheduler", sched)
+    monkeypatch.setattr(ss, "INTERVALS", ["1m", "1h"])
+    monkeypatch.setattr(ss, "high_priority_symbols", ["BTCUSDT"])
+    monkeypatch.setattr(ss, "tier2_symbols", ["ETHUSDT"])
+    monkeypatch.setattr(ss, "tier3_symbols", ["DOGEUSDT", "PEPEUSDT"])
+
+    ss.request_symbols([" dogeusdt", "BTCUSDT", "NOPEUSDT", "DOGEUSDT"])
+    jobs = [queue.get(0) for _ in range(len(queue))]
+    assert [(j.level, j.interval, j.symbols, j.rotating) for j in sorted(jobs, key=lambda j: j.interval)] == [
+        (3, "1h", ["DOGEUSDT"], False), (3, "1m", ["DOGEUSDT"], False)]
+    ss.request_symbols(["BTCUSDT"])                 # 第一层不重复计算
+    assert len(queue) == 0
+
+    monkeypatch.setitem(ss.last_computed, "1m", datetime.now(timezone.utc) - timedelta(minutes=1))
+    ss.run_lower_tiers(["1m"])
+    ss.run_lower_tiers(["1m"])
+    jobs = [queue.get(0) for _ in range(len(queue))]
+    # 第二层每 2 根、第三层每根触发；同层同周期只保留最新一次
+    assert sorted((j.level, tuple(j.symbols), j.rotating) for j in jobs) == [
+        (2, ("ETHUSDT",), True), (3, ("DOGEUSDT", "PEPEUSDT"), True)]
+
+
+def test_async_engine_coalesces_overrunning_tier1(monkeypatch):
+    """测试第一层同周期在途时触发被合并：不堆积线程，结束后只补算一次"""
+    from src.core import async_full_engine as afe
+
+    engine = afe.FullAsyncEngine.__new__(afe.FullAsyncEngine)
+    engine._tiers = _scheduler()
+    engine._inflight, engine._rerun, engine._inflight_lock = set(), {}, threading.Lock()
+    engine._klines_data = lambda symbols, interval: dict.fromkeys(symbols, b"")
+    release = threading.Event()
+    runs = []
+
+    def run_dag(indicators, klines_data, interval):
+        runs.append((sorted(klines_data), interval))
+        release.wait(5)
+
+    engine._run_dag = run_dag
+    engine._compute_interval(["A"], "1m", ["X.py"])
+    deadline = time.time() + 5
+    while not runs and time.time() < deadline:
+        time.sleep(0.01)
+    engine._compute_interval(["A"], "1m", ["X.py"])
+    engine._compute_interval(["A", "B"], "1m", ["X.py"])
+    assert len(runs) == 1 and engine._rerun["1m"][0] == ["A", "B"]
+
+    release.set()
+    while "1m" in engine._inflight and time.time() < deadline:
+        time.sleep(0.01)
+    assert runs == [(["A"], "1m"), (["A", "B"], "1m")]
+    assert not engine._inflight and not engine._rerun
@@ -0,0 +1,141 @@
+"""
+Tracing 采样 / 环形缓冲 / 导出测试
+"""
+import json
+import pickle
+import threading
+import time
+
+import pytest
+
+from src.observability import tracing
+from src.observability.tracing import (
+    configure,
+    current_context,
+    export_traces,
+    get_traces,
+    ingest_spans,
+    pop_trace_spans,
+    to_chrome_trace,
+    to_otlp_json,
+    trace,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracer(monkeypatch):
+    monkeypatch.setattr(tracing, "_pending", {})
+    monkeypatch.setattr(tracing, "_traces", tracing.deque(maxlen=50))
+    monkeypatch.setattr(tracing, "_finished", tracing.OrderedDict())
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "SLOW_MS", 5000.0)
+
+
+def test_nested_spans_land_in_buffer():
+    """测试嵌套 Span 共享 trace_id，根 Span 结束后整条 trace 进入缓冲"""
+    with trace("root", symbol="BTCUSDT") as root:
+        with trace("child") as child:
+            assert current_context() == (root.trace_id, child.span_id, True)
+        assert not get_traces()
+    traces = get_traces()
+    assert len(traces) == 1 and [s.name for s in traces[0]] == ["child", "root"]
+    assert child.parent_id == root.span_id and root.parent_id is None
+    assert len(root.trace_id) == 32 and len(root.span_id) == 16
+
+
+def test_sampling_keeps_slow_and_error_traces():
+    """测试未采样的 trace 只保留慢的和出错的"""
+    configure(sample_rate=0, slow_ms=20)
+    with trace("fast"):
+        pass
+    with trace("slow"):
+        time.sleep(0.03)
+    with pytest.raises(ValueError):
+        with trace("boom"):
+            raise ValueError("x")
+    assert [t[0].name for t in get_traces()] == ["slow", "boom"]
+    assert get_traces()[1][0].tags["error"] == "x"
+
+
+def test_buffer_is_bounded():
+    """测试环形缓冲只保留最近的 trace"""
+    configure(buffer=3)
+    for i in range(5):
+        with trace(f"t{i}"):
+            pass
+    assert [t[0].name for t in get_traces()] == ["t2", "t3", "t4"]
+    assert [t[0].name for t in get_traces(limit=1)] == ["t4"]
+
+
+def test_cross_thread_parent():
+    """测试线程池任务通过 parent 上下文挂到调用方的 trace 下"""
+    with trace("batch") as root:
+        ctx = current_context()
+
+        def work():
+            with trace("node", parent=ctx):
+                pass
+        t = threading.Thread(target=work)
+        t.start()
+        t.join()
+    spans = get_traces()[0]
+    node = next(s for s in spans if s.name == "node")
+    assert node.trace_id == root.trace_id and node.parent_id == root.span_id
+    assert node.tid != root.tid
+
+
+def test_worker_spans_round_trip(monkeypatch):
+    """测试子进程 Span 经 pickle 带回后并入主进程的 trace"""
+    with trace("compute") as root:
+        ctx = current_context()
+        # 模拟子进程：独立的进行中表，本地根 Span 的父节点来自主进程
+        parent_pending = tracing._pending
+        monkeypatch.setattr(tracing, "_pending", {})
+        with trace("compute.batch", parent=ctx) as batch:
+            with trace("MACD"):
+                pass
+        spans = pickle.loads(pickle.dumps(pop_trace_spans(batch.trace_id)))
+        monkeypatch.setattr(tracing, "_pending", parent_pending)
+        assert [s.name for s in spans] == ["MACD", "compute.batch"]
+        ingest_spans(spans)
+    assert [s.name for s in get_traces()[0]] == ["MACD", "compute.batch", "compute"]
+    assert get_traces()[0][1].parent_id == root.span_id
+
+    # trace 已结束后带回的 Span 丢弃
+    ingest_spans(spans)
+    assert len(get_traces()[0]) == 3
+
+
+def test_chrome_and_otlp_export(tmp_path):
+    """测试 Chrome trace-event 与 OTLP-JSON 导出结构"""
+    with trace("root", n=3):
+        with trace("child") as child:
+            child.add_event("retry", attempt=1)
+
+    chrome = to_chrome_trace()
+    spans = [e for e in chrome["traceEvents"] if e["ph"] == "X"]
+    assert len(spans) == 2 and all({"ts", "dur", "pid", "tid"} <= e.keys() for e in spans)
+    assert any(e["ph"] == "i" and e["name"] == "retry" for e in chrome["traceEvents"])
+
+    otlp = to_otlp_json()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in otlp}
+    assert len(by_name["root"]["traceId"]) == 32 and "parentSpanId" not in by_name["root"]
+    assert by_name["child"]["parentSpanId"] == by_name["root"]["spanId"]
+    assert {"key": "n", "value": {"intValue": "3"}} in by_name["root"]["attributes"]
+
+    path = tmp_path / "trace.json"
+    export_traces(path, fmt="otlp")
+    assert json.loads(path.read_text())["resourceSpans"]
+    export_traces(path)
+    assert json.loads(path.read_text())["traceEvents"]
+
+
+def test_dag_nodes_traced_under_batch():
+    """测试 DAG 节点在调用方 Span 下各自生成 Span"""
+    pytest.importorskip("psycopg")
+    from src.core.dag import DagScheduler
+
+    with trace("compute.batch"):
+        DagScheduler({"a": (), "b": ("a",)}, max_workers=2).run(lambda node: None)
+    names = sorted(s.name for s in get_traces()[0])
+    assert names == ["a", "b", "compute.batch"]
@@ -0,0 +1,51 @@
+"""
+VPVR 成交量分布测试
+"""
+import numpy as np
+
+from src.indicators.batch.vpvr import build_volume_profiles, compute_vpvr_distribution
+
+
+def _naive_profile(df, bins):
+    lo, hi = float(df["low"].min()), float(df["high"].max())
+    total, buy = np.zeros(bins), np.zeros(bins)
+    for _, row in df.iterrows():
+        vol = float(row["volume"])
+        if not vol > 0:
+            continue
+        taker = float(row["taker_buy_volume"])
+        taker = vol * 0.5 if taker == 0 or np.isnan(taker) else taker
+        tp = (row["high"] + row["low"] + row["close"]) / 3
+        idx = min(max(int((tp - lo) / (hi - lo) * bins), 0), bins - 1)
+        total[idx] += vol
+        buy[idx] += taker
+    return total, buy
+
+
+def test_profile_matches_row_loop(sample_klines):
+    """测试 bincount 分布与逐行累加逐位一致（含缺失成交量与主动买量）"""
+    df = sample_klines.iloc[-200:]
+    profile = build_volume_profiles(df, [(0, len(df), 48)])[0]
+    total, buy = _naive_profile(df, 48)
+    assert np.array_equal(profile.总量, total)
+    assert np.array_equal(profile.主动买量, buy)
+    assert np.allclose(profile.主动买量 + profile.主动卖量, profile.总量)
+
+
+def test_multi_window_profiles_match_single(sample_klines):
+    """测试一次构建多窗口/多分桶与逐个构建一致"""
+    windows = [(0, 150, 48), (150, 300, 48), (250, 450, 24), (0, 450, 96)]
+    profiles = build_volume_profiles(sample_klines, windows)
+    for (start, end, bins), profile in zip(windows, profiles, strict=True):
+        single = build_volume_profiles(sample_klines.iloc[start:end], [(0, end - start, bins)])[0]
+        assert np.array_equal(profile.总量, single.总量)
+        assert profile.总成交量 == single.总成交量
+        assert profile.价格下限 == single.价格下限
+
+
+def test_zero_volume_window(sample_klines):
+    """测试无成交量窗口返回 None"""
+    df = sample_klines.iloc[-50:].copy()
+    df["volume"] = 0.0
+    assert build_volume_profiles(df, [(0, len(df), 48)]) == [None]
+    assert compute_vpvr_distribution(df) is None